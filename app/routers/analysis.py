@@ -4,11 +4,13 @@
 
 import asyncio
 import json
+import os
 import re
 import secrets
 import threading
 import time
 from collections import OrderedDict, deque
+from contextlib import contextmanager
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from enum import Enum
@@ -45,8 +47,13 @@ def _get_report_mgr():
     return _report_mgr_instance
 
 
-# 專用執行緒池：分析任務獨立執行（最大並發 3 個分析）
-_ANALYSIS_EXECUTOR = ThreadPoolExecutor(max_workers=3, thread_name_prefix="analysis")
+# 專用執行緒池：分析任務獨立執行（預設最大並發 3 個分析）
+# 每個分析的設定與快取範圍各自綁定，可透過 ANALYSIS_MAX_CONCURRENCY 提高並發數
+try:
+    _ANALYSIS_MAX_CONCURRENCY = max(1, int(os.getenv("ANALYSIS_MAX_CONCURRENCY", "3")))
+except ValueError:
+    _ANALYSIS_MAX_CONCURRENCY = 3
+_ANALYSIS_EXECUTOR = ThreadPoolExecutor(max_workers=_ANALYSIS_MAX_CONCURRENCY, thread_name_prefix="analysis")
 # 翻譯專用執行緒池（與分析分離，避免長時間翻譯阻塞新分析請求）
 _TRANSLATE_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="translate")
 # 個股快照用輕量執行緒池（yfinance I/O 密集）
@@ -993,6 +1000,19 @@ def _get_translate_client(provider: str):
         return _translate_clients[provider]
 
 
+@contextmanager
+def _translate_slot(provider: str, model: str, tokens: int):
+    """以 background 優先權取得 LLM 調度器額度（與分析共用供應商額度；調度器停用時不限制）"""
+    from tradingagents.graph.llm_governor import PRIORITY_BACKGROUND, get_llm_governor
+
+    governor = get_llm_governor()
+    if governor is None:
+        yield None
+        return
+    with governor.acquire(provider, model, tokens, PRIORITY_BACKGROUND) as lease:
+        yield lease
+
+
 def _translate_result_to_english(formatted_result: dict) -> dict | None:
     """將分析結果翻譯成英文，支援 OpenAI / Anthropic 自動 fallback。
 
@@ -1001,6 +1021,8 @@ def _translate_result_to_english(formatted_result: dict) -> dict | None:
     """
     import os
 
+    from tradingagents.agents.utils.context_budget import get_tokenizer
+
     state = formatted_result.get("state", {})
     decision = formatted_result.get("decision", {})
 
@@ -1069,27 +1091,36 @@ def _translate_result_to_english(formatted_result: dict) -> dict | None:
                 client = _get_translate_client("openai")
                 if client is None:
                     continue
-                resp = client.chat.completions.create(
-                    model=model,
-                    temperature=0.3,
-                    response_format={"type": "json_object"},
-                    messages=[
-                        {"role": "system", "content": _TRANSLATE_SYSTEM_PROMPT},
-                        {"role": "user", "content": user_content},
-                    ],
-                )
+                # 譯文長度與原文相當，估算的 token 數為輸入的兩倍
+                estimated = 2 * get_tokenizer(model).count(_TRANSLATE_SYSTEM_PROMPT + user_content)
+                with _translate_slot(provider, model, estimated) as lease:
+                    resp = client.chat.completions.create(
+                        model=model,
+                        temperature=0.3,
+                        response_format={"type": "json_object"},
+                        messages=[
+                            {"role": "system", "content": _TRANSLATE_SYSTEM_PROMPT},
+                            {"role": "user", "content": user_content},
+                        ],
+                    )
+                    if lease is not None and resp.usage is not None:
+                        lease.settle(resp.usage.total_tokens)
                 translated = json.loads(resp.choices[0].message.content)
             else:
                 client = _get_translate_client("anthropic")
                 if client is None:
                     continue
-                resp = client.messages.create(
-                    model=model,
-                    max_tokens=8192,
-                    temperature=0.3,
-                    system=_TRANSLATE_SYSTEM_PROMPT,
-                    messages=[{"role": "user", "content": user_content}],
-                )
+                estimated = 2 * get_tokenizer(model).count(_TRANSLATE_SYSTEM_PROMPT + user_content)
+                with _translate_slot(provider, model, estimated) as lease:
+                    resp = client.messages.create(
+                        model=model,
+                        max_tokens=8192,
+                        temperature=0.3,
+                        system=_TRANSLATE_SYSTEM_PROMPT,
+                        messages=[{"role": "user", "content": user_content}],
+                    )
+                    if lease is not None and resp.usage is not None:
+                        lease.settle(resp.usage.input_tokens + resp.usage.output_tokens)
                 # 從回應文字中解析 JSON（穩健處理 code fence 變體）
                 raw = resp.content[0].text.strip()
                 fence_match = re.search(r"```(?:json)?[ \t]*\n([\s\S]*?)\n[ \t]*```", raw)
@@ -1162,13 +1193,27 @@ def _translate_result_to_english(formatted_result: dict) -> dict | None:
 # ---------------------------------------------------------------------------
 # 個股快照 API（即時行情 + 新聞）
 # ---------------------------------------------------------------------------
-_CONTEXT_CACHE: dict = {}
-_CONTEXT_CACHE_LOCK = threading.Lock()  # 保護 _CONTEXT_CACHE 的並發讀寫
-_CONTEXT_CACHE_TTL = 900  # 15 分鐘（個股快照更新頻率不需太高）
-_MAX_CONTEXT_CACHE = 200  # 快取條目上限
+# 個股快照存於分層快取的 stock_context 命名空間（15 分鐘，更新頻率不需太高），多個 worker 共用
+_CONTEXT_CACHE_NAMESPACE = "stock_context"
 _CONTEXT_FETCH_MAX_RETRIES = 2  # 快照取得失敗時最多重試次數
 
 
+async def _get_cached_context(cache_key: str) -> Optional[dict]:
+    """讀取個股快照快取（回傳深拷貝，呼叫端修改不影響快取內容；I/O 於執行緒中執行）"""
+    import copy
+    from tradingagents.dataflows.tiered_cache import get_tiered_cache
+
+    cached = await get_tiered_cache().aget(_CONTEXT_CACHE_NAMESPACE, cache_key)
+    return copy.deepcopy(cached) if cached is not None else None
+
+
+async def _set_cached_context(cache_key: str, data: dict) -> None:
+    """寫入個股快照快取（寫入深拷貝，之後修改 data 不影響快取內容）"""
+    import copy
+    from tradingagents.dataflows.tiered_cache import get_tiered_cache
+
+    await get_tiered_cache().aset(_CONTEXT_CACHE_NAMESPACE, cache_key, copy.deepcopy(data))
+
 
 def _fetch_stock_context(symbol: str, _retry: int = 0) -> dict:
     """取得個股即時行情、關鍵指標和近期新聞（同步，在 executor 中執行）
@@ -1246,36 +1291,24 @@ async def get_stock_context(symbol: str, request: Request):
 
     # 快取檢查：英文直接使用基礎快取，中文使用語言特定快取（含翻譯標題）
     base_cache_key = f"ctx_{symbol}"
-    with _CONTEXT_CACHE_LOCK:
-        if lang != "zh-TW":
-            cached = _CONTEXT_CACHE.get(base_cache_key)
-            if cached and time.time() - cached["_ts"] < _CONTEXT_CACHE_TTL:
-                return cached["data"]
-        else:
-            cache_key = f"ctx_{symbol}_zh-TW"
-            cached = _CONTEXT_CACHE.get(cache_key)
-            if cached and time.time() - cached["_ts"] < _CONTEXT_CACHE_TTL:
-                return cached["data"]
-
-        base_cached = _CONTEXT_CACHE.get(base_cache_key)
+    cache_key = f"ctx_{symbol}_zh-TW" if lang == "zh-TW" else base_cache_key
+    cached = await _get_cached_context(cache_key)
+    if cached is not None:
+        return cached
 
     loop = asyncio.get_running_loop()
 
-    import copy
-    if base_cached and time.time() - base_cached["_ts"] < _CONTEXT_CACHE_TTL:
-        # 基礎資料已快取，深拷貝後再翻譯避免汙染基礎快取
-        data = copy.deepcopy(base_cached["data"])
-    else:
+    # 中文語系可沿用已快取的英文基礎資料，再翻譯新聞標題
+    data = await _get_cached_context(base_cache_key) if cache_key != base_cache_key else None
+    if data is None:
         data = await loop.run_in_executor(_CONTEXT_EXECUTOR, _fetch_stock_context, symbol)
 
         # 若取得行情失敗，回傳 502 並使用 i18n 錯誤訊息
         if data.get("error"):
             raise HTTPException(status_code=502, detail=_t("stock_context_error", request))
 
-        # 寫入基礎快取（深拷貝，避免後續翻譯修改影響快取中的英文版本）
-        now = time.time()
-        with _CONTEXT_CACHE_LOCK:
-            _CONTEXT_CACHE[base_cache_key] = {"data": copy.deepcopy(data), "_ts": now}
+        # 寫入基礎快取（深拷貝，後續翻譯修改不影響快取中的英文版本）
+        await _set_cached_context(base_cache_key, data)
 
     # 中文語系時翻譯新聞標題（使用 gpt-4.1-nano 快速翻譯 + 共用快取）
     if lang == "zh-TW" and data.get("news"):
@@ -1289,19 +1322,8 @@ async def get_stock_context(symbol: str, request: Request):
         except Exception as exc:
             logger.debug(f"股票快照新聞翻譯逾時或失敗（顯示英文）: {exc}")
 
-    # 寫入快取（中文寫入語言特定鍵，英文已由基礎快取涵蓋）+ 清理過期與超限條目
-    now = time.time()
-    with _CONTEXT_CACHE_LOCK:
-        if lang == "zh-TW":
-            _CONTEXT_CACHE[cache_key] = {"data": data, "_ts": now}
-        expired = [k for k, v in _CONTEXT_CACHE.items() if now - v["_ts"] > _CONTEXT_CACHE_TTL]
-        for k in expired:
-            _CONTEXT_CACHE.pop(k, None)
-        if len(_CONTEXT_CACHE) > _MAX_CONTEXT_CACHE:
-            sorted_keys = sorted(
-                _CONTEXT_CACHE.keys(), key=lambda k: _CONTEXT_CACHE[k]["_ts"]
-            )
-            for k in sorted_keys[:len(_CONTEXT_CACHE) - _MAX_CONTEXT_CACHE]:
-                _CONTEXT_CACHE.pop(k, None)
+    # 中文寫入語言特定鍵（英文已由基礎快取涵蓋）；過期與容量由分層快取處理
+    if cache_key != base_cache_key:
+        await _set_cached_context(cache_key, data)
 
     return data
@@ -30,17 +30,12 @@ from app.utils.tw_terminology import normalize_tw_terminology
 
 router = APIRouter(tags=["trending"])
 
-# 快取設定
-_CACHE_TTL_SECONDS = 600  # 10 分鐘快取（市場資料）
-_AI_CACHE_TTL_SECONDS = 7200  # 2 小時快取（AI 分析）
+# 快取設定（市場資料 10 分鐘、AI 分析 2 小時，由分層快取的 trending / trending_ai 命名空間設定）
 _BG_REFRESH_INTERVAL = 300  # 背景刷新間隔：5 分鐘
 _BG_REFRESH_TIMEOUT = 120  # 背景刷新超時：2 分鐘
 _BG_BACKOFF_EXPONENT_MAX = 10  # 指數退避上限（避免大整數運算）
 _BG_BACKOFF_SECONDS_MAX = 1800  # 退避最大間隔：30 分鐘
 _BG_JITTER_MAX = 30  # 隨機抖動上限：30 秒
-_MAX_CACHE_ENTRIES = 20  # 快取條目上限，防止記憶體膨脹
-_cache: dict = {}
-_cache_lock = threading.Lock()
 
 # AI 分析端點專屬速率限制（每 IP 5 次/60 秒，防止高成本 LLM 呼叫被濫用）
 _AI_RATE_LIMIT_MAX = 5
@@ -177,21 +172,23 @@ async def _safe_run_in_executor(fn, fallback, *, context: str = ""):
         return fallback
 
 
-def _get_llm(provider: str, model: str, temperature: float = 0, max_tokens: int = 2000):
-    """取得或建立 LangChain LLM 客戶端（執行緒安全懶初始化）"""
-    key = f"{provider}:{model}:{temperature}"
+def _get_llm(provider: str, model: str, temperature: float = 0, max_tokens: int = 2000,
+             priority: str = "background"):
+    """取得或建立 LangChain LLM 客戶端（執行緒安全懶初始化）
+
+    客戶端經過行程共用的 LLM 調度器，與分析共用供應商的 RPM / TPM 額度；
+    預設為 background 優先權（標題翻譯、預先產生），不佔用保留給互動分析的額度
+    """
+    from tradingagents.graph.llm_governor import create_chat_model
+
+    key = f"{provider}:{model}:{temperature}:{priority}"
     with _llm_clients_lock:
         if key not in _llm_clients:
-            if provider == "openai":
-                from langchain_openai import ChatOpenAI
-                _llm_clients[key] = ChatOpenAI(
-                    model=model, temperature=temperature, max_tokens=max_tokens
-                )
-            else:
-                from langchain_anthropic import ChatAnthropic
-                _llm_clients[key] = ChatAnthropic(
-                    model=model, temperature=temperature, max_tokens=max_tokens
-                )
+            _llm_clients[key] = create_chat_model(
+                "openai" if provider == "openai" else "anthropic",
+                priority=priority,
+                model=model, temperature=temperature, max_tokens=max_tokens,
+            )
         return _llm_clients[key]
 
 
@@ -229,18 +226,19 @@ _STOCK_UNIVERSE = [
 ]
 
 
-def _get_cached(key: str, ttl: int = _CACHE_TTL_SECONDS) -> Optional[dict]:
-    """取得快取資料（如果未過期）"""
-    with _cache_lock:
-        entry = _cache.get(key)
-        if entry and time.time() - entry["ts"] < ttl:
-            return entry["data"]
-    return None
+def _cache_namespace(key: str) -> str:
+    return "trending_ai" if key.startswith("ai_") else "trending"
+
+
+async def _get_cached(key: str) -> Optional[dict]:
+    """取得快取資料（如果未過期），經分層快取由多個 worker 共用（I/O 於執行緒中執行）"""
+    from tradingagents.dataflows.tiered_cache import get_tiered_cache
+    return await get_tiered_cache().aget(_cache_namespace(key), key)
 
 
-def get_cached_overview() -> Optional[dict]:
+async def get_cached_overview() -> Optional[dict]:
     """取得快取的市場概覽資料（供首頁 SSR 預渲染用）"""
-    return _get_cached("overview")
+    return await _get_cached("overview")
 
 
 # 預序列化的 SSR JSON 字串快取（背景刷新時更新，避免每次請求重複序列化）
@@ -252,34 +250,21 @@ def get_cached_overview_json() -> str:
     return _cached_ssr_json
 
 
-def _update_ssr_json_cache():
+async def _update_ssr_json_cache():
     """背景刷新後呼叫，將 overview 資料預序列化為 JSON 字串"""
     global _cached_ssr_json
     import json as _json
-    data = _get_cached("overview")
+    data = await _get_cached("overview")
     if data:
         _cached_ssr_json = _json.dumps(data, ensure_ascii=False).replace("</", r"<\/")
     else:
         _cached_ssr_json = ""
 
 
-def _set_cache(key: str, data: dict):
-    """設定快取（超過上限時先清過期再淘汰最舊，確保不超限）"""
-    now = time.time()
-    with _cache_lock:
-        _cache[key] = {"data": data, "ts": now}
-        if len(_cache) > _MAX_CACHE_ENTRIES:
-            # 第一輪：清理已過期的條目
-            expired = [
-                k for k, v in _cache.items()
-                if now - v["ts"] > (_AI_CACHE_TTL_SECONDS if k.startswith("ai_") else _CACHE_TTL_SECONDS)
-            ]
-            for k in expired:
-                _cache.pop(k, None)
-            # 第二輪：仍超限則淘汰最舊條目（LRU 保底）
-            while len(_cache) > _MAX_CACHE_ENTRIES:
-                oldest_key = min(_cache, key=lambda k: _cache[k]["ts"])
-                _cache.pop(oldest_key, None)
+async def _set_cache(key: str, data: dict):
+    """設定快取（有效期依命名空間，容量與淘汰由分層快取處理）"""
+    from tradingagents.dataflows.tiered_cache import get_tiered_cache
+    await get_tiered_cache().aset(_cache_namespace(key), key, data)
 
 
 def _fetch_indices_and_sectors() -> tuple[list[dict], list[dict]]:
@@ -633,7 +618,7 @@ def _translate_news_titles(news_items: list[dict]) -> list[dict]:
 @router.get("/trending/overview")
 async def get_market_overview():
     """取得市場概覽（主要指數 + 漲跌幅排行 + 新聞）"""
-    cached = _get_cached("overview")
+    cached = await _get_cached("overview")
     if cached:
         return cached
 
@@ -678,15 +663,15 @@ async def get_market_overview():
         result["degraded"] = True
         return JSONResponse(status_code=503, content=result)
 
-    _set_cache("overview", result)
-    _update_ssr_json_cache()
+    await _set_cache("overview", result)
+    await _update_ssr_json_cache()
     return result
 
 
 @router.get("/trending/indices")
 async def get_indices():
     """取得主要指數行情"""
-    cached = _get_cached("indices")
+    cached = await _get_cached("indices")
     if cached:
         return cached
 
@@ -704,7 +689,7 @@ async def get_indices():
         result["degraded"] = True
         return JSONResponse(status_code=503, content=result)
 
-    _set_cache("indices", result)
+    await _set_cache("indices", result)
     return result
 
 
@@ -896,11 +881,12 @@ Please write a daily market trend analysis report covering:
 Note: Do NOT provide any buy/sell recommendations for individual stocks. Keep the analysis purely objective and informational."""
 
 
-def _generate_ai_analysis(market_context: str, lang: str) -> tuple[str, str, str]:
+def _generate_ai_analysis(market_context: str, lang: str, priority: str = "background") -> tuple[str, str, str]:
     """呼叫 LLM 生成市場趨勢分析（支援自動 fallback）。
 
     回傳 (content, error, actual_provider)。
     如果第一個 provider 失敗，會自動嘗試下一個。
+    使用者請求時以 interactive 優先權呼叫，背景預先產生使用 background。
     """
     providers = _get_ai_providers()
     if not providers:
@@ -915,7 +901,7 @@ def _generate_ai_analysis(market_context: str, lang: str) -> tuple[str, str, str
     last_error = ""
     for provider, model in providers:
         try:
-            llm = _get_llm(provider, model, temperature=0.3)
+            llm = _get_llm(provider, model, temperature=0.3, priority=priority)
 
             response = llm.invoke(messages)
             content = response.content
@@ -960,7 +946,7 @@ async def get_ai_analysis(request: Request, lang: str = "zh-TW"):
         lang = "zh-TW"
 
     cache_key = f"ai_analysis_{lang}"
-    cached = _get_cached(cache_key, ttl=_AI_CACHE_TTL_SECONDS)
+    cached = await _get_cached(cache_key)
     if cached:
         return cached
 
@@ -1010,12 +996,12 @@ async def get_ai_analysis(request: Request, lang: str = "zh-TW"):
 
     try:
         # double-check: 前一個請求可能已填入快取
-        cached = _get_cached(cache_key, ttl=_AI_CACHE_TTL_SECONDS)
+        cached = await _get_cached(cache_key)
         if cached:
             return cached
 
         # 取得市場資料（帶容錯的並行抓取）
-        overview = _get_cached("overview")
+        overview = await _get_cached("overview")
         if not overview:
             # 合併 indices + sectors 為單次 API 呼叫，避免重複執行
             indices_and_sectors, movers, news = await asyncio.gather(
@@ -1031,15 +1017,15 @@ async def get_ai_analysis(request: Request, lang: str = "zh-TW"):
                 "sectors": sectors,
                 "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             }
-            _set_cache("overview", overview)
-            _update_ssr_json_cache()
+            await _set_cache("overview", overview)
+            await _update_ssr_json_cache()
 
         market_context = _build_market_context(overview)
         loop = asyncio.get_running_loop()
 
         content, error, actual_provider = await asyncio.wait_for(
             loop.run_in_executor(
-                _TRENDING_EXECUTOR, _generate_ai_analysis, market_context, lang
+                _TRENDING_EXECUTOR, _generate_ai_analysis, market_context, lang, "interactive"
             ),
             timeout=120.0,
         )
@@ -1053,7 +1039,7 @@ async def get_ai_analysis(request: Request, lang: str = "zh-TW"):
         if error:
             result["error"] = error
         if content:
-            _set_cache(cache_key, result)
+            await _set_cache(cache_key, result)
         return result
 
     except asyncio.TimeoutError:
@@ -1079,7 +1065,7 @@ async def get_ai_analysis(request: Request, lang: str = "zh-TW"):
 
 async def _pregenerate_ai_analysis():
     """預先產生中英文 AI 趨勢分析（背景呼叫）"""
-    overview = _get_cached("overview")
+    overview = await _get_cached("overview")
     if not overview:
         return
 
@@ -1093,7 +1079,7 @@ async def _pregenerate_ai_analysis():
     # 收集需要產生的語言（已快取且未過期者跳過）
     langs_to_generate = [
         lang for lang in ("zh-TW", "en")
-        if not _get_cached(f"ai_analysis_{lang}", ttl=_AI_CACHE_TTL_SECONDS)
+        if not await _get_cached(f"ai_analysis_{lang}")
     ]
     if not langs_to_generate:
         return
@@ -1115,7 +1101,7 @@ async def _pregenerate_ai_analysis():
                     "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                     "provider": actual_provider or providers[0][0],
                 }
-                _set_cache(cache_key, result)
+                await _set_cache(cache_key, result)
                 logger.info(f"AI 趨勢分析預產生完成 (lang={lang})")
             elif error:
                 logger.warning(f"AI 趨勢分析預產生失敗 (lang={lang}): {error}")
@@ -1132,10 +1118,10 @@ async def _precache_top_movers_context():
     """背景預快取漲跌排行 Top 股票的個股快照。
 
     從快取的市場概覽中提取 gainers + losers 的股票代碼，
-    並行呼叫 _fetch_stock_context() 寫入 _CONTEXT_CACHE，
+    並行呼叫 _fetch_stock_context() 寫入個股快照快取，
     讓使用者點擊漲跌排行時能立即取得個股快照（100ms vs 5-15s）。
     """
-    overview = get_cached_overview()
+    overview = await get_cached_overview()
     if not overview:
         return
 
@@ -1150,19 +1136,10 @@ async def _precache_top_movers_context():
     if not symbols:
         return
 
-    from app.routers.analysis import (
-        _fetch_stock_context, _CONTEXT_CACHE, _CONTEXT_CACHE_LOCK, _CONTEXT_CACHE_TTL,
-    )
+    from app.routers.analysis import _fetch_stock_context, _get_cached_context, _set_cached_context
 
     # 過濾已有有效快取的股票，只預快取缺失或過期的
-    now = time.time()
-    need_cache = []
-    with _CONTEXT_CACHE_LOCK:
-        for sym in symbols:
-            cache_key = f"ctx_{sym}"
-            cached = _CONTEXT_CACHE.get(cache_key)
-            if not cached or now - cached["_ts"] > _CONTEXT_CACHE_TTL:
-                need_cache.append(sym)
+    need_cache = [sym for sym in symbols if await _get_cached_context(f"ctx_{sym}") is None]
 
     if not need_cache:
         logger.info(f"Top 股票快照全部命中快取（{len(symbols)} 支）")
@@ -1175,15 +1152,13 @@ async def _precache_top_movers_context():
     results = await asyncio.gather(*tasks, return_exceptions=True)
 
     cached_count = 0
-    now = time.time()
-    with _CONTEXT_CACHE_LOCK:
-        for sym, result in zip(need_cache, results):
-            if isinstance(result, Exception):
-                logger.debug(f"預快取 {sym} 快照失敗: {result}")
-                continue
-            if isinstance(result, dict) and not result.get("error"):
-                _CONTEXT_CACHE[f"ctx_{sym}"] = {"data": result, "_ts": now}
-                cached_count += 1
+    for sym, result in zip(need_cache, results):
+        if isinstance(result, Exception):
+            logger.debug(f"預快取 {sym} 快照失敗: {result}")
+            continue
+        if isinstance(result, dict) and not result.get("error"):
+            await _set_cached_context(f"ctx_{sym}", result)
+            cached_count += 1
 
     logger.info(f"Top 股票快照預快取完成: {cached_count}/{len(need_cache)} 成功")
 
@@ -1214,11 +1189,9 @@ async def start_background_refresh():
             jitter = random.uniform(0, _BG_JITTER_MAX)
             await asyncio.sleep(backoff + jitter)
         try:
-            # 標記快取過期但保留舊資料，避免穿透（使用者仍可讀取舊快取）
-            with _cache_lock:
-                entry = _cache.get("overview")
-                if entry:
-                    _cache["overview"] = {"data": entry["data"], "ts": 0}
+            # 使快取失效以重新取得（首頁 SSR 預序列化的 JSON 保留舊資料直到刷新完成）
+            from tradingagents.dataflows.tiered_cache import get_tiered_cache
+            await get_tiered_cache().adelete(_cache_namespace("overview"), "overview")
             # 含 LLM 翻譯的市場資料取得
             await asyncio.wait_for(get_market_overview(), timeout=_BG_REFRESH_TIMEOUT)
             logger.info("背景趨勢刷新完成")
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+測試共用設定與假物件
+
+- 載入時將日誌、設定檔與資料快取目錄導向本次測試的暫存目錄，
+  測試不在原始碼樹中留下檢查點、鎖檔、快取、日誌或設定檔
+- fake_llm / fake_toolkit：記錄呼叫的假 LLM 與假工具（回傳類別，由測試建立實例）
+- build_graph：以假 LLM 與假工具重建只含指定分析師的 TradingAgentsGraph，
+  資料快取與結果目錄位於該測試的 tmp_path
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+# 必須在匯入 tradingagents 之前設定：設定管理器與日誌系統在匯入時即建立檔案
+_SANDBOX_DIR = tempfile.mkdtemp(prefix="tradingagents-tests-")
+os.environ["TRADINGAGENTS_LOG_DIR"] = os.path.join(_SANDBOX_DIR, "logs")
+os.environ["TRADINGAGENTS_CONFIG_DIR"] = os.path.join(_SANDBOX_DIR, "config")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from tradingagents.default_config import DEFAULT_CONFIG  # noqa: E402
+
+DEFAULT_CONFIG["data_cache_dir"] = os.path.join(_SANDBOX_DIR, "data_cache")
+DEFAULT_CONFIG["results_dir"] = os.path.join(_SANDBOX_DIR, "results")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_SANDBOX_DIR, ignore_errors=True)
+
+
+DEFAULT_REPLY = "分析結論：建議買入，目標價 $200，理由充分。"
+
+
+class FakeLLM:
+    """記錄同步與非同步呼叫的假 LLM
+
+    Args:
+        content: 回應內容，或接收目前呼叫次數並回傳內容的函式
+        delay: 每次呼叫的延遲秒數
+        fail: 是否每次呼叫都失敗
+        model_name: 模型 ID（設定時報告快取可計算快取鍵）
+        live: False 時任何呼叫都視為測試失敗（replay 模式不應連網）
+    """
+
+    def __init__(self, content=DEFAULT_REPLY, delay=0.0, fail=False, model_name=None, live=True):
+        self.content = content
+        self.delay = delay
+        self.fail = fail
+        self.live = live
+        if model_name:
+            self.model_name = model_name
+            self.temperature = 0
+        self.prompts = []
+        self.sync_calls = 0
+        self.async_calls = 0
+        self._failures = []
+        self._lock = threading.Lock()
+
+    @property
+    def calls(self):
+        return self.sync_calls + self.async_calls
+
+    def fail_on(self, *markers, times=-1):
+        """提示詞包含所有 markers 時拋出 503（times 次後恢復，-1 表示持續失敗）"""
+        with self._lock:
+            self._failures.append([markers, times])
+
+    def clear_failures(self):
+        with self._lock:
+            self._failures.clear()
+
+    def count(self, *markers):
+        """包含所有 markers 的提示詞數"""
+        with self._lock:
+            return sum(all(m in str(p) for m in markers) for p in self.prompts)
+
+    def _record(self, prompt, is_async):
+        assert self.live, "replay 模式不應呼叫 LLM"
+        text = str(prompt)
+        with self._lock:
+            self.prompts.append(prompt)
+            if is_async:
+                self.async_calls += 1
+            else:
+                self.sync_calls += 1
+            calls = self.sync_calls + self.async_calls
+            if self.fail:
+                raise RuntimeError("503 Service Unavailable")
+            for failure in self._failures:
+                markers, remaining = failure
+                if remaining != 0 and all(m in text for m in markers):
+                    failure[1] = remaining - 1 if remaining > 0 else remaining
+                    raise RuntimeError("503 Service Unavailable")
+        content = self.content(calls) if callable(self.content) else self.content
+        return AIMessage(content=content)
+
+    def invoke(self, prompt):
+        reply = self._record(prompt, is_async=False)
+        time.sleep(self.delay)
+        return reply
+
+    async def ainvoke(self, prompt):
+        reply = self._record(prompt, is_async=True)
+        await asyncio.sleep(self.delay)
+        return reply
+
+
+class FakeTool:
+    def __init__(self, toolkit, name):
+        self.toolkit = toolkit
+        self.name = name
+
+    def invoke(self, args):
+        assert self.toolkit.live, "replay 模式不應呼叫工具"
+        self.toolkit.calls.append(self.name)
+        output = self.toolkit.outputs.get(self.name, self.toolkit.output)
+        return output(self.name) if callable(output) else output.format(name=self.name)
+
+
+class FakeToolkit:
+    """分析師只使用 toolkit.config 與 get_* 工具屬性
+
+    Args:
+        online_tools: 分析師依此選擇工具（False 時批次分析不經由 yfinance 下載日K線）
+        output: 工具結果（可含 {name}），或接收工具名稱並回傳結果的函式；outputs 可覆寫個別工具
+        live: False 時任何工具呼叫都視為測試失敗
+    """
+
+    def __init__(self, online_tools=True, output="{name} 資料", live=True):
+        self.config = {"online_tools": online_tools}
+        self.output = output
+        self.outputs = {}
+        self.calls = []
+        self.live = live
+
+    def __getattr__(self, name):
+        if name.startswith("get_"):
+            return FakeTool(self, name)
+        raise AttributeError(name)
+
+
+@pytest.fixture
+def fake_llm():
+    return FakeLLM
+
+
+@pytest.fixture
+def fake_toolkit():
+    return FakeToolkit
+
+
+@pytest.fixture
+def build_graph(tmp_path, monkeypatch):
+    """回傳建立測試用圖的函式：build_graph(llm, toolkit, analysts=("market",), **config)
+
+    預設停用記憶與檢查點；config 可覆寫任何設定（如 checkpoint_backend="sqlite"）。
+    """
+    from tradingagents.graph.trading_graph import TradingAgentsGraph
+
+    # 分析狀態日誌寫入工作目錄下的 eval_results/
+    monkeypatch.chdir(tmp_path)
+
+    def _build(llm, toolkit, analysts=("market",), **config):
+        analysts = list(analysts)
+        graph = TradingAgentsGraph(
+            selected_analysts=analysts,
+            config={
+                "memory_enabled": False,
+                "checkpoint_backend": "none",
+                "data_cache_dir": str(tmp_path / "data_cache"),
+                "results_dir": str(tmp_path / "results"),
+                **config,
+            },
+        )
+        # 以假 LLM 與假工具重建圖，檢查點沿用圖實例建立的儲存
+        graph.graph_setup.quick_thinking_llm = llm
+        graph.graph_setup.deep_thinking_llm = llm
+        graph.graph_setup.toolkit = toolkit
+        graph.toolkit = toolkit
+        graph.graph = graph.graph_setup.setup_graph(analysts, checkpointer=graph.checkpointer)
+        return graph
+
+    return _build
@@ -6,6 +6,7 @@
 
 import os
 import sys
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -48,10 +49,11 @@ def test_graph_initialization():
         config["memory_enabled"] = True
         config["online_tools"] = True
         
-        # 修復路徑
-        config["data_dir"] = str(project_root / "data")
-        config["results_dir"] = str(project_root / "results")
-        config["data_cache_dir"] = str(project_root / "tradingagents" / "dataflows" / "data_cache")
+        # 修復路徑（暫存目錄：工具與資料流依 use_config 寫入 data_cache_dir，不在原始碼樹中留下快取）
+        work_dir = Path(tempfile.mkdtemp(prefix="tradingagents-analysis-"))
+        config["data_dir"] = str(work_dir / "data")
+        config["results_dir"] = str(work_dir / "results")
+        config["data_cache_dir"] = str(work_dir / "data_cache")
         
         # 建立目錄
         os.makedirs(config["data_dir"], exist_ok=True)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+測試分析層級快取範圍
+驗證同時執行的分析互不清除快取、綁定日期的結果透過引用計數共享、範圍綁定可傳遞到節點執行緒，
+以及分析師只等待自己需要的預載入工具
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+class _CountingTool:
+    """記錄呼叫次數的假工具"""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, args):
+        with self._lock:
+            self.calls += 1
+        return f"{self.name}:{sorted(args.items())}"
+
+
+def test_contexts_are_isolated():
+    """測試新分析開始時不會清除另一個分析的快取"""
+    print(" 測試分析範圍隔離...")
+    from tradingagents.agents.utils.agent_utils import invoke_tools_direct, reset_tool_result_cache
+    from tradingagents.agents.utils.analysis_context import AnalysisContext
+
+    tool = _CountingTool("technical")
+    args = {"ticker": "AAPL"}  # 未綁定日期，不進入共享層
+
+    first = AnalysisContext(label="first")
+    invoke_tools_direct([tool], [args], context=first)
+
+    # 另一個分析開始（舊版會清除全域快取）
+    second = reset_tool_result_cache()
+    invoke_tools_direct([tool], [args], context=first)
+    assert tool.calls == 1
+    assert first.tool_stats()["hits"] == 1
+
+    # 未綁定日期的結果不跨分析共享
+    invoke_tools_direct([tool], [args], context=second)
+    assert tool.calls == 2
+
+    embedding_calls = []
+
+    class _Memory:
+        def get_embedding(self, text):
+            embedding_calls.append(text)
+            return [0.5, 0.5]
+
+    from tradingagents.agents.utils.agent_utils import get_cached_embedding
+    assert get_cached_embedding("情境", _Memory(), context=first) == [0.5, 0.5]
+    assert get_cached_embedding("情境", _Memory(), context=first) == [0.5, 0.5]
+    assert get_cached_embedding("情境", _Memory(), context=second) == [0.5, 0.5]
+    assert len(embedding_calls) == 2
+
+    first.close()
+    second.close()
+    print(" 分析範圍隔離測試通過")
+
+
+def test_reset_closes_previous_context():
+    """測試重複開始新的分析範圍時，先前綁定的範圍會被關閉並釋放共享結果"""
+    print(" 測試重置分析範圍...")
+    from tradingagents.agents.utils.agent_utils import invoke_tools_direct, reset_tool_result_cache
+    from tradingagents.agents.utils.analysis_context import get_shared_result_count
+
+    tool = _CountingTool("fundamentals")
+    args = {"ticker": "MSFT", "curr_date": "2024-01-05"}
+
+    before = get_shared_result_count()
+    first = reset_tool_result_cache()
+    invoke_tools_direct([tool], [args])
+    assert get_shared_result_count() == before + 1
+
+    second = reset_tool_result_cache()
+    assert first.closed and not second.closed
+    assert get_shared_result_count() == before
+    second.close()
+    print(" 重置分析範圍測試通過")
+
+
+def test_shared_layer_refcount():
+    """測試綁定日期的結果在同時執行的分析間共享，最後一個引用釋放後移除"""
+    print(" 測試共享層引用計數...")
+    from tradingagents.agents.utils.agent_utils import _make_cache_key, invoke_tools_direct
+    from tradingagents.agents.utils.analysis_context import AnalysisContext, _SharedResultLayer
+
+    layer = _SharedResultLayer()
+    tool = _CountingTool("fundamentals")
+    args = {"ticker": "MSFT", "curr_date": "2024-01-05"}
+    key = _make_cache_key(tool.name, args)
+
+    a = AnalysisContext(label="a", shared_layer=layer)
+    b = AnalysisContext(label="b", shared_layer=layer)
+    invoke_tools_direct([tool], [args], context=a)
+    invoke_tools_direct([tool], [args], context=b)
+    assert tool.calls == 1
+    assert layer.refcount(key) == 2
+    assert b.tool_stats()["shared_hits"] == 1
+
+    a.close()
+    assert layer.refcount(key) == 1
+    a.close()  # 重複關閉不應重複釋放
+    assert layer.refcount(key) == 1
+    b.close()
+    assert layer.refcount(key) == 0
+    assert len(layer) == 0
+
+    # 失敗結果不共享
+    class _FailingTool:
+        name = "failing"
+
+        def invoke(self, args):
+            return "取得失敗"
+
+    c = AnalysisContext(label="c", shared_layer=layer)
+    invoke_tools_direct([_FailingTool()], [args], context=c)
+    assert len(layer) == 0
+    c.close()
+    print(" 共享層引用計數測試通過")
+
+
+def test_scope_binding_propagates():
+    """測試 analysis_scope 綁定可透過 copy_context 傳遞到節點執行緒"""
+    print(" 測試分析範圍綁定傳遞...")
+    from tradingagents.agents.utils.analysis_context import (
+        analysis_scope,
+        get_current_analysis_context,
+        resolve_analysis_context,
+    )
+
+    previous = get_current_analysis_context()
+    with analysis_scope("AAPL@2024-01-05") as context:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            seen = pool.submit(copy_context().run, resolve_analysis_context).result()
+        assert seen is context
+    assert context.closed
+    assert get_current_analysis_context() is previous
+    print(" 分析範圍綁定傳遞測試通過")
+
+
+def test_waits_only_for_own_prefetch():
+    """測試分析師等待預載入中的工具而不重複呼叫，且不受其他慢工具阻塞"""
+    print(" 測試預載入 Future...")
+    from tradingagents.agents.utils import agent_utils
+    from tradingagents.agents.utils.analysis_context import AnalysisContext
+
+    class _SlowTool(_CountingTool):
+        def __init__(self, name, delay):
+            super().__init__(name)
+            self.delay = delay
+
+        def invoke(self, args):
+            time.sleep(self.delay)
+            return super().invoke(args)
+
+    market = _SlowTool("market", 0.3)
+    news = _SlowTool("google_news", 3.0)
+    args = {"ticker": "AAPL", "curr_date": "2024-01-05"}
+
+    with AnalysisContext(label="prefetch") as context:
+        for tool in (market, news):
+            key = agent_utils._make_cache_key(tool.name, args)
+            future = agent_utils._GLOBAL_TOOL_EXECUTOR.submit(agent_utils._prefetch_one, tool, args, context)
+            context.register_pending(key, future)
+
+        t0 = time.monotonic()
+        result = agent_utils.invoke_tools_direct([market], [args], context=context)
+        elapsed = time.monotonic() - t0
+        assert result == [f"market:{sorted(args.items())}"]
+        assert market.calls == 1
+        # 只等待市場資料，不等待 3 秒的新聞
+        assert elapsed < 2.0
+        assert context.tool_stats()["pending"] == 1
+    print(" 預載入 Future 測試通過")
+
+
+if __name__ == "__main__":
+    test_contexts_are_isolated()
+    test_reset_closes_previous_context()
+    test_shared_layer_refcount()
+    test_scope_binding_propagates()
+    test_waits_only_for_own_prefetch()
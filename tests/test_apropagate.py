@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+測試非同步分析路徑
+驗證節點的 anode 版本使用 LLM ainvoke、並行辯論以 asyncio.gather 執行並保留錯誤處理，
+以及 graph.astream 會走節點的非同步版本
+"""
+
+import asyncio
+import os
+import sys
+import time
+from typing import TypedDict
+
+import pytest
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def _risk_state():
+    return {
+        "company_of_interest": "AAPL",
+        "trade_date": "2024-01-05",
+        "market_report": "市場",
+        "sentiment_report": "情緒",
+        "news_report": "新聞",
+        "fundamentals_report": "基本面",
+        "trader_investment_plan": "買入",
+        "investment_plan": "買入",
+        "risk_debate_state": {
+            "history": "", "risky_history": "", "safe_history": "", "neutral_history": "",
+            "latest_speaker": "", "current_risky_response": "", "current_safe_response": "",
+            "current_neutral_response": "", "count": 0,
+        },
+    }
+
+
+def test_parallel_risk_debate_async(fake_llm):
+    """測試並行風險辯論的非同步版本同時執行三位分析師並合併結果"""
+    print(" 測試非同步並行風險辯論...")
+    from tradingagents.agents import (
+        create_neutral_debator,
+        create_parallel_risk_debate,
+        create_risky_debator,
+        create_safe_debator,
+    )
+
+    llms = [fake_llm(f"觀點{i}", delay=0.3) for i in range(3)]
+    node = create_parallel_risk_debate(
+        create_risky_debator(llms[0]), create_safe_debator(llms[1]), create_neutral_debator(llms[2])
+    )
+
+    t0 = time.monotonic()
+    result = asyncio.run(node.anode(_risk_state()))
+    elapsed = time.monotonic() - t0
+
+    merged = result["risk_debate_state"]
+    assert merged["count"] == 3
+    assert "觀點0" in merged["current_risky_response"]
+    assert "觀點1" in merged["current_safe_response"]
+    assert "觀點2" in merged["current_neutral_response"]
+    assert all(llm.async_calls == 1 and llm.sync_calls == 0 for llm in llms)
+    # 三個 0.3 秒的呼叫並行完成
+    assert elapsed < 0.8
+
+    # 單一分析師失敗時其餘結果仍合併
+    failing = create_parallel_risk_debate(
+        create_risky_debator(fake_llm(fail=True)),
+        create_safe_debator(fake_llm("保守")),
+        create_neutral_debator(fake_llm("中立")),
+    )
+    merged = asyncio.run(failing.anode(_risk_state()))["risk_debate_state"]
+    assert merged["count"] == 2
+    assert merged["current_risky_response"] == ""
+    print(" 非同步並行風險辯論測試通過")
+
+
+def test_risk_manager_async_retry(fake_llm):
+    """測試風險經理非同步版本的重試與預設決策"""
+    print(" 測試風險經理非同步重試...")
+    from tradingagents.agents import create_risk_manager
+
+    llm = fake_llm("這是一份足夠長度的最終交易決策內容")
+    result = asyncio.run(create_risk_manager(llm, None).anode(_risk_state()))
+    assert result["final_trade_decision"] == llm.content
+    assert llm.async_calls == 1 and llm.sync_calls == 0
+
+    failing = fake_llm(fail=True)
+    result = asyncio.run(create_risk_manager(failing, None).anode(_risk_state()))
+    assert failing.async_calls == 3
+    assert "預設建議：持有" in result["final_trade_decision"]
+    print(" 風險經理非同步重試測試通過")
+
+
+def test_astream_uses_async_nodes():
+    """測試 as_graph_node 包裝後 stream 走同步版本、astream 走非同步版本"""
+    print(" 測試 graph.astream 使用非同步節點...")
+    from langgraph.graph import END, START, StateGraph
+    from tradingagents.graph.setup import as_graph_node
+
+    class _State(TypedDict):
+        value: str
+
+    calls = []
+
+    def node(state):
+        calls.append("sync")
+        return {"value": state["value"] + "-sync"}
+
+    async def anode(state):
+        calls.append("async")
+        return {"value": state["value"] + "-async"}
+
+    node.anode = anode
+
+    def plain(state):
+        return {"value": state["value"] + "-plain"}
+
+    workflow = StateGraph(_State)
+    workflow.add_node("Dual", as_graph_node(node, "Dual"))
+    workflow.add_node("Plain", as_graph_node(plain, "Plain"))
+    workflow.add_edge(START, "Dual")
+    workflow.add_edge("Dual", "Plain")
+    workflow.add_edge("Plain", END)
+    graph = workflow.compile()
+
+    assert graph.invoke({"value": "x"})["value"] == "x-sync-plain"
+
+    async def _run():
+        final = None
+        async for chunk in graph.astream({"value": "x"}, stream_mode="values"):
+            final = chunk
+        return final
+
+    assert asyncio.run(_run())["value"] == "x-async-plain"
+    assert calls == ["sync", "async"]
+    print(" graph.astream 使用非同步節點測試通過")
+
+
+def test_async_tool_requests_share_context():
+    """測試非同步工具呼叫使用分析範圍快取"""
+    print(" 測試非同步工具呼叫快取...")
+    from tradingagents.agents.utils.agent_utils import ainvoke_data_requests
+    from tradingagents.agents.utils.analysis_context import AnalysisContext
+
+    class _Tool:
+        name = "quote"
+        calls = 0
+
+        def invoke(self, args):
+            _Tool.calls += 1
+            return f"quote:{args['ticker']}"
+
+    tool = _Tool()
+    with AnalysisContext(label="async") as context:
+        requests = [(tool, {"ticker": "AAPL"}), (tool, {"ticker": "MSFT"})]
+        first = asyncio.run(ainvoke_data_requests(requests, context=context))
+        second = asyncio.run(ainvoke_data_requests(requests, context=context))
+        assert first == second == ["quote:AAPL", "quote:MSFT"]
+        assert _Tool.calls == 2
+    print(" 非同步工具呼叫快取測試通過")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
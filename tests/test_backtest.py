@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+測試歷史區間回測引擎
+驗證向量化績效指標、價格只從時點價格儲存讀取、frozen 模式並行分析日期、
+learn 模式只在持有期結束後才反思（不使用未來資訊），以及時點設定只在回測期間生效
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+class _FakeGraph:
+    """依日期回傳固定訊號的假圖，記錄分析與反思順序"""
+
+    def __init__(self, actions, data_cache_dir, delay=0.0, fail_dates=(), selected_analysts=("market",)):
+        self.config = {"data_cache_dir": data_cache_dir}
+        self.selected_analysts = list(selected_analysts)
+        self.point_in_time = set()
+        self.actions = actions
+        self.delay = delay
+        self.fail_dates = set(fail_dates)
+        self.events = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def propagate(self, ticker, date):
+        with self._lock:
+            self.events.append(("propagate", date))
+            self.point_in_time.add(self.config.get("point_in_time_data"))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delay)
+            if date in self.fail_dates:
+                raise RuntimeError("503 Service Unavailable")
+            return {"trade_date": date}, {"action": self.actions.get(date, "持有"), "target_price": None}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def reflect_and_remember(self, returns_losses, final_state=None):
+        self.events.append(("reflect", final_state["trade_date"], returns_losses))
+
+
+class _SeededPrices:
+    """將假價格寫入暫存價格儲存並替換全局美股資料提供器的儲存，禁止網路下載"""
+
+    def __enter__(self):
+        from tradingagents.dataflows import optimized_us_data
+        from tradingagents.dataflows.price_store import PriceStore
+
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = self._tmp.name
+        store = PriceStore(os.path.join(self.cache_dir, "prices"))
+        dates = pd.bdate_range("2023-10-02", "2024-03-29")
+        self.closes = pd.Series(100.0 + np.arange(len(dates)), index=dates.strftime("%Y-%m-%d"))
+        data = pd.DataFrame({
+            "Date": dates, "Open": self.closes.values, "High": self.closes.values,
+            "Low": self.closes.values, "Close": self.closes.values, "Volume": 1000.0,
+        })
+        store.merge("AAPL", data, [("2023-10-01", "2024-04-01")])
+
+        self._provider = optimized_us_data.get_optimized_us_data_provider()
+        self._original = (self._provider.price_store, optimized_us_data.yf.Ticker)
+        self._provider.price_store = store
+
+        def no_network(symbol):
+            raise AssertionError("回測期間不應重新下載價格")
+
+        optimized_us_data.yf.Ticker = no_network
+        self._module = optimized_us_data
+        return self
+
+    def __exit__(self, *exc):
+        self._provider.price_store, self._module.yf.Ticker = self._original
+        self._tmp.cleanup()
+
+
+def test_metrics():
+    """測試命中率、報酬與最大回撤的計算"""
+    print(" 測試回測績效指標...")
+    from tradingagents.backtest import compute_metrics, forward_returns, max_drawdown
+
+    closes = np.array([100.0, 110.0, 99.0, 99.0, 120.0])
+    returns = forward_returns(closes, np.array([0, 1, 2, 4]), holding_days=1)
+    assert np.allclose(returns[:3], [0.1, -0.1, 0.0])
+    assert np.isnan(returns[3])
+
+    metrics = compute_metrics(["買入", "買入", "賣出", "買入"], returns)
+    # 買入 +10%、買入 -10%，賣出不放空視為空手；最後一筆無出場價格不納入
+    assert metrics["num_signals"] == 3
+    assert metrics["num_trades"] == 2
+    assert np.isclose(metrics["total_return"], 1.1 * 0.9 - 1)
+    assert np.isclose(metrics["max_drawdown"], -0.1)
+    assert np.isclose(metrics["hit_rate"], 1 / 3)
+
+    short = compute_metrics(["賣出", "賣出"], np.array([-0.05, -0.05]), allow_short=True)
+    assert np.isclose(short["total_return"], 1.05 ** 2 - 1)
+    assert short["hit_rate"] == 1.0
+    assert max_drawdown(np.array([1.0, 1.2, 0.9, 1.3])) == -0.25
+    print(" 回測績效指標測試通過")
+
+
+def test_frozen_mode_parallel():
+    """測試 frozen 模式並行分析日期、失敗日期視為空手，且不重新下載價格"""
+    print(" 測試 frozen 模式回測...")
+    from tradingagents.backtest import Backtester
+
+    with _SeededPrices() as prices:
+        graph = _FakeGraph({"2024-02-01": "買入", "2024-02-02": "賣出"}, prices.cache_dir,
+                           delay=0.1, fail_dates={"2024-02-06"})
+        result = Backtester(graph, holding_days=1, max_workers=4).run("aapl", "2024-02-01", "2024-02-07")
+
+        # 分析期間啟用時點資料，回測結束後還原圖設定
+        assert graph.point_in_time == {True}
+        assert "point_in_time_data" not in graph.config
+        assert graph.peak > 1
+        assert [r["date"] for r in result["records"]] == [
+            "2024-02-01", "2024-02-02", "2024-02-05", "2024-02-06", "2024-02-07"
+        ]
+        first = result["records"][0]
+        expected = prices.closes["2024-02-02"] / prices.closes["2024-02-01"] - 1
+        assert first["action"] == "買入" and np.isclose(first["forward_return"], expected)
+        assert result["records"][3]["error"] and result["records"][3]["action"] == "持有"
+
+        metrics = result["metrics"]
+        assert metrics["failed_dates"] == 1
+        assert metrics["num_trades"] == 1
+        assert np.isclose(metrics["total_return"], expected)
+        assert metrics["hit_rate"] == 0.5
+    print(" frozen 模式回測測試通過")
+
+
+def test_learn_mode_reflects_after_exit():
+    """測試 learn 模式依序分析，且反思只在出場日之後發生"""
+    print(" 測試 learn 模式回測...")
+    from tradingagents.backtest import Backtester
+
+    with _SeededPrices() as prices:
+        graph = _FakeGraph({}, prices.cache_dir)
+        graph.config["point_in_time_data"] = False
+        Backtester(graph, holding_days=2, memory_mode="learn").run("AAPL", "2024-02-01", "2024-02-07")
+        assert graph.point_in_time == {True}
+        assert graph.config["point_in_time_data"] is False
+
+        order = [e[:2] for e in graph.events]
+        assert order == [
+            ("propagate", "2024-02-01"),
+            ("propagate", "2024-02-02"),
+            # 02-01 的持有期在 02-05 結束，分析 02-05 前才反思
+            ("reflect", "2024-02-01"),
+            ("propagate", "2024-02-05"),
+            ("reflect", "2024-02-02"),
+            ("propagate", "2024-02-06"),
+            ("reflect", "2024-02-05"),
+            ("propagate", "2024-02-07"),
+            ("reflect", "2024-02-06"),
+            ("reflect", "2024-02-07"),
+        ]
+        assert graph.events[2][2].startswith("+")
+
+        try:
+            Backtester(_FakeGraph({}, prices.cache_dir), memory_mode="online")
+            raise AssertionError("不支援的記憶模式應拋出例外")
+        except ValueError:
+            pass
+        # 新聞等分析師的資料為即時抓取，回測時拒絕
+        try:
+            Backtester(_FakeGraph({}, prices.cache_dir, selected_analysts=["market", "news"]))
+            raise AssertionError("非時點資料的分析師應拋出例外")
+        except ValueError:
+            pass
+    print(" learn 模式回測測試通過")
+
+
+if __name__ == "__main__":
+    test_metrics()
+    test_frozen_mode_parallel()
+    test_learn_mode_reflects_after_exit()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+測試快取中繼資料索引
+驗證 StockDataCache 的索引查找、容量淘汰、過期清理、舊版匯入與多行程共用
+"""
+
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def test_lookup_and_eviction():
+    """測試查找與 max_files 淘汰會刪除資料檔"""
+    print(" 測試快取索引查找與淘汰...")
+    from tradingagents.dataflows.cache_manager import StockDataCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = StockDataCache(tmp)
+        key = cache.save_fundamentals_data("AAPL", "基本面報告", data_source="finnhub")
+        assert cache.find_cached_fundamentals_data("AAPL", data_source="finnhub") == key
+        assert cache.find_cached_fundamentals_data("AAPL", data_source="openai") is None
+        assert cache.load_fundamentals_data(key) == "基本面報告"
+
+        cache.cache_config['us_fundamentals']['max_files'] = 3
+        paths = []
+        for i in range(5):
+            k = cache.save_fundamentals_data(f"T{i}", f"報告 {i}", data_source="finnhub")
+            paths.append(cache._load_metadata(k)['file_path'])
+
+        stats = cache.get_cache_stats()
+        assert stats['fundamentals_count'] == 3
+        # 最久未使用的項目與其資料檔都被刪除
+        assert cache._load_metadata(key) is None
+        assert not os.path.exists(paths[0])
+        assert os.path.exists(paths[-1])
+    print(" 快取索引查找與淘汰測試通過")
+
+
+def test_size_budget_and_expiry():
+    """測試總大小上限與過期清理"""
+    print(" 測試快取大小上限與過期清理...")
+    from tradingagents.dataflows.cache_manager import StockDataCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = StockDataCache(tmp)
+        cache.max_cache_size_mb = 2500 / (1024 * 1024)
+        for i in range(4):
+            cache.save_news_data(f"N{i}", "x" * 1000, data_source="test")
+        stats = cache.get_cache_stats()
+        assert stats['news_count'] == 2
+
+        cache.max_cache_size_mb = 0
+        old_key = cache.save_news_data("OLD", "舊新聞", data_source="test")
+        old_meta = cache._load_metadata(old_key)
+        cache._index.put(old_key, old_meta, size_bytes=old_meta['size_bytes'],
+                         cached_at=(datetime.now() - timedelta(days=10)).timestamp())
+        cache.clear_old_cache(max_age_days=7)
+        assert cache._load_metadata(old_key) is None
+        assert not os.path.exists(old_meta['file_path'])
+        assert cache.get_cache_stats()['news_count'] == 2
+    print(" 快取大小上限與過期清理測試通過")
+
+
+def test_legacy_import():
+    """測試舊版 *_meta.json 匯入"""
+    print(" 測試舊版中繼資料匯入...")
+    from tradingagents.dataflows.cache_manager import StockDataCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "metadata"))
+        os.makedirs(os.path.join(tmp, "us_fundamentals"))
+        data_path = os.path.join(tmp, "us_fundamentals", "MSFT_fundamentals_abc.txt")
+        with open(data_path, "w", encoding="utf-8") as f:
+            f.write("舊報告")
+        with open(os.path.join(tmp, "metadata", "MSFT_fundamentals_abc_meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "symbol": "MSFT", "data_type": "fundamentals", "market_type": "us",
+                "data_source": "finnhub", "file_path": data_path, "file_format": "txt",
+                "content_length": 3, "cached_at": datetime.now().isoformat(),
+            }, f)
+
+        cache = StockDataCache(tmp)
+        key = cache.find_cached_fundamentals_data("MSFT", data_source="finnhub")
+        assert key == "MSFT_fundamentals_abc"
+        assert cache.load_fundamentals_data(key) == "舊報告"
+    print(" 舊版中繼資料匯入測試通過")
+
+
+def _worker(cache_dir: str, worker_id: int):
+    from tradingagents.dataflows.cache_manager import StockDataCache
+    cache = StockDataCache(cache_dir)
+    for i in range(20):
+        cache.save_fundamentals_data(f"W{worker_id}_{i}", f"資料 {worker_id}-{i}", data_source="mp")
+
+
+def test_multi_process_writers():
+    """測試多個行程同時寫入同一個快取目錄"""
+    print(" 測試多行程共用快取索引...")
+    from tradingagents.dataflows.cache_manager import StockDataCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        StockDataCache(tmp)
+        ctx = multiprocessing.get_context("spawn")
+        procs = [ctx.Process(target=_worker, args=(tmp, n)) for n in range(3)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join(timeout=120)
+            assert p.exitcode == 0
+
+        cache = StockDataCache(tmp)
+        assert cache.get_cache_stats()['fundamentals_count'] == 60
+        key = cache.find_cached_fundamentals_data("W2_19", data_source="mp")
+        assert cache.load_fundamentals_data(key) == "資料 2-19"
+    print(" 多行程共用快取索引測試通過")
+
+
+if __name__ == "__main__":
+    test_lookup_and_eviction()
+    test_size_budget_and_expiry()
+    test_legacy_import()
+    test_multi_process_writers()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+測試工具結果與 LLM 回應的錄製 / 重播
+驗證請求鍵的正規化、record 模式錄製整個分析，以及 replay 模式完全不呼叫工具與 LLM
+即可重現相同的決策，找不到錄製時明確失敗
+"""
+
+import gzip
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def _tool_output(name):
+    # 含產生時間，模擬每次執行都不同的報告內容
+    return f"{name} 資料（產生時間 {datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}）"
+
+
+def _cassette_graph(build_graph, fake_llm, fake_toolkit, cassette_path, mode, live):
+    llm = fake_llm(content=lambda calls: f"分析結論：建議買入，目標價 $200，理由充分。（第 {calls} 次呼叫）", live=live)
+    graph = build_graph(
+        llm, fake_toolkit(output=_tool_output, live=live), analysts=("market", "news"),
+        cassette_mode=mode, cassette_path=cassette_path,
+    )
+    return graph, llm
+
+
+def test_request_key_normalization():
+    """測試請求鍵忽略時間戳與空白差異，但區分類型、名稱與內容"""
+    print(" 測試 cassette 請求鍵...")
+    from tradingagents.agents.utils.cassette import request_key
+
+    key = request_key("llm", "gpt-4o-mini", "報告  產生於 2024-01-05 10:00:01\n結論")
+    assert key == request_key("llm", "gpt-4o-mini", "報告 產生於 2025-06-30 23:59:59.123 結論")
+    assert key != request_key("llm", "gpt-4o", "報告 產生於 2024-01-05 10:00:01 結論")
+    assert key != request_key("tool", "gpt-4o-mini", "報告 產生於 2024-01-05 10:00:01 結論")
+    assert request_key("tool", "t", {"a": 1, "b": 2}) == request_key("tool", "t", {"b": 2, "a": 1})
+    assert request_key("tool", "t", {"a": 1}) != request_key("tool", "t", {"a": 2})
+    print(" cassette 請求鍵測試通過")
+
+
+def test_record_then_replay(build_graph, fake_llm, fake_toolkit, tmp_path):
+    """測試錄製後以 replay 模式離線重現相同的決策"""
+    print(" 測試錄製與重播...")
+    from tradingagents.agents.utils.cassette import CassetteMissError
+
+    path = str(tmp_path / "cassette.json.gz")
+
+    recorder, live_llm = _cassette_graph(build_graph, fake_llm, fake_toolkit, path, "record", live=True)
+    recorded_state, recorded_signal = recorder.propagate("AAPL", "2024-01-05")
+    assert live_llm.calls > 0
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        entries = json.load(f)["entries"]
+    kinds = {entry["kind"] for entry in entries.values()}
+    assert kinds == {"tool", "llm"}
+
+    player, _ = _cassette_graph(build_graph, fake_llm, fake_toolkit, path, "replay", live=False)
+    state, signal = player.propagate("AAPL", "2024-01-05")
+    assert state["final_trade_decision"] == recorded_state["final_trade_decision"]
+    assert state["market_report"] == recorded_state["market_report"]
+    assert signal == recorded_signal
+    assert player.cassette.misses == 0
+
+    # 沒有錄製的請求明確失敗，不會退回真實呼叫
+    try:
+        player.propagate("MSFT", "2024-01-05")
+        raise AssertionError("缺少錄製時應拋出 CassetteMissError")
+    except CassetteMissError:
+        pass
+    print(" 錄製與重播測試通過")
+
+
+def test_replay_requires_file(tmp_path):
+    """測試 replay 模式的 cassette 檔案不存在時於建立圖時失敗"""
+    print(" 測試缺少 cassette 檔案...")
+    from tradingagents.agents.utils.cassette import cassette_from_config
+
+    assert cassette_from_config({"cassette_mode": "off"}) is None
+    try:
+        cassette_from_config({"cassette_mode": "replay", "cassette_path": str(tmp_path / "none.json.gz")})
+        raise AssertionError("缺少檔案應拋出例外")
+    except FileNotFoundError:
+        pass
+    print(" 缺少 cassette 檔案測試通過")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+測試依 tokenizer 計算的上下文預算
+驗證中英文的 token 估算、預算分配、依段落 / 表格邊界截斷報告、辯論歷史依輪次截斷，
+以及下游節點的提示詞大小受節點預算限制
+"""
+
+import os
+import sys
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def test_tokenizer_estimates():
+    """測試估算 tokenizer 區分中文與英文密度，且依模型共用實例"""
+    print(" 測試 token 估算...")
+    from tradingagents.agents.utils.context_budget import get_tokenizer
+
+    tokenizer = get_tokenizer(None)
+    assert not tokenizer.exact
+    assert tokenizer.count("營收成長強勁") == 6
+    assert tokenizer.count("revenue growth") == 4
+    assert tokenizer.count("") == 0
+    assert get_tokenizer("claude-sonnet-4-5").count("營收成長強勁") > tokenizer.count("營收成長強勁")
+    assert get_tokenizer("gpt-4o-mini") is get_tokenizer("gpt-4o-mini")
+
+    text = "營收成長強勁。" * 20
+    head = tokenizer.truncate(text, 50)
+    assert tokenizer.count(head) <= 50 and text.startswith(head)
+    print(" token 估算測試通過")
+
+
+def test_allocate():
+    """測試短區段保留全文，剩餘預算依權重分給長區段"""
+    print(" 測試預算分配...")
+    from tradingagents.agents.utils.context_budget import allocate
+
+    assert allocate({"a": 100, "b": 100}, 1000) == {"a": 100, "b": 100}
+    allocation = allocate({"short": 100, "long1": 5000, "long2": 5000}, 1000)
+    assert allocation["short"] == 100
+    assert allocation["long1"] == allocation["long2"] == 450
+    weighted = allocate({"a": 5000, "b": 5000}, 1000, weights={"a": 3, "b": 1})
+    assert weighted == {"a": 750, "b": 250}
+    assert allocate({"a": 0, "b": 10}, 0) == {"a": 0, "b": 0}
+    print(" 預算分配測試通過")
+
+
+def test_trim_report_boundaries():
+    """測試截斷只發生在段落、表格列或句尾，不留下空標題"""
+    print(" 測試報告截斷邊界...")
+    from tradingagents.agents.utils.context_budget import TRUNCATION_MARKER, get_tokenizer, trim_report
+
+    tokenizer = get_tokenizer(None)
+    table = "| 日期 | 收盤價 |\n|---|---|\n" + "\n".join(f"| 2024-01-{d:02d} | 18{d}.50 |" for d in range(1, 31))
+    report = "\n\n".join([
+        "## 技術分析",
+        "股價站上所有均線。成交量溫和放大。" * 5,
+        table,
+        "## 結論",
+        "建議買入。",
+    ])
+    assert trim_report(report, 10000, tokenizer) == report
+
+    trimmed = trim_report(report, 250, tokenizer)
+    assert tokenizer.count(trimmed) <= 250
+    assert trimmed.endswith(TRUNCATION_MARKER)
+    body = trimmed[: -len(TRUNCATION_MARKER)].rstrip()
+    table_lines = [line for line in body.splitlines() if line.startswith("|")]
+    # 表格保留表頭與完整的資料列
+    assert table_lines[:2] == ["| 日期 | 收盤價 |", "|---|---|"]
+    assert all(line.endswith("|") for line in table_lines)
+    assert not body.endswith("## 結論")
+
+    prose = trim_report("第一句。第二句很長" + "很長" * 100 + "。", 40, tokenizer)
+    assert prose == "第一句。\n\n" + TRUNCATION_MARKER
+    print(" 報告截斷邊界測試通過")
+
+
+def test_trim_history_keeps_turns():
+    """測試辯論歷史超過預算時每輪發言都保留"""
+    print(" 測試辯論歷史截斷...")
+    from tradingagents.agents.utils.context_budget import get_tokenizer, trim_history
+
+    tokenizer = get_tokenizer(None)
+    history = "\n".join([
+        "Bull Analyst: " + "成長動能強勁。" * 80,
+        "Bear Analyst: 估值過高。",
+        "Bull Analyst: " + "現金流充沛。" * 80,
+    ])
+    trimmed = trim_history(history, 300, tokenizer)
+    assert tokenizer.count(trimmed) <= 300
+    assert trimmed.count("Bull Analyst:") == 2
+    assert "Bear Analyst: 估值過高。" in trimmed
+    print(" 辯論歷史截斷測試通過")
+
+
+def test_node_prompt_within_budget():
+    """測試下游節點的提示詞大小受節點預算限制，記憶情境描述受預算限制且結果固定"""
+    print(" 測試節點輸入預算...")
+    from tradingagents.agents import create_research_manager
+    from tradingagents.agents.utils.agent_utils import get_situation_for_memory
+    from tradingagents.agents.utils.context_budget import get_tokenizer
+    from tradingagents.dataflows.config import use_config
+    from tradingagents.default_config import DEFAULT_CONFIG
+
+    class _LLM:
+        prompts = []
+
+        def invoke(self, messages):
+            from langchain_core.messages import AIMessage
+            self.prompts.append(messages)
+            return AIMessage(content="建議持有，等待更明確的訊號。")
+
+    long_report = "\n\n".join(f"第{i}段分析：營收成長，毛利率改善，現金流穩定。" * 4 for i in range(200))
+    state = {
+        "company_of_interest": "AAPL",
+        "trade_date": "2024-01-05",
+        "market_report": long_report,
+        "sentiment_report": long_report,
+        "news_report": long_report,
+        "fundamentals_report": long_report,
+        "investment_debate_state": {
+            "history": "\n".join(f"Bull Analyst: {long_report}\nBear Analyst: {long_report}" for _ in range(2)),
+            "bull_history": "", "bear_history": "", "current_response": "", "count": 4,
+        },
+    }
+
+    tokenizer = get_tokenizer(None)
+    config = dict(DEFAULT_CONFIG, context_budget_shared_reports=2000,
+                  context_budget_node_overrides={"research_manager": 5000})
+    with use_config(config):
+        llm = _LLM()
+        create_research_manager(llm, None)(state)
+        situation = get_situation_for_memory(state, max_tokens=800)
+
+    total = sum(tokenizer.count(m.content) for m in llm.prompts[0])
+    assert tokenizer.count(llm.prompts[0][0].content) <= 2200
+    assert 4000 < total <= 5000
+    assert tokenizer.count(situation) <= 800
+    assert situation == get_situation_for_memory(state, max_tokens=800)
+    print(" 節點輸入預算測試通過")
+
+
+if __name__ == "__main__":
+    test_tokenizer_estimates()
+    test_allocate()
+    test_trim_report_boundaries()
+    test_trim_history_keeps_turns()
+    test_node_prompt_within_budget()
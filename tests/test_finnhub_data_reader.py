@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+測試 Finnhub 離線資料讀取
+驗證日期區間查詢、共用載入與檔案更新後重新載入
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def _write_news(data_dir: str, payload: dict) -> str:
+    path = os.path.join(data_dir, "finnhub_data", "news_data", "TEST_data_formatted.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    return path
+
+
+def test_range_query_and_reload():
+    """測試區間查詢結果與檔案更新後的重新載入"""
+    print(" 測試 Finnhub 離線資料區間查詢...")
+    from tradingagents.dataflows import finnhub_utils
+
+    payload = {
+        "2024-01-05": [{"headline": "c"}],
+        "2024-01-01": [{"headline": "a"}],
+        "2024-01-03": [],
+        "2024-01-04": [{"headline": "b"}],
+        "2024-01-09": [{"headline": "d"}],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _write_news(tmp, payload)
+
+        result = finnhub_utils.get_data_in_range("TEST", "2024-01-02", "2024-01-05", "news_data", tmp)
+        assert list(result.keys()) == ["2024-01-04", "2024-01-05"]
+        assert finnhub_utils.get_data_in_range("TEST", "2024-02-01", "2024-02-05", "news_data", tmp) == {}
+        assert finnhub_utils.get_data_in_range("MISSING", "2024-01-01", "2024-01-05", "news_data", tmp) == {}
+
+        # 再次查詢應共用同一份已載入資料
+        again = finnhub_utils.get_data_in_range("TEST", "2024-01-01", "2024-01-09", "news_data", tmp)
+        assert again["2024-01-05"] is result["2024-01-05"]
+
+        # 檔案更新後應重新載入
+        payload["2024-01-06"] = [{"headline": "e"}]
+        time.sleep(0.01)
+        _write_news(tmp, payload)
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+        updated = finnhub_utils.get_data_in_range("TEST", "2024-01-06", "2024-01-06", "news_data", tmp)
+        assert updated == {"2024-01-06": [{"headline": "e"}]}
+    print(" Finnhub 離線資料區間查詢測試通過")
+
+
+if __name__ == "__main__":
+    test_range_query_and_reload()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+測試圖執行檢查點
+驗證分析在後段失敗後以同一個 thread_id 續跑時，不會重新執行已完成的分析師與工具，
+成功完成後清除檢查點，以及 thread_id 不可用於其他股票或日期
+"""
+
+import os
+import sys
+
+import pytest
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def test_resume_after_failure(build_graph, fake_llm, fake_toolkit):
+    """測試交易員失敗後續跑只執行尚未完成的節點"""
+    print(" 測試檢查點續跑...")
+    llm = fake_llm()
+    toolkit = fake_toolkit()
+    graph = build_graph(llm, toolkit, checkpoint_backend="sqlite")
+
+    llm.fail_on("專業交易員")
+    try:
+        graph.propagate("AAPL", "2024-01-05", thread_id="AAPL-run-1")
+        raise AssertionError("交易員失敗應拋出例外")
+    except RuntimeError as e:
+        assert "503" in str(e)
+
+    analyst_calls = llm.count("股票技術分析師")
+    tool_calls = len(toolkit.calls)
+    assert analyst_calls == 1
+    assert tool_calls > 0
+
+    llm.clear_failures()
+    events = []
+    final_state, signal = graph.propagate(
+        "AAPL", "2024-01-05", progress_callback=events.append, thread_id="AAPL-run-1"
+    )
+
+    # 分析師與工具不重新執行，交易員之後的節點完成
+    assert llm.count("股票技術分析師") == analyst_calls
+    assert len(toolkit.calls) == tool_calls
+    assert "node_prefetch_started" not in events
+    assert final_state["market_report"]
+    assert final_state["final_trade_decision"]
+    assert signal["action"] == "買入"
+
+    # 成功後清除檢查點，相同 thread_id 重新開始完整分析
+    assert graph.graph.get_state({"configurable": {"thread_id": "AAPL-run-1"}}).values == {}
+    print(" 檢查點續跑測試通過")
+
+
+def test_thread_id_mismatch(build_graph, fake_llm, fake_toolkit):
+    """測試 thread_id 不可續跑其他股票的檢查點"""
+    print(" 測試 thread_id 檢查...")
+    llm = fake_llm()
+    graph = build_graph(llm, fake_toolkit(), checkpoint_backend="sqlite")
+
+    llm.fail_on("專業交易員")
+    try:
+        graph.propagate("AAPL", "2024-01-05", thread_id="shared")
+    except RuntimeError:
+        pass
+
+    llm.clear_failures()
+    try:
+        graph.propagate("MSFT", "2024-01-05", thread_id="shared")
+        raise AssertionError("不同股票應拒絕續跑")
+    except ValueError as e:
+        assert "shared" in str(e)
+    print(" thread_id 檢查測試通過")
+
+
+def test_checkpoint_disabled(tmp_path):
+    """測試停用檢查點時照常執行"""
+    print(" 測試停用檢查點...")
+    from tradingagents.graph.checkpointer import create_checkpointer
+
+    assert create_checkpointer({"checkpoint_backend": "none"}) is None
+    config = {"checkpoint_backend": "sqlite", "data_cache_dir": str(tmp_path)}
+    saver = create_checkpointer(config)
+    assert saver is create_checkpointer(config)
+    assert os.path.exists(tmp_path / "graph_checkpoints.sqlite")
+    print(" 停用檢查點測試通過")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+測試實例層級設定
+驗證 Toolkit 設定不再跨實例共用，以及 use_config 綁定的分析設定在並行執行時互不干擾
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def test_toolkit_config_is_per_instance():
+    """測試兩個 Toolkit 的設定互相獨立"""
+    print(" 測試 Toolkit 實例設定...")
+    from tradingagents.agents.utils.agent_utils import Toolkit
+    from tradingagents.default_config import DEFAULT_CONFIG
+
+    online = Toolkit(config={"online_tools": True, "data_dir": "/tmp/a"})
+    offline = Toolkit(config={"online_tools": False, "data_dir": "/tmp/b"})
+    assert online.config["online_tools"] is True
+    assert offline.config["online_tools"] is False
+
+    online.update_config({"data_dir": "/tmp/c"})
+    assert offline.config["data_dir"] == "/tmp/b"
+    assert DEFAULT_CONFIG["data_dir"] != "/tmp/c"
+    print(" Toolkit 實例設定測試通過")
+
+
+def test_use_config_isolated_between_threads():
+    """測試並行分析各自綁定的設定不互相覆寫，也不修改全域設定"""
+    print(" 測試分析設定綁定...")
+    from tradingagents.dataflows.config import get_config, get_data_dir, use_config
+
+    global_before = get_config()
+    barrier = threading.Barrier(2)
+
+    def run(data_dir, online):
+        with use_config({"data_dir": data_dir, "online_tools": online}):
+            barrier.wait(timeout=10)
+            # 模擬 LangGraph 節點執行緒繼承綁定
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                seen = pool.submit(copy_context().run, get_config).result()
+            return seen["data_dir"], seen["online_tools"], get_data_dir()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        a = pool.submit(run, "/tmp/run_a", True)
+        b = pool.submit(run, "/tmp/run_b", False)
+        assert a.result() == ("/tmp/run_a", True, "/tmp/run_a")
+        assert b.result() == ("/tmp/run_b", False, "/tmp/run_b")
+
+    global_after = get_config()
+    assert global_after["data_dir"] == global_before["data_dir"]
+    assert global_after["online_tools"] == global_before["online_tools"]
+    print(" 分析設定綁定測試通過")
+
+
+def test_tool_executor_sees_bound_config():
+    """測試預載入與直接呼叫工具在全域工具執行緒池中仍讀到 use_config 綁定的設定"""
+    print(" 測試工具執行緒池的分析設定...")
+    from tradingagents.agents.utils.agent_utils import invoke_tools_direct, prefetch_data_requests
+    from tradingagents.agents.utils.analysis_context import AnalysisContext
+    from tradingagents.dataflows.config import get_config, get_data_dir, use_config
+
+    class ConfigTool:
+        def __init__(self, name):
+            self.name = name
+
+        def invoke(self, args):
+            config = get_config()
+            return f"{get_data_dir()}|{config['data_cache_dir']}|{args['n']}"
+
+    tenant = {"data_dir": "/tmp/TENANT_A", "data_cache_dir": "/tmp/TENANT_A_cache"}
+    expected = "/tmp/TENANT_A|/tmp/TENANT_A_cache"
+    with use_config(tenant), AnalysisContext("tenant") as context:
+        futures = prefetch_data_requests(
+            [(ConfigTool("get_prefetch_a"), {"n": 1}), (ConfigTool("get_prefetch_b"), {"n": 2})],
+            context=context,
+        )
+        assert [f.result() for f in futures] == [f"{expected}|1", f"{expected}|2"]
+
+        results = invoke_tools_direct(
+            [ConfigTool("get_direct_a"), ConfigTool("get_direct_b")], [{"n": 3}, {"n": 4}],
+            context=context,
+        )
+        assert results == [f"{expected}|3", f"{expected}|4"]
+    print(" 工具執行緒池的分析設定測試通過")
+
+
+if __name__ == "__main__":
+    test_toolkit_config_is_per_instance()
+    test_use_config_isolated_between_threads()
+    test_tool_executor_sees_bound_config()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+測試供應商層級的 LLM 回應快取
+驗證快取鍵只統一空白、命中後不再呼叫模型並統計節省的 token、過短回應不快取、
+TTL 過期與超過大小上限時淘汰最久未使用的條目
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+class _CountingModel(GenericFakeChatModel):
+    """每次實際呼叫都回傳帶 token 用量的新回應，並記錄呼叫次數"""
+
+    calls: int = 0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def _model(cache, replies):
+    messages = iter(
+        AIMessage(
+            content=reply,
+            usage_metadata={"input_tokens": 100, "output_tokens": 20, "total_tokens": 120},
+        )
+        for reply in replies
+    )
+    return _CountingModel(messages=messages, cache=cache)
+
+
+def test_cache_key_normalization():
+    """測試快取鍵忽略空白差異，但區分時間戳、模型參數與內容"""
+    print(" 測試 LLM 快取鍵...")
+    from tradingagents.graph.llm_cache import LLMResponseCache
+
+    key = LLMResponseCache.cache_key("報告  產生於 2024-01-05 10:00:01\n結論", "gpt-4o-mini")
+    assert key == LLMResponseCache.cache_key(" 報告 產生於 2024-01-05 10:00:01 結論 ", "gpt-4o-mini")
+    assert key != LLMResponseCache.cache_key("報告 產生於 2025-06-30 23:59:59 結論", "gpt-4o-mini")
+    assert key != LLMResponseCache.cache_key("報告 產生於 2024-01-05 10:00:01 結論", "gpt-4o")
+    assert key != LLMResponseCache.cache_key("報告 產生於 2024-01-05 10:00:01 看空", "gpt-4o-mini")
+    print(" LLM 快取鍵測試通過")
+
+
+def test_hit_skips_provider():
+    """測試相同提示詞第二次呼叫直接回傳快取，並統計命中與節省的 token"""
+    print(" 測試 LLM 快取命中...")
+    from tradingagents.graph.llm_cache import SQLiteLLMCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SQLiteLLMCache(os.path.join(tmp, "llm.sqlite"), ttl_seconds=3600, max_bytes=1 << 20)
+        model = _model(cache, ["市場分析：趨勢向上，建議買入。", "第二次呼叫不應發生的回應內容。", "太短"])
+
+        first = model.invoke("分析 AAPL（產生時間 2024-01-05 10:00:01）")
+        second = model.invoke("分析\n  AAPL（產生時間 2024-01-05 10:00:01）")
+        assert model.calls == 1
+        assert second.content == first.content
+        assert second.response_metadata.get("llm_cache_hit") is True
+
+        # 不同提示詞需要實際呼叫
+        model.invoke("分析 MSFT")
+        assert model.calls == 2
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 2 and stats["stores"] == 2
+        assert stats["tokens_saved"] == 120
+        assert stats["hit_ratio"] == round(1 / 3, 4)
+
+        # 過短的回應不快取（風險經理等節點會重試過短的回應）
+        model.invoke("風險評估")
+        assert len(cache) == 2
+
+        # 同一路徑重新開啟仍可命中（持久化）
+        reopened = SQLiteLLMCache(cache.db_path, ttl_seconds=3600, max_bytes=1 << 20)
+        model.cache = reopened
+        assert model.invoke("分析 AAPL（產生時間 2024-01-05 10:00:01）").content == first.content
+        assert model.calls == 3
+    print(" LLM 快取命中測試通過")
+
+
+def test_ttl_and_eviction():
+    """測試 TTL 過期與超過大小上限時淘汰最久未使用的條目"""
+    print(" 測試 LLM 快取過期與淘汰...")
+    from tradingagents.graph.llm_cache import SQLiteLLMCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        expiring = SQLiteLLMCache(os.path.join(tmp, "ttl.sqlite"), ttl_seconds=0, max_bytes=1 << 20)
+        expiring.update("p", "m", [_chat_generation("一段足夠長的回應內容，可以被快取。")])
+        time.sleep(0.01)
+        assert expiring.lookup("p", "m") is None
+        assert len(expiring) == 0
+
+        payload = "回應" * 200
+        cache = SQLiteLLMCache(os.path.join(tmp, "lru.sqlite"), ttl_seconds=3600, max_bytes=4000)
+        for i in range(3):
+            cache.update(f"prompt-{i}", "m", [_chat_generation(f"{i}{payload}")])
+            time.sleep(0.01)
+        # 存取 prompt-0 使其成為最近使用，寫入新條目時淘汰 prompt-1
+        assert cache.lookup("prompt-0", "m") is not None
+        cache.update("prompt-3", "m", [_chat_generation(f"3{payload}")])
+
+        assert cache.get_stats()["evictions"] >= 1
+        assert cache.lookup("prompt-1", "m") is None
+        assert cache.lookup("prompt-0", "m") is not None
+        assert cache.lookup("prompt-3", "m") is not None
+    print(" LLM 快取過期與淘汰測試通過")
+
+
+def test_create_from_config():
+    """測試依設定建立快取：預設停用、同一路徑共用實例、graph 的模型掛上快取"""
+    print(" 測試 LLM 快取設定...")
+    from tradingagents.graph.llm_cache import create_llm_cache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        assert create_llm_cache({"llm_cache_backend": "none"}) is None
+        config = {"llm_cache_backend": "sqlite", "data_cache_dir": tmp}
+        cache = create_llm_cache(config)
+        assert cache is create_llm_cache(dict(config))
+        assert cache.db_path == os.path.join(os.path.abspath(tmp), "llm_response_cache.sqlite")
+
+        os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+        from tradingagents.graph.trading_graph import TradingAgentsGraph
+        graph = TradingAgentsGraph(
+            selected_analysts=["market"],
+            config={"memory_enabled": False, "checkpoint_backend": "none", **config},
+        )
+        assert graph.llm_cache is cache
+        assert graph.quick_thinking_llm.cache is cache
+        assert graph.deep_thinking_llm.cache is cache
+    print(" LLM 快取設定測試通過")
+
+
+def _chat_generation(text):
+    from langchain_core.outputs import ChatGeneration
+    return ChatGeneration(message=AIMessage(content=text))
+
+
+if __name__ == "__main__":
+    test_cache_key_normalization()
+    test_hit_skips_provider()
+    test_ttl_and_eviction()
+    test_create_from_config()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+測試 LLM 速率限制與並發調度
+驗證 token bucket 依 TPM 限流並依實際用量退回、background 請求不使用保留額度、
+並發已滿時互動請求優先，以及聊天模型只在實際呼叫供應商時計量（快取命中不佔額度）
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def test_token_bucket_throttles_and_settles():
+    """測試超過 TPM 時等待補充，依實際用量退回估算的 token 數"""
+    print(" 測試 token bucket 限流...")
+    from tradingagents.graph.llm_governor import LLMGovernor
+
+    governor = LLMGovernor({"openai": {"tpm": 600}})
+    with governor.acquire("openai", "gpt-4o-mini", 600) as lease:
+        lease.settle(300)  # 實際只用了 300 tokens，退回 300
+
+    started = time.monotonic()
+    governor.acquire("openai", "gpt-4o-mini", 300).release()
+    assert time.monotonic() - started < 0.2
+
+    # 額度用完，每秒補充 10 tokens，5 tokens 約需等待 0.5 秒
+    started = time.monotonic()
+    governor.acquire("openai", "gpt-4o-mini", 5).release()
+    assert 0.3 < time.monotonic() - started < 2.0
+
+    stats = governor.get_stats()["openai:gpt-4o-mini"]
+    assert stats["requests"] == 3 and stats["throttled"] == 1
+    assert stats["tokens"] == 605 and stats["in_flight"] == 0
+    # 其他模型各自計量
+    assert governor.limits_for("openai", "gpt-4.1").tpm == 600
+    assert "openai:gpt-4.1" not in governor.get_stats()
+    print(" token bucket 限流測試通過")
+
+
+def test_background_keeps_reserve():
+    """測試 background 請求不可使用保留給互動請求的額度，等待超過上限時直接放行"""
+    print(" 測試背景請求保留額度...")
+    from tradingagents.graph.llm_governor import PRIORITY_BACKGROUND, LLMGovernor
+
+    governor = LLMGovernor({"anthropic": {"tpm": 1000}}, background_reserve=0.3, max_wait_seconds=0.3)
+    governor.acquire("anthropic", "claude-haiku-4-5", 600).release()
+
+    started = time.monotonic()
+    governor.acquire("anthropic", "claude-haiku-4-5", 200).release()
+    assert time.monotonic() - started < 0.2
+
+    started = time.monotonic()
+    governor.acquire("anthropic", "claude-haiku-4-5", 200, PRIORITY_BACKGROUND).release()
+    assert time.monotonic() - started >= 0.3
+    assert governor.get_stats()["anthropic:claude-haiku-4-5"]["forced"] == 1
+
+    try:
+        governor.acquire("anthropic", "claude-haiku-4-5", 1, "batch")
+        raise AssertionError("不支援的優先權應拋出例外")
+    except ValueError:
+        pass
+    print(" 背景請求保留額度測試通過")
+
+
+def test_interactive_priority_on_concurrency():
+    """測試並發已滿時，名額釋出後由等待中的互動請求優先取得"""
+    print(" 測試互動請求優先...")
+    from tradingagents.graph.llm_governor import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, LLMGovernor
+
+    governor = LLMGovernor({"openai": {"max_concurrency": 1}})
+    order = []
+
+    def _call(priority):
+        with governor.acquire("openai", "gpt-4o-mini", 10, priority):
+            order.append(priority)
+            time.sleep(0.05)
+
+    holder = governor.acquire("openai", "gpt-4o-mini", 10)
+    background = threading.Thread(target=_call, args=(PRIORITY_BACKGROUND,))
+    background.start()
+    time.sleep(0.1)
+    interactive = threading.Thread(target=_call, args=(PRIORITY_INTERACTIVE,))
+    interactive.start()
+    time.sleep(0.1)
+    holder.release()
+    background.join(5)
+    interactive.join(5)
+
+    assert order == [PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND]
+    assert governor.get_stats()["openai:gpt-4o-mini"]["in_flight"] == 0
+    print(" 互動請求優先測試通過")
+
+
+def test_governed_chat_model():
+    """測試聊天模型呼叫時取得額度並依 usage_metadata 結算，快取命中不計量"""
+    print(" 測試經過調度的聊天模型...")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+    from langchain_core.caches import InMemoryCache
+    from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+    from tradingagents.graph.llm_governor import (
+        GovernedChatOpenAI,
+        LLMGovernor,
+        PRIORITY_BACKGROUND,
+        _GovernedChatModel,
+        create_chat_model,
+        set_llm_governor,
+    )
+
+    class _FakeGoverned(_GovernedChatModel, FakeMessagesListChatModel):
+        _governor_provider = "openai"
+        model_name: str = "gpt-4o-mini"
+
+    reply = AIMessage(
+        content="建議持有，等待財報公布。",
+        usage_metadata={"input_tokens": 40, "output_tokens": 10, "total_tokens": 50},
+    )
+    governor = LLMGovernor({"openai": {"rpm": 100, "tpm": 100000}})
+    previous = set_llm_governor(governor)
+    try:
+        llm = _FakeGoverned(responses=[reply, reply], cache=InMemoryCache())
+        prompt = [HumanMessage(content="AAPL 目前是否適合買入？")]
+        assert llm.invoke(prompt).content == reply.content
+        assert llm.invoke(prompt).content == reply.content  # 快取命中，不呼叫供應商
+
+        stats = governor.get_stats()["openai:gpt-4o-mini"]
+        assert stats["requests"] == 1
+        assert stats["tokens"] == 50
+
+        set_llm_governor(None)
+        assert llm.invoke([HumanMessage(content="MSFT 呢？")]).content == reply.content
+    finally:
+        set_llm_governor(previous)
+
+    model = create_chat_model("openai", priority=PRIORITY_BACKGROUND, model="gpt-4o-mini", max_tokens=100)
+    assert isinstance(model, GovernedChatOpenAI)
+    assert model.governor_priority == PRIORITY_BACKGROUND and model._llm_type == "openai-chat"
+    assert create_chat_model("openai", model="gpt-4o-mini").governor_priority == "interactive"
+    print(" 經過調度的聊天模型測試通過")
+
+
+def test_first_explicit_config_wins(monkeypatch):
+    """測試隱含建立的預設調度器被第一個明確設定取代，之後不同的設定沿用既有調度器並警告一次"""
+    print(" 測試調度器設定衝突...")
+    from tradingagents.graph import llm_governor
+
+    monkeypatch.setattr(llm_governor, "_governor", llm_governor._UNSET)
+    monkeypatch.setattr(llm_governor, "_governor_settings", None)
+    monkeypatch.setattr(llm_governor, "_governor_explicit", False)
+    monkeypatch.setattr(llm_governor, "_warned_settings", set())
+    warnings = []
+    monkeypatch.setattr(llm_governor.logger, "warning", warnings.append)
+
+    # 聊天模型先以預設設定（停用）隱含建立
+    assert llm_governor.get_llm_governor() is None
+
+    first = {"llm_governor_backend": "local", "llm_rate_limits": {"openai": {"rpm": 60}}}
+    governor = llm_governor.get_llm_governor(first)
+    assert governor is not None and governor.limits_for("openai", "gpt-4o").rpm == 60
+    assert llm_governor.get_llm_governor() is governor
+    assert llm_governor.get_llm_governor(dict(first)) is governor
+    assert warnings == []
+
+    other = {"llm_governor_backend": "local", "llm_rate_limits": {"openai": {"rpm": 500}}}
+    assert llm_governor.get_llm_governor(other) is governor
+    assert llm_governor.get_llm_governor(other) is governor
+    assert len(warnings) == 1 and "llm_rate_limits" in warnings[0]
+    print(" 調度器設定衝突測試通過")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
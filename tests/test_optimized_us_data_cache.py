@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+測試美股資料提供器的原始資料快取
+驗證不同區間的請求共用同一次K線抓取，報告依請求區間產生
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+class _FakeTicker:
+    calls = []
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def history(self, start, end):
+        _FakeTicker.calls.append((start, end))
+        dates = pd.bdate_range(start, end, inclusive="left", name="Date")
+        close = (dates - pd.Timestamp("2024-01-01")).days.to_numpy(dtype=float) + 100
+        return pd.DataFrame({
+            "Open": close, "High": close + 1, "Low": close - 1,
+            "Close": close, "Volume": np.full(len(dates), 1000.0),
+        }, index=dates)
+
+
+def test_windows_share_raw_history():
+    """測試子區間請求直接由已抓取的原始K線產生報告"""
+    print(" 測試原始K線快取共用...")
+    from tradingagents.dataflows import optimized_us_data
+    from tradingagents.dataflows.price_store import PriceStore
+
+    original_yf_ticker = optimized_us_data.yf.Ticker
+    optimized_us_data.yf.Ticker = _FakeTicker
+    _FakeTicker.calls = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            provider = optimized_us_data.OptimizedUSDataProvider()
+            provider.price_store = PriceStore(tmp)
+            provider._get_data_from_finnhub = lambda symbol: None
+            provider._rate_limits["yfinance"]["interval"] = 0
+
+            report = provider.get_stock_data("TEST", "2024-01-01", "2024-03-01")
+            assert "MA20" in report and "資料條數: 44條" in report
+            assert len(_FakeTicker.calls) == 1
+
+            # 不同但被覆蓋的區間：不應再次抓取，報告依新區間產生
+            report = provider.get_stock_data("TEST", "2024-02-01", "2024-02-15")
+            assert len(_FakeTicker.calls) == 1
+            assert "資料期間: 2024-02-01 至 2024-02-15" in report
+            assert "資料條數: 10條" in report
+
+            history = provider.get_price_history("TEST", "2024-02-12", "2024-02-14")
+            assert list(history.index.strftime("%Y-%m-%d")) == ["2024-02-12", "2024-02-13"]
+    finally:
+        optimized_us_data.yf.Ticker = original_yf_ticker
+    print(" 原始K線快取共用測試通過")
+
+
+def test_quote_cached_by_symbol():
+    """測試 FINNHUB 報價以 symbol 快取，可服務不同區間"""
+    print(" 測試報價快取...")
+    from tradingagents.dataflows import optimized_us_data
+
+    provider = optimized_us_data.OptimizedUSDataProvider()
+    provider._rate_limits["finnhub"]["interval"] = 0
+    calls = []
+
+    def fake_finnhub(symbol):
+        calls.append(symbol)
+        return {"quote": {"c": 10.0, "d": 1.0, "dp": 11.1, "o": 9.5, "h": 10.5, "l": 9.0, "pc": 9.0},
+                "company_name": "Test Inc", "fetched_at": "2024-01-01 00:00:00"}
+
+    provider._get_data_from_finnhub = fake_finnhub
+    first = provider.get_stock_data("TEST", "2024-01-01", "2024-02-01")
+    second = provider.get_stock_data("TEST", "2024-01-15", "2024-02-01")
+    assert calls == ["TEST"]
+    assert "Test Inc" in first and "資料期間: 2024-01-15 至 2024-02-01" in second
+    print(" 報價快取測試通過")
+
+
+if __name__ == "__main__":
+    test_windows_share_raw_history()
+    test_quote_cached_by_symbol()
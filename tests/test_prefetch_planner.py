@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+測試預載入規劃器
+驗證依選擇的分析師與 online_tools 設定推導去重後的工具呼叫清單
+"""
+
+import os
+import sys
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def _build_nodes(toolkit, analysts):
+    from tradingagents.agents import (
+        create_fundamentals_analyst,
+        create_market_analyst,
+        create_news_analyst,
+        create_social_media_analyst,
+    )
+    factories = {
+        "market": create_market_analyst,
+        "social": create_social_media_analyst,
+        "news": create_news_analyst,
+        "fundamentals": create_fundamentals_analyst,
+    }
+    return [factories[a](None, toolkit) for a in analysts]
+
+
+def _names(planned):
+    return [getattr(tool, "name", "") for tool, _ in planned]
+
+
+def test_market_only_plan():
+    """測試只選市場分析師時只預載入 2 個請求"""
+    print(" 測試市場分析師預載入規劃...")
+    from tradingagents.agents.utils.agent_utils import Toolkit, plan_prefetch
+
+    toolkit = Toolkit(config={"online_tools": True})
+    planned = plan_prefetch(_build_nodes(toolkit, ["market"]), toolkit, "AAPL", "2024-01-05")
+    assert _names(planned) == ["get_stock_market_data_unified", "get_finnhub_technical_signals"]
+    print(" 市場分析師預載入規劃測試通過")
+
+
+def test_full_plan_deduplicates():
+    """測試全部分析師時共用的 Finnhub 情緒只預載入一次"""
+    print(" 測試完整預載入規劃...")
+    from tradingagents.agents.utils.agent_utils import Toolkit, plan_prefetch
+
+    toolkit = Toolkit(config={"online_tools": True})
+    nodes = _build_nodes(toolkit, ["market", "social", "news", "fundamentals"])
+    planned = plan_prefetch(nodes, toolkit, "AAPL", "2024-01-05")
+    names = _names(planned)
+    assert len(planned) == 7
+    assert names.count("get_finnhub_sentiment_data") == 1
+    # 未指定節點時與全部分析師相同
+    assert _names(plan_prefetch(None, toolkit, "AAPL", "2024-01-05")) == names
+    print(" 完整預載入規劃測試通過")
+
+
+def test_offline_plan_uses_offline_tools():
+    """測試 online_tools 關閉時預載入離線分析師實際使用的工具"""
+    print(" 測試離線模式預載入規劃...")
+    from tradingagents.agents.utils.agent_utils import Toolkit, plan_prefetch
+
+    toolkit = Toolkit(config={"online_tools": False})
+    planned = plan_prefetch(_build_nodes(toolkit, ["market", "social"]), toolkit, "AAPL", "2024-01-05")
+    names = _names(planned)
+    assert "get_google_news" not in names
+    assert "get_stock_market_data_unified" not in names
+    assert names == [
+        "get_YFin_data",
+        "get_stockstats_indicators_report",
+        "get_finnhub_technical_signals",
+        "get_stock_sentiment_unified",
+        "get_finnhub_sentiment_data",
+    ]
+    print(" 離線模式預載入規劃測試通過")
+
+
+if __name__ == "__main__":
+    test_market_only_plan()
+    test_full_plan_deduplicates()
+    test_offline_plan_uses_offline_tools()
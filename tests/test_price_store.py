@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+測試列式價格儲存
+驗證寫入、附加、日期切片與 CSV 匯入
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def _make_bars(start: str, periods: int) -> pd.DataFrame:
+    dates = pd.bdate_range(start, periods=periods)
+    close = np.arange(periods, dtype=float) + 100
+    return pd.DataFrame({
+        "Date": dates,
+        "Open": close - 0.5,
+        "High": close + 1,
+        "Low": close - 1,
+        "Close": close,
+        "Volume": np.arange(periods) * 10 + 1000,
+    })
+
+
+def test_write_append_and_slice():
+    """測試寫入後附加新K線，並以日期區間切片"""
+    print(" 測試列式價格儲存寫入/附加...")
+    from tradingagents.dataflows.price_store import PriceStore
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PriceStore(tmp)
+        bars = _make_bars("2024-01-01", 30)
+        assert store.write("test", bars.iloc[:20]) == 20
+        assert store.date_range("TEST") == ("2024-01-01", "2024-01-26")
+
+        # 重疊部分應被略過，只附加較新的K線
+        assert store.append("TEST", bars.iloc[15:]) == 10
+        assert store.append("TEST", bars.iloc[25:]) == 0
+
+        arrays = store.get_arrays("TEST", "2024-01-08", "2024-01-12")
+        assert isinstance(arrays["Close"], np.memmap)
+        assert list(arrays["Close"]) == [105.0, 106.0, 107.0, 108.0, 109.0]
+
+        frame = store.get_frame("TEST", "2024-02-01")
+        assert frame["Date"].iloc[0] == "2024-02-01"
+        assert frame["Date"].iloc[-1] == "2024-02-09"
+        assert list(frame.columns) == ["Date", "Open", "High", "Low", "Close", "Volume"]
+    print(" 列式價格儲存寫入/附加測試通過")
+
+
+def test_load_offline_prices_from_csv():
+    """測試離線 CSV 匯入與重新匯入判斷"""
+    print(" 測試離線 CSV 匯入...")
+    from tradingagents.dataflows.price_store import get_price_store, load_offline_prices
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bars = _make_bars("2024-01-01", 10)
+        bars["Date"] = bars["Date"].dt.strftime("%Y-%m-%d 00:00:00-05:00")
+        csv_path = os.path.join(tmp, "TEST-YFin-data-2015-01-01-2025-03-25.csv")
+        bars.to_csv(csv_path, index=False)
+
+        frame = load_offline_prices("TEST", tmp, "2024-01-03", "2024-01-05")
+        assert list(frame["Date"]) == ["2024-01-03", "2024-01-04", "2024-01-05"]
+
+        store = get_price_store(os.path.join(tmp, ".price_store"))
+        assert store.import_csv("TEST", csv_path) is False
+
+        try:
+            load_offline_prices("MISSING", tmp)
+            assert False, "缺少 CSV 時應拋出 FileNotFoundError"
+        except FileNotFoundError:
+            pass
+    print(" 離線 CSV 匯入測試通過")
+
+
+def test_offline_prices_keep_csv_dtypes():
+    """測試離線讀取保留整數欄 dtype 與原 CSV index，輸出與直接篩選 CSV 相同"""
+    print(" 測試離線價格欄位型別...")
+    from tradingagents.dataflows.price_store import load_offline_prices
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bars = _make_bars("2024-01-01", 10)
+        bars["Date"] = bars["Date"].dt.strftime("%Y-%m-%d")
+        csv_path = os.path.join(tmp, "TEST-YFin-data-2015-01-01-2025-03-25.csv")
+        bars.to_csv(csv_path, index=False)
+
+        baseline = pd.read_csv(csv_path)
+        baseline = baseline[(baseline["Date"] >= "2024-01-03") & (baseline["Date"] <= "2024-01-05")]
+        frame = load_offline_prices("TEST", tmp, "2024-01-03", "2024-01-05", keep_index=True)
+        assert frame["Volume"].dtype == np.int64
+        assert frame.to_string() == baseline.to_string()
+        assert list(load_offline_prices("TEST", tmp, "2024-01-03", "2024-01-05").index) == [0, 1, 2]
+
+        # 含非數值欄時退回直接讀取 CSV，不丟失欄位
+        bars["Note"] = "x"
+        bars.to_csv(os.path.join(tmp, "NOTE-YFin-data-2015-01-01-2025-03-25.csv"), index=False)
+        assert list(load_offline_prices("NOTE", tmp)["Note"]) == ["x"] * 10
+    print(" 離線價格欄位型別測試通過")
+
+
+def test_ensure_range_fetches_only_gaps():
+    """測試區間覆蓋：只下載缺口，子區間直接由既有資料提供"""
+    print(" 測試區間感知的增量補齊...")
+    from tradingagents.dataflows.price_store import PriceStore
+
+    calls = []
+    scale = {"value": 1.0}
+
+    def fetch(start, end):
+        calls.append((start, end))
+        dates = pd.bdate_range(start, end, inclusive="left")
+        # 收盤價由日期決定，重疊K線在未調整時必定相同
+        close = (dates - pd.Timestamp("2023-12-01")).days.to_numpy(dtype=float) + 100
+        close = close * scale["value"]
+        return pd.DataFrame({"Close": close, "Volume": np.ones(len(dates))},
+                            index=pd.Index(dates, name="Date"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PriceStore(tmp)
+        assert store.ensure_range("TEST", "2024-01-01", "2024-03-01", fetch) == 1
+        # 子區間與相同區間不應再下載
+        assert store.ensure_range("TEST", "2024-01-15", "2024-02-15", fetch) == 0
+        assert store.ensure_range("TEST", "2024-01-01", "2024-03-01", fetch) == 0
+
+        # 尾端缺口：只抓最後已存交易日之後（含一根重疊K線）
+        calls.clear()
+        assert store.ensure_range("TEST", "2024-01-01", "2024-03-06", fetch) == 1
+        assert calls == [("2024-02-29", "2024-03-06")]
+
+        # 次日補資料走附加寫入，不重寫整段序列
+        writes, appends = [], []
+        original_write, original_append = store.write, store.append
+        store.write = lambda *a, **k: writes.append(a[0]) or original_write(*a, **k)
+        store.append = lambda *a, **k: appends.append(a[0]) or original_append(*a, **k)
+        assert store.ensure_range("TEST", "2024-01-01", "2024-03-07", fetch) == 1
+        assert appends == ["TEST"] and writes == []
+        assert store.date_range("TEST") == ("2024-01-01", "2024-03-06")
+        store.write, store.append = original_write, original_append
+
+        # 頭端缺口：只抓缺少的前段，並與既有資料合併
+        calls.clear()
+        assert store.ensure_range("TEST", "2023-12-01", "2024-03-07", fetch) == 1
+        assert calls == [("2023-12-01", "2024-01-01")]
+        assert store.date_range("TEST") == ("2023-12-01", "2024-03-06")
+        assert store.get_coverage("TEST") == [["2023-12-01", "2024-03-07"]]
+
+        # 歷史價格重新調整（重疊K線收盤價不同）時重新下載整段
+        calls.clear()
+        scale["value"] = 0.5
+        store.ensure_range("TEST", "2023-12-01", "2024-03-08", fetch)
+        assert calls[-1] == ("2023-12-01", "2024-03-08")
+        assert store.get_frame("TEST", "2023-12-01", "2023-12-01")["Close"].iloc[0] == 50.0
+    print(" 區間感知的增量補齊測試通過")
+
+
+if __name__ == "__main__":
+    test_write_append_and_slice()
+    test_load_offline_prices_from_csv()
+    test_offline_prices_keep_csv_dtypes()
+    test_ensure_range_fetches_only_gaps()
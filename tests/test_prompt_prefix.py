@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+測試下游節點的共用報告前綴與供應商提示詞快取
+驗證多空研究員、兩位經理與三位風險辯論者的第一則訊息逐字相同、
+Anthropic 模型加上 cache_control 斷點，以及依節點記錄快取讀取的 token 數
+"""
+
+import os
+import sys
+
+from langchain_core.messages import AIMessage
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+class _CapturingLLM:
+    """記錄每次呼叫的訊息，回傳帶供應商快取用量的回應"""
+
+    def __init__(self, llm_type="openai-chat", openai_api_base=None):
+        self._llm_type = llm_type
+        self.openai_api_base = openai_api_base
+        self.prompts = []
+
+    def invoke(self, messages):
+        self.prompts.append(messages)
+        cache_read = 3000 if len(self.prompts) > 1 else 0
+        return AIMessage(
+            content="辯論觀點：營收成長強勁，但估值偏高，建議持有並設定停損。",
+            usage_metadata={
+                "input_tokens": 4000,
+                "output_tokens": 200,
+                "total_tokens": 4200,
+                "input_token_details": {"cache_read": cache_read},
+            },
+        )
+
+
+def _state():
+    debate = {"history": "", "bull_history": "", "bear_history": "", "current_response": "", "count": 0}
+    risk = {
+        "history": "", "risky_history": "", "safe_history": "", "neutral_history": "",
+        "latest_speaker": "", "current_risky_response": "", "current_safe_response": "",
+        "current_neutral_response": "", "count": 0,
+    }
+    return {
+        "company_of_interest": "AAPL",
+        "trade_date": "2024-01-05",
+        "market_report": "市場報告 " * 500,
+        "sentiment_report": "情緒報告 " * 100,
+        "news_report": "新聞報告 " * 100,
+        "fundamentals_report": "基本面報告 " * 300,
+        "investment_plan": "研究經理建議買入",
+        "trader_investment_plan": "交易員計劃：買入，目標價 $210",
+        "investment_debate_state": debate,
+        "risk_debate_state": risk,
+    }
+
+
+def _run_downstream_nodes(llm):
+    from tradingagents.agents import (
+        create_bear_researcher,
+        create_bull_researcher,
+        create_neutral_debator,
+        create_research_manager,
+        create_risk_manager,
+        create_risky_debator,
+        create_safe_debator,
+    )
+
+    state = _state()
+    nodes = [
+        create_bull_researcher(llm, None),
+        create_bear_researcher(llm, None),
+        create_research_manager(llm, None),
+        create_risky_debator(llm),
+        create_safe_debator(llm),
+        create_neutral_debator(llm),
+        create_risk_manager(llm, None),
+    ]
+    for node in nodes:
+        node(state)
+    return llm.prompts
+
+
+def test_shared_prefix_identical():
+    """測試所有下游節點的共用前綴逐字相同，且依截斷長度放入報告"""
+    print(" 測試共用報告前綴...")
+    from tradingagents.agents.utils.prompt_prefix import build_shared_report_context
+
+    prompts = _run_downstream_nodes(_CapturingLLM())
+    assert len(prompts) == 7
+    shared = build_shared_report_context(_state())
+    for messages in prompts:
+        assert messages[0].type == "system"
+        assert messages[0].content.startswith(shared)
+        # 共用報告不再重複出現在節點指示中
+        assert "市場報告" not in messages[1].content
+
+    # 三位風險辯論者的第二層前綴（交易員計劃）也相同
+    risk_prefixes = {messages[0].content for messages in prompts[3:6]}
+    assert len(risk_prefixes) == 1
+    assert "交易員計劃：買入" in risk_prefixes.pop()
+    assert "(略)" in shared
+    print(" 共用報告前綴測試通過")
+
+
+def test_anthropic_cache_breakpoints():
+    """測試 Anthropic 模型的前綴區塊帶 cache_control 斷點"""
+    print(" 測試 Anthropic cache_control 斷點...")
+    from tradingagents.agents.utils.prompt_prefix import build_shared_report_context
+
+    prompts = _run_downstream_nodes(_CapturingLLM("anthropic-chat"))
+    shared = build_shared_report_context(_state())
+    for messages in prompts:
+        blocks = messages[0].content
+        assert blocks[0] == {"type": "text", "text": shared, "cache_control": {"type": "ephemeral"}}
+        assert all("cache_control" in block for block in blocks)
+    assert [len(m[0].content) for m in prompts] == [1, 1, 1, 2, 2, 2, 1]
+    print(" Anthropic cache_control 斷點測試通過")
+
+
+def test_cache_usage_per_node():
+    """測試依節點記錄輸入與快取讀取的 token 數"""
+    print(" 測試提示詞快取用量統計...")
+    from tradingagents.agents.utils.analysis_context import analysis_scope
+
+    with analysis_scope("AAPL@2024-01-05") as context:
+        _run_downstream_nodes(_CapturingLLM())
+        usage = context.llm_usage_stats()
+
+    assert usage["bull_researcher"] == {"calls": 1, "input_tokens": 4000, "cache_read": 0, "cache_creation": 0}
+    assert usage["bear_researcher"]["cache_read"] == 3000
+    assert set(usage) == {
+        "bull_researcher", "bear_researcher", "research_manager",
+        "risky_debator", "safe_debator", "neutral_debator", "risk_manager",
+    }
+    print(" 提示詞快取用量統計測試通過")
+
+
+def test_risk_excerpts_without_prefix_cache():
+    """測試供應商不快取前綴時（相容 API 代理、停用提示詞快取），風險辯論者改用報告節錄"""
+    print(" 測試無前綴快取時的風險辯論者節錄...")
+    from tradingagents.agents.utils.context_budget import tokenizer_for_llm
+    from tradingagents.agents.utils.prompt_prefix import build_report_excerpts, build_shared_report_context
+    from tradingagents.dataflows.config import use_config
+
+    def check(llm):
+        prompts = _run_downstream_nodes(llm)
+        shared = build_shared_report_context(_state(), llm)
+        excerpts = build_report_excerpts(_state(), llm)
+        tokenizer = tokenizer_for_llm(llm)
+        assert tokenizer.count(excerpts) < tokenizer.count(shared) / 2
+        # 研究員與經理仍使用完整前綴，三位風險辯論者使用相同的節錄
+        for i in (0, 1, 2, 6):
+            assert prompts[i][0].content.startswith(shared)
+        for i in (3, 4, 5):
+            assert prompts[i][0].content.startswith(excerpts)
+            assert "交易員計劃：買入" in prompts[i][0].content
+
+    check(_CapturingLLM(openai_api_base="https://proxy.example.com/v1"))
+    check(_CapturingLLM("google-generative-ai"))
+    with use_config({"prompt_cache_enabled": False}):
+        check(_CapturingLLM())
+    print(" 無前綴快取時的風險辯論者節錄測試通過")
+
+
+if __name__ == "__main__":
+    test_shared_prefix_identical()
+    test_anthropic_cache_breakpoints()
+    test_cache_usage_per_node()
+    test_risk_excerpts_without_prefix_cache()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+測試多檔股票批次分析
+驗證日K線以單次 yf.download 批次下載、所有圖的 LLM 呼叫受共用並發預算限制，以及單檔失敗被隔離並從檢查點重試
+"""
+
+import os
+import sys
+import threading
+
+import pandas as pd
+import pytest
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def test_batch_price_download(tmp_path, monkeypatch):
+    """測試多檔股票的日K線以單次 yf.download 下載並寫入價格儲存"""
+    print(" 測試批次下載日K線...")
+    from tradingagents.dataflows import optimized_us_data
+    from tradingagents.dataflows.price_store import PriceStore
+
+    calls = []
+
+    def fake_download(symbols, start, end, **kwargs):
+        calls.append(list(symbols))
+        dates = pd.bdate_range(start, pd.Timestamp(end) - pd.Timedelta(days=1), name="Date")
+        frames = {}
+        for symbol in symbols:
+            # 下載失敗的股票在 yfinance 批次結果中整欄為 NaN
+            price, volume = (float("nan"),) * 2 if symbol == "NODATA" else (100.0, 1000.0)
+            frames[symbol] = pd.DataFrame(
+                {"Open": price, "High": price, "Low": price, "Close": price, "Volume": volume},
+                index=dates,
+            )
+        return pd.concat(frames, axis=1)
+
+    def fail_history(symbol):
+        raise AssertionError("批次下載後不應再逐檔請求")
+
+    provider = optimized_us_data.OptimizedUSDataProvider()
+    provider.price_store = PriceStore(str(tmp_path))
+    monkeypatch.setattr(optimized_us_data.yf, "download", fake_download)
+    seeded = provider.prefetch_price_histories(["aapl", "MSFT", "AAPL", "NODATA"], "2024-01-02", "2024-01-10")
+    assert calls == [["AAPL", "MSFT", "NODATA"]]
+    assert seeded == ["AAPL", "MSFT"]
+
+    # 已覆蓋的股票不再下載，單檔讀取直接命中價格儲存
+    assert provider.prefetch_price_histories(["AAPL", "MSFT"], "2024-01-02", "2024-01-10") == []
+    assert len(calls) == 1
+    monkeypatch.setattr(optimized_us_data.yf, "Ticker", fail_history)
+    frame = provider.get_price_history("MSFT", "2024-01-02", "2024-01-10")
+    assert len(frame) == 6
+    assert frame["Close"].iloc[-1] == 100.0
+    print(" 批次下載日K線測試通過")
+
+
+def test_llm_budget_limits_concurrency(fake_llm):
+    """測試綁定預算後所有執行緒的 LLM 呼叫數不超過上限"""
+    print(" 測試 LLM 並發預算...")
+    from contextvars import copy_context
+
+    from tradingagents.agents.utils.llm_budget import LLMConcurrencyBudget, use_llm_budget
+    from tradingagents.agents.utils.report_cache import invoke_llm_cached
+
+    llm = fake_llm(delay=0.05)
+    budget = LLMConcurrencyBudget(2)
+    with use_llm_budget(budget):
+        threads = [
+            threading.Thread(target=copy_context().run, args=(invoke_llm_cached, llm, f"提示詞{i}", "trader"))
+            for i in range(6)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert len(llm.prompts) == 6
+    assert budget.peak == 2
+    assert budget.in_flight == 0
+    print(" LLM 並發預算測試通過")
+
+
+def test_propagate_many_isolates_failures(build_graph, fake_llm, fake_toolkit, monkeypatch):
+    """測試批次分析依完成順序產出結果，暫時失敗從檢查點續跑，持續失敗不影響其他股票"""
+    print(" 測試批次分析...")
+    from tradingagents.graph import trading_graph
+
+    monkeypatch.setattr(trading_graph, "_BATCH_RETRY_BASE_DELAY", 0)
+    llm = fake_llm()
+    # 離線模式：批次分析不經由 yfinance 下載日K線
+    graph = build_graph(llm, fake_toolkit(online_tools=False), checkpoint_backend="sqlite")
+    llm.fail_on("專業交易員", "MSFT", times=1)
+    llm.fail_on("專業交易員", "NVDA")
+
+    events = []
+    results = {
+        r["ticker"]: r
+        for r in graph.propagate_many(
+            ["AAPL", "MSFT", "NVDA", "123"], "2024-01-05",
+            max_concurrency=3, max_llm_concurrency=2, retries=1,
+            progress_callback=lambda ticker, event: events.append((ticker, event)),
+        )
+    }
+
+    assert set(results) == {"AAPL", "MSFT", "NVDA", "123"}
+    assert isinstance(results["123"]["error"], ValueError)
+
+    assert results["AAPL"]["error"] is None and results["AAPL"]["attempts"] == 1
+    assert results["AAPL"]["signal"]["action"] == "買入"
+
+    # 暫時失敗：第二次從檢查點續跑，分析師不重新執行
+    assert results["MSFT"]["error"] is None and results["MSFT"]["attempts"] == 2
+    assert results["MSFT"]["final_state"]["final_trade_decision"]
+    assert llm.count("股票技術分析師", "MSFT") == 1
+
+    # 持續失敗：回報錯誤並保留檢查點供之後續跑
+    assert isinstance(results["NVDA"]["error"], RuntimeError)
+    assert results["NVDA"]["attempts"] == 2
+    snapshot = graph.graph.get_state({"configurable": {"thread_id": results["NVDA"]["thread_id"]}})
+    assert snapshot.next
+
+    assert ("AAPL", "node_market_done") in events
+    print(" 批次分析測試通過")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+測試內容定址的節點報告快取
+驗證快取鍵涵蓋節點、模型與提示詞，輸入相同時跳過 LLM 呼叫，
+以及只有資料改變的節點重新呼叫 LLM
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def test_cache_key(fake_llm):
+    """測試快取鍵依節點、模型與提示詞變化，無模型 ID 時不快取"""
+    print(" 測試報告快取鍵...")
+    from tradingagents.agents.utils.report_cache import report_cache_key
+
+    llm = fake_llm(model_name="gpt-test")
+    prompt = [HumanMessage(content="分析 AAPL")]
+    key = report_cache_key("market_analyst", llm, prompt)
+    assert key == report_cache_key("market_analyst", llm, [HumanMessage(content="分析 AAPL")])
+    assert key != report_cache_key("news_analyst", llm, prompt)
+    assert key != report_cache_key("market_analyst", fake_llm(model_name="gpt-other"), prompt)
+    assert key != report_cache_key("market_analyst", llm, [HumanMessage(content="分析 MSFT")])
+
+    assert report_cache_key("market_analyst", fake_llm(), prompt) is None
+    print(" 報告快取鍵測試通過")
+
+
+def test_invoke_llm_cached(fake_llm, tmp_path):
+    """測試命中時跳過 LLM 呼叫，過短回應不寫入快取，設定可停用"""
+    print(" 測試報告快取讀寫...")
+    from tradingagents.agents.utils.report_cache import ainvoke_llm_cached, invoke_llm_cached
+    from tradingagents.dataflows.config import use_config
+    from tradingagents.dataflows.tiered_cache import TieredCache
+
+    cache = TieredCache(cache_dir=str(tmp_path), use_database=False)
+    llm = fake_llm(content="分析報告內容", model_name="gpt-test")
+
+    first = invoke_llm_cached(llm, "提示詞", "trader", cache=cache)
+    second = asyncio.run(ainvoke_llm_cached(llm, "提示詞", "trader", cache=cache))
+    assert first.content == second.content == "分析報告內容"
+    assert isinstance(second, AIMessage)
+    assert llm.calls == 1
+
+    short = fake_llm(content="太短", model_name="gpt-test")
+    invoke_llm_cached(short, "提示詞", "risk_manager", cache=cache, min_chars=10)
+    invoke_llm_cached(short, "提示詞", "risk_manager", cache=cache, min_chars=10)
+    assert short.calls == 2
+
+    with use_config({"report_cache_enabled": False}):
+        invoke_llm_cached(llm, "提示詞", "trader", cache=cache)
+    assert llm.calls == 2
+    cache.flush()
+    print(" 報告快取讀寫測試通過")
+
+
+def test_only_changed_nodes_rerun(fake_llm, fake_toolkit, tmp_path):
+    """測試只有輸入資料改變的分析師重新呼叫 LLM"""
+    print(" 測試部分節點重用...")
+    from tradingagents.agents import create_market_analyst, create_news_analyst
+    from tradingagents.agents.utils.analysis_context import analysis_scope
+    from tradingagents.dataflows.config import use_config
+    from tradingagents.dataflows.tiered_cache import get_tiered_cache
+
+    state = {"company_of_interest": "AAPL", "trade_date": "2024-01-05", "messages": []}
+    # 分層快取依 data_cache_dir 區分實例，暫存目錄即為獨立的快取
+    with use_config({"data_cache_dir": str(tmp_path)}):
+        try:
+            toolkit = fake_toolkit()
+            market_llm = fake_llm(content="分析報告內容", model_name="gpt-test")
+            news_llm = fake_llm(content="分析報告內容", model_name="gpt-test")
+            market = create_market_analyst(market_llm, toolkit)
+            news = create_news_analyst(news_llm, toolkit)
+
+            def run():
+                # 每次模擬一個新的分析（工具結果快取範圍獨立）
+                with analysis_scope("AAPL@2024-01-05"):
+                    return market(state), news(state)
+
+            run()
+            assert (market_llm.calls, news_llm.calls) == (1, 1)
+
+            # 新聞資料更新：只有新聞分析師重新呼叫 LLM
+            toolkit.outputs["get_finnhub_sentiment_data"] = "情緒資料已更新"
+            market_result, news_result = run()
+            assert (market_llm.calls, news_llm.calls) == (1, 2)
+            assert market_result["market_report"] == "分析報告內容"
+        finally:
+            get_tiered_cache().flush()
+    print(" 部分節點重用測試通過")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
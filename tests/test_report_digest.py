@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+測試分析報告摘要（digest）階段
+驗證規則擷取保留關鍵數據與結論、llm 模式失敗時退回規則擷取、
+下游節點改用摘要作為共用前綴，以及啟用後摘要節點位於分析師 fan-in 與辯論之間
+"""
+
+import os
+import sys
+
+import pytest
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+_MARKET_REPORT = """## 技術分析
+市場整體氣氛平穩，投資人觀望情緒濃厚。盤勢缺乏明確方向。
+
+| 指標 | 數值 | 訊號 |
+|---|---|---|
+| RSI | 65.3 | 中性偏多 |
+| MACD | 1.25 | 多頭 |
+
+股價站上 20 日均線 $185.2，短線支撐位於 $180。
+
+## 結論
+綜合技術面，建議買入，目標價 $210。
+"""
+
+
+_DIGEST_REPLY = "核心結論：看多。關鍵數據：RSI 65.3，目標價 $210。"
+
+
+def test_extract_digest():
+    """測試規則擷取保留數據、表格指標與結論，依原文順序且不超過預算"""
+    print(" 測試規則擷取摘要...")
+    from tradingagents.agents.digest.report_digest import extract_digest
+    from tradingagents.agents.utils.context_budget import get_tokenizer
+
+    tokenizer = get_tokenizer(None)
+    digest = extract_digest(_MARKET_REPORT, 400, tokenizer)
+    lines = digest.splitlines()
+    assert "- RSI：65.3：中性偏多" in lines
+    assert "- 綜合技術面，建議買入，目標價 $210。" in lines
+    assert "- 股價站上 20 日均線 $185.2，短線支撐位於 $180。" in lines
+    # 沒有數據與關鍵字的敘述不列入
+    assert "盤勢缺乏明確方向" not in digest
+    assert lines.index("- RSI：65.3：中性偏多") < lines.index("- 綜合技術面，建議買入，目標價 $210。")
+
+    short = extract_digest(_MARKET_REPORT, 40, tokenizer)
+    assert tokenizer.count(short) <= 40
+    assert "建議買入" in short
+    print(" 規則擷取摘要測試通過")
+
+
+def test_llm_digest_with_fallback(fake_llm):
+    """測試 llm 模式每份報告摘要一次，失敗時退回規則擷取"""
+    print(" 測試 LLM 摘要...")
+    from tradingagents.agents import create_report_digest
+
+    state = {"market_report": _MARKET_REPORT, "news_report": "新聞：營收年增 12%，優於預期。", "sentiment_report": ""}
+    llm = fake_llm(content=_DIGEST_REPLY)
+    digests = create_report_digest(llm, mode="llm")(state)["report_digests"]
+    assert set(digests) == {"market_report", "news_report"}
+    assert digests["market_report"].startswith("核心結論：看多")
+    assert len(llm.prompts) == 2
+
+    # 長度上限依報告的字元 / token 比例由 token 換算為字數（中文約每字一個 token，英文約四個字元）
+    english = "Revenue grew 12% year over year, beating estimates. " * 20
+    create_report_digest(llm, mode="llm", max_tokens=400)({"news_report": english, "market_report": "營收成長強勁。" * 50})
+    prompts = {("Revenue grew" in str(p)): str(p) for p in llm.prompts[-2:]}
+    assert "總長度不超過 400 字" in prompts[False]
+    assert "總長度不超過 1600 字" in prompts[True]
+
+    failing = create_report_digest(fake_llm(fail=True), mode="llm")(state)["report_digests"]
+    assert "- 新聞：營收年增 12%，優於預期。" == failing["news_report"]
+
+    try:
+        create_report_digest(llm, mode="summary")
+        raise AssertionError("不支援的模式應拋出例外")
+    except ValueError:
+        pass
+    print(" LLM 摘要測試通過")
+
+
+def test_downstream_nodes_use_digest(fake_llm):
+    """測試有摘要時共用前綴使用摘要，交易員也收到相同前綴"""
+    print(" 測試下游節點使用摘要...")
+    from tradingagents.agents import create_bull_researcher, create_trader
+    from tradingagents.agents.utils.prompt_prefix import build_shared_report_context
+
+    state = {
+        "company_of_interest": "AAPL",
+        "trade_date": "2024-01-05",
+        "market_report": _MARKET_REPORT * 20,
+        "sentiment_report": "",
+        "news_report": "",
+        "fundamentals_report": "",
+        "report_digests": {"market_report": "- 建議買入，目標價 $210。"},
+        "investment_plan": "研究經理建議買入",
+        "investment_debate_state": {"history": "", "bull_history": "", "bear_history": "", "current_response": "", "count": 0},
+    }
+    shared = build_shared_report_context(state)
+    assert "- 建議買入，目標價 $210。" in shared
+    assert "盤勢缺乏明確方向" not in shared
+
+    llm = fake_llm(content="看漲論點：營收成長與估值支撐股價。")
+    create_bull_researcher(llm, None)(state)
+    create_trader(llm, None)(state)
+    bull_prefix, trader_prefix = llm.prompts[0][0], llm.prompts[1][0]
+    assert bull_prefix.content == trader_prefix.content == shared
+
+    state.pop("report_digests")
+    create_trader(llm, None)(state)
+    assert isinstance(llm.prompts[2][0], dict)
+    print(" 下游節點使用摘要測試通過")
+
+
+def test_graph_inserts_digest_stage(build_graph, fake_llm, fake_toolkit):
+    """測試啟用摘要時圖在分析師 fan-in 與辯論之間加入摘要節點並完成分析"""
+    print(" 測試圖中的摘要節點...")
+    llm = fake_llm(content="分析結論：建議買入，目標價 $210，RSI 65.3。")
+    toolkit = fake_toolkit(online_tools=False, output="{name} 資料：收盤價 $185.2")
+    graph = build_graph(llm, toolkit, analysts=("market", "news"), report_digest_mode="extract")
+
+    assert "Report Digest" in graph.graph.nodes
+    final_state, _ = graph.propagate("AAPL", "2024-01-05")
+    assert set(final_state["report_digests"]) == {"market_report", "news_report"}
+    assert "目標價 $210" in final_state["report_digests"]["market_report"]
+
+    plain = build_graph(llm, toolkit, report_digest_mode="off")
+    assert "Report Digest" not in plain.graph.nodes
+    print(" 圖中的摘要節點測試通過")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+測試 SimFin 基本面索引
+驗證時點查詢結果與原本整檔過濾 + idxmax 的結果一致
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def _write_balance_csv(data_dir: str) -> str:
+    path = os.path.join(
+        data_dir, "fundamental_data", "simfin_data_all", "balance_sheet",
+        "companies", "us", "us-balance-quarterly.csv",
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rows = [
+        ("AAPL", 1, "2023-09-30", "2023-11-03", 100),
+        ("MSFT", 2, "2023-09-30", "2023-10-24", 200),
+        ("AAPL", 1, "2023-12-31", "2024-02-02", 110),
+        ("AAPL", 1, "2024-03-31", "2024-05-03", 120),
+        # 同一發布日的重複列：應取原始順序的第一筆
+        ("AAPL", 1, "2024-03-31", "2024-05-03", 121),
+        ("MSFT", 2, "2023-12-31", "2024-01-30", 210),
+        ("AAPL", 1, "2024-06-30", "", 130),
+    ]
+    pd.DataFrame(rows, columns=["Ticker", "SimFinId", "Report Date", "Publish Date", "Total Assets"]).to_csv(
+        path, sep=";", index=False
+    )
+    return path
+
+
+def _legacy_latest(path: str, ticker: str, curr_date: str):
+    """原本逐次讀檔的查詢邏輯"""
+    df = pd.read_csv(path, sep=";")
+    df["Report Date"] = pd.to_datetime(df["Report Date"], utc=True).dt.normalize()
+    df["Publish Date"] = pd.to_datetime(df["Publish Date"], utc=True).dt.normalize()
+    curr_date_dt = pd.to_datetime(curr_date, utc=True).normalize()
+    filtered_df = df[(df["Ticker"] == ticker) & (df["Publish Date"] <= curr_date_dt)]
+    if filtered_df.empty:
+        return None
+    return filtered_df.loc[filtered_df["Publish Date"].idxmax()]
+
+
+def test_latest_statement_matches_legacy():
+    """測試索引查詢與原邏輯一致"""
+    print(" 測試 SimFin 時點查詢...")
+    from tradingagents.dataflows.simfin_store import get_latest_statement
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _write_balance_csv(tmp)
+        for ticker in ("AAPL", "MSFT", "GOOG"):
+            for curr_date in ("2023-10-01", "2023-11-03", "2024-02-01", "2024-05-03", "2025-01-01"):
+                expected = _legacy_latest(path, ticker, curr_date)
+                actual = get_latest_statement(tmp, "balance_sheet", ticker, "quarterly", curr_date)
+                if expected is None:
+                    assert actual is None, (ticker, curr_date)
+                else:
+                    assert str(actual) == str(expected), (ticker, curr_date)
+
+        assert get_latest_statement(tmp, "balance_sheet", "AAPL", "quarterly", "2024-06-01")["Total Assets"] == 120
+    print(" SimFin 時點查詢測試通過")
+
+
+if __name__ == "__main__":
+    test_latest_statement_matches_legacy()
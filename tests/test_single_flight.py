@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+測試跨行程 single-flight
+驗證同鍵請求在執行緒與行程之間只執行一次，且 leader 失敗後可重試；
+等待者從結果儲存取得的 DataFrame 保留型別，失敗或空結果不發布
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def _make_flight(tmp: str):
+    from tradingagents.dataflows.single_flight import SingleFlight
+    from tradingagents.dataflows.tiered_cache import TieredCache
+    results = TieredCache(cache_dir=os.path.join(tmp, "results"), use_database=False)
+    return SingleFlight(lock_dir=os.path.join(tmp, "locks"), result_cache=results, use_redis=False)
+
+
+def test_in_process_dedup():
+    """測試同一行程內多個執行緒只執行一次"""
+    print(" 測試行程內 single-flight...")
+    with tempfile.TemporaryDirectory() as tmp:
+        flight = _make_flight(tmp)
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.3)
+            return "報告"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("test", "AAPL", fetch)))
+                   for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert results == ["報告"] * 8
+        assert len(calls) == 1
+        assert flight.get_stats()["leader"] == 1
+    print(" 行程內 single-flight 測試通過")
+
+
+def test_leader_failure_allows_retry():
+    """測試 leader 失敗不發布結果，下一次呼叫重新執行"""
+    print(" 測試 leader 失敗後重試...")
+    with tempfile.TemporaryDirectory() as tmp:
+        flight = _make_flight(tmp)
+
+        def failing():
+            raise RuntimeError("API 失敗")
+
+        try:
+            flight.do("test", "MSFT", failing)
+            raise AssertionError("應拋出例外")
+        except RuntimeError:
+            pass
+        assert flight.do("test", "MSFT", lambda: "成功") == "成功"
+    print(" leader 失敗後重試測試通過")
+
+
+def _run_with_waiter(tmp: str, leader_fn, waiter_fn, **kwargs):
+    """兩個獨立實例（各自的行程內狀態與 L1）共用鎖目錄與結果儲存，模擬兩個行程"""
+    leader, waiter = _make_flight(tmp), _make_flight(tmp)
+    results = {}
+    thread = threading.Thread(target=lambda: results.setdefault("leader", leader.do("test", "TSM", leader_fn, **kwargs)))
+    thread.start()
+    time.sleep(0.1)
+    results["waiter"] = waiter.do("test", "TSM", waiter_fn, poll_interval=0.05, **kwargs)
+    thread.join()
+    return results, waiter
+
+
+def test_published_dataframe_from_store():
+    """測試等待者從結果儲存（非 leader 的 L1）取得 DataFrame，日期欄仍為日期型別"""
+    print(" 測試跨實例發布 DataFrame...")
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory() as tmp:
+        frame = pd.DataFrame({"Date": pd.to_datetime(["2024-01-02", "2024-01-03"]), "Close": [185.6, 184.3]})
+        waiter_calls = []
+
+        def leader_fn():
+            time.sleep(0.5)
+            return frame
+
+        results, waiter = _run_with_waiter(tmp, leader_fn, lambda: waiter_calls.append(1))
+        shared = results["waiter"]
+        assert isinstance(shared, pd.DataFrame)
+        assert pd.api.types.is_datetime64_any_dtype(shared["Date"])
+        assert shared["Close"].tolist() == [185.6, 184.3]
+        assert not waiter_calls
+        assert waiter.get_stats()["shared_cross_process"] == 1
+    print(" 跨實例發布 DataFrame 測試通過")
+
+
+def test_unsuccessful_result_not_published():
+    """測試空結果與錯誤訊息不發布，等待者自行取得"""
+    print(" 測試失敗結果不發布...")
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def empty_leader():
+            time.sleep(0.3)
+            return pd.DataFrame()
+
+        results, _ = _run_with_waiter(tmp, empty_leader, lambda: "自行取得")
+        assert results["waiter"] == "自行取得"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def error_leader():
+            time.sleep(0.3)
+            return "錯誤：未配置FINNHUB_API_KEY環境變數"
+
+        results, _ = _run_with_waiter(tmp, error_leader, lambda: "自行取得",
+                                      publish_if=lambda value: not value.startswith("錯誤"))
+        assert results["waiter"] == "自行取得"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 行程內等待者同樣不共用失敗的結果
+        flight = _make_flight(tmp)
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return ""
+
+        threads = [threading.Thread(target=lambda: flight.do("test", "AMD", fetch)) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(calls) == 3
+    print(" 失敗結果不發布測試通過")
+
+
+def _worker(tmp: str, counter_path: str, queue, barrier):
+    flight = _make_flight(tmp)
+
+    def fetch():
+        with open(counter_path, "a", encoding="utf-8") as f:
+            f.write("call\n")
+        time.sleep(1.0)
+        return {"price": 123.4}
+
+    # 所有行程就緒後同時送出請求
+    barrier.wait(timeout=120)
+    queue.put(flight.do("test", "NVDA", fetch, poll_interval=0.05))
+
+
+def test_cross_process_dedup():
+    """測試多個行程同時請求時只有一個 leader 呼叫 API"""
+    print(" 測試跨行程 single-flight...")
+    with tempfile.TemporaryDirectory() as tmp:
+        counter_path = os.path.join(tmp, "calls.txt")
+        ctx = multiprocessing.get_context("spawn")
+        queue = ctx.Queue()
+        barrier = ctx.Barrier(3)
+        procs = [ctx.Process(target=_worker, args=(tmp, counter_path, queue, barrier)) for _ in range(3)]
+        for p in procs:
+            p.start()
+        results = [queue.get(timeout=120) for _ in procs]
+        for p in procs:
+            p.join(timeout=60)
+            assert p.exitcode == 0
+
+        assert results == [{"price": 123.4}] * 3
+        with open(counter_path, encoding="utf-8") as f:
+            assert len(f.readlines()) == 1
+    print(" 跨行程 single-flight 測試通過")
+
+
+if __name__ == "__main__":
+    test_in_process_dedup()
+    test_leader_failure_allows_retry()
+    test_published_dataframe_from_store()
+    test_unsuccessful_result_not_published()
+    test_cross_process_dedup()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+測試 stale-while-revalidate
+驗證寬限期內回傳舊值並於背景更新、超過寬限期同步取得，以及檔案快取的寬限期查詢
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def test_tiered_cache_revalidate():
+    """測試寬限期內回傳舊值並於背景重新整理"""
+    print(" 測試分層快取 stale-while-revalidate...")
+    from tradingagents.dataflows.tiered_cache import TieredCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TieredCache(cache_dir=tmp, use_database=False)
+        cache.register_namespace("swr", 1, stale_grace_seconds=60)
+        cache.set("swr", "AAPL", "舊報告")
+        time.sleep(1.1)
+
+        # 一般讀取不回傳過期值
+        assert cache.get("swr", "AAPL") is None
+        assert cache.get_entry("swr", "AAPL") == ("舊報告", False)
+
+        started = threading.Event()
+        release = threading.Event()
+
+        def loader():
+            started.set()
+            release.wait(5)
+            return "新報告"
+
+        # 立即回傳舊值，loader 在背景執行
+        assert cache.get_or_revalidate("swr", "AAPL", loader) == "舊報告"
+        assert started.wait(5)
+        release.set()
+        for _ in range(50):
+            if cache.get("swr", "AAPL") == "新報告":
+                break
+            time.sleep(0.05)
+        assert cache.get("swr", "AAPL") == "新報告"
+        assert cache.get_stats()["revalidations"] == 1
+        cache.flush()
+    print(" 分層快取 stale-while-revalidate 測試通過")
+
+
+def test_hard_expiry_blocks():
+    """測試未啟用寬限期時過期後同步取得"""
+    print(" 測試未啟用寬限期的同步取得...")
+    from tradingagents.dataflows.tiered_cache import TieredCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TieredCache(cache_dir=tmp, use_database=False)
+        cache.register_namespace("plain", 1)
+        cache.set("plain", "MSFT", "舊報告")
+        time.sleep(1.1)
+        assert cache.get_entry("plain", "MSFT") is None
+        assert cache.get_or_revalidate("plain", "MSFT", lambda: "新報告") == "新報告"
+        assert cache.get("plain", "MSFT") == "新報告"
+        cache.flush()
+    print(" 未啟用寬限期的同步取得測試通過")
+
+
+def test_stock_data_cache_stale_lookup():
+    """測試檔案快取的寬限期查詢"""
+    print(" 測試檔案快取寬限期查詢...")
+    from tradingagents.dataflows.cache_manager import StockDataCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = StockDataCache(tmp)
+        key = cache.save_fundamentals_data("AAPL", "舊基本面", data_source="finnhub")
+        meta = cache._load_metadata(key)
+        cache._index.put(key, meta, size_bytes=meta['size_bytes'],
+                         cached_at=(datetime.now() - timedelta(hours=30)).timestamp())
+
+        assert cache.find_cached_fundamentals_data("AAPL", data_source="finnhub") is None
+        # 未啟用寬限期
+        assert cache.find_stale_cached_data("AAPL", "fundamentals", data_source="finnhub") is None
+
+        cache.cache_config['us_fundamentals']['stale_grace_hours'] = 12
+        assert cache.find_stale_cached_data("AAPL", "fundamentals", data_source="finnhub") == key
+        cache.cache_config['us_fundamentals']['stale_grace_hours'] = 3
+        assert cache.find_stale_cached_data("AAPL", "fundamentals", data_source="finnhub") is None
+    print(" 檔案快取寬限期查詢測試通過")
+
+
+if __name__ == "__main__":
+    test_tiered_cache_revalidate()
+    test_hard_expiry_blocks()
+    test_stock_data_cache_stale_lookup()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+測試向量化技術指標視窗
+驗證一次計算整段指標的結果與逐日查詢一致
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def _write_price_csv(price_dir: str, symbol: str) -> pd.DataFrame:
+    """產生合成價格資料並寫成離線 YFin CSV"""
+    dates = pd.bdate_range("2024-01-01", periods=120)
+    rng = np.random.default_rng(42)
+    close = 100 + np.cumsum(rng.normal(0, 1, len(dates)))
+    data = pd.DataFrame({
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Open": close + rng.normal(0, 0.5, len(dates)),
+        "High": close + 1.5,
+        "Low": close - 1.5,
+        "Close": close,
+        "Volume": rng.integers(1_000, 10_000, len(dates)),
+    })
+    os.makedirs(price_dir, exist_ok=True)
+    data.to_csv(
+        os.path.join(price_dir, f"{symbol}-YFin-data-2015-01-01-2025-03-25.csv"),
+        index=False,
+    )
+    return data
+
+
+def test_window_matches_per_day():
+    """測試視窗結果與逐日 get_stock_stats 一致"""
+    print(" 測試指標視窗與逐日查詢一致性...")
+    from tradingagents.dataflows.stockstats_utils import StockstatsUtils
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_price_csv(tmp, "TEST")
+        for indicator in ("rsi", "macd", "close_50_sma", "boll_ub"):
+            window = StockstatsUtils.get_stock_stats_window(
+                "TEST", indicator, "2024-04-01", "2024-05-15", tmp
+            )
+            assert window, f"{indicator} 視窗不應為空"
+            for date_str, value in window.items():
+                expected = StockstatsUtils.get_stock_stats("TEST", indicator, date_str, tmp)
+                assert np.isclose(value, expected, equal_nan=True), (indicator, date_str)
+            # 週末不應出現在視窗中
+            assert "2024-04-06" not in window
+    print(" 指標視窗一致性測試通過")
+
+
+def test_interface_window_format():
+    """測試 get_stock_stats_indicators_window 輸出格式（離線只列交易日）"""
+    print(" 測試指標視窗報告格式...")
+    from tradingagents.dataflows import interface
+    from tradingagents.dataflows.config import use_config
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_price_csv(os.path.join(tmp, "market_data", "price_data"), "TEST")
+        with use_config({"data_dir": tmp}):
+            report = interface.get_stock_stats_indicators_window(
+                "TEST", "rsi", "2024-05-15", 10, False
+            )
+
+    assert report.startswith("## rsi values from 2024-05-05 to 2024-05-15:\n\n")
+    lines = [line for line in report.split("\n") if line[:4] == "2024"]
+    # 2024-05-06 ~ 2024-05-15 共 8 個交易日，由新到舊排列
+    assert len(lines) == 8
+    assert lines[0].startswith("2024-05-15: ")
+    assert lines[-1].startswith("2024-05-06: ")
+    assert "RSI" in report
+    print(" 指標視窗報告格式測試通過")
+
+
+if __name__ == "__main__":
+    test_window_matches_per_day()
+    test_interface_window_format()
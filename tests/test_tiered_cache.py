@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+測試統一分層快取
+驗證 L1 命中、檔案層回填、TTL 到期、依條件清除與 DataFrame 序列化
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+# 新增專案根目錄到路徑
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+
+def test_l1_and_file_promotion():
+    """測試 L1 命中與清空 L1 後由檔案層回填"""
+    print(" 測試分層快取讀寫與回填...")
+    from tradingagents.dataflows.tiered_cache import TieredCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TieredCache(cache_dir=tmp, use_database=False)
+        cache.set("news", "AAPL:10", "報告內容")
+        assert cache.get("news", "AAPL:10") == "報告內容"
+        assert cache.get("news", "MSFT:10") is None
+
+        # 等待背景寫入後清空 L1，模擬新的行程
+        cache.flush()
+        cache._l1.clear()
+        assert cache.get("news", "AAPL:10") == "報告內容"
+        # 已回填至 L1
+        assert cache.get("news", "AAPL:10") == "報告內容"
+
+        stats = cache.get_stats()
+        assert stats["l1_hits"] == 2
+        assert stats["l3_hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["l3_backend"] == "file"
+        assert stats["l2_backend"] is None
+
+        # 另一個實例共用同一個檔案層
+        other = TieredCache(cache_dir=tmp, use_database=False)
+        assert other.get("news", "AAPL:10") == "報告內容"
+    print(" 分層快取讀寫與回填測試通過")
+
+
+def test_ttl_and_clear():
+    """測試 TTL 到期與依 ticker 清除"""
+    print(" 測試分層快取 TTL 與清除...")
+    from tradingagents.dataflows.tiered_cache import TieredCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TieredCache(cache_dir=tmp, use_database=False)
+        cache.set("finnhub_sentiment", "AAPL:2024-01-05", "a", ttl=1)
+        cache.set("finnhub_sentiment", "AAPL:2024-01-06", "b")
+        cache.set("finnhub_sentiment", "MSFT:2024-01-05", "c")
+        cache.flush()
+
+        time.sleep(1.1)
+        assert cache.get("finnhub_sentiment", "AAPL:2024-01-05") is None
+
+        cache.clear("finnhub_sentiment", contains="AAPL:")
+        cache._l1.clear()
+        assert cache.get("finnhub_sentiment", "AAPL:2024-01-06") is None
+        assert cache.get("finnhub_sentiment", "MSFT:2024-01-05") == "c"
+
+        cache.clear("finnhub_sentiment")
+        assert cache.get("finnhub_sentiment", "MSFT:2024-01-05") is None
+    print(" 分層快取 TTL 與清除測試通過")
+
+
+def test_dataframe_roundtrip():
+    """測試 DataFrame 經檔案層序列化後保持一致"""
+    print(" 測試分層快取 DataFrame 序列化...")
+    from tradingagents.dataflows.tiered_cache import TieredCache
+
+    df = pd.DataFrame(
+        {"Close": [1.5, 2.5], "Volume": [100, 200]},
+        index=pd.to_datetime(["2024-01-02", "2024-01-03"]),
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TieredCache(cache_dir=tmp, use_database=False)
+        cache.set("stock_data", "AAPL", df)
+        cache.flush()
+        cache._l1.clear()
+        loaded = cache.get("stock_data", "AAPL")
+        pd.testing.assert_frame_equal(loaded, df, check_freq=False)
+
+        calls = []
+        value = cache.get_or_set("stock_data", "MSFT", lambda: calls.append(1) or "x")
+        assert value == "x"
+        assert cache.get_or_set("stock_data", "MSFT", lambda: calls.append(1) or "y") == "x"
+        assert len(calls) == 1
+        cache.flush()
+    print(" 分層快取 DataFrame 序列化測試通過")
+
+
+def test_async_api_runs_off_event_loop():
+    """測試非同步介面在執行緒中讀寫，不在事件迴圈執行緒上做 I/O"""
+    print(" 測試分層快取非同步介面...")
+    import threading
+    from tradingagents.dataflows.tiered_cache import TieredCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TieredCache(cache_dir=tmp, use_database=False)
+        io_threads = []
+        original_lookup = cache._lookup
+        cache._lookup = lambda *a: io_threads.append(threading.get_ident()) or original_lookup(*a)
+
+        async def run():
+            await cache.aset("trending", "overview", {"indices": [1]})
+            value = await cache.aget("trending", "overview")
+            await cache.adelete("trending", "overview")
+            return value, await cache.aget("trending", "overview", "missing")
+
+        assert asyncio.run(run()) == ({"indices": [1]}, "missing")
+        assert io_threads and threading.get_ident() not in io_threads
+    print(" 分層快取非同步介面測試通過")
+
+
+class _GlobRedis:
+    """以 Redis glob 規則（反斜線跳脫、* ? [...]）比對的假 Redis"""
+
+    def __init__(self, keys):
+        self.keys = set(keys)
+
+    @staticmethod
+    def _to_regex(pattern):
+        import re
+        out, i = [], 0
+        while i < len(pattern):
+            ch = pattern[i]
+            if ch == "\\" and i + 1 < len(pattern):
+                out.append(re.escape(pattern[i + 1]))
+                i += 2
+                continue
+            if ch == "[":
+                end = pattern.index("]", i + 1)
+                out.append("[" + pattern[i + 1:end] + "]")
+                i = end + 1
+                continue
+            out.append({"*": ".*", "?": "."}.get(ch, re.escape(ch)))
+            i += 1
+        return re.compile("^" + "".join(out) + "$")
+
+    def scan_iter(self, match, count=None):
+        regex = self._to_regex(match)
+        return [k for k in self.keys if regex.match(k)]
+
+    def delete(self, *keys):
+        self.keys.difference_update(keys)
+
+
+def test_clear_escapes_redis_glob():
+    """測試依條件清除時，contains 中的萬用字元以字面比對，不會刪除過多 Redis 鍵"""
+    print(" 測試分層快取 Redis 清除跳脫...")
+    from tradingagents.dataflows.tiered_cache import TieredCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TieredCache(cache_dir=tmp, use_database=False)
+        cache._redis = _GlobRedis({"ta:news:A*B:1", "ta:news:AXB:1", "ta:news:A?:1", "ta:news:AB:1"})
+        cache.clear("news", contains="A*B")
+        assert cache._redis.keys == {"ta:news:AXB:1", "ta:news:A?:1", "ta:news:AB:1"}
+        cache.clear("news", contains="A?")
+        assert cache._redis.keys == {"ta:news:AXB:1", "ta:news:AB:1"}
+        cache.clear("news", contains="[AX]")
+        assert cache._redis.keys == {"ta:news:AXB:1", "ta:news:AB:1"}
+    print(" 分層快取 Redis 清除跳脫測試通過")
+
+
+if __name__ == "__main__":
+    test_l1_and_file_promotion()
+    test_ttl_and_clear()
+    test_dataframe_roundtrip()
+    test_async_api_runs_off_event_loop()
+    test_clear_escapes_redis_glob()
@@ -1,4 +1,5 @@
-from .utils.agent_utils import Toolkit, create_msg_delete, reset_tool_result_cache, prefetch_analyst_data, calc_start_date
+from .utils.agent_utils import Toolkit, create_msg_delete, reset_tool_result_cache, prefetch_analyst_data, plan_prefetch, calc_start_date
+from .utils.analysis_context import AnalysisContext, analysis_scope
 from .utils.agent_states import AgentState, InvestDebateState, RiskDebateState
 from .utils.memory import FinancialSituationMemory
 
@@ -21,6 +22,8 @@ from .managers.risk_manager import create_risk_manager
 
 from .trader.trader import create_trader
 
+from .digest.report_digest import create_report_digest
+
 __all__ = [
     "FinancialSituationMemory",
     "Toolkit",
@@ -28,6 +31,9 @@ __all__ = [
     "create_msg_delete",
     "reset_tool_result_cache",
     "prefetch_analyst_data",
+    "plan_prefetch",
+    "AnalysisContext",
+    "analysis_scope",
     "calc_start_date",
     "InvestDebateState",
     "RiskDebateState",
@@ -43,6 +49,7 @@ __all__ = [
     "create_safe_debator",
     "create_social_media_analyst",
     "create_trader",
+    "create_report_digest",
     "create_parallel_risk_debate",
     "create_parallel_invest_debate",
 ]
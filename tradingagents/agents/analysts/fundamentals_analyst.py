@@ -8,21 +8,45 @@ from tradingagents.utils.tool_logging import log_analyst_module
 
 # 匯入統一日誌系統
 from tradingagents.utils.logging_init import get_logger
+from tradingagents.agents.utils.report_cache import invoke_llm_cached, ainvoke_llm_cached
 logger = get_logger("agents.analysts.fundamentals")
 
 
+from langchain_core.messages import HumanMessage
+
+from tradingagents.agents.utils.agent_utils import invoke_data_requests, ainvoke_data_requests
 from tradingagents.utils.stock_utils import get_company_name as _get_company_name
 
 
+def get_fundamentals_data_requests(toolkit, ticker, current_date):
+    """基本面分析師需要的工具呼叫（工具, 參數），供分析師節點與預載入規劃共用
+
+    離線模式最後一項固定為分析師共識，其餘為基本面資料。
+    """
+    if toolkit.config["online_tools"]:
+        from tradingagents.agents.utils.agent_utils import calc_start_date
+        start_date = calc_start_date(current_date)
+        return [
+            (toolkit.get_stock_fundamentals_unified,
+             {"ticker": ticker, "start_date": start_date, "end_date": current_date, "curr_date": current_date}),
+            (toolkit.get_finnhub_analyst_consensus, {"ticker": ticker, "curr_date": current_date}),
+        ]
+    return [
+        (toolkit.get_finnhub_company_insider_sentiment, {"ticker": ticker, "curr_date": current_date}),
+        (toolkit.get_finnhub_company_insider_transactions, {"ticker": ticker, "curr_date": current_date}),
+        (toolkit.get_simfin_balance_sheet, {"ticker": ticker, "freq": "quarterly"}),
+        (toolkit.get_simfin_cashflow, {"ticker": ticker, "freq": "quarterly"}),
+        (toolkit.get_simfin_income_stmt, {"ticker": ticker, "freq": "quarterly"}),
+        (toolkit.get_finnhub_analyst_consensus, {"ticker": ticker, "curr_date": current_date}),
+    ]
+
+
 def create_fundamentals_analyst(llm, toolkit):
-    @log_analyst_module("fundamentals")
-    def fundamentals_analyst_node(state):
+    def _data_requests(state):
         logger.debug("===== 基本面分析師節點開始 =====")
 
         current_date = state["trade_date"]
         ticker = state["company_of_interest"]
-        from tradingagents.agents.utils.agent_utils import calc_start_date
-        start_date = calc_start_date(current_date)
 
         logger.debug(f"輸入參數: ticker={ticker}, date={current_date}")
         logger.debug(f"當前狀態中的訊息數量: {len(state.get('messages', []))}")
@@ -42,53 +66,34 @@ def create_fundamentals_analyst(llm, toolkit):
         logger.debug(f"市場資訊: is_us={market_info['is_us']}")
         logger.debug(f"工具配置檢查: online_tools={toolkit.config['online_tools']}")
 
-        # 取得公司名稱
-        company_name = _get_company_name(ticker)
-        logger.debug(f"公司名稱: {ticker} -> {company_name}")
-
         # 直接呼叫工具取得資料（跳過 LLM 工具決策步驟，節省一次 LLM 呼叫）
-        currency_info = f"{market_info['currency_name']}（{market_info['currency_symbol']}）"
-
         if toolkit.config["online_tools"]:
             logger.info("[基本面分析師] 直接呼叫工具取得基本面資料和分析師共識")
+        else:
+            logger.info("[基本面分析師] 離線模式，直接呼叫多個資料工具")
+        return get_fundamentals_data_requests(toolkit, ticker, current_date)
+
+    def _build_prompt(state, tool_results) -> str:
+        current_date = state["trade_date"]
+        ticker = state["company_of_interest"]
+
+        from tradingagents.utils.stock_utils import get_stock_market_info
+        market_info = get_stock_market_info(ticker)
+        currency_info = f"{market_info['currency_name']}（{market_info['currency_symbol']}）"
 
-            from tradingagents.agents.utils.agent_utils import invoke_tools_direct
-            tools = [toolkit.get_stock_fundamentals_unified, toolkit.get_finnhub_analyst_consensus]
-            tool_args = [
-                {"ticker": ticker, "start_date": start_date, "end_date": current_date, "curr_date": current_date},
-                {"ticker": ticker, "curr_date": current_date},
-            ]
-            tool_results = invoke_tools_direct(tools, tool_args, logger)
+        # 取得公司名稱
+        company_name = _get_company_name(ticker)
+        logger.debug(f"公司名稱: {ticker} -> {company_name}")
 
+        if toolkit.config["online_tools"]:
             fundamentals_data = tool_results[0]
             analyst_consensus = tool_results[1]
         else:
-            logger.info("[基本面分析師] 離線模式，直接呼叫多個資料工具")
-            from tradingagents.agents.utils.agent_utils import invoke_tools_direct
-            tools = [
-                toolkit.get_finnhub_company_insider_sentiment,
-                toolkit.get_finnhub_company_insider_transactions,
-                toolkit.get_simfin_balance_sheet,
-                toolkit.get_simfin_cashflow,
-                toolkit.get_simfin_income_stmt,
-                toolkit.get_finnhub_analyst_consensus,
-            ]
-            tool_args = [
-                {"ticker": ticker, "curr_date": current_date},
-                {"ticker": ticker, "curr_date": current_date},
-                {"ticker": ticker, "freq": "quarterly"},
-                {"ticker": ticker, "freq": "quarterly"},
-                {"ticker": ticker, "freq": "quarterly"},
-                {"ticker": ticker, "curr_date": current_date},
-            ]
-            tool_results = invoke_tools_direct(tools, tool_args, logger)
             fundamentals_data = "\n\n".join(tool_results[:-1])
             analyst_consensus = tool_results[-1]
 
         # 單次 LLM 呼叫：基於已取得的工具資料生成分析報告
-        from langchain_core.messages import HumanMessage
-
-        analysis_prompt = f"""你是一位專業的股票基本面分析師。
+        return f"""你是一位專業的股票基本面分析師。
 
 **重要：你必須使用繁體中文回答，絕對不可使用簡體字。**
 
@@ -118,14 +123,32 @@ def create_fundamentals_analyst(llm, toolkit):
 ## 估值分析
 ## 投資建議"""
 
+    @log_analyst_module("fundamentals")
+    def fundamentals_analyst_node(state):
+        tool_results = invoke_data_requests(_data_requests(state), logger)
+        prompt = _build_prompt(state, tool_results)
         try:
-            result = llm.invoke([HumanMessage(content=analysis_prompt)])
-            report = result.content
+            report = invoke_llm_cached(llm, [HumanMessage(content=prompt)], "fundamentals_analyst").content
             logger.info(f"[基本面分析師] 直接模式完成，報告長度: {len(report)}")
         except Exception as e:
             logger.error(f"[基本面分析師] LLM 分析失敗: {e}", exc_info=True)
             report = f"基本面分析失敗: {str(e)}"
+        return {"fundamentals_report": report}
 
+    @log_analyst_module("fundamentals")
+    async def afundamentals_analyst_node(state):
+        tool_results = await ainvoke_data_requests(_data_requests(state), logger)
+        prompt = _build_prompt(state, tool_results)
+        try:
+            report = (await ainvoke_llm_cached(llm, [HumanMessage(content=prompt)], "fundamentals_analyst")).content
+            logger.info(f"[基本面分析師] 直接模式完成，報告長度: {len(report)}")
+        except Exception as e:
+            logger.error(f"[基本面分析師] LLM 分析失敗: {e}", exc_info=True)
+            report = f"基本面分析失敗: {str(e)}"
         return {"fundamentals_report": report}
 
+    # 宣告資料相依，供預載入規劃器推導需要的工具呼叫
+    fundamentals_analyst_node.data_requests = get_fundamentals_data_requests
+    # 非同步版本供 graph.astream（apropagate）使用
+    fundamentals_analyst_node.anode = afundamentals_analyst_node
     return fundamentals_analyst_node
@@ -3,17 +3,37 @@ from tradingagents.utils.tool_logging import log_analyst_module
 
 # 匯入統一日誌系統
 from tradingagents.utils.logging_init import get_logger
+from tradingagents.agents.utils.report_cache import invoke_llm_cached, ainvoke_llm_cached
 logger = get_logger("agents.analysts.market")
 
 
+from langchain_core.messages import HumanMessage
+
 from tradingagents.agents.utils.agent_utils import calc_start_date as _calc_start_date
+from tradingagents.agents.utils.agent_utils import invoke_data_requests, ainvoke_data_requests
 from tradingagents.utils.stock_utils import get_company_name as _get_company_name
 
 
+def get_market_data_requests(toolkit, ticker, current_date):
+    """市場分析師需要的工具呼叫（工具, 參數），供分析師節點與預載入規劃共用"""
+    start_date = _calc_start_date(current_date)
+    if toolkit.config["online_tools"]:
+        return [
+            (toolkit.get_stock_market_data_unified,
+             {"ticker": ticker, "start_date": start_date, "end_date": current_date}),
+            (toolkit.get_finnhub_technical_signals, {"ticker": ticker}),
+        ]
+    return [
+        (toolkit.get_YFin_data, {"symbol": ticker, "start_date": start_date, "end_date": current_date}),
+        (toolkit.get_stockstats_indicators_report,
+         {"symbol": ticker, "indicator": "rsi_14", "curr_date": current_date}),
+        (toolkit.get_finnhub_technical_signals, {"ticker": ticker}),
+    ]
+
+
 def create_market_analyst(llm, toolkit):
 
-    @log_analyst_module("market")
-    def market_analyst_node(state):
+    def _build_prompt(state, tool_results) -> str:
         logger.debug("===== 市場分析師節點開始 =====")
 
         current_date = state["trade_date"]
@@ -35,25 +55,11 @@ def create_market_analyst(llm, toolkit):
         logger.debug(f"公司名稱: {ticker} -> {company_name}")
 
         if toolkit.config["online_tools"]:
-            # 直接呼叫工具取得資料（跳過 LLM 工具決策，節省一次 LLM 呼叫）
-            logger.info("[市場分析師] 直接呼叫工具取得市場資料和技術訊號")
-            start_date = _calc_start_date(current_date)
-
-            from tradingagents.agents.utils.agent_utils import invoke_tools_direct
-            tools = [toolkit.get_stock_market_data_unified, toolkit.get_finnhub_technical_signals]
-            tool_args = [
-                {"ticker": ticker, "start_date": start_date, "end_date": current_date},
-                {"ticker": ticker},
-            ]
-            tool_results = invoke_tools_direct(tools, tool_args, logger)
-
             market_data = tool_results[0]
             technical_signals = tool_results[1]
 
             # 單次 LLM 呼叫：基於已取得的工具資料生成分析報告
-            from langchain_core.messages import HumanMessage
-
-            analysis_prompt = f"""你是一位專業的股票技術分析師。
+            return f"""你是一位專業的股票技術分析師。
 
 **重要：你必須使用繁體中文回答，絕對不可使用簡體字。**
 
@@ -82,40 +88,57 @@ def create_market_analyst(llm, toolkit):
 ## 價格趨勢分析
 ## 投資建議"""
 
-            try:
-                result = llm.invoke([HumanMessage(content=analysis_prompt)])
-                report = result.content
-                logger.info(f"[市場分析師] 直接模式完成，報告長度: {len(report)}")
-            except Exception as e:
-                logger.error(f"[市場分析師] LLM 分析失敗: {e}", exc_info=True)
-                report = f"市場分析失敗: {str(e)}"
-        else:
-            # 離線模式保留原有工具呼叫流程
-            tools = [
-                toolkit.get_YFin_data,
-                toolkit.get_stockstats_indicators_report,
-                toolkit.get_finnhub_technical_signals,
-            ]
-            from langchain_core.messages import HumanMessage
-            from tradingagents.agents.utils.agent_utils import invoke_tools_direct
-
-            tool_args = [
-                {"symbol": ticker, "start_date": _calc_start_date(current_date), "end_date": current_date},
-                {"symbol": ticker, "indicator": "rsi_14", "curr_date": current_date},
-                {"ticker": ticker},
-            ]
-            tool_results = invoke_tools_direct(tools, tool_args, logger)
-
-            result = llm.invoke([HumanMessage(content=(
-                f"你是一位專業的股票技術分析師。請用繁體中文分析{ticker}。\n\n"
-                + "\n\n".join(f"工具結果 {i+1}:\n{r}" for i, r in enumerate(tool_results))
-                + "\n\n請生成完整的技術分析報告。"
-            ))])
-            report = result.content
+        # 離線模式保留原有工具呼叫流程
+        return (
+            f"你是一位專業的股票技術分析師。請用繁體中文分析{ticker}。\n\n"
+            + "\n\n".join(f"工具結果 {i+1}:\n{r}" for i, r in enumerate(tool_results))
+            + "\n\n請生成完整的技術分析報告。"
+        )
+
+    def _data_requests(state):
+        if toolkit.config["online_tools"]:
+            # 直接呼叫工具取得資料（跳過 LLM 工具決策，節省一次 LLM 呼叫）
+            logger.info("[市場分析師] 直接呼叫工具取得市場資料和技術訊號")
+        return get_market_data_requests(toolkit, state["company_of_interest"], state["trade_date"])
 
+    def _build_update(report) -> dict:
         return {
             "messages": [("assistant", report)],
             "market_report": report,
         }
 
+    @log_analyst_module("market")
+    def market_analyst_node(state):
+        tool_results = invoke_data_requests(_data_requests(state), logger)
+        prompt = _build_prompt(state, tool_results)
+
+        if not toolkit.config["online_tools"]:
+            return _build_update(invoke_llm_cached(llm, [HumanMessage(content=prompt)], "market_analyst").content)
+        try:
+            report = invoke_llm_cached(llm, [HumanMessage(content=prompt)], "market_analyst").content
+            logger.info(f"[市場分析師] 直接模式完成，報告長度: {len(report)}")
+        except Exception as e:
+            logger.error(f"[市場分析師] LLM 分析失敗: {e}", exc_info=True)
+            report = f"市場分析失敗: {str(e)}"
+        return _build_update(report)
+
+    @log_analyst_module("market")
+    async def amarket_analyst_node(state):
+        tool_results = await ainvoke_data_requests(_data_requests(state), logger)
+        prompt = _build_prompt(state, tool_results)
+
+        if not toolkit.config["online_tools"]:
+            return _build_update((await ainvoke_llm_cached(llm, [HumanMessage(content=prompt)], "market_analyst")).content)
+        try:
+            report = (await ainvoke_llm_cached(llm, [HumanMessage(content=prompt)], "market_analyst")).content
+            logger.info(f"[市場分析師] 直接模式完成，報告長度: {len(report)}")
+        except Exception as e:
+            logger.error(f"[市場分析師] LLM 分析失敗: {e}", exc_info=True)
+            report = f"市場分析失敗: {str(e)}"
+        return _build_update(report)
+
+    # 宣告資料相依，供預載入規劃器推導需要的工具呼叫
+    market_analyst_node.data_requests = get_market_data_requests
+    # 非同步版本供 graph.astream（apropagate）使用
+    market_analyst_node.anode = amarket_analyst_node
     return market_analyst_node
@@ -1,7 +1,11 @@
 from datetime import datetime
 
+from langchain_core.messages import HumanMessage
+
 # 匯入統一日誌系統和分析模組日誌裝飾器
 from tradingagents.utils.logging_init import get_logger
+from tradingagents.agents.utils.report_cache import invoke_llm_cached, ainvoke_llm_cached
+from tradingagents.agents.utils.agent_utils import invoke_data_requests, ainvoke_data_requests
 from tradingagents.utils.tool_logging import log_analyst_module
 # 匯入統一新聞工具
 from tradingagents.tools.unified_news_tool import create_unified_news_tool
@@ -10,10 +14,18 @@ from tradingagents.utils.stock_utils import get_stock_market_info, get_company_n
 logger = get_logger("agents.analysts.news")
 
 
+def get_news_data_requests(toolkit, ticker, current_date):
+    """新聞分析師需要的工具呼叫（工具, 參數），供分析師節點與預載入規劃共用"""
+    unified_news_tool = create_unified_news_tool(toolkit)
+    unified_news_tool.name = "get_stock_news_unified"
+    return [
+        (unified_news_tool, {"stock_code": ticker, "max_news": 10, "model_info": ""}),
+        (toolkit.get_finnhub_sentiment_data, {"ticker": ticker, "curr_date": current_date}),
+    ]
+
+
 def create_news_analyst(llm, toolkit):
-    @log_analyst_module("news")
-    def news_analyst_node(state):
-        start_time = datetime.now()
+    def _data_requests(state, start_time):
         current_date = state["trade_date"]
         ticker = state["company_of_interest"]
         
@@ -32,16 +44,12 @@ def create_news_analyst(llm, toolkit):
         # 直接呼叫工具取得資料（跳過 LLM 工具決策步驟，節省一次 LLM 呼叫）
         logger.info("[新聞分析師] 直接呼叫統一新聞工具和 FinnHub 情緒工具")
 
-        unified_news_tool = create_unified_news_tool(toolkit)
-        unified_news_tool.name = "get_stock_news_unified"
+        return get_news_data_requests(toolkit, ticker, current_date)
 
-        from tradingagents.agents.utils.agent_utils import invoke_tools_direct
-        tools = [unified_news_tool, toolkit.get_finnhub_sentiment_data]
-        tool_args = [
-            {"stock_code": ticker, "max_news": 10, "model_info": ""},
-            {"ticker": ticker, "curr_date": current_date},
-        ]
-        tool_results = invoke_tools_direct(tools, tool_args, logger)
+    def _build_prompt(state, tool_results, start_time) -> str:
+        current_date = state["trade_date"]
+        ticker = state["company_of_interest"]
+        company_name = _get_company_name(ticker)
 
         news_data = tool_results[0]
         sentiment_data = tool_results[1]
@@ -50,9 +58,7 @@ def create_news_analyst(llm, toolkit):
         logger.info(f"[新聞分析師] 工具呼叫完成，耗時: {tool_time:.2f}秒")
 
         # 單次 LLM 呼叫：基於已取得的資料生成新聞分析報告
-        from langchain_core.messages import HumanMessage
-
-        analysis_prompt = f"""你是一位專業的財經新聞分析師。
+        return f"""你是一位專業的財經新聞分析師。
 
 **重要：你必須使用繁體中文回答，絕對不可使用簡體字。**
 
@@ -79,22 +85,47 @@ def create_news_analyst(llm, toolkit):
 ## 價格影響評估
 ## 投資建議"""
 
+    def _build_update(report, start_time) -> dict:
+        total_time_taken = (datetime.now() - start_time).total_seconds()
+        logger.info(f"[新聞分析師] 新聞分析完成，總耗時: {total_time_taken:.2f}秒")
+
+        return {
+            "messages": [("assistant", report)],
+            "news_report": report,
+        }
+
+    @log_analyst_module("news")
+    def news_analyst_node(state):
+        start_time = datetime.now()
+        tool_results = invoke_data_requests(_data_requests(state, start_time), logger)
+        prompt = _build_prompt(state, tool_results, start_time)
         try:
             llm_start_time = datetime.now()
-            result = llm.invoke([HumanMessage(content=analysis_prompt)])
-            report = result.content
+            report = invoke_llm_cached(llm, [HumanMessage(content=prompt)], "news_analyst").content
             llm_time = (datetime.now() - llm_start_time).total_seconds()
             logger.info(f"[新聞分析師] 直接模式完成，報告長度: {len(report)}，LLM耗時: {llm_time:.2f}秒")
         except Exception as e:
             logger.error(f"[新聞分析師] LLM 分析失敗: {e}", exc_info=True)
             report = f"新聞分析失敗: {str(e)}"
+        return _build_update(report, start_time)
 
-        total_time_taken = (datetime.now() - start_time).total_seconds()
-        logger.info(f"[新聞分析師] 新聞分析完成，總耗時: {total_time_taken:.2f}秒")
-
-        return {
-            "messages": [("assistant", report)],
-            "news_report": report,
-        }
+    @log_analyst_module("news")
+    async def anews_analyst_node(state):
+        start_time = datetime.now()
+        tool_results = await ainvoke_data_requests(_data_requests(state, start_time), logger)
+        prompt = _build_prompt(state, tool_results, start_time)
+        try:
+            llm_start_time = datetime.now()
+            report = (await ainvoke_llm_cached(llm, [HumanMessage(content=prompt)], "news_analyst")).content
+            llm_time = (datetime.now() - llm_start_time).total_seconds()
+            logger.info(f"[新聞分析師] 直接模式完成，報告長度: {len(report)}，LLM耗時: {llm_time:.2f}秒")
+        except Exception as e:
+            logger.error(f"[新聞分析師] LLM 分析失敗: {e}", exc_info=True)
+            report = f"新聞分析失敗: {str(e)}"
+        return _build_update(report, start_time)
 
+    # 宣告資料相依，供預載入規劃器推導需要的工具呼叫
+    news_analyst_node.data_requests = get_news_data_requests
+    # 非同步版本供 graph.astream（apropagate）使用
+    news_analyst_node.anode = anews_analyst_node
     return news_analyst_node
@@ -1,13 +1,31 @@
 # 匯入統一日誌系統和分析模組日誌裝飾器
+from langchain_core.messages import HumanMessage
+
 from tradingagents.utils.logging_init import get_logger
+from tradingagents.agents.utils.report_cache import invoke_llm_cached, ainvoke_llm_cached
+from tradingagents.agents.utils.agent_utils import invoke_data_requests, ainvoke_data_requests
 from tradingagents.utils.tool_logging import log_analyst_module
 from tradingagents.utils.stock_utils import get_company_name as _get_company_name
 logger = get_logger("agents.analysts.social_media")
 
 
+def get_social_data_requests(toolkit, ticker, current_date):
+    """社交媒體分析師需要的工具呼叫（工具, 參數），供分析師節點與預載入規劃共用"""
+    if toolkit.config["online_tools"]:
+        # 使用 Google News + Finnhub 情緒資料（無 LLM 呼叫，純 API）
+        return [
+            (toolkit.get_google_news,
+             {"query": f"{ticker} stock social media sentiment", "curr_date": current_date}),
+            (toolkit.get_finnhub_sentiment_data, {"ticker": ticker, "curr_date": current_date}),
+        ]
+    return [
+        (toolkit.get_stock_sentiment_unified, {"ticker": ticker, "curr_date": current_date}),
+        (toolkit.get_finnhub_sentiment_data, {"ticker": ticker, "curr_date": current_date}),
+    ]
+
+
 def create_social_media_analyst(llm, toolkit):
-    @log_analyst_module("social_media")
-    def social_media_analyst_node(state):
+    def _build_prompt(state, tool_results) -> str:
         current_date = state["trade_date"]
         ticker = state["company_of_interest"]
         
@@ -19,33 +37,11 @@ def create_social_media_analyst(llm, toolkit):
         company_name = _get_company_name(ticker)
         logger.info(f"[社交媒體分析師] 公司名稱: {company_name}")
 
-        # 直接呼叫工具取得資料（跳過 LLM 工具決策步驟，節省一次 LLM 呼叫）
-        logger.info("[社交媒體分析師] 直接呼叫工具取得社群情緒資料")
-
-        from tradingagents.agents.utils.agent_utils import invoke_tools_direct
-
-        # 使用 Google News + Finnhub 情緒資料（無 LLM 呼叫，純 API）
-        if toolkit.config["online_tools"]:
-            tools = [toolkit.get_google_news, toolkit.get_finnhub_sentiment_data]
-            tool_args = [
-                {"query": f"{ticker} stock social media sentiment", "curr_date": current_date},
-                {"ticker": ticker, "curr_date": current_date},
-            ]
-        else:
-            tools = [toolkit.get_stock_sentiment_unified, toolkit.get_finnhub_sentiment_data]
-            tool_args = [
-                {"ticker": ticker, "curr_date": current_date},
-                {"ticker": ticker, "curr_date": current_date},
-            ]
-
-        tool_results = invoke_tools_direct(tools, tool_args, logger)
         social_data = tool_results[0]
         sentiment_data = tool_results[1]
 
         # 單次 LLM 呼叫：基於已取得的資料生成情緒分析報告
-        from langchain_core.messages import HumanMessage
-
-        analysis_prompt = f"""你是一位專業的社交媒體和投資情緒分析師。
+        return f"""你是一位專業的社交媒體和投資情緒分析師。
 
 **重要：你必須使用繁體中文回答，絕對不可使用簡體字。**
 
@@ -74,17 +70,43 @@ def create_social_media_analyst(llm, toolkit):
 ## 價格影響評估
 ## 交易建議"""
 
+    def _data_requests(state):
+        # 直接呼叫工具取得資料（跳過 LLM 工具決策步驟，節省一次 LLM 呼叫）
+        logger.info("[社交媒體分析師] 直接呼叫工具取得社群情緒資料")
+        return get_social_data_requests(toolkit, state["company_of_interest"], state["trade_date"])
+
+    def _build_update(report) -> dict:
+        return {
+            "messages": [("assistant", report)],
+            "sentiment_report": report,
+        }
+
+    @log_analyst_module("social_media")
+    def social_media_analyst_node(state):
+        tool_results = invoke_data_requests(_data_requests(state), logger)
+        prompt = _build_prompt(state, tool_results)
         try:
-            result = llm.invoke([HumanMessage(content=analysis_prompt)])
-            report = result.content
+            report = invoke_llm_cached(llm, [HumanMessage(content=prompt)], "social_media_analyst").content
             logger.info(f"[社交媒體分析師] 直接模式完成，報告長度: {len(report)}")
         except Exception as e:
             logger.error(f"[社交媒體分析師] LLM 分析失敗: {e}", exc_info=True)
             report = f"社群情緒分析失敗: {str(e)}"
+        return _build_update(report)
 
-        return {
-            "messages": [("assistant", report)],
-            "sentiment_report": report,
-        }
+    @log_analyst_module("social_media")
+    async def asocial_media_analyst_node(state):
+        tool_results = await ainvoke_data_requests(_data_requests(state), logger)
+        prompt = _build_prompt(state, tool_results)
+        try:
+            report = (await ainvoke_llm_cached(llm, [HumanMessage(content=prompt)], "social_media_analyst")).content
+            logger.info(f"[社交媒體分析師] 直接模式完成，報告長度: {len(report)}")
+        except Exception as e:
+            logger.error(f"[社交媒體分析師] LLM 分析失敗: {e}", exc_info=True)
+            report = f"社群情緒分析失敗: {str(e)}"
+        return _build_update(report)
 
+    # 宣告資料相依，供預載入規劃器推導需要的工具呼叫
+    social_media_analyst_node.data_requests = get_social_data_requests
+    # 非同步版本供 graph.astream（apropagate）使用
+    social_media_analyst_node.anode = asocial_media_analyst_node
     return social_media_analyst_node
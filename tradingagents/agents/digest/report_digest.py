@@ -0,0 +1,172 @@
+# 分析報告摘要（digest）節點
+# 分析師 fan-in 之後只執行一次，將四份報告濃縮為結構化摘要存入 AgentState.report_digests，
+# 多空辯論、研究經理、交易員與風險節點改用摘要作為共用報告前綴，不再各自重讀長篇報告
+
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+from tradingagents.agents.utils.context_budget import tokenizer_for_llm, trim_report
+from tradingagents.agents.utils.prompt_prefix import SHARED_REPORT_SECTIONS
+from tradingagents.agents.utils.report_cache import invoke_llm_cached, ainvoke_llm_cached
+from tradingagents.utils.logging_init import get_logger
+logger = get_logger("agents.digest")
+
+
+# extract：以規則擷取關鍵數據與結論（不呼叫 LLM）；llm：以 quick_think 模型各摘要一次
+DIGEST_MODES = ("extract", "llm")
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[。！？!?；])")
+_LIST_MARKER_RE = re.compile(r"^(?:[-*•>]+|\d+[.、)])\s*")
+_DIGIT_RE = re.compile(r"\d")
+_CONCLUSION_RE = re.compile(r"結論|總結|建議|摘要|summary|conclusion|recommendation", re.IGNORECASE)
+_KEY_TERMS = (
+    "建議", "買入", "賣出", "持有", "目標價", "支撐", "阻力", "風險", "看多", "看空", "趨勢",
+    "營收", "獲利", "EPS", "本益比", "P/E", "RSI", "MACD", "均線", "殖利率",
+)
+_MIN_SENTENCE_CHARS = 4
+
+_DIGEST_PROMPT = """請將以下{title}報告濃縮為結構化摘要，供後續辯論與風險評估使用。請用繁體中文回答，不可使用簡體字，總長度不超過 {max_chars} 字，只輸出摘要本身：
+核心結論：（一句話，標明看多 / 看空 / 中性）
+關鍵數據：（保留具體數字，如價格、技術指標、財務比率、日期）
+主要風險：
+對股價的影響：
+
+報告內容：
+{report}"""
+
+
+def _candidates(report: str):
+    """逐行產生 (句子, 是否位於結論段落)；表格資料列轉為「欄位：值」"""
+    in_conclusion = False
+    for line in report.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith("#"):
+            in_conclusion = bool(_CONCLUSION_RE.search(stripped))
+            continue
+        if stripped.startswith("|"):
+            cells = [cell.strip() for cell in stripped.strip("|").split("|")]
+            if all(set(cell) <= set("-: ") for cell in cells):
+                continue
+            yield "：".join(cell for cell in cells if cell), in_conclusion
+            continue
+        stripped = _LIST_MARKER_RE.sub("", stripped).replace("**", "")
+        for sentence in _SENTENCE_SPLIT_RE.split(stripped):
+            sentence = sentence.strip()
+            if len(sentence) >= _MIN_SENTENCE_CHARS:
+                yield sentence, in_conclusion
+
+
+def _score(sentence: str, in_conclusion: bool) -> int:
+    score = 2 if _DIGIT_RE.search(sentence) else 0
+    score += min(sum(term in sentence for term in _KEY_TERMS), 3)
+    if in_conclusion:
+        score += 2
+    return score
+
+
+def extract_digest(report: str, max_tokens: int, tokenizer) -> str:
+    """以規則擷取報告中的關鍵數據與結論句，依原文順序列出且不超過 max_tokens"""
+    if not report:
+        return ""
+    scored, seen = [], set()
+    for index, (sentence, in_conclusion) in enumerate(_candidates(report)):
+        score = _score(sentence, in_conclusion)
+        if score > 0 and sentence not in seen:
+            seen.add(sentence)
+            scored.append((score, index, sentence))
+
+    selected, used = [], 0
+    for score, index, sentence in sorted(scored, key=lambda item: (-item[0], item[1])):
+        line = f"- {sentence}"
+        cost = tokenizer.count(line + "\n")
+        if used + cost > max_tokens:
+            continue
+        selected.append((index, line))
+        used += cost
+    if not selected:
+        return trim_report(report, max_tokens, tokenizer)
+    return "\n".join(line for _, line in sorted(selected))
+
+
+def create_report_digest(llm, mode: str = "extract", max_tokens: int = 400):
+    """建立報告摘要節點
+
+    Args:
+        llm: llm 模式使用的聊天模型（建議 quick_think 模型）；也決定計算摘要長度的 tokenizer
+        mode: extract（規則擷取，不呼叫 LLM）/ llm（每份報告摘要一次，失敗時退回規則擷取）
+        max_tokens: 每份報告摘要的 token 上限
+    """
+    if mode not in DIGEST_MODES:
+        raise ValueError(f"不支援的報告摘要模式: {mode}（可用: {', '.join(DIGEST_MODES)}）")
+    tokenizer = tokenizer_for_llm(llm)
+
+    def _reports(state) -> list:
+        return [
+            (field, title, state.get(field))
+            for field, title, _ in SHARED_REPORT_SECTIONS
+            if state.get(field)
+        ]
+
+    def _prompt(title, report) -> str:
+        # 模型只能理解字數，依報告本身的字元 / token 比例換算 token 上限
+        max_chars = tokenizer.chars_for_tokens(max_tokens, report)
+        return _DIGEST_PROMPT.format(title=title, max_chars=max_chars, report=report)
+
+    def _finalize(field, report, response) -> str:
+        content = getattr(response, "content", None)
+        if isinstance(content, str) and content.strip():
+            return trim_report(content.strip(), max_tokens, tokenizer)
+        logger.warning(f"[報告摘要] {field} LLM 摘要為空，改用規則擷取")
+        return extract_digest(report, max_tokens, tokenizer)
+
+    def _build_update(reports, digests: dict) -> dict:
+        before = sum(tokenizer.count(report) for _, _, report in reports)
+        after = sum(tokenizer.count(digest) for digest in digests.values())
+        logger.info(f"[報告摘要] {mode} 模式完成: {len(digests)} 份報告 {before} -> {after} tokens")
+        return {"report_digests": digests}
+
+    def _digest_llm(field, title, report) -> str:
+        try:
+            response = invoke_llm_cached(llm, _prompt(title, report), f"report_digest_{field}")
+        except Exception as e:
+            logger.warning(f"[報告摘要] {field} LLM 摘要失敗，改用規則擷取: {e}")
+            return extract_digest(report, max_tokens, tokenizer)
+        return _finalize(field, report, response)
+
+    async def _adigest_llm(field, title, report) -> str:
+        try:
+            response = await ainvoke_llm_cached(llm, _prompt(title, report), f"report_digest_{field}")
+        except Exception as e:
+            logger.warning(f"[報告摘要] {field} LLM 摘要失敗，改用規則擷取: {e}")
+            return extract_digest(report, max_tokens, tokenizer)
+        return _finalize(field, report, response)
+
+    def report_digest_node(state) -> dict:
+        reports = _reports(state)
+        if mode == "extract" or not reports:
+            digests = {field: extract_digest(report, max_tokens, tokenizer) for field, _, report in reports}
+            return _build_update(reports, digests)
+
+        # 各報告的摘要互不相依，並行呼叫（各自複製 contextvars，沿用本次分析範圍）
+        with ThreadPoolExecutor(max_workers=len(reports), thread_name_prefix="report_digest") as executor:
+            futures = {
+                field: executor.submit(copy_context().run, _digest_llm, field, title, report)
+                for field, title, report in reports
+            }
+            digests = {field: future.result() for field, future in futures.items()}
+        return _build_update(reports, digests)
+
+    async def areport_digest_node(state) -> dict:
+        reports = _reports(state)
+        if mode == "extract" or not reports:
+            return report_digest_node(state)
+        results = await asyncio.gather(*(_adigest_llm(field, title, report) for field, title, report in reports))
+        return _build_update(reports, {field: digest for (field, _, _), digest in zip(reports, results)})
+
+    # 非同步版本供 graph.astream（apropagate）使用
+    report_digest_node.anode = areport_digest_node
+    return report_digest_node
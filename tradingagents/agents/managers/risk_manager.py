@@ -1,38 +1,59 @@
+import asyncio
 import time
 
 # 匯入統一日誌系統
 from tradingagents.utils.logging_init import get_logger
+from tradingagents.agents.utils.report_cache import invoke_llm_cached, ainvoke_llm_cached
+from tradingagents.agents.utils.agent_utils import get_past_memories, aget_past_memories
+from tradingagents.agents.utils.prompt_prefix import build_prefixed_messages, fit_node_sections
 logger = get_logger("agents.managers.risk")
 
 
-def create_risk_manager(llm, memory):
-    def risk_manager_node(state) -> dict:
+_MAX_RETRIES = 3
+_MIN_DECISION_CHARS = 10
 
-        company_name = state["company_of_interest"]
 
-        risk_debate_state = state["risk_debate_state"]
-        # 截斷辯論歷史以降低 deep_think 輸入 token（超過 4000 字元時截斷）
-        from tradingagents.agents.utils.agent_utils import truncate_report
-        history = truncate_report(risk_debate_state.get("history", ""), max_chars=4000)
-        trader_plan = truncate_report(state.get("investment_plan", ""), max_chars=3000)
+def _extract_decision(response) -> str:
+    """檢查 LLM 回應是否有實質內容，無效時回傳空字串"""
+    if response and hasattr(response, 'content') and response.content:
+        response_content = response.content.strip()
+        if len(response_content) > _MIN_DECISION_CHARS:  # 確保回應有實質內容
+            logger.info(f"[Risk Manager] LLM呼叫成功，生成決策長度: {len(response_content)} 字元")
+            return response_content
+        logger.warning(f"[Risk Manager] LLM回應內容過短: {len(response_content)} 字元")
+    else:
+        logger.warning("[Risk Manager] LLM回應為空或無效")
+    return ""
 
-        # 使用標準化情境描述（與其他節點共用格式，嵌入快取命中率 100%）
-        from tradingagents.agents.utils.agent_utils import get_situation_for_memory, get_cached_embedding
-        curr_situation = get_situation_for_memory(state)
 
-        # 安全檢查：確保memory不為None
-        if memory is not None:
-            cached_emb = get_cached_embedding(curr_situation, memory)
-            past_memories = memory.get_memories(curr_situation, n_matches=2, cached_embedding=cached_emb)
-        else:
-            logger.warning("memory為None，跳過歷史記憶檢索")
-            past_memories = []
+def _retry_backoff(retry_count: int) -> float:
+    # 指數退避：0.5s, 1s, 2s...
+    backoff = 0.5 * (2 ** (retry_count - 1))
+    logger.info(f"[Risk Manager] 等待 {backoff}s 後重試...")
+    return backoff
 
+
+def create_risk_manager(llm, memory):
+    def _build_prompt(state, past_memories) -> list:
+        risk_debate_state = state["risk_debate_state"]
         past_memory_str = ""
         for i, rec in enumerate(past_memories, 1):
             past_memory_str += rec["recommendation"] + "\n\n"
 
-        prompt = f"""你是風險管理委員會主席。請用繁體中文回答，不可使用簡體字。以自然對話方式呈現分析。
+        # 依 deep_think 模型的 tokenizer 將辯論歷史、原始計劃與記憶放入節點剩餘的輸入預算
+        fitted = fit_node_sections(
+            llm, state, "risk_manager",
+            {
+                "history": risk_debate_state.get("history", ""),
+                "trader_plan": state.get("investment_plan", ""),
+                "memories": past_memory_str,
+            },
+            weights={"history": 0.55, "trader_plan": 0.3, "memories": 0.15},
+            kinds={"history": "history"},
+        )
+
+        # 共用報告前綴與研究經理（同為 deep_think 模型）逐字相同，可直接讀取供應商提示詞快取
+        instructions = f"""你是風險管理委員會主席。以自然對話方式呈現分析。
 
 職責：評估激進、中性、保守三位風險分析師的辯論，為交易員確定最佳行動方案。決策必須明確（買入/賣出/持有），避免因各方皆有理就預設持有。
 
@@ -41,47 +62,19 @@ def create_risk_manager(llm, memory):
 2. 明確建議及推理依據（引用辯論中的具體論點）
 3. 完善交易員計劃：基於原始計劃調整風險控制措施
 
-交易員原始計劃：{trader_plan}
+交易員原始計劃：{fitted['trader_plan']}
 
 過去經驗教訓（避免重蹈覆轍）：
-\"{past_memory_str}\"
+\"{fitted['memories']}\"
 
 分析師辯論歷史：
-{history}"""
+{fitted['history']}"""
+        return build_prefixed_messages(llm, state, instructions)
+
+    def _build_update(state, response_content: str) -> dict:
+        company_name = state["company_of_interest"]
+        risk_debate_state = state["risk_debate_state"]
 
-        # 增強的LLM呼叫，包含錯誤處理和重試機制
-        max_retries = 3
-        retry_count = 0
-        response_content = ""
-        
-        while retry_count < max_retries:
-            try:
-                logger.info(f"[Risk Manager] 呼叫LLM生成交易決策 (嘗試 {retry_count + 1}/{max_retries})")
-                response = llm.invoke(prompt)
-                
-                if response and hasattr(response, 'content') and response.content:
-                    response_content = response.content.strip()
-                    if len(response_content) > 10:  # 確保回應有實質內容
-                        logger.info(f"[Risk Manager] LLM呼叫成功，生成決策長度: {len(response_content)} 字元")
-                        break
-                    else:
-                        logger.warning(f"[Risk Manager] LLM回應內容過短: {len(response_content)} 字元")
-                        response_content = ""
-                else:
-                    logger.warning("[Risk Manager] LLM回應為空或無效")
-                    response_content = ""
-                    
-            except Exception as e:
-                logger.error(f"[Risk Manager] LLM呼叫失敗 (嘗試 {retry_count + 1}): {str(e)}")
-                response_content = ""
-            
-            retry_count += 1
-            if retry_count < max_retries and not response_content:
-                # 指數退避：0.5s, 1s, 2s...
-                backoff = 0.5 * (2 ** (retry_count - 1))
-                logger.info(f"[Risk Manager] 等待 {backoff}s 後重試...")
-                time.sleep(backoff)
-        
         # 如果所有重試都失敗，生成預設決策
         if not response_content:
             logger.error("[Risk Manager] 所有LLM呼叫嘗試失敗，使用預設決策")
@@ -121,4 +114,46 @@ def create_risk_manager(llm, memory):
             "final_trade_decision": response_content,
         }
 
+    def risk_manager_node(state) -> dict:
+        # 使用標準化情境描述（與其他節點共用格式，嵌入快取命中率 100%）
+        prompt = _build_prompt(state, get_past_memories(memory, state))
+
+        # 增強的LLM呼叫，包含錯誤處理和重試機制
+        response_content = ""
+        for retry_count in range(1, _MAX_RETRIES + 1):
+            try:
+                logger.info(f"[Risk Manager] 呼叫LLM生成交易決策 (嘗試 {retry_count}/{_MAX_RETRIES})")
+                response = invoke_llm_cached(llm, prompt, "risk_manager", min_chars=_MIN_DECISION_CHARS)
+                response_content = _extract_decision(response)
+            except Exception as e:
+                logger.error(f"[Risk Manager] LLM呼叫失敗 (嘗試 {retry_count}): {str(e)}")
+                response_content = ""
+            if response_content:
+                break
+            if retry_count < _MAX_RETRIES:
+                time.sleep(_retry_backoff(retry_count))
+
+        return _build_update(state, response_content)
+
+    async def arisk_manager_node(state) -> dict:
+        prompt = _build_prompt(state, await aget_past_memories(memory, state))
+
+        response_content = ""
+        for retry_count in range(1, _MAX_RETRIES + 1):
+            try:
+                logger.info(f"[Risk Manager] 呼叫LLM生成交易決策 (嘗試 {retry_count}/{_MAX_RETRIES})")
+                response = await ainvoke_llm_cached(llm, prompt, "risk_manager", min_chars=_MIN_DECISION_CHARS)
+                response_content = _extract_decision(response)
+            except Exception as e:
+                logger.error(f"[Risk Manager] LLM呼叫失敗 (嘗試 {retry_count}): {str(e)}")
+                response_content = ""
+            if response_content:
+                break
+            if retry_count < _MAX_RETRIES:
+                await asyncio.sleep(_retry_backoff(retry_count))
+
+        return _build_update(state, response_content)
+
+    # 非同步版本供 graph.astream（apropagate）使用
+    risk_manager_node.anode = arisk_manager_node
     return risk_manager_node
@@ -1,48 +1,33 @@
 
 # 匯入統一日誌系統
 from tradingagents.utils.logging_init import get_logger
-from tradingagents.agents.utils.agent_utils import truncate_report, get_situation_for_memory
+from tradingagents.agents.utils.report_cache import invoke_llm_cached, ainvoke_llm_cached
+from tradingagents.agents.utils.agent_utils import get_past_memories, aget_past_memories
+from tradingagents.agents.utils.prompt_prefix import build_prefixed_messages, fit_node_sections
 logger = get_logger("agents.researchers.bear")
 
 
 def create_bear_researcher(llm, memory):
-    def bear_node(state) -> dict:
+    def _build_prompt(state, past_memories) -> list:
         investment_debate_state = state["investment_debate_state"]
         history = investment_debate_state.get("history", "")
-        bear_history = investment_debate_state.get("bear_history", "")
-
         current_response = investment_debate_state.get("current_response", "")
-        # 截斷分析報告以降低 token 消耗（辯論用 2000 字元足以涵蓋關鍵論點）
-        market_research_report = truncate_report(state["market_report"], max_chars=2000)
-        sentiment_report = truncate_report(state["sentiment_report"], max_chars=1500)
-        news_report = truncate_report(state["news_report"], max_chars=1500)
-        fundamentals_report = truncate_report(state["fundamentals_report"], max_chars=2000)
-
-        # 取得股票市場資訊（僅支援美股）
         company_name = state.get('company_of_interest', 'Unknown')
-        from tradingagents.utils.stock_utils import get_stock_market_info
-        market_info = get_stock_market_info(company_name)
-
-        currency = market_info['currency_name']
-        currency_symbol = market_info['currency_symbol']
-
-        # 使用標準化情境描述（所有節點共用相同格式，確保嵌入快取 100% 命中）
-        curr_situation = get_situation_for_memory(state)
-
-        # 安全檢查：確保memory不為None
-        if memory is not None:
-            from tradingagents.agents.utils.agent_utils import get_cached_embedding
-            cached_emb = get_cached_embedding(curr_situation, memory)
-            past_memories = memory.get_memories(curr_situation, n_matches=2, cached_embedding=cached_emb)
-        else:
-            logger.warning("memory為None，跳過歷史記憶檢索")
-            past_memories = []
 
         past_memory_str = ""
         for i, rec in enumerate(past_memories, 1):
             past_memory_str += rec["recommendation"] + "\n\n"
 
-        prompt = f"""你是看跌分析師，論證不投資股票 {company_name} 的理由。請用繁體中文回答，不可使用簡體字。貨幣單位：{currency}（{currency_symbol}）。
+        # 依模型 tokenizer 將辯論歷史、對方論點與記憶放入節點剩餘的輸入預算
+        fitted = fit_node_sections(
+            llm, state, "bear_researcher",
+            {"history": history, "current_response": current_response, "memories": past_memory_str},
+            weights={"history": 0.5, "current_response": 0.3, "memories": 0.2},
+            kinds={"history": "history"},
+        )
+
+        # 分析報告放在所有下游節點逐字相同的共用前綴，觸發供應商提示詞快取
+        instructions = f"""你是看跌分析師，根據上方研究報告論證不投資股票 {company_name} 的理由。
 
 以對話風格直接回應看漲論點並有效辯論，重點關注：
 - 風險與挑戰：市場飽和、財務不穩定、宏觀經濟威脅
@@ -50,17 +35,16 @@ def create_bear_researcher(llm, memory):
 - 負面指標：不利的財務資料、市場趨勢、負面訊息
 - 反駁看漲觀點：用具體資料揭露弱點或過度樂觀假設
 
-可用資源：
-市場研究：{market_research_report}
-情緒報告：{sentiment_report}
-新聞：{news_report}
-基本面：{fundamentals_report}
-辯論歷史：{history}
-看漲論點：{current_response}
-過去經驗教訓：{past_memory_str}
+辯論歷史：{fitted['history']}
+看漲論點：{fitted['current_response']}
+過去經驗教訓：{fitted['memories']}
 """
+        return build_prefixed_messages(llm, state, instructions)
 
-        response = llm.invoke(prompt)
+    def _build_update(state, response) -> dict:
+        investment_debate_state = state["investment_debate_state"]
+        history = investment_debate_state.get("history", "")
+        bear_history = investment_debate_state.get("bear_history", "")
 
         argument = f"Bear Analyst: {response.content}"
 
@@ -74,4 +58,15 @@ def create_bear_researcher(llm, memory):
 
         return {"investment_debate_state": new_investment_debate_state}
 
+    def bear_node(state) -> dict:
+        # 使用標準化情境描述與快取嵌入檢索記憶（所有節點共用相同格式，確保嵌入快取 100% 命中）
+        prompt = _build_prompt(state, get_past_memories(memory, state))
+        return _build_update(state, invoke_llm_cached(llm, prompt, "bear_researcher"))
+
+    async def abear_node(state) -> dict:
+        prompt = _build_prompt(state, await aget_past_memories(memory, state))
+        return _build_update(state, await ainvoke_llm_cached(llm, prompt, "bear_researcher"))
+
+    # 非同步版本供 graph.astream（apropagate）使用
+    bear_node.anode = abear_node
     return bear_node
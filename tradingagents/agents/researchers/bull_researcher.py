@@ -1,53 +1,35 @@
 
 # 匯入統一日誌系統
 from tradingagents.utils.logging_init import get_logger
-from tradingagents.agents.utils.agent_utils import truncate_report, get_situation_for_memory
+from tradingagents.agents.utils.report_cache import invoke_llm_cached, ainvoke_llm_cached
+from tradingagents.agents.utils.agent_utils import get_past_memories, aget_past_memories
+from tradingagents.agents.utils.prompt_prefix import build_prefixed_messages, fit_node_sections
 logger = get_logger("agents.researchers.bull")
 
 
 def create_bull_researcher(llm, memory):
-    def bull_node(state) -> dict:
+    def _build_prompt(state, past_memories) -> list:
         logger.debug("===== 看漲研究員節點開始 =====")
 
         investment_debate_state = state["investment_debate_state"]
         history = investment_debate_state.get("history", "")
-        bull_history = investment_debate_state.get("bull_history", "")
-
         current_response = investment_debate_state.get("current_response", "")
-        # 截斷分析報告以降低 token 消耗（辯論用 2000 字元足以涵蓋關鍵論點）
-        market_research_report = truncate_report(state["market_report"], max_chars=2000)
-        sentiment_report = truncate_report(state["sentiment_report"], max_chars=1500)
-        news_report = truncate_report(state["news_report"], max_chars=1500)
-        fundamentals_report = truncate_report(state["fundamentals_report"], max_chars=2000)
-
-        # 取得股票市場資訊（僅支援美股）
         company_name = state.get('company_of_interest', 'Unknown')
-        from tradingagents.utils.stock_utils import get_stock_market_info
-        market_info = get_stock_market_info(company_name)
-
-        currency = market_info['currency_name']
-        currency_symbol = market_info['currency_symbol']
-
-        logger.debug(f"[看漲研究員] {company_name} 報告長度: 市場={len(market_research_report)} 情緒={len(sentiment_report)} 新聞={len(news_report)} 基本面={len(fundamentals_report)}")
-
-        # 使用標準化情境描述（所有節點共用相同格式，確保嵌入快取 100% 命中）
-        curr_situation = get_situation_for_memory(state)
-
-        # 安全檢查：確保memory不為None
-        if memory is not None:
-            # 使用快取嵌入（避免多節點重複呼叫嵌入 API）
-            from tradingagents.agents.utils.agent_utils import get_cached_embedding
-            cached_emb = get_cached_embedding(curr_situation, memory)
-            past_memories = memory.get_memories(curr_situation, n_matches=2, cached_embedding=cached_emb)
-        else:
-            logger.warning("memory為None，跳過歷史記憶檢索")
-            past_memories = []
 
         past_memory_str = ""
         for i, rec in enumerate(past_memories, 1):
             past_memory_str += rec["recommendation"] + "\n\n"
 
-        prompt = f"""你是看漲分析師，為股票 {company_name} 建立投資論證。請用繁體中文回答，不可使用簡體字。貨幣單位：{currency}（{currency_symbol}）。
+        # 依模型 tokenizer 將辯論歷史、對方論點與記憶放入節點剩餘的輸入預算
+        fitted = fit_node_sections(
+            llm, state, "bull_researcher",
+            {"history": history, "current_response": current_response, "memories": past_memory_str},
+            weights={"history": 0.5, "current_response": 0.3, "memories": 0.2},
+            kinds={"history": "history"},
+        )
+
+        # 分析報告放在所有下游節點逐字相同的共用前綴，觸發供應商提示詞快取
+        instructions = f"""你是看漲分析師，根據上方研究報告為股票 {company_name} 建立投資論證。
 
 以對話風格直接回應看跌論點並有效辯論，重點關注：
 - 增長潛力：市場機會、收入預測、可擴展性
@@ -55,17 +37,16 @@ def create_bull_researcher(llm, memory):
 - 積極指標：財務健康、行業趨勢、正面訊息
 - 反駁看跌觀點：用具體資料和推理解決擔憂
 
-可用資源：
-市場研究：{market_research_report}
-情緒報告：{sentiment_report}
-新聞：{news_report}
-基本面：{fundamentals_report}
-辯論歷史：{history}
-看跌論點：{current_response}
-過去經驗教訓：{past_memory_str}
+辯論歷史：{fitted['history']}
+看跌論點：{fitted['current_response']}
+過去經驗教訓：{fitted['memories']}
 """
+        return build_prefixed_messages(llm, state, instructions)
 
-        response = llm.invoke(prompt)
+    def _build_update(state, response) -> dict:
+        investment_debate_state = state["investment_debate_state"]
+        history = investment_debate_state.get("history", "")
+        bull_history = investment_debate_state.get("bull_history", "")
 
         argument = f"Bull Analyst: {response.content}"
 
@@ -79,4 +60,15 @@ def create_bull_researcher(llm, memory):
 
         return {"investment_debate_state": new_investment_debate_state}
 
+    def bull_node(state) -> dict:
+        # 使用標準化情境描述與快取嵌入檢索記憶（所有節點共用相同格式，確保嵌入快取 100% 命中）
+        prompt = _build_prompt(state, get_past_memories(memory, state))
+        return _build_update(state, invoke_llm_cached(llm, prompt, "bull_researcher"))
+
+    async def abull_node(state) -> dict:
+        prompt = _build_prompt(state, await aget_past_memories(memory, state))
+        return _build_update(state, await ainvoke_llm_cached(llm, prompt, "bull_researcher"))
+
+    # 非同步版本供 graph.astream（apropagate）使用
+    bull_node.anode = abull_node
     return bull_node
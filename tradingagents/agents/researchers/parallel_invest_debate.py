@@ -1,8 +1,11 @@
 # 並行多空辯論包裝器
 # 當投資辯論僅需一輪時，同時執行看漲和看跌研究員以加速分析
 
+import asyncio
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
 
+from tradingagents.agents.utils.agent_utils import ainvoke_node
 from tradingagents.utils.logging_init import get_logger
 logger = get_logger("agents.researchers.parallel")
 
@@ -15,28 +18,9 @@ def create_parallel_invest_debate(bull_fn, bear_fn):
     串行執行約需 4-10 秒（每位研究員 ~2-5 秒），並行後僅需一次 LLM 延遲。
     """
 
-    def parallel_invest_debate_node(state) -> dict:
-        logger.info("[Parallel Invest Debate] 啟動看漲/看跌研究員並行執行")
-
-        results = {}
-        errors = {}
-
-        # 使用執行緒池同時呼叫兩位研究員的 LLM
-        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="invest_debate") as executor:
-            futures = {
-                executor.submit(bull_fn, state): "bull",
-                executor.submit(bear_fn, state): "bear",
-            }
-
-            for future in as_completed(futures):
-                researcher_name = futures[future]
-                try:
-                    results[researcher_name] = future.result()
-                    logger.info(f"[Parallel Invest Debate] {researcher_name} 研究員完成")
-                except Exception as e:
-                    logger.error(f"[Parallel Invest Debate] {researcher_name} 研究員發生錯誤: {e}")
-                    errors[researcher_name] = str(e)
+    researchers = {"bull": bull_fn, "bear": bear_fn}
 
+    def _merge_results(state, results: dict, errors: dict) -> dict:
         if errors:
             logger.warning(f"[Parallel Invest Debate] 部分研究員失敗: {list(errors.keys())}")
 
@@ -77,4 +61,50 @@ def create_parallel_invest_debate(bull_fn, bear_fn):
         )
         return {"investment_debate_state": merged_state}
 
+    def parallel_invest_debate_node(state) -> dict:
+        logger.info("[Parallel Invest Debate] 啟動看漲/看跌研究員並行執行")
+
+        results = {}
+        errors = {}
+
+        # 使用執行緒池同時呼叫兩位研究員的 LLM（各自複製 contextvars，沿用本次分析範圍）
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="invest_debate") as executor:
+            futures = {
+                executor.submit(copy_context().run, fn, state): name
+                for name, fn in researchers.items()
+            }
+
+            for future in as_completed(futures):
+                researcher_name = futures[future]
+                try:
+                    results[researcher_name] = future.result()
+                    logger.info(f"[Parallel Invest Debate] {researcher_name} 研究員完成")
+                except Exception as e:
+                    logger.error(f"[Parallel Invest Debate] {researcher_name} 研究員發生錯誤: {e}")
+                    errors[researcher_name] = str(e)
+
+        return _merge_results(state, results, errors)
+
+    async def aparallel_invest_debate_node(state) -> dict:
+        logger.info("[Parallel Invest Debate] 啟動看漲/看跌研究員並行執行（非同步）")
+
+        outcomes = await asyncio.gather(
+            *(ainvoke_node(fn, state) for fn in researchers.values()),
+            return_exceptions=True,
+        )
+
+        results = {}
+        errors = {}
+        for researcher_name, outcome in zip(researchers, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"[Parallel Invest Debate] {researcher_name} 研究員發生錯誤: {outcome}")
+                errors[researcher_name] = str(outcome)
+            else:
+                results[researcher_name] = outcome
+                logger.info(f"[Parallel Invest Debate] {researcher_name} 研究員完成")
+
+        return _merge_results(state, results, errors)
+
+    # 非同步版本供 graph.astream（apropagate）使用
+    parallel_invest_debate_node.anode = aparallel_invest_debate_node
     return parallel_invest_debate_node
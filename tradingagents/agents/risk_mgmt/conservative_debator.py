@@ -1,46 +1,46 @@
 
 # 匯入統一日誌系統
 from tradingagents.utils.logging_init import get_logger
-from tradingagents.agents.utils.agent_utils import truncate_report
+from tradingagents.agents.utils.report_cache import invoke_llm_cached, ainvoke_llm_cached
+from tradingagents.agents.utils.prompt_prefix import build_prefixed_messages, build_trader_plan_context, fit_node_sections
 logger = get_logger("agents.risk_mgmt.conservative")
 
 
 def create_safe_debator(llm):
-    def safe_node(state) -> dict:
+    def _build_prompt(state) -> list:
         risk_debate_state = state["risk_debate_state"]
         history = risk_debate_state.get("history", "")
-        safe_history = risk_debate_state.get("safe_history", "")
 
         current_risky_response = risk_debate_state.get("current_risky_response", "")
         current_neutral_response = risk_debate_state.get("current_neutral_response", "")
 
-        # 截斷報告上下文：風險辯論者只需關鍵結論，不需完整分析資料
-        market_research_report = truncate_report(state["market_report"])
-        sentiment_report = truncate_report(state["sentiment_report"])
-        news_report = truncate_report(state["news_report"])
-        fundamentals_report = truncate_report(state["fundamentals_report"])
-
-        trader_decision = state["trader_investment_plan"]
+        trader_plan = build_trader_plan_context(state, llm)
+        # 依模型 tokenizer 將辯論歷史與其他分析師觀點放入節點剩餘的輸入預算
+        fitted = fit_node_sections(
+            llm, state, "safe_debator",
+            {"history": history, "current_risky_response": current_risky_response, "current_neutral_response": current_neutral_response},
+            weights={"history": 0.5, "current_risky_response": 0.25, "current_neutral_response": 0.25},
+            kinds={"history": "history"},
+            extra_context=trader_plan,
+            excerpt_when_uncached=True,
+        )
 
         # 保守風險分析師 prompt：優先保護資產與穩定增長
-        prompt = f"""你是保守風險分析師，優先保護資產、最小化波動性，確保穩定可靠的增長。請用繁體中文回答，不可使用簡體字。
+        # 分析報告與交易員計劃依序放在共用前綴（三位辯論者逐字相同），觸發供應商提示詞快取；
+        # 供應商不快取前綴時改用報告節錄，避免輸入 token 倍增
+        instructions = f"""你是保守風險分析師，優先保護資產、最小化波動性，確保穩定可靠的增長。
 
-交易員決策：
-{trader_decision}
-
-參考資料：
-- 市場研究：{market_research_report}
-- 情緒分析：{sentiment_report}
-- 新聞事件：{news_report}
-- 基本面：{fundamentals_report}
-
-辯論歷史：{history}
-激進分析師觀點：{current_risky_response}
-中性分析師觀點：{current_neutral_response}
+辯論歷史：{fitted['history']}
+激進分析師觀點：{fitted['current_risky_response']}
+中性分析師觀點：{fitted['current_neutral_response']}
 
 任務：直接回應激進和中性分析師的每個論點，指出他們忽視的下行風險和潛在威脅。用資料證明保守策略為何是保護資產的最安全道路。若對方尚未回應，直接提出你的觀點即可。以對話方式輸出，不使用任何特殊格式。"""
+        return build_prefixed_messages(llm, state, instructions, trader_plan, excerpt_when_uncached=True)
 
-        response = llm.invoke(prompt)
+    def _build_update(state, response) -> dict:
+        risk_debate_state = state["risk_debate_state"]
+        history = risk_debate_state.get("history", "")
+        safe_history = risk_debate_state.get("safe_history", "")
 
         argument = f"Safe Analyst: {response.content}"
 
@@ -62,4 +62,12 @@ def create_safe_debator(llm):
 
         return {"risk_debate_state": new_risk_debate_state}
 
+    def safe_node(state) -> dict:
+        return _build_update(state, invoke_llm_cached(llm, _build_prompt(state), "safe_debator"))
+
+    async def asafe_node(state) -> dict:
+        return _build_update(state, await ainvoke_llm_cached(llm, _build_prompt(state), "safe_debator"))
+
+    # 非同步版本供 graph.astream（apropagate）使用
+    safe_node.anode = asafe_node
     return safe_node
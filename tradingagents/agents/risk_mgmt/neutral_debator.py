@@ -1,46 +1,46 @@
 
 # 匯入統一日誌系統
 from tradingagents.utils.logging_init import get_logger
-from tradingagents.agents.utils.agent_utils import truncate_report
+from tradingagents.agents.utils.report_cache import invoke_llm_cached, ainvoke_llm_cached
+from tradingagents.agents.utils.prompt_prefix import build_prefixed_messages, build_trader_plan_context, fit_node_sections
 logger = get_logger("agents.risk_mgmt.neutral")
 
 
 def create_neutral_debator(llm):
-    def neutral_node(state) -> dict:
+    def _build_prompt(state) -> list:
         risk_debate_state = state["risk_debate_state"]
         history = risk_debate_state.get("history", "")
-        neutral_history = risk_debate_state.get("neutral_history", "")
 
         current_risky_response = risk_debate_state.get("current_risky_response", "")
         current_safe_response = risk_debate_state.get("current_safe_response", "")
 
-        # 截斷報告上下文：風險辯論者只需關鍵結論，不需完整分析資料
-        market_research_report = truncate_report(state["market_report"])
-        sentiment_report = truncate_report(state["sentiment_report"])
-        news_report = truncate_report(state["news_report"])
-        fundamentals_report = truncate_report(state["fundamentals_report"])
-
-        trader_decision = state["trader_investment_plan"]
+        trader_plan = build_trader_plan_context(state, llm)
+        # 依模型 tokenizer 將辯論歷史與其他分析師觀點放入節點剩餘的輸入預算
+        fitted = fit_node_sections(
+            llm, state, "neutral_debator",
+            {"history": history, "current_risky_response": current_risky_response, "current_safe_response": current_safe_response},
+            weights={"history": 0.5, "current_risky_response": 0.25, "current_safe_response": 0.25},
+            kinds={"history": "history"},
+            extra_context=trader_plan,
+            excerpt_when_uncached=True,
+        )
 
         # 中性風險分析師 prompt：平衡視角，權衡收益與風險
-        prompt = f"""你是中性風險分析師，提供平衡視角，同時權衡收益潛力與下行風險。請用繁體中文回答，不可使用簡體字。
+        # 分析報告與交易員計劃依序放在共用前綴（三位辯論者逐字相同），觸發供應商提示詞快取；
+        # 供應商不快取前綴時改用報告節錄，避免輸入 token 倍增
+        instructions = f"""你是中性風險分析師，提供平衡視角，同時權衡收益潛力與下行風險。
 
-交易員決策：
-{trader_decision}
-
-參考資料：
-- 市場研究：{market_research_report}
-- 情緒分析：{sentiment_report}
-- 新聞事件：{news_report}
-- 基本面：{fundamentals_report}
-
-辯論歷史：{history}
-激進分析師觀點：{current_risky_response}
-保守分析師觀點：{current_safe_response}
+辯論歷史：{fitted['history']}
+激進分析師觀點：{fitted['current_risky_response']}
+保守分析師觀點：{fitted['current_safe_response']}
 
 任務：批判性分析激進和保守雙方論點中的弱點，指出各自過於樂觀或過於謹慎之處。倡導適度風險策略，說明平衡方法如何兼顧增長潛力與風險防範。若對方尚未回應，直接提出你的觀點即可。以對話方式輸出，不使用任何特殊格式。"""
+        return build_prefixed_messages(llm, state, instructions, trader_plan, excerpt_when_uncached=True)
 
-        response = llm.invoke(prompt)
+    def _build_update(state, response) -> dict:
+        risk_debate_state = state["risk_debate_state"]
+        history = risk_debate_state.get("history", "")
+        neutral_history = risk_debate_state.get("neutral_history", "")
 
         argument = f"Neutral Analyst: {response.content}"
 
@@ -60,4 +60,12 @@ def create_neutral_debator(llm):
 
         return {"risk_debate_state": new_risk_debate_state}
 
+    def neutral_node(state) -> dict:
+        return _build_update(state, invoke_llm_cached(llm, _build_prompt(state), "neutral_debator"))
+
+    async def aneutral_node(state) -> dict:
+        return _build_update(state, await ainvoke_llm_cached(llm, _build_prompt(state), "neutral_debator"))
+
+    # 非同步版本供 graph.astream（apropagate）使用
+    neutral_node.anode = aneutral_node
     return neutral_node
@@ -1,8 +1,11 @@
 # 並行風險分析辯論包裝器
 # 當風險辯論僅需一輪時，同時執行三位風險分析師（激進、保守、中立）以加速分析
 
+import asyncio
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
 
+from tradingagents.agents.utils.agent_utils import ainvoke_node
 from tradingagents.utils.logging_init import get_logger
 logger = get_logger("agents.risk_mgmt.parallel")
 
@@ -15,29 +18,9 @@ def create_parallel_risk_debate(risky_fn, safe_fn, neutral_fn):
     串行執行約需 6 秒（每位分析師 ~2 秒），並行後約 2 秒完成。
     """
 
-    def parallel_risk_debate_node(state) -> dict:
-        logger.info("[Parallel Risk Debate] 啟動三位風險分析師並行執行")
-
-        results = {}
-        errors = {}
-
-        # 使用執行緒池同時呼叫三位分析師的 LLM
-        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="risk_analyst") as executor:
-            futures = {
-                executor.submit(risky_fn, state): "risky",
-                executor.submit(safe_fn, state): "safe",
-                executor.submit(neutral_fn, state): "neutral",
-            }
-
-            for future in as_completed(futures):
-                analyst_name = futures[future]
-                try:
-                    results[analyst_name] = future.result()
-                    logger.info(f"[Parallel Risk Debate] {analyst_name} 分析師完成")
-                except Exception as e:
-                    logger.error(f"[Parallel Risk Debate] {analyst_name} 分析師發生錯誤: {e}")
-                    errors[analyst_name] = str(e)
+    analysts = {"risky": risky_fn, "safe": safe_fn, "neutral": neutral_fn}
 
+    def _merge_results(state, results: dict, errors: dict) -> dict:
         if errors:
             logger.warning(f"[Parallel Risk Debate] 部分分析師失敗: {list(errors.keys())}")
 
@@ -88,4 +71,50 @@ def create_parallel_risk_debate(risky_fn, safe_fn, neutral_fn):
         )
         return {"risk_debate_state": merged_state}
 
+    def parallel_risk_debate_node(state) -> dict:
+        logger.info("[Parallel Risk Debate] 啟動三位風險分析師並行執行")
+
+        results = {}
+        errors = {}
+
+        # 使用執行緒池同時呼叫三位分析師的 LLM（各自複製 contextvars，沿用本次分析範圍）
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="risk_analyst") as executor:
+            futures = {
+                executor.submit(copy_context().run, fn, state): name
+                for name, fn in analysts.items()
+            }
+
+            for future in as_completed(futures):
+                analyst_name = futures[future]
+                try:
+                    results[analyst_name] = future.result()
+                    logger.info(f"[Parallel Risk Debate] {analyst_name} 分析師完成")
+                except Exception as e:
+                    logger.error(f"[Parallel Risk Debate] {analyst_name} 分析師發生錯誤: {e}")
+                    errors[analyst_name] = str(e)
+
+        return _merge_results(state, results, errors)
+
+    async def aparallel_risk_debate_node(state) -> dict:
+        logger.info("[Parallel Risk Debate] 啟動三位風險分析師並行執行（非同步）")
+
+        outcomes = await asyncio.gather(
+            *(ainvoke_node(fn, state) for fn in analysts.values()),
+            return_exceptions=True,
+        )
+
+        results = {}
+        errors = {}
+        for analyst_name, outcome in zip(analysts, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"[Parallel Risk Debate] {analyst_name} 分析師發生錯誤: {outcome}")
+                errors[analyst_name] = str(outcome)
+            else:
+                results[analyst_name] = outcome
+                logger.info(f"[Parallel Risk Debate] {analyst_name} 分析師完成")
+
+        return _merge_results(state, results, errors)
+
+    # 非同步版本供 graph.astream（apropagate）使用
+    parallel_risk_debate_node.anode = aparallel_risk_debate_node
     return parallel_risk_debate_node
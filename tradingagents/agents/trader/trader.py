@@ -2,12 +2,14 @@ import functools
 
 # 匯入統一日誌系統
 from tradingagents.utils.logging_init import get_logger
-from tradingagents.agents.utils.agent_utils import get_situation_for_memory
+from tradingagents.agents.utils.report_cache import invoke_llm_cached, ainvoke_llm_cached
+from tradingagents.agents.utils.agent_utils import get_past_memories, aget_past_memories
+from tradingagents.agents.utils.prompt_prefix import shared_prefix_message
 logger = get_logger("agents.trader")
 
 
 def create_trader(llm, memory):
-    def trader_node(state, name):
+    def _build_messages(state, past_memories) -> list:
         company_name = state["company_of_interest"]
         investment_plan = state["investment_plan"]
 
@@ -23,21 +25,11 @@ def create_trader(llm, memory):
         logger.debug(f"交易員檢測股票類型: {company_name} -> {market_info['market_name']}, 貨幣: {currency}")
         logger.debug(f"貨幣符號: {currency_symbol}")
 
-        # 使用標準化情境描述（與其他節點共用格式，嵌入快取命中率 100%）
-        curr_situation = get_situation_for_memory(state)
-
-        # 檢查memory是否可用
         if memory is not None:
-            logger.debug("memory可用，取得歷史記憶")
-            from tradingagents.agents.utils.agent_utils import get_cached_embedding
-            cached_emb = get_cached_embedding(curr_situation, memory)
-            past_memories = memory.get_memories(curr_situation, n_matches=2, cached_embedding=cached_emb)
             past_memory_str = ""
             for i, rec in enumerate(past_memories, 1):
                 past_memory_str += rec["recommendation"] + "\n\n"
         else:
-            logger.warning("memory為None，跳過歷史記憶檢索")
-            past_memories = []
             past_memory_str = "暫無歷史記憶資料可參考。"
 
         # 交易員接收 Research Manager 的投資計劃，作為交易決策的基礎
@@ -75,11 +67,15 @@ def create_trader(llm, memory):
             context,
         ]
 
+        # 有報告摘要時一併提供（與辯論、風險節點共用同一前綴，可讀取供應商提示詞快取）
+        if state.get("report_digests"):
+            messages.insert(0, shared_prefix_message(llm, state))
+
         logger.debug(f"準備呼叫LLM，系統提示包含貨幣: {currency}")
         logger.debug(f"系統提示中的關鍵部分: 目標價格({currency})")
+        return messages
 
-        result = llm.invoke(messages)
-
+    def _build_update(result, name) -> dict:
         logger.debug("LLM呼叫完成")
         logger.debug(f"交易員回覆長度: {len(result.content)}")
         logger.debug(f"交易員回覆前500字元: {result.content[:500]}...")
@@ -91,4 +87,16 @@ def create_trader(llm, memory):
             "sender": name,
         }
 
-    return functools.partial(trader_node, name="Trader")
+    def trader_node(state, name):
+        # 使用標準化情境描述（與其他節點共用格式，嵌入快取命中率 100%）
+        messages = _build_messages(state, get_past_memories(memory, state))
+        return _build_update(invoke_llm_cached(llm, messages, "trader"), name)
+
+    async def atrader_node(state, name):
+        messages = _build_messages(state, await aget_past_memories(memory, state))
+        return _build_update(await ainvoke_llm_cached(llm, messages, "trader"), name)
+
+    node = functools.partial(trader_node, name="Trader")
+    # 非同步版本供 graph.astream（apropagate）使用
+    node.anode = functools.partial(atrader_node, name="Trader")
+    return node
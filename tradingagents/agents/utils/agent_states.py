@@ -39,6 +39,8 @@ class AgentState(MessagesState):
     sentiment_report: Annotated[str, "社群情緒分析報告"]
     news_report: Annotated[str, "新聞事件分析報告"]
     fundamentals_report: Annotated[str, "基本面分析報告"]
+    # 報告摘要（選用的 digest 階段產生，報告欄位 -> 摘要，下游節點以此取代原始報告）
+    report_digests: Annotated[dict, "分析報告摘要"]
 
     # 投資辯論階段
     investment_debate_state: Annotated[
@@ -2,10 +2,13 @@ from langchain_core.messages import HumanMessage
 from typing import Annotated
 from langchain_core.tools import tool
 from datetime import datetime
+import asyncio
 import json
 import os
+import time
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait as futures_wait
 import tradingagents.dataflows.interface as interface
 from tradingagents.dataflows.finnhub_extra import (
     get_finnhub_sentiment_report,
@@ -29,37 +32,17 @@ _GLOBAL_TOOL_EXECUTOR = ThreadPoolExecutor(
     thread_name_prefix="tool",
 )
 
-# 分析層級工具結果快取（跨分析師共享，每次分析重置）
-# 當多個分析師並行呼叫相同工具+參數時（如 get_finnhub_sentiment_data），
-# 第二個呼叫直接返回快取結果，避免重複 API 呼叫
-_tool_result_cache: dict[str, str] = {}
-_tool_cache_lock = threading.Lock()
-_tool_cache_hits = 0
-_tool_cache_misses = 0
-
-
-# 分析層級記憶嵌入快取（避免多節點重複呼叫嵌入 API）
-# 同一次分析中 5 個節點使用相同的 current_situation，只需計算一次嵌入
-_embedding_cache: dict[int, list[float]] = {}
-_embedding_cache_lock = threading.Lock()
-
-
-def truncate_report(text: str, max_chars: int = 800) -> str:
-    """截斷報告文字，用於下游節點的參考上下文。
-
-    風險辯論者等節點不需要完整的分析報告，只需關鍵結論。
-    截斷可大幅減少 LLM 輸入 token，加速推理。
-
-    Args:
-        text: 原始報告文字
-        max_chars: 保留的最大字元數
-
-    Returns:
-        str: 截斷後的文字（超過上限時加 '...(略)' 後綴）
-    """
-    if not text or len(text) <= max_chars:
-        return text or ""
-    return text[:max_chars] + "...(略)"
+# 分析層級工具結果與記憶嵌入快取改由 AnalysisContext 管理（每次分析獨立範圍），
+# 同時執行的多個分析不會互相清除預載入的資料
+from tradingagents.agents.utils.context_budget import fit_sections, get_tokenizer
+from tradingagents.agents.utils.analysis_context import (
+    AnalysisContext,
+    bind_analysis_context,
+    get_current_analysis_context,
+    is_shareable_result,
+    reset_default_context,
+    resolve_analysis_context,
+)
 
 
 def calc_start_date(trade_date: str, days_back: int = 90) -> str:
@@ -72,39 +55,46 @@ def calc_start_date(trade_date: str, days_back: int = 90) -> str:
         return (datetime.now() - timedelta(days=days_back)).strftime("%Y-%m-%d")
 
 
-def get_situation_for_memory(state: dict, max_chars: int = 1500) -> str:
+def get_situation_for_memory(state: dict, max_tokens: int = None, model: str = None) -> str:
     """產生標準化的 current_situation 字串供記憶嵌入使用。
 
-    所有節點使用相同格式和截斷長度，確保嵌入快取最大命中率。
+    所有節點使用相同格式和 token 預算，確保嵌入快取最大命中率。
     第一個節點計算嵌入後，後續節點全部命中快取，
     將 3-4 次嵌入 API 呼叫減少為 1 次。
 
     Args:
         state: LangGraph 狀態字典
-        max_chars: 每份報告保留的最大字元數
+        max_tokens: 四份報告合計的 token 預算（預設 context_budget_memory_situation）
+        model: 嵌入模型名稱（決定 tokenizer，無法辨識時以字元估算）
 
     Returns:
         str: 標準化的情境描述文字
     """
-    return (
-        truncate_report(state.get("market_report", ""), max_chars)
-        + "\n\n"
-        + truncate_report(state.get("sentiment_report", ""), max_chars)
-        + "\n\n"
-        + truncate_report(state.get("news_report", ""), max_chars)
-        + "\n\n"
-        + truncate_report(state.get("fundamentals_report", ""), max_chars)
-    )
+    if max_tokens is None:
+        from tradingagents.dataflows.config import get_config
+        max_tokens = int(get_config().get("context_budget_memory_situation", 1500))
+    fields = ("market_report", "sentiment_report", "news_report", "fundamentals_report")
+    fitted = fit_sections({f: state.get(f, "") or "" for f in fields}, max_tokens, get_tokenizer(model))
+    return "\n\n".join(fitted[f] for f in fields)
 
 
-def get_cached_embedding(situation_text: str, memory_instance) -> list[float]:
-    """取得 current_situation 的嵌入向量（快取避免重複 API 呼叫，含 15 秒超時保護）"""
-    cache_key = hash(situation_text)
-    with _embedding_cache_lock:
-        cached = _embedding_cache.get(cache_key)
-        if cached is not None:
-            logger.debug("記憶嵌入快取命中，跳過 API 呼叫")
-            return cached
+def get_cached_embedding(situation_text: str, memory_instance, context: AnalysisContext = None) -> list[float]:
+    """取得 current_situation 的嵌入向量（快取避免重複 API 呼叫，含 15 秒超時保護）
+
+    快取範圍為本次分析的 AnalysisContext（未傳入時使用目前綁定的範圍）。
+    """
+    context = resolve_analysis_context(context)
+    cached = context.get_embedding(situation_text)
+    if cached is not None:
+        logger.debug("記憶嵌入快取命中，跳過 API 呼叫")
+        return cached
+
+    cassette = context.cassette
+    embedding_model = str(getattr(memory_instance, "embedding", None) or type(memory_instance).__name__)
+    if cassette is not None and cassette.replaying:
+        embedding = cassette.replay("embedding", embedding_model, situation_text)
+        context.set_embedding(situation_text, embedding)
+        return embedding
 
     # 快取未命中，使用執行緒 + 超時保護，防止嵌入 API 無限阻塞
     import concurrent.futures
@@ -116,29 +106,52 @@ def get_cached_embedding(situation_text: str, memory_instance) -> list[float]:
             logger.warning(f"嵌入 API 超時或失敗（{e}），返回零向量降級")
             return [0.0] * 1024
 
-    with _embedding_cache_lock:
-        _embedding_cache[cache_key] = embedding
+    context.set_embedding(situation_text, embedding)
+    if cassette is not None and cassette.recording:
+        cassette.record("embedding", embedding_model, situation_text, list(embedding))
     logger.info("記憶嵌入已計算並快取")
     return embedding
 
 
-def reset_tool_result_cache():
-    """重置工具結果快取，在每次新分析開始前呼叫"""
-    global _tool_result_cache, _tool_cache_hits, _tool_cache_misses
-    with _tool_cache_lock:
-        if _tool_result_cache:
-            logger.info(
-                f"工具結果快取重置: {len(_tool_result_cache)} 筆, "
-                f"命中 {_tool_cache_hits} 次, 未命中 {_tool_cache_misses} 次"
-            )
-        _tool_result_cache = {}
-        _tool_cache_hits = 0
-        _tool_cache_misses = 0
-    # 同時重置嵌入快取
-    with _embedding_cache_lock:
-        if _embedding_cache:
-            logger.info(f"記憶嵌入快取重置: {len(_embedding_cache)} 筆")
-        _embedding_cache.clear()
+def get_past_memories(memory, state: dict, n_matches: int = 2, context: AnalysisContext = None) -> list:
+    """以標準化情境描述檢索歷史記憶（嵌入向量使用分析層級快取）"""
+    if memory is None:
+        logger.warning("memory為None，跳過歷史記憶檢索")
+        return []
+    curr_situation = get_situation_for_memory(state, model=getattr(memory, "embedding", None))
+    cached_emb = get_cached_embedding(curr_situation, memory, context=context)
+    return memory.get_memories(curr_situation, n_matches=n_matches, cached_embedding=cached_emb)
+
+
+async def aget_past_memories(memory, state: dict, n_matches: int = 2, context: AnalysisContext = None) -> list:
+    """get_past_memories 的非同步版本
+
+    嵌入 API 與 ChromaDB 查詢只有同步用戶端，交由預設執行緒池執行以免阻塞事件迴圈
+    （asyncio.to_thread 會複製 contextvars，分析範圍保持不變）。
+    """
+    if memory is None:
+        logger.warning("memory為None，跳過歷史記憶檢索")
+        return []
+    return await asyncio.to_thread(get_past_memories, memory, state, n_matches, context)
+
+
+def reset_tool_result_cache() -> AnalysisContext:
+    """開始新的分析快取範圍並綁定到目前的執行上下文
+
+    只影響呼叫端自己的範圍，不會清除其他同時執行中分析的快取；
+    先前由本函式綁定的範圍會先關閉，釋放共享結果引用與未完成的預載入。
+    新程式碼建議使用 analysis_context.analysis_scope() 以確保範圍結束時釋放共享結果。
+
+    Returns:
+        AnalysisContext: 新建立的分析範圍
+    """
+    reset_default_context()
+    previous = get_current_analysis_context()
+    if previous is not None:
+        previous.close()
+    context = AnalysisContext()
+    bind_analysis_context(context)
+    return context
 
 
 def _make_cache_key(tool_name: str, args: dict) -> str:
@@ -150,7 +163,79 @@ def _make_cache_key(tool_name: str, args: dict) -> str:
     return f"{tool_name}::{args_str}"
 
 
-def invoke_tools_direct(tools, tool_args_list, logger_instance=None):
+# 等待預載入中工具的最長秒數（與 invoke_tools_direct 的整體超時一致）
+_PREFETCH_WAIT_TIMEOUT = 30
+
+
+def _tool_name(tool) -> str:
+    return getattr(tool, 'name', getattr(tool, '__name__', str(tool)))
+
+
+def _invoke_tool_cached(tool, args, context: AnalysisContext, _log, wait_for_pending: bool = True):
+    """執行單一工具呼叫，帶分析層級快取。
+    支援 LangChain 工具（有 .invoke 方法）和普通可呼叫物件（如函式）。
+
+    同一工具仍在預載入時，等待該次預載入完成後直接使用其結果。
+    """
+    name = _tool_name(tool)
+    cache_key = _make_cache_key(name, args)
+
+    # 檢查本次分析快取與跨分析共享層
+    cached = context.get_tool_result(cache_key)
+    if cached is None and wait_for_pending and context.is_pending(cache_key):
+        t0 = time.monotonic()
+        if context.wait_pending(cache_key, timeout=_PREFETCH_WAIT_TIMEOUT):
+            cached = context.get_tool_result(cache_key)
+            if cached is not None:
+                _log.info(f"工具預載入完成: {name}（等待 {time.monotonic() - t0:.2f} 秒）")
+    if cached is not None:
+        _log.info(f"工具快取命中: {name} (結果長度: {len(cached)})")
+        return cached
+
+    replayed = _replay_tool(context, name, args, cache_key)
+    if replayed is not None:
+        return replayed
+
+    try:
+        # 支援 LangChain 工具和普通可呼叫物件
+        if hasattr(tool, 'invoke'):
+            result = tool.invoke(args)
+        elif callable(tool):
+            result = tool(**args)
+        else:
+            raise TypeError(f"工具 {name} 既無 invoke 方法也不可呼叫")
+        result_str = str(result)
+        _log.debug(f"直接工具呼叫 {name} 成功，結果長度: {len(result_str)}")
+
+        # 失敗訊息不快取，讓重試或其他分析師重新呼叫；綁定日期的成功結果同時發布到共享層
+        if not _is_failed_result(result_str):
+            context.set_tool_result(cache_key, result_str, shareable=is_shareable_result(args))
+    except Exception as e:
+        _log.error(f"直接工具呼叫 {name} 失敗: {e}")
+        result_str = f"工具 {name} 執行失敗: {str(e)}"
+    _record_tool(context, name, args, result_str)
+    return result_str
+
+
+def _replay_tool(context: AnalysisContext, name: str, args, cache_key: str):
+    """replay 模式回傳錄製的工具結果（找不到時拋出 CassetteMissError），否則回傳 None"""
+    cassette = context.cassette
+    if cassette is None or not cassette.replaying:
+        return None
+    result_str = cassette.replay("tool", name, args)
+    if not _is_failed_result(result_str):
+        context.set_tool_result(cache_key, result_str, shareable=is_shareable_result(args))
+    return result_str
+
+
+def _record_tool(context: AnalysisContext, name: str, args, result_str: str) -> None:
+    # 失敗結果也錄製，重播時重現相同的執行路徑
+    cassette = context.cassette
+    if cassette is not None and cassette.recording:
+        cassette.record("tool", name, args, result_str)
+
+
+def invoke_tools_direct(tools, tool_args_list, logger_instance=None, context: AnalysisContext = None):
     """跳過 LLM 工具決策，直接以程式碼並行呼叫所有指定工具。
 
     內建分析層級快取：同一次分析中，相同工具+參數的呼叫只執行一次，
@@ -160,48 +245,18 @@ def invoke_tools_direct(tools, tool_args_list, logger_instance=None):
         tools: 要呼叫的工具物件列表
         tool_args_list: 每個工具對應的參數字典列表（與 tools 同序）
         logger_instance: 日誌實例（可選）
+        context: 分析快取範圍（可選，預設為目前綁定的範圍）
 
     Returns:
         list[str]: 每個工具的回傳結果（字串列表，與 tools 同序）
     """
-    global _tool_cache_hits, _tool_cache_misses
     _log = logger_instance or logger
+    # 在呼叫端執行緒解析範圍；工具執行緒池中的執行緒不會繼承 contextvars，
+    # 送出時以 copy_context() 傳遞 use_config() 綁定的單次分析設定
+    context = resolve_analysis_context(context)
 
     def _invoke_one(tool, args):
-        """執行單一工具呼叫，帶分析層級快取。
-        支援 LangChain 工具（有 .invoke 方法）和普通可呼叫物件（如函式）。
-        """
-        name = getattr(tool, 'name', getattr(tool, '__name__', str(tool)))
-        cache_key = _make_cache_key(name, args)
-
-        # 檢查快取（讀取不需要鎖，dict 讀取是原子操作）
-        cached = _tool_result_cache.get(cache_key)
-        if cached is not None:
-            with _tool_cache_lock:
-                _tool_cache_hits += 1
-            _log.info(f"工具快取命中: {name} (結果長度: {len(cached)})")
-            return cached
-
-        try:
-            # 支援 LangChain 工具和普通可呼叫物件
-            if hasattr(tool, 'invoke'):
-                result = tool.invoke(args)
-            elif callable(tool):
-                result = tool(**args)
-            else:
-                raise TypeError(f"工具 {name} 既無 invoke 方法也不可呼叫")
-            result_str = str(result)
-            _log.debug(f"直接工具呼叫 {name} 成功，結果長度: {len(result_str)}")
-
-            # 寫入快取（加鎖保護）
-            with _tool_cache_lock:
-                _tool_result_cache[cache_key] = result_str
-                _tool_cache_misses += 1
-
-            return result_str
-        except Exception as e:
-            _log.error(f"直接工具呼叫 {name} 失敗: {e}")
-            return f"工具 {name} 執行失敗: {str(e)}"
+        return _invoke_tool_cached(tool, args, context, _log)
 
     if len(tools) <= 1:
         return [_invoke_one(t, a) for t, a in zip(tools, tool_args_list)]
@@ -210,7 +265,7 @@ def invoke_tools_direct(tools, tool_args_list, logger_instance=None):
     results = [None] * len(tools)
     # 使用全域共享執行緒池，避免每次呼叫建立/銷毀池的開銷
     future_to_idx = {
-        _GLOBAL_TOOL_EXECUTOR.submit(_invoke_one, t, a): i
+        _GLOBAL_TOOL_EXECUTOR.submit(copy_context().run, _invoke_one, t, a): i
         for i, (t, a) in enumerate(zip(tools, tool_args_list))
     }
     # 30 秒超時保護：避免單一工具卡住阻塞整個流程
@@ -227,88 +282,238 @@ def invoke_tools_direct(tools, tool_args_list, logger_instance=None):
         _log.warning("部分工具呼叫超過 30 秒超時，跳過未完成的工具")
 
     # 快取命中率摘要（幫助監控 prefetch 效能）
-    with _tool_cache_lock:
-        total = _tool_cache_hits + _tool_cache_misses
-        if total > 0:
-            hit_rate = _tool_cache_hits / total * 100
-            _log.info(
-                f"工具快取統計: 命中 {_tool_cache_hits}/{total} "
-                f"({hit_rate:.0f}%), 快取條目 {len(_tool_result_cache)}"
-            )
+    stats = context.tool_stats()
+    total = stats["hits"] + stats["misses"]
+    if total > 0:
+        hit_rate = stats["hits"] / total * 100
+        _log.info(
+            f"工具快取統計: 命中 {stats['hits']}/{total} "
+            f"({hit_rate:.0f}%，共享 {stats['shared_hits']}), 快取條目 {stats['entries']}"
+        )
 
     return results
 
 
-def prefetch_analyst_data(toolkit, ticker: str, trade_date: str):
-    """在圖執行前預載入所有分析師需要的資料到快取中。
+def _is_failed_result(result) -> bool:
+    return not result or "失敗" in str(result)
+
+
+def _prefetch_one(tool, args, context: AnalysisContext):
+    """預載入單一工具，失敗時 0.3 秒後重試一次"""
+    result = _invoke_tool_cached(tool, args, context, logger, wait_for_pending=False)
+    if _is_failed_result(result):
+        logger.warning(f"[資料預載入] {_tool_name(tool)} 失敗，0.3 秒後重試")
+        time.sleep(0.3)
+        retry = _invoke_tool_cached(tool, args, context, logger, wait_for_pending=False)
+        if not _is_failed_result(retry):
+            result = retry
+    return result
+
+
+def invoke_data_requests(requests, logger_instance=None, context: AnalysisContext = None):
+    """以 invoke_tools_direct 執行 (工具, 參數) 列表，回傳與 requests 同序的結果"""
+    return invoke_tools_direct(
+        [t for t, _ in requests], [a for _, a in requests], logger_instance, context=context
+    )
+
+
+async def _ainvoke_tool_cached(tool, args, context: AnalysisContext, _log):
+    """_invoke_tool_cached 的非同步版本：預載入中的工具以 asyncio.wrap_future 等待，不佔用執行緒"""
+    name = _tool_name(tool)
+    cache_key = _make_cache_key(name, args)
+
+    cached = context.get_tool_result(cache_key)
+    pending = context.pending_future(cache_key) if cached is None else None
+    if pending is not None:
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(pending)), timeout=_PREFETCH_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            _log.warning(f"等待預載入 {name} 逾時，改為直接呼叫")
+        except Exception:
+            # 預載入失敗時改為直接呼叫
+            pass
+        cached = context.get_tool_result(cache_key)
+        if cached is not None:
+            _log.info(f"工具預載入完成: {name}（等待 {time.monotonic() - t0:.2f} 秒）")
+    if cached is not None:
+        _log.info(f"工具快取命中: {name} (結果長度: {len(cached)})")
+        return cached
+
+    replayed = _replay_tool(context, name, args, cache_key)
+    if replayed is not None:
+        return replayed
+
+    try:
+        # LangChain 工具的 ainvoke 對同步函式會交由執行緒池執行；一般函式以 to_thread 執行
+        if hasattr(tool, 'ainvoke'):
+            result = await tool.ainvoke(args)
+        elif hasattr(tool, 'invoke'):
+            result = await asyncio.to_thread(tool.invoke, args)
+        elif callable(tool):
+            result = await asyncio.to_thread(tool, **args)
+        else:
+            raise TypeError(f"工具 {name} 既無 invoke 方法也不可呼叫")
+        result_str = str(result)
+        if not _is_failed_result(result_str):
+            context.set_tool_result(cache_key, result_str, shareable=is_shareable_result(args))
+    except Exception as e:
+        _log.error(f"直接工具呼叫 {name} 失敗: {e}")
+        result_str = f"工具 {name} 執行失敗: {str(e)}"
+    _record_tool(context, name, args, result_str)
+    return result_str
+
+
+async def ainvoke_data_requests(requests, logger_instance=None, context: AnalysisContext = None):
+    """invoke_data_requests 的非同步版本：以 asyncio.gather 並行呼叫，回傳與 requests 同序的結果"""
+    _log = logger_instance or logger
+    context = resolve_analysis_context(context)
+
+    async def _one(tool_obj, args):
+        try:
+            return await asyncio.wait_for(
+                _ainvoke_tool_cached(tool_obj, args, context, _log), timeout=_PREFETCH_WAIT_TIMEOUT * 2
+            )
+        except asyncio.TimeoutError:
+            name = _tool_name(tool_obj)
+            _log.warning(f"工具 {name} 呼叫逾時")
+            return f"工具 {name} 執行失敗: 逾時"
+
+    return list(await asyncio.gather(*(_one(t, a) for t, a in requests)))
+
+
+async def ainvoke_node(node, state):
+    """以非同步方式執行圖節點：優先使用節點宣告的 anode，否則交由執行緒池執行同步版本"""
+    anode = getattr(node, "anode", None)
+    if anode is not None:
+        return await anode(state)
+    return await asyncio.to_thread(node, state)
+
+
+def _default_analyst_data_requests():
+    """未指定分析師節點時使用的全部 4 個分析師資料相依宣告"""
+    from tradingagents.agents.analysts.fundamentals_analyst import get_fundamentals_data_requests
+    from tradingagents.agents.analysts.market_analyst import get_market_data_requests
+    from tradingagents.agents.analysts.news_analyst import get_news_data_requests
+    from tradingagents.agents.analysts.social_media_analyst import get_social_data_requests
+    return [get_market_data_requests, get_social_data_requests, get_news_data_requests,
+            get_fundamentals_data_requests]
+
+
+def plan_prefetch(analyst_nodes, toolkit, ticker: str, trade_date: str):
+    """依分析師節點宣告的資料相依推導預載入清單（依工具+參數去重，保留宣告順序）
 
-    將 7 個獨立 API 呼叫合併為一批並行請求，
-    避免 4 個分析師各自建立執行緒池競爭資源。
-    分析師開始時所有資料已在快取中，零等待直接進入 LLM 推理。
+    每個分析師節點以 data_requests 屬性宣告 (toolkit, ticker, trade_date) -> [(工具, 參數)]，
+    依 toolkit.config（如 online_tools）回傳實際會呼叫的工具，
+    因此只選市場分析師時只會預載入 2 個請求。
+
+    Args:
+        analyst_nodes: 圖中的分析師節點（None 時使用全部 4 個分析師）
+        toolkit: 分析師使用的 Toolkit 實例
+        ticker: 股票代碼
+        trade_date: 分析日期（YYYY-MM-DD）
+
+    Returns:
+        list[tuple]: 去重後的 (工具, 參數) 列表
+    """
+    if analyst_nodes is None:
+        declarations = _default_analyst_data_requests()
+    else:
+        declarations = [getattr(node, "data_requests", None) for node in analyst_nodes]
+
+    planned = []
+    seen = set()
+    for declare in declarations:
+        if declare is None:
+            continue
+        for tool_obj, args in declare(toolkit, ticker, trade_date):
+            cache_key = _make_cache_key(_tool_name(tool_obj), args)
+            if cache_key in seen:
+                continue
+            seen.add(cache_key)
+            planned.append((tool_obj, args))
+    return planned
+
+
+def prefetch_analyst_data(toolkit, ticker: str, trade_date: str, context: AnalysisContext = None,
+                          wait: bool = True, analyst_nodes=None):
+    """在圖執行前預載入分析師需要的資料到快取中。
+
+    由 plan_prefetch 依分析師宣告的資料相依與設定推導出不重複的工具呼叫，
+    合併為一批並行請求，避免各分析師各自建立執行緒池競爭資源。
+    每個工具的 Future 登記在分析範圍中：wait=False 時立即返回，
+    分析師只等待自己需要的工具完成，不必等最慢的工具（如 Google News）。
 
     Args:
         toolkit: Toolkit 實例，包含所有工具
         ticker: 股票代碼（如 AAPL）
         trade_date: 分析日期（YYYY-MM-DD）
+        context: 分析快取範圍（可選，預設為目前綁定的範圍）
+        wait: 是否等待全部工具完成（預設 True）
+        analyst_nodes: 圖中的分析師節點（可選，預設為全部 4 個分析師）
+
+    Returns:
+        list[Future]: 本次送出的預載入 Future（已快取或預載入中的工具不重複送出）
+    """
+    planned = plan_prefetch(analyst_nodes, toolkit, ticker, trade_date)
+    return prefetch_data_requests(planned, context=context, wait=wait)
+
+
+def prefetch_data_requests(planned, context: AnalysisContext = None, wait: bool = True):
+    """以全域工具執行緒池送出 (工具, 參數) 列表，Future 登記在分析範圍中
+
+    由 prefetch_analyst_data 使用。
+
+    Args:
+        planned: (工具, 參數) 列表
+        context: 分析快取範圍（可選，預設為目前綁定的範圍）
+        wait: 是否等待全部工具完成（預設 True）
+
+    Returns:
+        list[Future]: 本次送出的預載入 Future（已快取或預載入中的工具不重複送出）
     """
-    start_date = calc_start_date(trade_date)
-
-    # 建立統一新聞工具（與新聞分析師使用相同的工具和參數）
-    from tradingagents.tools.unified_news_tool import create_unified_news_tool
-    unified_news_tool = create_unified_news_tool(toolkit)
-    unified_news_tool.name = "get_stock_news_unified"
-
-    # 收集 4 個分析師需要的所有 7 個不重複工具呼叫
-    # 全部使用純 API 呼叫（無 OpenAI web_search LLM），大幅縮短預載入時間
-    tools = [
-        # 市場分析師需要的 2 個工具
-        toolkit.get_stock_market_data_unified,
-        toolkit.get_finnhub_technical_signals,
-        # 社交媒體分析師需要的 2 個工具（Google News + Finnhub 情緒）
-        toolkit.get_google_news,
-        toolkit.get_finnhub_sentiment_data,  # 新聞分析師也需要，會快取命中
-        # 新聞分析師的統一新聞工具
-        unified_news_tool,
-        # 基本面分析師需要的 2 個工具
-        toolkit.get_stock_fundamentals_unified,
-        toolkit.get_finnhub_analyst_consensus,
-    ]
-
-    tool_args = [
-        {"ticker": ticker, "start_date": start_date, "end_date": trade_date},
-        {"ticker": ticker},
-        {"query": f"{ticker} stock social media sentiment", "curr_date": trade_date},
-        {"ticker": ticker, "curr_date": trade_date},
-        {"stock_code": ticker, "max_news": 10, "model_info": ""},
-        {"ticker": ticker, "start_date": start_date, "end_date": trade_date, "curr_date": trade_date},
-        {"ticker": ticker, "curr_date": trade_date},
-    ]
+    context = resolve_analysis_context(context)
+    tools = [t for t, _ in planned]
+    tool_args = [a for _, a in planned]
 
     logger.info(f"[資料預載入] 開始並行載入 {len(tools)} 個工具結果到快取")
-    import time
-    t0 = time.time()
-
-    results = invoke_tools_direct(tools, tool_args, logger)
-
-    # 檢查哪些工具失敗了，嘗試重試一次（指數退避 1 秒）
-    failed_indices = [
-        i for i, r in enumerate(results)
-        if not r or "失敗" in str(r) or "執行失敗" in str(r)
-    ]
-    if failed_indices:
-        failed_names = [getattr(tools[i], 'name', '?') for i in failed_indices]
-        logger.warning(f"[資料預載入] {len(failed_indices)} 個工具失敗，0.3 秒後重試: {failed_names}")
-        time.sleep(0.3)
-        retry_tools = [tools[i] for i in failed_indices]
-        retry_args = [tool_args[i] for i in failed_indices]
-        retry_results = invoke_tools_direct(retry_tools, retry_args, logger)
-        for idx, retry_result in zip(failed_indices, retry_results):
-            if retry_result and "失敗" not in str(retry_result) and "執行失敗" not in str(retry_result):
-                results[idx] = retry_result
+    t0 = time.monotonic()
+
+    futures = []
+    for tool_obj, args in zip(tools, tool_args):
+        cache_key = _make_cache_key(_tool_name(tool_obj), args)
+        if context.is_pending(cache_key) or context.get_tool_result(cache_key) is not None:
+            continue
+        # 工具與資料流在工作執行緒中需讀到 use_config() 綁定的設定
+        future = _GLOBAL_TOOL_EXECUTOR.submit(copy_context().run, _prefetch_one, tool_obj, args, context)
+        context.register_pending(cache_key, future)
+        futures.append(future)
+
+    # 全部完成時記錄摘要（不阻塞呼叫端）
+    remaining = [len(futures)]
+    ok_count = [0]
+    summary_lock = threading.Lock()
+
+    def _on_done(future):
+        ok = not future.cancelled() and future.exception() is None and not _is_failed_result(future.result())
+        with summary_lock:
+            ok_count[0] += int(ok)
+            remaining[0] -= 1
+            finished = remaining[0] == 0
+        if finished:
+            logger.info(
+                f"[資料預載入] 完成，{ok_count[0]}/{len(futures)} 個成功，"
+                f"耗時: {time.monotonic() - t0:.1f}秒"
+            )
+
+    for future in futures:
+        future.add_done_callback(_on_done)
 
-    elapsed = time.time() - t0
-    ok_count = sum(1 for r in results if r and "失敗" not in str(r) and "執行失敗" not in str(r))
-    logger.info(f"[資料預載入] 完成，{ok_count}/{len(results)} 個成功，耗時: {elapsed:.1f}秒")
+    if wait and futures:
+        done, not_done = futures_wait(futures, timeout=_PREFETCH_WAIT_TIMEOUT + 5)
+        if not_done:
+            logger.warning(f"[資料預載入] {len(not_done)} 個工具超時，分析師將自行等待或重試")
+    return futures
 
 
 def create_msg_delete():
@@ -324,16 +529,18 @@ def create_msg_delete():
         """回傳佔位訊息，不執行任何刪除操作"""
         return {"messages": [HumanMessage(content="Continue")]}
 
+    async def adelete_messages(state):
+        return delete_messages(state)
+
+    # 非同步版本供 graph.astream（apropagate）使用
+    delete_messages.anode = adelete_messages
     return delete_messages
 
 
 class Toolkit:
-    _config = DEFAULT_CONFIG.copy()
-
-    @classmethod
-    def update_config(cls, config):
-        """Update the class-level configuration."""
-        cls._config.update(config)
+    def update_config(self, config):
+        """Update this toolkit's configuration (instance-level, not shared)."""
+        self._config.update(config)
 
     @property
     def config(self):
@@ -341,6 +548,8 @@ class Toolkit:
         return self._config
 
     def __init__(self, config=None):
+        # 每個實例持有獨立設定，避免多個 TradingAgentsGraph 互相覆寫
+        self._config = DEFAULT_CONFIG.copy()
         if config:
             self.update_config(config)
 
@@ -0,0 +1,352 @@
+"""
+分析層級快取範圍（AnalysisContext）
+
+每次 propagate 建立獨立的 AnalysisContext，工具結果與記憶嵌入快取只存在於該次分析，
+多個分析同時執行（如 FastAPI 分析執行緒池）時不會互相清除預載入的資料。
+
+- 目前分析的 context 以 contextvars 綁定，LangGraph 節點執行緒會自動繼承
+- 也可將 context 以參數明確傳入 prefetch_analyst_data / invoke_tools_direct / get_cached_embedding
+- 綁定日期的工具結果（參數含 curr_date / end_date / trade_date）視為不可變，
+  放入引用計數的共享層，同時執行的分析可直接共用；最後一個引用的分析結束時才移除
+- 預載入中的工具以 Future 登記在 context，分析師只等待自己需要的工具完成
+"""
+
+import itertools
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# 匯入日誌模組
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+
+# 參數含以下任一欄位的工具結果視為綁定日期的不可變結果，可跨分析共享
+_DATE_PINNED_ARGS = ("curr_date", "end_date", "trade_date")
+
+
+def is_shareable_result(args: dict) -> bool:
+    """判斷工具結果是否可跨分析共享（參數固定了分析日期）"""
+    return isinstance(args, dict) and any(args.get(k) for k in _DATE_PINNED_ARGS)
+
+
+class _SharedResultLayer:
+    """引用計數的跨分析共享結果層
+
+    每個 AnalysisContext 讀寫共享結果時登記引用，context 關閉時釋放；
+    引用數歸零的條目立即移除，不需要全域重置。
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, list] = {}  # key -> [value, refcount]
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> Optional[str]:
+        """取得共享結果並增加引用，不存在時回傳 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry[1] += 1
+            return entry[0]
+
+    def publish(self, key: str, value: str) -> bool:
+        """發布結果並登記一個引用；已有其他分析發布時只增加引用
+
+        Returns:
+            bool: 是否為新發布的條目
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] += 1
+                return False
+            self._entries[key] = [value, 1]
+            return True
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._entries[key]
+
+    def refcount(self, key: str) -> int:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry else 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+_shared_results = _SharedResultLayer()
+_context_ids = itertools.count(1)
+
+
+class AnalysisContext:
+    """單次分析的工具結果與記憶嵌入快取範圍"""
+
+    def __init__(self, label: str = "", shared_layer: _SharedResultLayer = None):
+        """
+        Args:
+            label: 日誌用標籤（如 "AAPL@2024-01-05"）
+            shared_layer: 共享結果層，預設為全域共享層
+        """
+        self.context_id = next(_context_ids)
+        self.label = label or f"analysis-{self.context_id}"
+        self._shared = shared_layer if shared_layer is not None else _shared_results
+        self._tool_results: Dict[str, str] = {}
+        self._shared_keys: set = set()
+        self._embeddings: Dict[int, list] = {}
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        # 錄製 / 重播工具結果與 LLM 回應（cassette.Cassette），None 時直接呼叫
+        self.cassette = None
+        self.tool_hits = 0
+        self.tool_misses = 0
+        self.shared_hits = 0
+        # 節點名稱 -> [呼叫次數, 輸入 tokens, 供應商快取讀取 tokens, 快取寫入 tokens]
+        self._llm_usage: Dict[str, list] = {}
+
+    # ------------------------------------------------------------------
+    # 工具結果
+    # ------------------------------------------------------------------
+
+    def get_tool_result(self, cache_key: str) -> Optional[str]:
+        """依序查詢本次分析快取與共享層"""
+        with self._lock:
+            cached = self._tool_results.get(cache_key)
+            if cached is not None:
+                self.tool_hits += 1
+                return cached
+            if cache_key in self._shared_keys or self._closed:
+                return None
+
+        shared = self._shared.acquire(cache_key)
+        if shared is None:
+            return None
+        with self._lock:
+            if self._closed or cache_key in self._shared_keys:
+                # 關閉中或其他執行緒已登記，歸還多取得的引用
+                self._shared.release(cache_key)
+            else:
+                self._shared_keys.add(cache_key)
+            self._tool_results[cache_key] = shared
+            self.tool_hits += 1
+            self.shared_hits += 1
+        return shared
+
+    def set_tool_result(self, cache_key: str, value: str, shareable: bool = False) -> None:
+        """寫入工具結果；shareable 時同時發布至共享層"""
+        with self._lock:
+            if self._closed:
+                return
+            self._tool_results[cache_key] = value
+            self.tool_misses += 1
+            if not shareable or cache_key in self._shared_keys:
+                return
+            self._shared_keys.add(cache_key)
+        self._shared.publish(cache_key, value)
+
+    def tool_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.tool_hits,
+                "misses": self.tool_misses,
+                "shared_hits": self.shared_hits,
+                "entries": len(self._tool_results),
+                "pending": len(self._pending),
+            }
+
+    # ------------------------------------------------------------------
+    # LLM 呼叫的提示詞快取統計
+    # ------------------------------------------------------------------
+
+    def record_llm_usage(self, node_name: str, input_tokens: int, cache_read: int, cache_creation: int) -> None:
+        with self._lock:
+            usage = self._llm_usage.setdefault(node_name, [0, 0, 0, 0])
+            usage[0] += 1
+            usage[1] += input_tokens
+            usage[2] += cache_read
+            usage[3] += cache_creation
+
+    def llm_usage_stats(self) -> Dict[str, Dict[str, int]]:
+        """依節點彙總的輸入與供應商快取 token 數"""
+        with self._lock:
+            return {
+                node: {"calls": u[0], "input_tokens": u[1], "cache_read": u[2], "cache_creation": u[3]}
+                for node, u in self._llm_usage.items()
+            }
+
+    # ------------------------------------------------------------------
+    # 預載入中的工具
+    # ------------------------------------------------------------------
+
+    def register_pending(self, cache_key: str, future: Future) -> None:
+        """登記預載入中的工具呼叫，完成後自動移除"""
+        with self._lock:
+            if self._closed:
+                future.cancel()
+                return
+            self._pending[cache_key] = future
+
+        def _done(f, key=cache_key):
+            with self._lock:
+                if self._pending.get(key) is f:
+                    del self._pending[key]
+
+        future.add_done_callback(_done)
+
+    def is_pending(self, cache_key: str) -> bool:
+        with self._lock:
+            return cache_key in self._pending
+
+    def pending_future(self, cache_key: str) -> Optional[Future]:
+        """取得預載入中的 Future（供非同步路徑以 asyncio.wrap_future 等待）"""
+        with self._lock:
+            return self._pending.get(cache_key)
+
+    def wait_pending(self, cache_key: str, timeout: float = None) -> bool:
+        """等待預載入中的工具完成
+
+        Returns:
+            bool: 是否有預載入中的呼叫（不論成功與否）；逾時或無登記時回傳 False
+        """
+        with self._lock:
+            future = self._pending.get(cache_key)
+        if future is None:
+            return False
+        try:
+            future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return False
+        except Exception:
+            # 預載入失敗時由呼叫端自行重新呼叫工具
+            pass
+        return True
+
+    # ------------------------------------------------------------------
+    # 記憶嵌入
+    # ------------------------------------------------------------------
+
+    def get_embedding(self, situation_text: str) -> Optional[list]:
+        with self._lock:
+            return self._embeddings.get(hash(situation_text))
+
+    def set_embedding(self, situation_text: str, embedding: list) -> None:
+        with self._lock:
+            self._embeddings[hash(situation_text)] = embedding
+
+    # ------------------------------------------------------------------
+    # 生命週期
+    # ------------------------------------------------------------------
+
+    def close(self) -> None:
+        """結束本次分析：釋放共享層引用並清空本地快取（可重複呼叫）"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            shared_keys = list(self._shared_keys)
+            self._shared_keys.clear()
+            pending = list(self._pending.values())
+            self._pending.clear()
+            stats = (self.tool_hits, self.tool_misses, self.shared_hits, len(self._tool_results))
+            self._tool_results.clear()
+            self._embeddings.clear()
+        # 尚未開始的預載入不再需要
+        for future in pending:
+            future.cancel()
+        for key in shared_keys:
+            self._shared.release(key)
+        if stats[0] or stats[1]:
+            logger.info(
+                f"[分析快取] {self.label} 結束: 命中 {stats[0]} 次（共享 {stats[2]} 次）, "
+                f"未命中 {stats[1]} 次, 條目 {stats[3]} 筆"
+            )
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+_current_context: ContextVar[Optional[AnalysisContext]] = ContextVar(
+    "tradingagents_analysis_context", default=None
+)
+
+# 未綁定分析範圍時（如單獨呼叫分析師節點）使用的預設範圍
+_default_context: Optional[AnalysisContext] = None
+_default_context_lock = threading.Lock()
+
+
+def get_current_analysis_context() -> Optional[AnalysisContext]:
+    """取得目前綁定的分析範圍（未綁定時回傳 None）"""
+    return _current_context.get()
+
+
+def bind_analysis_context(context: Optional[AnalysisContext]):
+    """將分析範圍綁定到目前的執行上下文，回傳可用於 unbind 的 token"""
+    return _current_context.set(context)
+
+
+def unbind_analysis_context(token) -> None:
+    _current_context.reset(token)
+
+
+def resolve_analysis_context(context: Optional[AnalysisContext] = None) -> AnalysisContext:
+    """依序使用明確傳入、目前綁定、全域預設的分析範圍"""
+    if context is not None:
+        return context
+    context = _current_context.get()
+    if context is not None and not context.closed:
+        return context
+    global _default_context
+    with _default_context_lock:
+        if _default_context is None or _default_context.closed:
+            _default_context = AnalysisContext(label="default")
+        return _default_context
+
+
+def reset_default_context() -> None:
+    """重置未綁定時使用的預設範圍"""
+    global _default_context
+    with _default_context_lock:
+        previous, _default_context = _default_context, None
+    if previous is not None:
+        previous.close()
+
+
+@contextmanager
+def analysis_scope(label: str = ""):
+    """建立並綁定一個分析範圍，離開時自動關閉
+
+    用法:
+        with analysis_scope("AAPL@2024-01-05") as context:
+            prefetch_analyst_data(toolkit, "AAPL", "2024-01-05", context=context)
+    """
+    context = AnalysisContext(label=label)
+    token = bind_analysis_context(context)
+    try:
+        yield context
+    finally:
+        unbind_analysis_context(token)
+        context.close()
+
+
+def get_shared_result_count() -> int:
+    """目前共享層的條目數（監控用）"""
+    return len(_shared_results)
@@ -0,0 +1,178 @@
+"""
+工具結果與 LLM 回應的錄製 / 重播（cassette）
+
+record 模式在真實呼叫後保存每個 invoke_tools_direct 工具結果、LLM 回應與記憶嵌入；
+replay 模式完全不連網，直接以錄製的回應執行 TradingAgentsGraph.propagate，
+用於在無網路的 CI 上執行基準測試，或排除網路波動分析圖與資料層本身的耗時。
+
+- 請求以「類型 + 名稱（工具名 / 模型 ID）+ 正規化請求內容」的雜湊為鍵；
+  正規化會移除時間戳等每次執行都不同的內容，並統一空白
+- 檔案為 gzip 壓縮的 JSON（不使用 pickle），record 模式會保留檔案中既有的錄製
+- cassette 綁定在 AnalysisContext 上，工具執行緒池中的呼叫也能取得
+- replay 模式找不到錄製時拋出 CassetteMissError，不會退回真實呼叫
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from langchain_core.messages import BaseMessage
+
+# 匯入日誌模組
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+
+CASSETTE_MODES = ("off", "record", "replay")
+_CASSETTE_VERSION = 1
+_DEFAULT_CASSETTE_NAME = "default.json.gz"
+
+# 每次執行都會不同、不影響回應語意的內容（如報告中的產生時間）
+_VOLATILE_PATTERNS = (
+    re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:\.\d+)?"),
+)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class CassetteMissError(RuntimeError):
+    """replay 模式下找不到對應的錄製"""
+
+
+def _default(obj):
+    if isinstance(obj, BaseMessage):
+        return {"type": obj.type, "content": obj.content}
+    return str(obj)
+
+
+def normalize_request(request: Any) -> str:
+    """將請求轉為穩定的字串：JSON 排序鍵、遮蔽時間戳、統一空白"""
+    text = request if isinstance(request, str) else json.dumps(
+        request, ensure_ascii=False, sort_keys=True, default=_default
+    )
+    for pattern in _VOLATILE_PATTERNS:
+        text = pattern.sub("<ts>", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def request_key(kind: str, name: str, request: Any) -> str:
+    digest = hashlib.sha256()
+    for part in (kind, name, normalize_request(request)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()[:32]
+
+
+class Cassette:
+    """單一 cassette 檔案的錄製與重播"""
+
+    def __init__(self, path: str, mode: str):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"不支援的 cassette 模式: {mode}")
+        self.path = os.path.abspath(path)
+        self.mode = mode
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+        if os.path.exists(self.path):
+            self._load()
+        elif mode == "replay":
+            raise FileNotFoundError(f"cassette 檔案不存在，無法重播: {self.path}")
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != _CASSETTE_VERSION:
+            raise ValueError(f"不支援的 cassette 版本 {data.get('version')}: {self.path}")
+        self._entries = data.get("entries", {})
+        logger.info(f"[Cassette] 載入 {len(self._entries)} 筆錄製: {self.path}")
+
+    def replay(self, kind: str, name: str, request: Any) -> Any:
+        """取得錄製的回應，找不到時拋出 CassetteMissError"""
+        key = request_key(kind, name, request)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None:
+            raise CassetteMissError(f"cassette 中沒有 {kind} {name} 的錄製（key={key}）: {self.path}")
+        return entry["response"]
+
+    def record(self, kind: str, name: str, request: Any, response: Any) -> None:
+        key = request_key(kind, name, request)
+        with self._lock:
+            self._entries[key] = {"kind": kind, "name": name, "response": response}
+            self._dirty = True
+            self.recorded += 1
+
+    def save(self) -> None:
+        """寫入錄製內容（先寫暫存檔再替換，避免中斷時損壞既有檔案）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = {"version": _CASSETTE_VERSION, "entries": dict(self._entries)}
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        logger.info(f"[Cassette] 已保存 {len(payload['entries'])} 筆錄製: {self.path}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+# 依 (路徑, 模式) 共用 cassette（同一行程的多個圖實例寫入同一份錄製）
+_cassettes: Dict[tuple, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: str, mode: str) -> Cassette:
+    key = (os.path.abspath(path), mode)
+    with _cassettes_lock:
+        cassette = _cassettes.get(key)
+        if cassette is None:
+            cassette = Cassette(path, mode)
+            _cassettes[key] = cassette
+        return cassette
+
+
+def cassette_from_config(config: Dict[str, Any]) -> Optional[Cassette]:
+    """依設定（cassette_mode: off / record / replay，cassette_path）取得 cassette，停用時回傳 None"""
+    mode = str(config.get("cassette_mode") or "off").lower()
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"不支援的 cassette 模式: {mode}（可用: {', '.join(CASSETTE_MODES)}）")
+    if mode == "off":
+        return None
+    path = config.get("cassette_path") or os.path.join(
+        config["data_cache_dir"], "cassettes", _DEFAULT_CASSETTE_NAME
+    )
+    cassette = get_cassette(path, mode)
+    logger.info(f"[Cassette] {mode} 模式: {cassette.path}")
+    return cassette
+
+
+def get_active_cassette() -> Optional[Cassette]:
+    """目前分析範圍綁定的 cassette（未綁定分析範圍或未啟用時回傳 None）"""
+    from tradingagents.agents.utils.analysis_context import get_current_analysis_context
+    context = get_current_analysis_context()
+    return getattr(context, "cassette", None) if context is not None else None
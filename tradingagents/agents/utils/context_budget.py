@@ -0,0 +1,290 @@
+"""
+依 tokenizer 計算的上下文預算
+
+下游節點（辯論、經理、風險）的提示詞過去以固定字元數截斷報告，但中文每個字元約一個
+token、英文表格則稀疏得多，提示詞不是過長就是從表格中間切斷。本模組改以 token 計算：
+
+- Tokenizer：OpenAI 模型使用 tiktoken 的對應編碼；無法載入（未安裝、離線無法下載編碼檔）
+  或非 OpenAI 模型（如 Claude，tokenizer 未公開）時，依 CJK 字元與其他字元分別估算
+- allocate：將總預算依權重分配給多個區段，較短的區段保留全文，剩餘預算再分給較長的區段
+- trim_report：依段落與表格邊界截斷（表格只保留完整的列，段落在句尾截斷）
+- trim_history：辯論歷史依發言輪次平均分配預算，每輪各自截斷，不會整輪消失
+"""
+
+import math
+import re
+import threading
+from typing import Callable, Dict, Optional
+
+# 匯入日誌模組
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken 為 langchain-openai 的依賴
+    tiktoken = None
+
+
+TRUNCATION_MARKER = "...(略)"
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+_SENTENCE_END_RE = re.compile(r"[。！？!?；;\n]|\.(?=\s)")
+_BLOCK_SPLIT_RE = re.compile(r"\n\s*\n")
+_TURN_SPLIT_RE = re.compile(r"\n(?=[A-Za-z]+ Analyst: )")
+
+# 區段剩餘預算低於此值時不再截取部分段落（避免只留下半句）
+_MIN_PARTIAL_TOKENS = 24
+
+# 估算參數：(每個 CJK 字元的 token 數, 其他字元每個 token 的平均字元數)
+_APPROX_PROFILES = {
+    "claude": (1.2, 3.5),
+    "default": (1.0, 4.0),
+}
+
+
+class Tokenizer:
+    """計算文字的 token 數（tiktoken 編碼或字元估算）"""
+
+    def __init__(self, name: str, encoding=None, profile: str = "default"):
+        self.name = name
+        self._encoding = encoding
+        self._cjk_cost, self._chars_per_token = _APPROX_PROFILES[profile]
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        cjk = len(_CJK_RE.findall(text))
+        return math.ceil(cjk * self._cjk_cost + (len(text) - cjk) / self._chars_per_token)
+
+    def chars_for_tokens(self, max_tokens: int, sample: str = "") -> int:
+        """依範例文字的字元 / token 比例，換算 max_tokens 約可容納的字元數
+
+        提示詞只能以字數向模型描述長度上限時使用（中文約每字一個 token，英文約四個字元一個 token）。
+        """
+        tokens = self.count(sample)
+        if tokens == 0:
+            return max_tokens
+        return max(1, int(max_tokens * len(sample) / tokens))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """截取不超過 max_tokens 的最長前綴"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        lo, hi = 0, len(text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.count(text[:mid]) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        return text[:lo]
+
+
+_tokenizers: Dict[str, Tokenizer] = {}
+_encodings: Dict[str, object] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def _load_encoding(encoding_name: str):
+    """載入 tiktoken 編碼（失敗結果也會記住，離線時不會重複嘗試下載）"""
+    if encoding_name not in _encodings:
+        try:
+            _encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            logger.info(f"[上下文預算] 無法載入 tiktoken 編碼 {encoding_name}，改用字元估算: {e}")
+            _encodings[encoding_name] = None
+    return _encodings[encoding_name]
+
+
+def _openai_encoding_name(model: str) -> Optional[str]:
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        if model.startswith(("gpt-", "o1", "o3", "o4", "chatgpt")):
+            return "o200k_base"
+        if model.startswith("text-embedding"):
+            return "cl100k_base"
+    return None
+
+
+def get_tokenizer(model: Optional[str] = None) -> Tokenizer:
+    """取得模型對應的 tokenizer（依模型名稱共用實例）"""
+    key = model or ""
+    with _tokenizers_lock:
+        tokenizer = _tokenizers.get(key)
+        if tokenizer is not None:
+            return tokenizer
+        encoding_name = _openai_encoding_name(model) if model else None
+        encoding = _load_encoding(encoding_name) if encoding_name else None
+        if encoding is not None:
+            tokenizer = Tokenizer(encoding_name, encoding)
+        else:
+            profile = "claude" if model and "claude" in model.lower() else "default"
+            tokenizer = Tokenizer(f"approx-{profile}", profile=profile)
+        _tokenizers[key] = tokenizer
+        return tokenizer
+
+
+def tokenizer_for_llm(llm) -> Tokenizer:
+    """依聊天模型的模型名稱取得 tokenizer（無法辨識時使用估算）"""
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+    return get_tokenizer(model if isinstance(model, str) and model else None)
+
+
+def allocate(counts: Dict[str, int], budget: int, weights: Optional[Dict[str, float]] = None) -> Dict[str, int]:
+    """將預算依權重分配給各區段
+
+    小於分配額度的區段保留原長度，省下的預算再依權重分給其餘區段。
+
+    Args:
+        counts: 區段名稱 -> 目前的 token 數
+        budget: 總預算
+        weights: 區段名稱 -> 權重（預設相同）
+
+    Returns:
+        Dict[str, int]: 區段名稱 -> 可使用的 token 數
+    """
+    weights = weights or {}
+    allocation = {name: 0 for name in counts}
+    pending = {name for name, count in counts.items() if count > 0}
+    remaining = max(budget, 0)
+    while pending:
+        total_weight = sum(weights.get(name, 1.0) for name in pending)
+        shares = {name: remaining * weights.get(name, 1.0) / total_weight for name in pending}
+        fitting = [name for name in pending if counts[name] <= shares[name]]
+        if not fitting:
+            for name in pending:
+                allocation[name] = int(shares[name])
+            break
+        for name in fitting:
+            allocation[name] = counts[name]
+            remaining -= counts[name]
+            pending.discard(name)
+    return allocation
+
+
+def _is_table(block: str) -> bool:
+    lines = [line for line in block.strip().splitlines() if line.strip()]
+    return bool(lines) and sum(line.lstrip().startswith("|") for line in lines) * 2 >= len(lines)
+
+
+def _is_heading(block: str) -> bool:
+    stripped = block.strip()
+    return stripped.startswith("#") and "\n" not in stripped
+
+
+def _trim_table(block: str, max_tokens: int, tokenizer: Tokenizer) -> str:
+    """保留表頭與能放入預算的完整資料列"""
+    lines = block.splitlines()
+    kept, used = [], 0
+    for line in lines:
+        cost = tokenizer.count(line + "\n")
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    # 只剩表頭與分隔線時整個表格捨棄
+    data_rows = [line for line in kept if line.strip() and not set(line.strip()) <= set("|-: ")]
+    return "\n".join(kept) if len(data_rows) > 1 else ""
+
+
+def _trim_prose(block: str, max_tokens: int, tokenizer: Tokenizer) -> str:
+    """在預算內的最後一個句尾截斷"""
+    head = tokenizer.truncate(block, max_tokens)
+    ends = [m.end() for m in _SENTENCE_END_RE.finditer(head)]
+    return head[:ends[-1]].rstrip() if ends else ""
+
+
+def trim_report(text: str, max_tokens: int, tokenizer: Tokenizer) -> str:
+    """依段落與表格邊界將報告截斷到 max_tokens 以內（超過時加上截斷標記）"""
+    if not text:
+        return ""
+    if tokenizer.count(text) <= max_tokens:
+        return text
+
+    budget = max_tokens - tokenizer.count(TRUNCATION_MARKER) - 1
+    kept, used = [], 0
+    for block in _BLOCK_SPLIT_RE.split(text):
+        if not block.strip():
+            continue
+        cost = tokenizer.count(block + "\n\n")
+        if used + cost <= budget:
+            kept.append(block)
+            used += cost
+            continue
+        remaining = budget - used
+        if remaining >= _MIN_PARTIAL_TOKENS:
+            partial = _trim_table(block, remaining, tokenizer) if _is_table(block) else _trim_prose(block, remaining, tokenizer)
+            if not partial and not kept:
+                # 第一段就超過預算且找不到句尾時直接截取，不回傳空報告
+                partial = tokenizer.truncate(block, remaining)
+            if partial:
+                kept.append(partial)
+        break
+
+    # 不留下沒有內容的標題
+    while kept and _is_heading(kept[-1]):
+        kept.pop()
+    return "\n\n".join(kept + [TRUNCATION_MARKER])
+
+
+def trim_history(history: str, max_tokens: int, tokenizer: Tokenizer) -> str:
+    """辯論歷史依發言輪次分配預算，每輪各自依句尾截斷"""
+    if not history or tokenizer.count(history) <= max_tokens:
+        return history or ""
+    turns = [turn for turn in _TURN_SPLIT_RE.split(history.strip()) if turn.strip()]
+    counts = {i: tokenizer.count(turn) for i, turn in enumerate(turns)}
+    allocation = allocate(counts, max_tokens - len(turns))
+    trimmed = [
+        turn if allocation[i] >= counts[i] else trim_report(turn, allocation[i], tokenizer)
+        for i, turn in enumerate(turns)
+    ]
+    return "\n".join(turn for turn in trimmed if turn)
+
+
+_TRIMMERS: Dict[str, Callable[[str, int, Tokenizer], str]] = {
+    "report": trim_report,
+    "history": trim_history,
+}
+
+
+def fit_sections(
+    sections: Dict[str, str],
+    budget: int,
+    tokenizer: Tokenizer,
+    weights: Optional[Dict[str, float]] = None,
+    kinds: Optional[Dict[str, str]] = None,
+) -> Dict[str, str]:
+    """將多個區段共同放入 budget 個 token 內
+
+    Args:
+        sections: 區段名稱 -> 文字
+        budget: 所有區段合計的 token 預算
+        tokenizer: 計算 token 的 tokenizer
+        weights: 區段名稱 -> 分配權重
+        kinds: 區段名稱 -> 截斷方式（report：段落 / 表格邊界，history：依發言輪次）
+
+    Returns:
+        Dict[str, str]: 截斷後的區段（順序與輸入相同）
+    """
+    kinds = kinds or {}
+    counts = {name: tokenizer.count(text or "") for name, text in sections.items()}
+    allocation = allocate(counts, budget, weights)
+    fitted = {}
+    for name, text in sections.items():
+        if counts[name] <= allocation[name]:
+            fitted[name] = text or ""
+        else:
+            fitted[name] = _TRIMMERS[kinds.get(name, "report")](text, allocation[name], tokenizer)
+    return fitted
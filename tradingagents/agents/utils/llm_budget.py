@@ -0,0 +1,95 @@
+"""
+LLM 並發預算
+
+批次分析（propagate_many）同時執行多個圖時，以單一預算限制所有圖同時進行中的 LLM 呼叫數，
+避免「圖並發數 x 每個圖的並行節點數」的突發請求觸發供應商 429。
+
+- 預算以 contextvars 綁定，LangGraph 節點執行緒與並行辯論的執行緒池會自動繼承
+- 未綁定預算時（一般 propagate）llm_slot 不做任何限制
+- 所有 LLM 節點經由 invoke_llm_cached / ainvoke_llm_cached 呼叫 LLM，預算在該處取得
+"""
+
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# 匯入日誌模組
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+
+class LLMConcurrencyBudget:
+    """同時進行中的 LLM 呼叫數上限（可跨執行緒共用）"""
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError(f"LLM 並發預算必須大於 0: {limit}")
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def acquire(self) -> None:
+        self._semaphore.acquire()
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+
+_current_budget: ContextVar[Optional[LLMConcurrencyBudget]] = ContextVar("llm_budget", default=None)
+
+
+@contextmanager
+def use_llm_budget(budget: Optional[LLMConcurrencyBudget]):
+    """在目前的 context 綁定 LLM 並發預算（None 表示不限制）"""
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def get_current_llm_budget() -> Optional[LLMConcurrencyBudget]:
+    return _current_budget.get()
+
+
+@contextmanager
+def llm_slot():
+    """取得一個 LLM 呼叫名額，未綁定預算時直接執行"""
+    budget = _current_budget.get()
+    if budget is None:
+        yield
+        return
+    budget.acquire()
+    try:
+        yield
+    finally:
+        budget.release()
+
+
+@asynccontextmanager
+async def allm_slot():
+    """llm_slot 的非同步版本（等待名額交由執行緒池，不阻塞事件迴圈）"""
+    budget = _current_budget.get()
+    if budget is None:
+        yield
+        return
+    acquire = asyncio.ensure_future(asyncio.to_thread(budget.acquire))
+    try:
+        await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        # 取消時名額可能已在執行緒中取得，等待完成後歸還
+        acquire.add_done_callback(lambda f: f.cancelled() or f.exception() or budget.release())
+        raise
+    try:
+        yield
+    finally:
+        budget.release()
@@ -0,0 +1,253 @@
+"""
+共用報告前綴與供應商提示詞快取
+
+多空研究員、研究經理與三位風險辯論者都引用同一組分析師報告。供應商的提示詞快取
+（Anthropic cache_control、OpenAI 自動前綴快取）只對「位元組完全相同的前綴」生效，
+因此這些節點的提示詞統一排列為：
+
+1. system：共用報告前綴（同一次分析中使用相同模型的節點逐字相同，固定 token 預算與格式），
+   風險辯論者接著放入交易員計劃（三位辯論者共用的第二層前綴）
+2. user：角色指示、辯論歷史、過去經驗等每個節點不同的內容
+
+Anthropic 模型在前綴區塊加上 cache_control 斷點；OpenAI 不需要標記，前綴超過
+1024 tokens 時自動快取。每次呼叫讀取 / 寫入快取的 token 數記錄在分析範圍中，
+分析結束時依節點輸出，用於確認首個 token 延遲的改善。
+
+供應商不快取前綴時（相容 API 代理、其他供應商或 prompt_cache_enabled 關閉），
+完整前綴只會增加輸入 token：風險辯論者改用每份報告 context_budget_report_excerpt
+個 token 的節錄，研究員與經理節點仍使用完整前綴。
+"""
+
+import functools
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from tradingagents.agents.utils.analysis_context import get_current_analysis_context
+from tradingagents.agents.utils.context_budget import fit_sections, tokenizer_for_llm, trim_report
+
+# 匯入日誌模組
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+
+# 共用前綴中的報告與預算分配權重（所有節點使用相同預算與權重，前綴才會逐字一致）
+SHARED_REPORT_SECTIONS = (
+    ("market_report", "市場研究", 0.3),
+    ("sentiment_report", "情緒分析", 0.2),
+    ("news_report", "新聞事件", 0.2),
+    ("fundamentals_report", "基本面", 0.3),
+)
+
+# 節點指示（角色、任務說明）預留的 token 數，不分配給歷史與記憶
+_INSTRUCTION_RESERVE = 600
+# 節點動態區段（辯論歷史、記憶等）至少保留的 token 數
+_MIN_SECTION_BUDGET = 800
+
+_CACHE_BREAKPOINT = {"type": "ephemeral"}
+
+
+def _budget_config() -> Dict[str, Any]:
+    from tradingagents.dataflows.config import get_config
+    return get_config()
+
+
+def is_official_openai(backend_url: str) -> bool:
+    """是否直接連線 OpenAI（相容 API 代理不一定支援前綴快取與 prompt_cache_key 參數）"""
+    return not backend_url or "api.openai.com" in backend_url
+
+
+def supports_prefix_cache(llm) -> bool:
+    """供應商是否快取共用前綴：Anthropic（cache_control 斷點）或直連 OpenAI（自動前綴快取）"""
+    if not _budget_config().get("prompt_cache_enabled", True):
+        return False
+    try:
+        llm_type = llm._llm_type
+    except Exception:
+        return False
+    if llm_type == "anthropic-chat":
+        return True
+    if llm_type == "openai-chat":
+        return is_official_openai(getattr(llm, "openai_api_base", None) or "")
+    return False
+
+
+def supports_cache_control(llm) -> bool:
+    """是否為支援 cache_control 斷點的 Anthropic 聊天模型（prompt_cache_enabled 關閉時不加斷點）"""
+    if not _budget_config().get("prompt_cache_enabled", True):
+        return False
+    try:
+        return llm._llm_type == "anthropic-chat"
+    except Exception:
+        return False
+
+
+def _report_header(company_name: str, trade_date: str) -> str:
+    from tradingagents.utils.stock_utils import get_stock_market_info
+    market_info = get_stock_market_info(company_name)
+    return (
+        f"以下是分析團隊對股票 {company_name} 於 {trade_date} 的研究報告（摘要），"
+        f"貨幣單位：{market_info['currency_name']}（{market_info['currency_symbol']}）。"
+        "所有回答請用繁體中文，不可使用簡體字。"
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def _shared_report_context(tokenizer, budget: int, company_name: str, trade_date: str, reports: tuple) -> str:
+    fitted = fit_sections(
+        {field: text for (field, _, _), text in zip(SHARED_REPORT_SECTIONS, reports)},
+        budget,
+        tokenizer,
+        weights={field: weight for field, _, weight in SHARED_REPORT_SECTIONS},
+    )
+    sections = [_report_header(company_name, trade_date)]
+    for field, title, _ in SHARED_REPORT_SECTIONS:
+        sections.append(f"【{title}】\n{fitted[field]}")
+    return "\n\n".join(sections)
+
+
+@functools.lru_cache(maxsize=64)
+def _report_excerpts(tokenizer, max_tokens: int, company_name: str, trade_date: str, reports: tuple) -> str:
+    sections = [_report_header(company_name, trade_date)]
+    for (_, title, _), text in zip(SHARED_REPORT_SECTIONS, reports):
+        sections.append(f"【{title}】\n{trim_report(text, max_tokens, tokenizer)}")
+    return "\n\n".join(sections)
+
+
+def _report_inputs(state: Dict[str, Any]) -> tuple:
+    """四份報告（有報告摘要時優先使用摘要）"""
+    digests = state.get("report_digests") or {}
+    return tuple(digests.get(field) or state.get(field, "") or "" for field, _, _ in SHARED_REPORT_SECTIONS)
+
+
+def build_shared_report_context(state: Dict[str, Any], llm=None) -> str:
+    """產生所有下游節點共用的報告前綴（只依賴模型 tokenizer、股票、日期與四份報告）
+
+    四份報告共用 context_budget_shared_reports 個 token，較短的報告保留全文，
+    其餘預算依權重分給較長的報告，並在段落 / 表格邊界截斷。
+    圖中有報告摘要階段時（state["report_digests"]）改用摘要，缺少摘要的報告仍使用原文。
+    """
+    return _shared_report_context(
+        tokenizer_for_llm(llm),
+        int(_budget_config().get("context_budget_shared_reports", 4000)),
+        state.get("company_of_interest", "Unknown"),
+        str(state.get("trade_date", "")),
+        _report_inputs(state),
+    )
+
+
+def build_report_excerpts(state: Dict[str, Any], llm=None) -> str:
+    """每份報告各節錄 context_budget_report_excerpt 個 token（供應商不快取前綴時的精簡版本）"""
+    return _report_excerpts(
+        tokenizer_for_llm(llm),
+        int(_budget_config().get("context_budget_report_excerpt", 200)),
+        state.get("company_of_interest", "Unknown"),
+        str(state.get("trade_date", "")),
+        _report_inputs(state),
+    )
+
+
+def build_report_context(state: Dict[str, Any], llm=None, excerpt_when_uncached: bool = False) -> str:
+    """節點使用的報告區段：供應商會快取前綴時為共用前綴，否則依 excerpt_when_uncached 改用節錄"""
+    if excerpt_when_uncached and not supports_prefix_cache(llm):
+        return build_report_excerpts(state, llm)
+    return build_shared_report_context(state, llm)
+
+
+def build_trader_plan_context(state: Dict[str, Any], llm=None) -> str:
+    """風險辯論者共用的第二層前綴（交易員計劃）"""
+    budget = int(_budget_config().get("context_budget_trader_plan", 1200))
+    plan = trim_report(state.get("trader_investment_plan", "") or "", budget, tokenizer_for_llm(llm))
+    return f"交易員決策：\n{plan}"
+
+
+def node_input_budget(node_name: str) -> int:
+    """節點的輸入 token 上限（含共用前綴）"""
+    config = _budget_config()
+    overrides = config.get("context_budget_node_overrides") or {}
+    return int(overrides.get(node_name, config.get("context_budget_node_tokens", 7000)))
+
+
+def fit_node_sections(
+    llm,
+    state: Dict[str, Any],
+    node_name: str,
+    sections: Dict[str, str],
+    weights: Optional[Dict[str, float]] = None,
+    kinds: Optional[Dict[str, str]] = None,
+    extra_context: str = "",
+    excerpt_when_uncached: bool = False,
+) -> Dict[str, str]:
+    """將節點的動態區段（辯論歷史、記憶、計劃等）放入扣除共用前綴後的剩餘預算
+
+    Args:
+        llm: 節點使用的聊天模型（決定 tokenizer）
+        state: 圖狀態
+        node_name: 節點名稱（對應 context_budget_node_overrides）
+        sections: 區段名稱 -> 文字
+        weights: 區段名稱 -> 分配權重
+        kinds: 區段名稱 -> 截斷方式（report / history）
+        extra_context: 節點使用的第二層前綴（計入已使用的預算）
+        excerpt_when_uncached: 供應商不快取前綴時改用報告節錄（與 build_prefixed_messages 一致）
+    """
+    tokenizer = tokenizer_for_llm(llm)
+    report_context = build_report_context(state, llm, excerpt_when_uncached)
+    used = tokenizer.count(report_context) + tokenizer.count(extra_context)
+    budget = max(node_input_budget(node_name) - used - _INSTRUCTION_RESERVE, _MIN_SECTION_BUDGET)
+    return fit_sections(sections, budget, tokenizer, weights=weights, kinds=kinds)
+
+
+def _prefix_message(llm, sections: List[str]) -> SystemMessage:
+    """Anthropic 模型每一層前綴各加一個 cache_control 斷點；其他模型直接串接（前綴不變即可自動快取）"""
+    if supports_cache_control(llm):
+        return SystemMessage(content=[
+            {"type": "text", "text": text, "cache_control": _CACHE_BREAKPOINT} for text in sections
+        ])
+    return SystemMessage(content="\n\n".join(sections))
+
+
+def shared_prefix_message(llm, state: Dict[str, Any], extra_context: str = "",
+                          excerpt_when_uncached: bool = False) -> SystemMessage:
+    """共用報告前綴（與選用的第二層前綴）組成的 system 訊息"""
+    sections = [build_report_context(state, llm, excerpt_when_uncached)]
+    if extra_context:
+        sections.append(extra_context)
+    return _prefix_message(llm, sections)
+
+
+def build_prefixed_messages(llm, state: Dict[str, Any], instructions: str, extra_context: str = "",
+                            excerpt_when_uncached: bool = False) -> List:
+    """依「共用報告前綴 → 共用第二層前綴 → 節點指示」組成訊息列表
+
+    Args:
+        llm: 節點使用的聊天模型（決定是否加上 cache_control 斷點）
+        state: 圖狀態
+        instructions: 節點的角色指示與動態內容（辯論歷史、過去經驗等）
+        extra_context: 多個節點共用的第二層前綴（如風險辯論者共用的交易員計劃）
+        excerpt_when_uncached: 供應商不快取前綴時以報告節錄取代完整前綴（風險辯論者使用）
+    """
+    return [
+        shared_prefix_message(llm, state, extra_context, excerpt_when_uncached),
+        HumanMessage(content=instructions),
+    ]
+
+
+def record_prompt_cache_usage(node_name: str, response) -> None:
+    """記錄一次 LLM 呼叫的輸入 token 與供應商快取讀取 / 寫入的 token 數"""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage or (getattr(response, "response_metadata", None) or {}).get("llm_cache_hit"):
+        return
+    input_tokens = int(usage.get("input_tokens") or 0)
+    details = usage.get("input_token_details") or {}
+    cache_read = int(details.get("cache_read") or 0)
+    cache_creation = int(details.get("cache_creation") or 0)
+    if not input_tokens:
+        return
+
+    logger.info(
+        f"[提示快取] {node_name} 輸入 {input_tokens} tokens，"
+        f"快取讀取 {cache_read}，快取寫入 {cache_creation}"
+    )
+    context = get_current_analysis_context()
+    if context is not None:
+        context.record_llm_usage(node_name, input_tokens, cache_read, cache_creation)
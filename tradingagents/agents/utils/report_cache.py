@@ -0,0 +1,177 @@
+"""
+內容定址的節點報告快取
+
+每個 LLM 節點（分析師、多空研究員、研究經理、交易員、風險辯論與風險經理）在呼叫 LLM 前，
+以「節點名稱 + 提示詞版本 + 模型 ID + 完整提示詞」的雜湊查詢持久化快取。
+提示詞已包含工具資料、上游報告與歷史記憶，因此輸入完全相同時直接沿用先前的輸出：
+
+- 同一股票與日期以不同研究深度重跑時，未改變的分析師報告直接命中
+- 只有部分資料變動（如新聞更新）時，只有受影響的節點與其下游重新呼叫 LLM
+- 無法辨識模型 ID 的 LLM（如測試用假物件）不使用快取
+- 未命中時在 LLM 並發預算內呼叫（批次分析時限制所有圖同時進行中的 LLM 呼叫數）
+- 分析綁定 cassette 時改由 cassette 錄製 / 重播（不讀寫報告快取，錄製內容才會完整）
+- 實際呼叫 LLM 時記錄供應商提示詞快取讀取 / 寫入的 token 數（依節點彙總）
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+from tradingagents.agents.utils.cassette import get_active_cassette
+from tradingagents.agents.utils.llm_budget import allm_slot, llm_slot
+from tradingagents.agents.utils.prompt_prefix import record_prompt_cache_usage
+
+# 匯入日誌模組
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+
+# 節點輸出格式或後處理改變時遞增，使舊快取失效
+PROMPT_VERSION = "1"
+
+_NAMESPACE = "llm_reports"
+
+
+def _model_id(llm) -> Optional[str]:
+    """取得 LLM 的模型 ID（含影響輸出的取樣參數），無法辨識時回傳 None"""
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+    if not isinstance(model, str) or not model:
+        return None
+    temperature = getattr(llm, "temperature", None)
+    max_tokens = getattr(llm, "max_tokens", None)
+    return f"{type(llm).__name__}:{model}:t={temperature}:m={max_tokens}"
+
+
+def _serialize_prompt(prompt: Any) -> str:
+    """將字串、訊息物件或 dict 訊息列表轉為穩定的字串"""
+    def _default(obj):
+        if isinstance(obj, BaseMessage):
+            return {"type": obj.type, "content": obj.content}
+        return str(obj)
+
+    if isinstance(prompt, str):
+        return prompt
+    return json.dumps(prompt, ensure_ascii=False, sort_keys=True, default=_default)
+
+
+def report_cache_key(node_name: str, llm, prompt: Any) -> Optional[str]:
+    """計算節點輸出的內容位址，無法辨識模型時回傳 None（不使用快取）"""
+    model_id = _model_id(llm)
+    if model_id is None:
+        return None
+    digest = hashlib.sha256()
+    for part in (node_name, PROMPT_VERSION, model_id, _serialize_prompt(prompt)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return f"{node_name}:{digest.hexdigest()}"
+
+
+def _is_enabled() -> bool:
+    from tradingagents.dataflows.config import get_config
+    return bool(get_config().get("report_cache_enabled", True))
+
+
+def _get_cache():
+    from tradingagents.dataflows.tiered_cache import get_tiered_cache
+    return get_tiered_cache()
+
+
+def _lookup(node_name: str, llm, prompt: Any, cache) -> tuple:
+    """回傳 (快取鍵, 快取的回應訊息)；停用或無法辨識模型時鍵為 None"""
+    if not _is_enabled():
+        return None, None
+    key = report_cache_key(node_name, llm, prompt)
+    if key is None:
+        return None, None
+    cache = cache or _get_cache()
+    try:
+        content = cache.get(_NAMESPACE, key)
+    except Exception as e:
+        logger.debug(f"[報告快取] 讀取失敗: {e}")
+        return key, None
+    if content is None:
+        return key, None
+    logger.info(f"[報告快取] {node_name} 命中，跳過 LLM 呼叫（長度: {len(content)}）")
+    return key, AIMessage(content=content)
+
+
+def _store(key: Optional[str], response, cache, min_chars: int) -> None:
+    if key is None:
+        return
+    content = getattr(response, "content", None)
+    # 只快取有實質內容的文字回應（過短的回應由呼叫端重試，不可被快取固定下來）
+    if not isinstance(content, str) or len(content.strip()) <= min_chars:
+        return
+    try:
+        (cache or _get_cache()).set(_NAMESPACE, key, content)
+    except Exception as e:
+        logger.debug(f"[報告快取] 寫入失敗: {e}")
+
+
+def _cassette_model(llm) -> str:
+    return _model_id(llm) or type(llm).__name__
+
+
+def _replay(cassette, llm, prompt: Any) -> AIMessage:
+    return AIMessage(content=cassette.replay("llm", _cassette_model(llm), prompt))
+
+
+def _record(cassette, llm, prompt: Any, response) -> None:
+    content = getattr(response, "content", None)
+    if isinstance(content, str):
+        cassette.record("llm", _cassette_model(llm), prompt, content)
+
+
+def invoke_llm_cached(llm, prompt: Any, node_name: str, cache=None, min_chars: int = 0):
+    """以內容定址快取包裝 llm.invoke（命中時回傳 AIMessage）
+
+    Args:
+        llm: LangChain 聊天模型
+        prompt: 傳給 llm.invoke 的提示詞（字串或訊息列表）
+        node_name: 節點名稱（快取鍵的一部分）
+        cache: TieredCache 實例，預設為全局分層快取
+        min_chars: 回應長度不超過此值時不寫入快取
+    """
+    cassette = get_active_cassette()
+    if cassette is not None:
+        if cassette.replaying:
+            return _replay(cassette, llm, prompt)
+        with llm_slot():
+            response = llm.invoke(prompt)
+        record_prompt_cache_usage(node_name, response)
+        _record(cassette, llm, prompt, response)
+        return response
+
+    key, cached = _lookup(node_name, llm, prompt, cache)
+    if cached is not None:
+        return cached
+    with llm_slot():
+        response = llm.invoke(prompt)
+    record_prompt_cache_usage(node_name, response)
+    _store(key, response, cache, min_chars)
+    return response
+
+
+async def ainvoke_llm_cached(llm, prompt: Any, node_name: str, cache=None, min_chars: int = 0):
+    """invoke_llm_cached 的非同步版本（快取查詢可能讀取檔案或資料庫，交由執行緒池執行）"""
+    cassette = get_active_cassette()
+    if cassette is not None:
+        if cassette.replaying:
+            return _replay(cassette, llm, prompt)
+        async with allm_slot():
+            response = await llm.ainvoke(prompt)
+        record_prompt_cache_usage(node_name, response)
+        _record(cassette, llm, prompt, response)
+        return response
+
+    key, cached = await asyncio.to_thread(_lookup, node_name, llm, prompt, cache)
+    if cached is not None:
+        return cached
+    async with allm_slot():
+        response = await llm.ainvoke(prompt)
+    record_prompt_cache_usage(node_name, response)
+    _store(key, response, cache, min_chars)
+    return response
@@ -0,0 +1,14 @@
+# TradingAgents/backtest/__init__.py
+
+from .engine import MEMORY_MODES, POINT_IN_TIME_ANALYSTS, Backtester
+from .metrics import compute_metrics, forward_returns, max_drawdown, signals_to_positions
+
+__all__ = [
+    "Backtester",
+    "MEMORY_MODES",
+    "POINT_IN_TIME_ANALYSTS",
+    "compute_metrics",
+    "forward_returns",
+    "max_drawdown",
+    "signals_to_positions",
+]
@@ -0,0 +1,217 @@
+# TradingAgents/backtest/engine.py
+"""
+歷史區間回測引擎
+
+在交易日曆上對單一股票逐日執行 propagate，並以訊號計算績效：
+
+- 時點資料：回測前一次補齊整個區間（含分析回看期與持有期）的日K線到列式價格儲存，
+  各日期的分析直接切片讀取；回測期間圖設定啟用 point_in_time_data，不使用即時報價，
+  結束後還原原本的設定
+- 分析師限制：只有日K線能依分析日取時點資料；新聞、社群情緒與基本面工具抓取的是
+  即時資料，會引入未來資訊（look-ahead bias），因此回測只允許市場分析師
+- 記憶模式 frozen（預設）：回測期間不更新記憶，各日期互不相依，以執行緒池並行分析
+- 記憶模式 learn：依日期順序分析，持有期結束（出場日不晚於目前分析日）的決策才進行反思，
+  記憶只包含分析當下已知的結果
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from tradingagents.agents.utils.agent_utils import calc_start_date
+from tradingagents.dataflows.config import use_config
+from tradingagents.dataflows.optimized_us_data import get_optimized_us_data_provider
+
+from .metrics import compute_metrics, forward_returns
+
+# 匯入統一日誌系統
+from tradingagents.utils.logging_init import get_logger
+logger = get_logger("backtest")
+
+
+MEMORY_MODES = ("frozen", "learn")
+
+# 資料能依分析日取時點版本的分析師（其餘分析師的工具抓取即時資料）
+POINT_IN_TIME_ANALYSTS = ("market",)
+
+# 持有期所需的額外日曆天數（涵蓋週末與假日）
+_EXIT_BUFFER_DAYS = 10
+
+
+class Backtester:
+    """單一股票的歷史區間回測"""
+
+    def __init__(self, graph, holding_days: int = 1, memory_mode: str = "frozen",
+                 max_workers: int = 4, allow_short: bool = False):
+        """
+        Args:
+            graph: TradingAgentsGraph 實例，只能包含市場分析師
+                （run 期間啟用其 point_in_time_data 設定，結束後還原）
+            holding_days: 每個訊號的持有交易日數
+            memory_mode: frozen（不更新記憶，日期並行）或 learn（依序分析並反思）
+            max_workers: frozen 模式同時分析的日期數
+            allow_short: 賣出訊號是否建立空頭部位（否則視為空手）
+        """
+        if memory_mode not in MEMORY_MODES:
+            raise ValueError(f"不支援的記憶模式: {memory_mode}（可用: {', '.join(MEMORY_MODES)}）")
+        if holding_days < 1:
+            raise ValueError(f"持有天數必須大於 0: {holding_days}")
+        unsupported = [a for a in graph.selected_analysts if a not in POINT_IN_TIME_ANALYSTS]
+        if unsupported:
+            raise ValueError(
+                f"回測不支援分析師: {', '.join(unsupported)}（其資料為即時抓取，會引入未來資訊；"
+                f"可用: {', '.join(POINT_IN_TIME_ANALYSTS)}）"
+            )
+        self.graph = graph
+        self.holding_days = holding_days
+        self.memory_mode = memory_mode
+        self.max_workers = max(1, max_workers)
+        self.allow_short = allow_short
+
+    def load_prices(self, ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """一次補齊回測所需的日K線（分析回看期起至最後一個訊號的出場日）"""
+        fetch_start = calc_start_date(start_date)
+        fetch_end = (
+            pd.Timestamp(end_date) + pd.Timedelta(days=self.holding_days * 2 + _EXIT_BUFFER_DAYS)
+        ).strftime("%Y-%m-%d")
+        with use_config(self.graph.config):
+            frame = get_optimized_us_data_provider().get_price_history(ticker, fetch_start, fetch_end)
+        if frame is None or frame.empty:
+            raise ValueError(f"{ticker} 在 {fetch_start} 至 {fetch_end} 沒有價格資料，無法回測")
+        return frame
+
+    def trading_calendar(self, prices: pd.DataFrame, start_date: str, end_date: str,
+                         step: int = 1) -> np.ndarray:
+        """回傳區間內交易日在價格序列中的位置（每 step 個交易日取一個）"""
+        dates = prices.index.strftime("%Y-%m-%d").to_numpy()
+        in_range = np.flatnonzero((dates >= start_date) & (dates <= end_date))
+        return in_range[::max(1, step)]
+
+    def run(self, ticker: str, start_date: str, end_date: str, step: int = 1,
+            progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """執行回測
+
+        Args:
+            ticker: 股票代碼
+            start_date: 回測起始日（YYYY-MM-DD，含）
+            end_date: 回測結束日（YYYY-MM-DD，含）
+            step: 每隔幾個交易日分析一次
+            progress_callback: 可選，每個日期完成時接收該日期的紀錄
+
+        Returns:
+            dict: ticker、start_date、end_date、holding_days、memory_mode、
+                  records（每個日期的 action / 報酬 / 錯誤）、metrics
+        """
+        # 市場資料只取分析日以前的歷史K線，避免即時報價引入未來資訊；
+        # 只在本次回測期間啟用，結束後還原，圖可繼續用於一般分析
+        previous = self.graph.config.get("point_in_time_data")
+        self.graph.config["point_in_time_data"] = True
+        try:
+            return self._run(ticker.upper().strip(), start_date, end_date, step, progress_callback)
+        finally:
+            if previous is None:
+                self.graph.config.pop("point_in_time_data", None)
+            else:
+                self.graph.config["point_in_time_data"] = previous
+
+    def _run(self, ticker: str, start_date: str, end_date: str, step: int,
+             progress_callback: Optional[Callable[[Dict[str, Any]], None]]) -> Dict[str, Any]:
+        prices = self.load_prices(ticker, start_date, end_date)
+        dates = prices.index.strftime("%Y-%m-%d").to_numpy()
+        closes = prices["Close"].to_numpy(dtype=np.float64)
+        signal_index = self.trading_calendar(prices, start_date, end_date, step)
+        signal_dates = [str(dates[i]) for i in signal_index]
+        logger.info(
+            f"[回測] {ticker} {start_date} ~ {end_date}: {len(signal_dates)} 個交易日，"
+            f"持有 {self.holding_days} 日，記憶模式 {self.memory_mode}"
+        )
+
+        returns = forward_returns(closes, signal_index, self.holding_days)
+        if self.memory_mode == "frozen":
+            outcomes = self._run_parallel(ticker, signal_dates, progress_callback)
+        else:
+            outcomes = self._run_sequential(ticker, signal_dates, signal_index, dates, returns, progress_callback)
+
+        records = []
+        for date, outcome, ret in zip(signal_dates, outcomes, returns):
+            signal = outcome["signal"] or {}
+            records.append({
+                "date": date,
+                "action": signal.get("action", "持有"),
+                "target_price": signal.get("target_price"),
+                "confidence": signal.get("confidence"),
+                "forward_return": None if np.isnan(ret) else float(ret),
+                "error": outcome["error"],
+            })
+
+        metrics = compute_metrics([r["action"] for r in records], returns, self.allow_short)
+        metrics["failed_dates"] = sum(1 for r in records if r["error"])
+        logger.info(
+            f"[回測] {ticker} 完成: 報酬 {metrics['total_return']:+.2%}"
+            f"（買入持有 {metrics['benchmark_return']:+.2%}），命中率 {metrics['hit_rate']:.1%}，"
+            f"最大回撤 {metrics['max_drawdown']:.2%}，失敗 {metrics['failed_dates']} 日"
+        )
+        return {
+            "ticker": ticker,
+            "start_date": start_date,
+            "end_date": end_date,
+            "holding_days": self.holding_days,
+            "memory_mode": self.memory_mode,
+            "records": records,
+            "metrics": metrics,
+        }
+
+    def _propagate_date(self, ticker: str, date: str) -> Dict[str, Any]:
+        """分析單一日期；失敗時記錄錯誤（該日期視為空手），不中斷回測"""
+        try:
+            final_state, signal = self.graph.propagate(ticker, date)
+            return {"final_state": final_state, "signal": signal, "error": None}
+        except Exception as e:
+            logger.error(f"[回測] {ticker}@{date} 分析失敗: {e}")
+            return {"final_state": None, "signal": None, "error": str(e)}
+
+    def _run_parallel(self, ticker, signal_dates: List[str], progress_callback) -> List[Dict[str, Any]]:
+        outcomes = {}
+        workers = min(self.max_workers, max(1, len(signal_dates)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backtest") as executor:
+            futures = {
+                executor.submit(copy_context().run, self._propagate_date, ticker, date): date
+                for date in signal_dates
+            }
+            for future in as_completed(futures):
+                date = futures[future]
+                outcomes[date] = future.result()
+                if progress_callback:
+                    progress_callback({"date": date, **outcomes[date]})
+        return [outcomes[date] for date in signal_dates]
+
+    def _run_sequential(self, ticker, signal_dates: List[str], signal_index: np.ndarray, dates: np.ndarray,
+                        returns: np.ndarray, progress_callback) -> List[Dict[str, Any]]:
+        outcomes = []
+        pending = []  # (出場日, 分析狀態, 持有期報酬)，依出場日排序
+        for i, date in enumerate(signal_dates):
+            # 只反思出場日不晚於目前分析日的決策（分析當下已知的結果）
+            while pending and pending[0][0] <= date:
+                self._reflect(*pending.pop(0)[1:])
+
+            outcome = self._propagate_date(ticker, date)
+            outcomes.append(outcome)
+            if progress_callback:
+                progress_callback({"date": date, **outcome})
+            if outcome["final_state"] is not None and not np.isnan(returns[i]):
+                exit_date = str(dates[signal_index[i] + self.holding_days])
+                pending.append((exit_date, outcome["final_state"], float(returns[i])))
+
+        # 回測結束後補上其餘已知結果，供之後的分析使用
+        for _, state, ret in pending:
+            self._reflect(state, ret)
+        return outcomes
+
+    def _reflect(self, final_state, ret: float) -> None:
+        try:
+            self.graph.reflect_and_remember(f"{ret:+.2%}", final_state=final_state)
+        except Exception as e:
+            logger.warning(f"[回測] 反思失敗: {e}")
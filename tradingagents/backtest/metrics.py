@@ -0,0 +1,93 @@
+# TradingAgents/backtest/metrics.py
+"""
+回測績效指標（向量化 NumPy）
+
+以 SignalProcessor 的 action 轉為部位，搭配每個訊號日之後 holding_days 個交易日的報酬，
+計算策略報酬、命中率、最大回撤等指標。報酬無法計算（資料不足）的訊號不納入統計。
+權益曲線依訊號順序複利；訊號間隔小於持有期時各持有期重疊，總報酬為近似值。
+"""
+
+from typing import Dict, Sequence
+
+import numpy as np
+
+# SignalProcessor action -> 部位方向
+_ACTION_DIRECTIONS = {"買入": 1.0, "持有": 0.0, "賣出": -1.0}
+
+
+def signals_to_positions(actions: Sequence[str], allow_short: bool = False) -> np.ndarray:
+    """將 action 序列轉為部位（買入 1、持有 0、賣出 -1 或不允許放空時為 0）"""
+    directions = np.array([_ACTION_DIRECTIONS.get(a, 0.0) for a in actions], dtype=np.float64)
+    if not allow_short:
+        directions = np.maximum(directions, 0.0)
+    return directions
+
+
+def signal_directions(actions: Sequence[str]) -> np.ndarray:
+    """將 action 序列轉為看多 / 看空方向（不受是否放空影響，用於命中率）"""
+    return np.array([_ACTION_DIRECTIONS.get(a, 0.0) for a in actions], dtype=np.float64)
+
+
+def forward_returns(closes: np.ndarray, signal_index: np.ndarray, holding_days: int = 1) -> np.ndarray:
+    """計算每個訊號日持有 holding_days 個交易日的報酬，超出資料範圍時為 NaN
+
+    Args:
+        closes: 完整交易日收盤價序列
+        signal_index: 訊號日在 closes 中的位置
+        holding_days: 持有交易日數
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    signal_index = np.asarray(signal_index, dtype=np.int64)
+    exit_index = signal_index + holding_days
+    valid = exit_index < len(closes)
+    result = np.full(len(signal_index), np.nan)
+    result[valid] = closes[exit_index[valid]] / closes[signal_index[valid]] - 1.0
+    return result
+
+
+def max_drawdown(equity: np.ndarray) -> float:
+    """權益曲線的最大回撤（負值，無回撤時為 0）"""
+    if len(equity) == 0:
+        return 0.0
+    peaks = np.maximum.accumulate(np.concatenate(([1.0], equity)))[1:]
+    return float(np.min(equity / peaks - 1.0, initial=0.0))
+
+
+def compute_metrics(actions: Sequence[str], returns: np.ndarray, allow_short: bool = False) -> Dict[str, float]:
+    """計算回測績效指標
+
+    Args:
+        actions: 每個訊號日的 action（買入 / 持有 / 賣出）
+        returns: 每個訊號日的持有期報酬（forward_returns 的結果）
+        allow_short: 賣出訊號是否建立空頭部位（否則視為空手）
+
+    Returns:
+        dict: total_return、benchmark_return、hit_rate、max_drawdown、
+              benchmark_max_drawdown、exposure、num_signals、num_trades、avg_trade_return
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    valid = ~np.isnan(returns)
+    returns = returns[valid]
+    positions = signals_to_positions(actions, allow_short)[valid]
+    directions = signal_directions(actions)[valid]
+
+    strategy = positions * returns
+    equity = np.cumprod(1.0 + strategy)
+    benchmark = np.cumprod(1.0 + returns)
+
+    # 命中率：買入後上漲、賣出後下跌視為命中，持有不列入
+    called = directions != 0
+    hits = np.sign(returns[called]) == directions[called]
+    trades = positions != 0
+
+    return {
+        "total_return": float(equity[-1] - 1.0) if len(equity) else 0.0,
+        "benchmark_return": float(benchmark[-1] - 1.0) if len(benchmark) else 0.0,
+        "hit_rate": float(hits.mean()) if hits.size else float("nan"),
+        "max_drawdown": max_drawdown(equity),
+        "benchmark_max_drawdown": max_drawdown(benchmark),
+        "exposure": float(trades.mean()) if len(trades) else 0.0,
+        "num_signals": int(len(returns)),
+        "num_trades": int(trades.sum()),
+        "avg_trade_return": float(strategy[trades].mean()) if trades.any() else 0.0,
+    }
@@ -670,7 +670,10 @@ class TokenTracker:
 
 # 全局配置管理器實例 - 使用專案根目錄的配置
 def _get_project_config_dir():
-    """取得專案根目錄的配置目錄"""
+    """取得專案根目錄的配置目錄（可用 TRADINGAGENTS_CONFIG_DIR 指定其他目錄）"""
+    env_config_dir = os.getenv("TRADINGAGENTS_CONFIG_DIR")
+    if env_config_dir:
+        return env_config_dir
     # 從當前檔案位置推斷專案根目錄
     current_file = Path(__file__)  # tradingagents/config/config_manager.py
     project_root = current_file.parent.parent.parent  # 向上三級到專案根目錄
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+快取中繼資料索引
+以單一 SQLite 檔（WAL 模式）保存 StockDataCache 的中繼資料，取代每筆一個 *_meta.json。
+
+- 依 (symbol, data_type, market_type, data_source) 與快取時間建立索引，查找不再線性掃描
+- 支援 TTL 到期查詢與依最後存取時間（LRU）/ 檔案數 / 總大小的淘汰，淘汰時同步刪除資料檔
+- WAL + busy_timeout 讓多個 worker 行程可共用同一個快取目錄
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# 匯入日誌模組
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('agents')
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    cache_key      TEXT PRIMARY KEY,
+    symbol         TEXT,
+    data_type      TEXT,
+    market_type    TEXT,
+    data_source    TEXT,
+    start_date     TEXT,
+    end_date       TEXT,
+    file_path      TEXT,
+    file_format    TEXT,
+    content_length INTEGER,
+    size_bytes     INTEGER NOT NULL DEFAULT 0,
+    cached_at      REAL NOT NULL,
+    last_access    REAL NOT NULL,
+    extra          TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_cache_lookup
+    ON cache_entries (symbol, data_type, market_type, data_source, cached_at);
+CREATE INDEX IF NOT EXISTS idx_cache_type_cached ON cache_entries (data_type, cached_at);
+CREATE INDEX IF NOT EXISTS idx_cache_type_access ON cache_entries (data_type, last_access);
+CREATE TABLE IF NOT EXISTS index_state (
+    name  TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# 直接對應資料表欄位的中繼資料鍵，其餘鍵存入 extra（JSON）
+_COLUMNS = (
+    "symbol", "data_type", "market_type", "data_source", "start_date",
+    "end_date", "file_path", "file_format", "content_length",
+)
+
+
+class CacheMetadataIndex:
+    """StockDataCache 的 SQLite 中繼資料索引（執行緒與行程安全）"""
+
+    def __init__(self, db_path: str):
+        self.db_path = str(db_path)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        # 每個執行緒 / 行程各自持有連線（sqlite3 連線不可跨執行緒或 fork 共用）
+        self._local = threading.local()
+        # executescript 自行提交，CREATE ... IF NOT EXISTS 可由多個行程重複執行
+        self._connect().executescript(_SCHEMA)
+
+    # ------------------------------------------------------------------
+    # 連線
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    class _Transaction:
+        """BEGIN IMMEDIATE 交易：先取得寫入鎖，避免多行程同時讀後寫"""
+
+        def __init__(self, conn: sqlite3.Connection):
+            self.conn = conn
+
+        def __enter__(self) -> sqlite3.Connection:
+            self.conn.execute("BEGIN IMMEDIATE")
+            return self.conn
+
+        def __exit__(self, exc_type, exc, tb):
+            self.conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+            return False
+
+    def _transaction(self) -> "_Transaction":
+        return self._Transaction(self._connect())
+
+    # ------------------------------------------------------------------
+    # 讀寫
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _row_to_metadata(row: sqlite3.Row) -> Dict[str, Any]:
+        metadata = json.loads(row["extra"]) if row["extra"] else {}
+        for column in _COLUMNS:
+            metadata[column] = row[column]
+        metadata["cached_at"] = datetime.fromtimestamp(row["cached_at"]).isoformat()
+        metadata["last_access"] = row["last_access"]
+        metadata["size_bytes"] = row["size_bytes"]
+        return metadata
+
+    def put(self, cache_key: str, metadata: Dict[str, Any], size_bytes: int = 0,
+            cached_at: float = None) -> None:
+        """新增或覆寫一筆中繼資料"""
+        now = time.time()
+        cached_at = cached_at if cached_at is not None else now
+        extra = {k: v for k, v in metadata.items()
+                 if k not in _COLUMNS and k not in ("cached_at", "last_access", "size_bytes")}
+        values = [metadata.get(column) for column in _COLUMNS]
+        with self._transaction() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO cache_entries (cache_key, {', '.join(_COLUMNS)}, "
+                f"size_bytes, cached_at, last_access, extra) "
+                f"VALUES (?, {', '.join('?' * len(_COLUMNS))}, ?, ?, ?, ?)",
+                [cache_key, *values, int(size_bytes), cached_at, now,
+                 json.dumps(extra, ensure_ascii=False, default=str) if extra else None],
+            )
+
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """取得單筆中繼資料，不存在時回傳 None"""
+        row = self._connect().execute(
+            "SELECT * FROM cache_entries WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        return self._row_to_metadata(row) if row is not None else None
+
+    def touch(self, cache_key: str) -> None:
+        """更新最後存取時間（LRU 淘汰依據）"""
+        try:
+            self._connect().execute(
+                "UPDATE cache_entries SET last_access = ? WHERE cache_key = ?",
+                (time.time(), cache_key),
+            )
+        except sqlite3.OperationalError as e:
+            # 其他行程長時間持有寫入鎖時略過，不影響讀取
+            logger.debug(f"更新快取存取時間失敗: {e}")
+
+    def find(self, symbol: str = None, data_type: str = None, market_type: str = None,
+             data_source: str = None, max_age_seconds: float = None) -> List[str]:
+        """依條件查找快取鍵（None 表示不限），最新的在前"""
+        clauses, params = [], []
+        for column, value in (("symbol", symbol), ("data_type", data_type),
+                              ("market_type", market_type), ("data_source", data_source)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if max_age_seconds is not None:
+            clauses.append("cached_at > ?")
+            params.append(time.time() - max_age_seconds)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT cache_key FROM cache_entries {where} ORDER BY cached_at DESC", params
+        ).fetchall()
+        return [row["cache_key"] for row in rows]
+
+    def entries(self, data_type: str = None) -> List[Dict[str, Any]]:
+        """列出中繼資料（含 cache_key），最新的在前"""
+        if data_type is None:
+            rows = self._connect().execute(
+                "SELECT * FROM cache_entries ORDER BY cached_at DESC").fetchall()
+        else:
+            rows = self._connect().execute(
+                "SELECT * FROM cache_entries WHERE data_type = ? ORDER BY cached_at DESC",
+                (data_type,)).fetchall()
+        result = []
+        for row in rows:
+            metadata = self._row_to_metadata(row)
+            metadata["cache_key"] = row["cache_key"]
+            result.append(metadata)
+        return result
+
+    # ------------------------------------------------------------------
+    # 到期與淘汰
+    # ------------------------------------------------------------------
+
+    def _delete_rows(self, conn: sqlite3.Connection, where: str, params: Iterable) -> List[str]:
+        """在交易中刪除符合條件的列，回傳其資料檔路徑（無檔案的列為空字串）"""
+        rows = conn.execute(
+            f"SELECT cache_key, file_path FROM cache_entries WHERE {where}", list(params)
+        ).fetchall()
+        if rows:
+            conn.executemany("DELETE FROM cache_entries WHERE cache_key = ?",
+                             [(row["cache_key"],) for row in rows])
+        return [row["file_path"] or "" for row in rows]
+
+    @staticmethod
+    def _unlink(paths: List[str]) -> None:
+        for path in paths:
+            if not path:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"刪除快取檔案失敗: {path} ({e})")
+
+    def delete_expired(self, max_age_seconds: float, data_type: str = None) -> int:
+        """刪除超過指定時間的項目與其資料檔，回傳刪除數量"""
+        where = "cached_at < ?"
+        params = [time.time() - max_age_seconds]
+        if data_type is not None:
+            where += " AND data_type = ?"
+            params.append(data_type)
+        with self._transaction() as conn:
+            paths = self._delete_rows(conn, where, params)
+        self._unlink(paths)
+        return len(paths)
+
+    def evict(self, data_type: str = None, max_entries: int = None,
+              max_bytes: int = None) -> int:
+        """
+        依最後存取時間淘汰項目，直到數量與總大小都在預算內
+
+        Args:
+            data_type: 只在此資料類型內淘汰，None 表示全部
+            max_entries: 項目數上限
+            max_bytes: 資料檔總大小上限
+
+        Returns:
+            int: 淘汰的項目數
+        """
+        scope, params = ("WHERE data_type = ?", [data_type]) if data_type else ("", [])
+        with self._transaction() as conn:
+            count, total = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM cache_entries {scope}", params
+            ).fetchone()
+            over_count = max(0, count - max_entries) if max_entries is not None else 0
+            over_bytes = max(0, total - max_bytes) if max_bytes is not None else 0
+            if not over_count and not over_bytes:
+                return 0
+
+            victims, freed = [], 0
+            cursor = conn.execute(
+                f"SELECT cache_key, size_bytes FROM cache_entries {scope} ORDER BY last_access ASC",
+                params,
+            )
+            for row in cursor:
+                if len(victims) >= over_count and freed >= over_bytes:
+                    break
+                victims.append(row["cache_key"])
+                freed += row["size_bytes"]
+            placeholders = ", ".join("?" * len(victims))
+            paths = self._delete_rows(conn, f"cache_key IN ({placeholders})", victims)
+        self._unlink(paths)
+        logger.info(f"快取淘汰 {len(victims)} 筆 ({data_type or 'all'})，釋放 {freed / (1024 * 1024):.2f} MB")
+        return len(victims)
+
+    # ------------------------------------------------------------------
+    # 統計與遷移
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """各資料類型的項目數與總大小"""
+        rows = self._connect().execute(
+            "SELECT data_type, COUNT(*) AS n, COALESCE(SUM(size_bytes), 0) AS size, "
+            "SUM(CASE WHEN size_bytes = 0 THEN 1 ELSE 0 END) AS empty "
+            "FROM cache_entries GROUP BY data_type"
+        ).fetchall()
+        return {row["data_type"]: {"count": row["n"], "size_bytes": row["size"],
+                                   "empty": row["empty"]} for row in rows}
+
+    def import_legacy_metadata(self, metadata_dir: Path) -> int:
+        """一次性匯入舊版 *_meta.json（匯入後即不再讀取）"""
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM index_state WHERE name = 'legacy_imported'").fetchone():
+                return 0
+            imported = 0
+            for metadata_file in Path(metadata_dir).glob("*_meta.json"):
+                try:
+                    with open(metadata_file, 'r', encoding='utf-8') as f:
+                        metadata = json.load(f)
+                    cached_at = datetime.fromisoformat(metadata['cached_at']).timestamp()
+                except (OSError, ValueError, KeyError, TypeError):
+                    continue
+                file_path = metadata.get('file_path') or ""
+                try:
+                    size_bytes = os.path.getsize(file_path) if file_path else 0
+                except OSError:
+                    size_bytes = 0
+                cache_key = metadata_file.stem[:-len('_meta')]
+                extra = {k: v for k, v in metadata.items() if k not in _COLUMNS and k != "cached_at"}
+                conn.execute(
+                    f"INSERT OR IGNORE INTO cache_entries (cache_key, {', '.join(_COLUMNS)}, "
+                    f"size_bytes, cached_at, last_access, extra) "
+                    f"VALUES (?, {', '.join('?' * len(_COLUMNS))}, ?, ?, ?, ?)",
+                    [cache_key, *[metadata.get(c) for c in _COLUMNS], size_bytes, cached_at,
+                     cached_at, json.dumps(extra, ensure_ascii=False, default=str) if extra else None],
+                )
+                imported += 1
+            conn.execute("INSERT OR REPLACE INTO index_state (name, value) VALUES ('legacy_imported', ?)",
+                         (datetime.now().isoformat(),))
+        if imported:
+            logger.info(f"已將 {imported} 筆舊版快取中繼資料匯入索引")
+        return imported
@@ -5,13 +5,15 @@
 """
 
 import os
-import json
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 from typing import Optional, Dict, Any, Union, List
 import hashlib
 
+from .cache_index import CacheMetadataIndex
+from .tiered_cache import NAMESPACE_STALE_GRACE
+
 # 匯入日誌模組
 from tradingagents.utils.logging_manager import get_logger
 logger = get_logger('agents')
@@ -25,15 +27,14 @@ class StockDataCache:
         初始化快取管理器
 
         Args:
-            cache_dir: 快取目錄路徑，預設為 tradingagents/dataflows/data_cache
+            cache_dir: 快取目錄路徑，預設為設定的 data_cache_dir
         """
         if cache_dir is None:
-            # 取得當前檔案所在目錄
-            current_dir = Path(__file__).parent
-            cache_dir = current_dir / "data_cache"
+            from .config import get_config
+            cache_dir = get_config()["data_cache_dir"]
 
         self.cache_dir = Path(cache_dir)
-        self.cache_dir.mkdir(exist_ok=True)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
 
         # 建立子目錄 - 美股市場分類
         self.us_stock_dir = self.cache_dir / "us_stocks"
@@ -46,10 +47,9 @@ class StockDataCache:
                         self.us_fundamentals_dir, self.metadata_dir]:
             dir_path.mkdir(exist_ok=True)
 
-        # 記憶體 metadata 索引：避免重複掃描檔案系統
-        # 格式: {cache_key: metadata_dict}
-        self._metadata_index: Dict[str, Dict[str, Any]] = {}
-        self._metadata_index_built = False
+        # 中繼資料索引：單一 SQLite 檔（WAL），多個 worker 行程可共用同一個快取目錄
+        self._index = CacheMetadataIndex(self.metadata_dir / "cache_index.sqlite3")
+        self._index.import_legacy_metadata(self.metadata_dir)
 
         # 快取配置 - 美股市場TTL設定
         # 同一交易日內重複分析同一股票時，較長的 TTL 可避免重複 API 呼叫
@@ -71,6 +71,14 @@ class StockDataCache:
             }
         }
 
+        # stale-while-revalidate 寬限期（小時，預設 0 不啟用），由 CACHE_STALE_GRACE 逐類型開啟
+        # 例: CACHE_STALE_GRACE=us_fundamentals=43200 表示基本面過期後 12 小時內仍可先回傳舊資料
+        for cache_type, type_config in self.cache_config.items():
+            type_config['stale_grace_hours'] = NAMESPACE_STALE_GRACE.get(cache_type, 0) / 3600
+
+        # 快取總大小上限（MB），超過時依最後存取時間淘汰
+        self.max_cache_size_mb = float(os.getenv('CACHE_MAX_SIZE_MB', '1024'))
+
         # 內容長度限制配置（檔案快取預設不限制）
         self.content_length_config = {
             'max_content_length': int(os.getenv('MAX_CACHE_CONTENT_LENGTH', '50000')),  # 50K字元
@@ -82,41 +90,33 @@ class StockDataCache:
         logger.info("資料庫快取管理器初始化完成")
         logger.info("   美股資料: 已配置")
 
-    def _build_metadata_index(self):
-        """建構記憶體 metadata 索引，避免每次查找都掃描檔案系統"""
-        if self._metadata_index_built:
-            return
+    def _find_in_index(self, max_age_hours: float = None, **filters) -> list:
+        """從中繼資料索引查找符合條件的 cache key 清單（最新的在前）"""
+        max_age_seconds = max_age_hours * 3600 if max_age_hours is not None else None
+        return self._index.find(max_age_seconds=max_age_seconds, **filters)
+
+    def _enforce_limits(self, data_type: str, market_type: str = 'us'):
+        """執行 max_files 與總大小上限，超出時淘汰最久未使用的項目（同時刪除資料檔）"""
         try:
-            for metadata_file in self.metadata_dir.glob("*_meta.json"):
-                try:
-                    with open(metadata_file, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-                    cache_key = metadata_file.stem.replace('_meta', '')
-                    self._metadata_index[cache_key] = metadata
-                except (json.JSONDecodeError, IOError):
-                    continue
-            self._metadata_index_built = True
-            logger.debug(f"metadata 索引建構完成，共 {len(self._metadata_index)} 筆")
-        except OSError as e:
-            logger.warning(f"建構 metadata 索引失敗: {e}")
-
-    def _index_metadata(self, cache_key: str, metadata: Dict[str, Any]):
-        """將新的 metadata 加入記憶體索引"""
-        self._metadata_index[cache_key] = metadata
-
-    def _find_in_index(self, **filters) -> list:
-        """從記憶體索引中查找符合條件的 cache key 清單"""
-        self._build_metadata_index()
-        results = []
-        for cache_key, metadata in self._metadata_index.items():
-            match = True
-            for key, value in filters.items():
-                if value is not None and metadata.get(key) != value:
-                    match = False
-                    break
-            if match:
-                results.append(cache_key)
-        return results
+            max_files = self.cache_config.get(f"{market_type}_{data_type}", {}).get('max_files')
+            if max_files:
+                self._index.evict(data_type=data_type, max_entries=max_files)
+            if self.max_cache_size_mb > 0:
+                self._index.evict(max_bytes=int(self.max_cache_size_mb * 1024 * 1024))
+        except Exception as e:
+            logger.warning(f"快取淘汰失敗: {e}")
+
+    @staticmethod
+    def _write_payload(cache_path: Path, data: Union[pd.DataFrame, str]):
+        """原子寫入資料檔：先寫暫存檔再 os.replace，避免其他行程讀到寫一半的檔案"""
+        cache_path.parent.mkdir(parents=True, exist_ok=True)  # 確保目錄存在
+        tmp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+        if isinstance(data, pd.DataFrame):
+            data.to_csv(tmp_path, index=True)
+        else:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(str(data))
+        os.replace(tmp_path, cache_path)
 
     @staticmethod
     def _date_bucket(date_str: str, bucket_days: int = 3) -> str:
@@ -220,34 +220,28 @@ class StockDataCache:
 
         return base_dir / f"{cache_key}.{file_format}"
     
-    def _get_metadata_path(self, cache_key: str) -> Path:
-        """取得中繼資料檔路徑"""
-        return self.metadata_dir / f"{cache_key}_meta.json"
-    
     def _save_metadata(self, cache_key: str, metadata: Dict[str, Any]):
-        """保存中繼資料（同時更新記憶體索引）"""
-        metadata_path = self._get_metadata_path(cache_key)
-        metadata_path.parent.mkdir(parents=True, exist_ok=True)
-        metadata['cached_at'] = datetime.now().isoformat()
-
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
-
-        # 同步更新記憶體索引
-        self._index_metadata(cache_key, metadata)
+        """保存中繼資料到索引，並執行容量上限"""
+        try:
+            size_bytes = os.path.getsize(metadata['file_path'])
+        except (OSError, KeyError):
+            size_bytes = 0
+        now = datetime.now()
+        metadata['cached_at'] = now.isoformat()
+        self._index.put(cache_key, metadata, size_bytes=size_bytes, cached_at=now.timestamp())
+        self._enforce_limits(metadata.get('data_type', 'stock_data'), metadata.get('market_type') or 'us')
     
     def _load_metadata(self, cache_key: str) -> Optional[Dict[str, Any]]:
         """載入中繼資料"""
-        metadata_path = self._get_metadata_path(cache_key)
-        if not metadata_path.exists():
-            return None
-        
         try:
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return self._index.get(cache_key)
         except Exception as e:
             logger.error(f"載入中繼資料失敗: {e}")
             return None
+
+    def list_entries(self, data_type: str = None) -> List[Dict[str, Any]]:
+        """列出快取項目的中繼資料（含 cache_key），最新的在前"""
+        return self._index.entries(data_type)
     
     def is_cache_valid(self, cache_key: str, max_age_hours: int = None, symbol: str = None, data_type: str = None) -> bool:
         """檢查快取是否有效 - 支援智慧TTL配置"""
@@ -331,15 +325,9 @@ class StockDataCache:
                                            market=market_type)
 
         # 保存資料
-        if isinstance(data, pd.DataFrame):
-            cache_path = self._get_cache_path("stock_data", cache_key, "csv", symbol)
-            cache_path.parent.mkdir(parents=True, exist_ok=True)  # 確保目錄存在
-            data.to_csv(cache_path, index=True)
-        else:
-            cache_path = self._get_cache_path("stock_data", cache_key, "txt", symbol)
-            cache_path.parent.mkdir(parents=True, exist_ok=True)  # 確保目錄存在
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                f.write(str(data))
+        file_format = 'csv' if isinstance(data, pd.DataFrame) else 'txt'
+        cache_path = self._get_cache_path("stock_data", cache_key, file_format, symbol)
+        self._write_payload(cache_path, data)
 
         # 保存中繼資料
         metadata = {
@@ -373,13 +361,15 @@ class StockDataCache:
         
         try:
             if metadata['file_format'] == 'csv':
-                return pd.read_csv(cache_path, index_col=0)
+                data = pd.read_csv(cache_path, index_col=0)
             else:
                 with open(cache_path, 'r', encoding='utf-8') as f:
-                    return f.read()
+                    data = f.read()
         except Exception as e:
             logger.error(f"載入快取資料失敗: {e}")
             return None
+        self._index.touch(cache_key)
+        return data
     
     def find_cached_stock_data(self, symbol: str, start_date: str = None,
                               end_date: str = None, data_source: str = None,
@@ -417,16 +407,15 @@ class StockDataCache:
             logger.info(f"找到精確匹配的{desc}: {symbol} -> {search_key}")
             return search_key
 
-        # 如果沒有精確匹配，使用記憶體索引查找部分匹配
+        # 如果沒有精確匹配，使用索引查找未過期的部分匹配
         candidate_keys = self._find_in_index(
+            max_age_hours=max_age_hours,
             symbol=symbol,
             data_type='stock_data',
             market_type=market_type,
+            data_source=data_source,
         )
         for cache_key in candidate_keys:
-            meta = self._metadata_index.get(cache_key, {})
-            if data_source is not None and meta.get('data_source') != data_source:
-                continue
             if self.is_cache_valid(cache_key, max_age_hours, symbol, 'stock_data'):
                 desc = self.cache_config.get(f"{market_type}_stock_data", {}).get('description', '資料')
                 logger.info(f"找到部分匹配的{desc}: {symbol} -> {cache_key}")
@@ -457,9 +446,7 @@ class StockDataCache:
                                            source=data_source)
         
         cache_path = self._get_cache_path("news", cache_key, "txt")
-        cache_path.parent.mkdir(parents=True, exist_ok=True)  # 確保目錄存在
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            f.write(news_data)
+        self._write_payload(cache_path, news_data)
         
         metadata = {
             'symbol': symbol,
@@ -496,9 +483,7 @@ class StockDataCache:
                                            market=market_type)
         
         cache_path = self._get_cache_path("fundamentals", cache_key, "txt", symbol)
-        cache_path.parent.mkdir(parents=True, exist_ok=True)  # 確保目錄存在
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            f.write(fundamentals_data)
+        self._write_payload(cache_path, fundamentals_data)
         
         metadata = {
             'symbol': symbol,
@@ -527,16 +512,18 @@ class StockDataCache:
         
         try:
             with open(cache_path, 'r', encoding='utf-8') as f:
-                return f.read()
+                data = f.read()
         except Exception as e:
             logger.error(f"載入基本面快取資料失敗: {e}")
             return None
+        self._index.touch(cache_key)
+        return data
     
     def find_cached_fundamentals_data(self, symbol: str, data_source: str = None,
                                     max_age_hours: int = None) -> Optional[str]:
         """
         查找匹配的基本面快取資料
-        先嘗試精確 key 匹配（O(1)），再退化到記憶體索引掃描
+        先嘗試精確 key 匹配，再退化到索引查詢
 
         Args:
             symbol: 股票代碼
@@ -563,16 +550,15 @@ class StockDataCache:
                 logger.info(f"找到精確匹配的{desc}快取: {symbol} ({data_source}) -> {exact_key}")
                 return exact_key
 
-        # 退化到記憶體索引掃描
+        # 退化到索引查詢
         candidate_keys = self._find_in_index(
+            max_age_hours=max_age_hours,
             symbol=symbol,
             data_type='fundamentals',
             market_type=market_type,
+            data_source=data_source,
         )
         for cache_key in candidate_keys:
-            meta = self._metadata_index.get(cache_key, {})
-            if data_source is not None and meta.get('data_source') != data_source:
-                continue
             if self.is_cache_valid(cache_key, max_age_hours, symbol, 'fundamentals'):
                 desc = self.cache_config.get(f"{market_type}_fundamentals", {}).get('description', '基本面資料')
                 logger.info(f"找到匹配的{desc}快取: {symbol} ({data_source}) -> {cache_key}")
@@ -582,33 +568,41 @@ class StockDataCache:
         logger.error(f"未找到有效的{desc}快取: {symbol} ({data_source})")
         return None
     
-    def clear_old_cache(self, max_age_days: int = 7):
-        """清理過期快取（同步清理記憶體索引）"""
-        cutoff_time = datetime.now() - timedelta(days=max_age_days)
-        cleared_count = 0
-
-        for metadata_file in self.metadata_dir.glob("*_meta.json"):
-            try:
-                with open(metadata_file, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-
-                cached_at = datetime.fromisoformat(metadata['cached_at'])
-                if cached_at < cutoff_time:
-                    # 刪除資料檔案
-                    data_file = Path(metadata['file_path'])
-                    if data_file.exists():
-                        data_file.unlink()
+    def find_stale_cached_data(self, symbol: str, data_type: str,
+                               data_source: str = None) -> Optional[str]:
+        """
+        查找已過期但仍在寬限期內的快取（stale-while-revalidate）
 
-                    # 從記憶體索引移除
-                    cache_key = metadata_file.stem.replace('_meta', '')
-                    self._metadata_index.pop(cache_key, None)
+        呼叫端先以 find_cached_* 確認沒有新鮮快取，再以此取得舊資料立即回傳，
+        並於背景重新取得；該類型未啟用寬限期時回傳 None
 
-                    # 刪除中繼資料檔
-                    metadata_file.unlink()
-                    cleared_count += 1
+        Args:
+            data_type: stock_data / news / fundamentals
+        """
+        market_type = self._determine_market_type(symbol)
+        type_config = self.cache_config.get(f"{market_type}_{data_type}", {})
+        grace_hours = type_config.get('stale_grace_hours', 0)
+        if not grace_hours:
+            return None
+        candidate_keys = self._find_in_index(
+            max_age_hours=type_config.get('ttl_hours', 24) + grace_hours,
+            symbol=symbol,
+            data_type=data_type,
+            market_type=market_type,
+            data_source=data_source,
+        )
+        if candidate_keys:
+            logger.info(f"找到寬限期內的過期{type_config.get('description', '資料')}快取: {symbol} -> {candidate_keys[0]}")
+            return candidate_keys[0]
+        return None
 
-            except Exception as e:
-                logger.warning(f"清理快取時出錯: {e}")
+    def clear_old_cache(self, max_age_days: int = 7):
+        """清理過期快取（同時刪除中繼資料與資料檔）"""
+        try:
+            cleared_count = self._index.delete_expired(max_age_days * 86400)
+        except Exception as e:
+            logger.warning(f"清理快取時出錯: {e}")
+            cleared_count = 0
 
         logger.info(f"已清理 {cleared_count} 個過期快取檔案")
     
@@ -623,33 +617,22 @@ class StockDataCache:
             'skipped_count': 0  # 新增：跳過的快取數量
         }
         
-        for metadata_file in self.metadata_dir.glob("*_meta.json"):
-            try:
-                with open(metadata_file, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-                
-                data_type = metadata.get('data_type', 'unknown')
-                if data_type == 'stock_data':
-                    stats['stock_data_count'] += 1
-                elif data_type == 'news':
-                    stats['news_count'] += 1
-                elif data_type == 'fundamentals':
-                    stats['fundamentals_count'] += 1
-                
-                # 檢查是否為跳過的快取（沒有實際檔案）
-                data_file = Path(metadata.get('file_path', ''))
-                if not data_file.exists():
-                    stats['skipped_count'] += 1
-                else:
-                    # 計算檔案大小
-                    stats['total_size_mb'] += data_file.stat().st_size / (1024 * 1024)
-                
-                stats['total_files'] += 1
-                
-            except Exception as e:
-                continue
+        try:
+            type_stats = self._index.stats()
+        except Exception as e:
+            logger.warning(f"取得快取統計失敗: {e}")
+            return stats
+
+        total_bytes = 0
+        for data_type, item in type_stats.items():
+            if data_type in ('stock_data', 'news', 'fundamentals'):
+                stats[f'{data_type}_count'] = item['count']
+            stats['total_files'] += item['count']
+            # 沒有實際檔案的項目視為跳過的快取
+            stats['skipped_count'] += item['empty']
+            total_bytes += item['size_bytes']
         
-        stats['total_size_mb'] = round(stats['total_size_mb'], 2)
+        stats['total_size_mb'] = round(total_bytes / (1024 * 1024), 2)
         return stats
 
     def get_content_length_config_status(self) -> Dict[str, Any]:
@@ -1,4 +1,6 @@
 import tradingagents.default_config as default_config
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Dict, Optional
 from tradingagents.config.config_manager import config_manager
 
@@ -6,6 +8,10 @@ from tradingagents.config.config_manager import config_manager
 _config: Optional[Dict] = None
 DATA_DIR: Optional[str] = None
 
+# 單次分析綁定的設定（每個 TradingAgentsGraph 在 propagate 期間綁定自己的設定），
+# 同一行程內不同設定的分析同時執行時不會互相覆寫全域設定
+_run_config: ContextVar[Optional[Dict]] = ContextVar("tradingagents_run_config", default=None)
+
 
 def initialize_config():
     """Initialize the configuration with default values."""
@@ -40,7 +46,14 @@ def set_config(config: Dict):
 
 
 def get_config() -> Dict:
-    """Get the current configuration."""
+    """Get the current configuration.
+
+    在 use_config() 範圍內回傳該次分析綁定的設定，否則回傳全域設定。
+    """
+    run_config = _run_config.get()
+    if run_config is not None:
+        return run_config.copy()
+
     if _config is None:
         initialize_config()
 
@@ -58,8 +71,30 @@ def get_config() -> Dict:
     return config_copy
 
 
+@contextmanager
+def use_config(config: Dict):
+    """在目前執行上下文綁定單次分析的設定（不修改全域設定）
+
+    未指定的欄位以預設設定補齊；LangGraph 節點執行緒會繼承此綁定。
+
+    用法:
+        with use_config(graph.config):
+            get_config()["online_tools"]
+    """
+    merged = default_config.DEFAULT_CONFIG.copy()
+    merged.update(config or {})
+    token = _run_config.set(merged)
+    try:
+        yield merged
+    finally:
+        _run_config.reset(token)
+
+
 def get_data_dir() -> str:
-    """取得資料目錄路徑"""
+    """取得資料目錄路徑（use_config() 範圍內回傳該次分析的資料目錄）"""
+    run_config = _run_config.get()
+    if run_config is not None and run_config.get("data_dir"):
+        return run_config["data_dir"]
     return config_manager.get_data_dir()
 
 
@@ -2,28 +2,21 @@
 FinnHub 進階資料聚合模組
 將多個免費 API 端點聚合為三個工具函式，供分析師智慧體使用
 包含：情緒資料、分析師共識、技術訊號
-每個報告帶有記憶體快取，避免同一股票短時間內重複呼叫 API
+每個報告經由分層快取（記憶體 → Redis → MongoDB/檔案），避免同一股票短時間內重複呼叫 API
 """
 
 import os
-import time
-import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import finnhub
 from datetime import datetime, timedelta
 from tradingagents.utils.logging_manager import get_logger
+from .tiered_cache import get_tiered_cache, refresh_in_background
+from .single_flight import run_single_flight
 
 logger = get_logger('dataflows')
 
-# 報告快取（模組層級，同行程內所有使用者共享）
-# 格式: { "report_type:TICKER:date": {"data": str, "timestamp": float} }
-_report_cache: dict = {}
-_MAX_CACHE_ENTRIES = 500  # 快取上限，防止記憶體無限增長
-
-# 執行緒鎖：避免並行分析師同時產生相同報告（如新聞+社群分析師同時查詢情緒資料）
-_cache_lock = threading.Lock()
-# 進行中的報告鍵集合，用於去重並行的 API 呼叫
-_pending_keys: dict = {}  # cache_key -> threading.Event
+# 報告快取：使用統一分層快取（L1 記憶體 → Redis → MongoDB/檔案），跨行程共用
+# 命名空間: finnhub_{report_type}，鍵: TICKER:date
 
 # Finnhub API I/O 執行緒池（獨立於全域工具池，避免競爭）
 # 每個報告內部的多個 API 呼叫同時送出，大幅縮短等待時間
@@ -37,76 +30,56 @@ _CACHE_TTL = {
 }
 
 
-def _get_cached_report(report_type: str, ticker: str, extra_key: str = "") -> str:
-    """從快取取得報告，如果存在且未過期則回傳，否則回傳 None"""
-    cache_key = f"{report_type}:{ticker}:{extra_key}"
-    with _cache_lock:
-        entry = _report_cache.get(cache_key)
-        if entry is None:
-            return None
-        ttl = _CACHE_TTL.get(report_type, 3600)
-        if (time.time() - entry["timestamp"]) > ttl:
-            _report_cache.pop(cache_key, None)
+def _get_cached_report(report_type: str, ticker: str, extra_key: str = "", refresh=None) -> str:
+    """
+    從快取取得報告，如果存在且未過期則回傳，否則回傳 None
+
+    命名空間啟用 stale-while-revalidate 且提供 refresh 時，寬限期內的舊報告會直接回傳，
+    並在背景呼叫 refresh 重新產生，不阻塞分析流程
+    """
+    entry = get_tiered_cache().get_entry(f"finnhub_{report_type}", f"{ticker}:{extra_key}")
+    if entry is None:
+        return None
+    data, is_fresh = entry
+    if not is_fresh:
+        if refresh is None:
             return None
+        refresh_in_background(f"finnhub_{report_type}:{ticker}:{extra_key}", refresh)
+        logger.info(f"FinnHub {report_type} 快取已過期，先回傳舊報告並於背景更新: {ticker}")
+        return data
     logger.info(f"FinnHub {report_type} 快取命中: {ticker}")
-    return entry["data"]
-
-
-def _evict_expired_cache() -> None:
-    """清理過期快取項目（呼叫前必須持有 _cache_lock）"""
-    now = time.time()
-    expired = [
-        k for k, v in _report_cache.items()
-        if now - v["timestamp"] > _CACHE_TTL.get(k.split(":")[0], 3600)
-    ]
-    for k in expired:
-        _report_cache.pop(k, None)
+    return data
 
 
 def _set_cached_report(report_type: str, ticker: str, data: str, extra_key: str = "") -> None:
     """將報告存入快取"""
-    with _cache_lock:
-        if len(_report_cache) >= _MAX_CACHE_ENTRIES:
-            _evict_expired_cache()
-        while len(_report_cache) >= _MAX_CACHE_ENTRIES:
-            oldest_key = min(_report_cache, key=lambda k: _report_cache[k]["timestamp"])
-            _report_cache.pop(oldest_key, None)
-        cache_key = f"{report_type}:{ticker}:{extra_key}"
-        _report_cache[cache_key] = {"data": data, "timestamp": time.time()}
-
-
-# 鍵鎖池：為每個快取鍵提供獨立鎖，避免並行分析師重複呼叫相同 API
-_key_locks: dict = {}        # cache_key -> Lock
-_key_lock_ts: dict = {}      # cache_key -> 最後使用時間戳
-_KEY_LOCK_MAX = 200          # 鍵鎖池容量上限
-_KEY_LOCK_TTL = 3600         # 閒置鎖過期秒數（1 小時）
-
-def _get_key_lock(cache_key: str) -> threading.Lock:
-    """取得指定快取鍵的專屬鎖（執行緒安全，含定期清理）"""
-    with _cache_lock:
-        now = time.time()
-        _key_lock_ts[cache_key] = now
-        if cache_key not in _key_locks:
-            # 超過上限時清理過期鎖（僅清理未被持有的閒置鎖）
-            if len(_key_locks) >= _KEY_LOCK_MAX:
-                cutoff = now - _KEY_LOCK_TTL
-                stale = [k for k, ts in _key_lock_ts.items()
-                         if ts < cutoff and k in _key_locks and not _key_locks[k].locked()]
-                for k in stale:
-                    del _key_locks[k]
-                    del _key_lock_ts[k]
-            _key_locks[cache_key] = threading.Lock()
-        return _key_locks[cache_key]
+    get_tiered_cache().set(
+        f"finnhub_{report_type}",
+        f"{ticker}:{extra_key}",
+        data,
+        ttl=_CACHE_TTL.get(report_type, 3600),
+    )
+
+
+def _single_flight_report(report_type: str, ticker: str, extra_key: str, generate) -> str:
+    """跨行程 single-flight：同一報告在所有 worker 間只呼叫一次 API，其餘等待 leader 的結果"""
+    def load():
+        # 雙重檢查：其他執行緒 / 行程可能已完成快取
+        return _get_cached_report(report_type, ticker, extra_key) or generate()
+
+    def succeeded(_report) -> bool:
+        # 成功的報告才會寫入快取；金鑰未設定、API 失敗等訊息不分享給等待者
+        return _get_cached_report(report_type, ticker, extra_key) is not None
+
+    return run_single_flight(f"finnhub_{report_type}", f"{ticker}:{extra_key}", load,
+                             publish_if=succeeded)
 
 
 def clear_finnhub_cache(ticker: str = None) -> None:
     """清除 FinnHub 報告快取，不指定 ticker 則清除全部"""
-    if ticker:
-        keys_to_remove = [k for k in _report_cache if f":{ticker}:" in k]
-        for k in keys_to_remove:
-            _report_cache.pop(k, None)
-    else:
-        _report_cache.clear()
+    cache = get_tiered_cache()
+    for report_type in _CACHE_TTL:
+        cache.clear(f"finnhub_{report_type}", contains=f"{ticker}:" if ticker else None)
 
 
 def _get_finnhub_client():
@@ -129,24 +102,22 @@ def get_finnhub_sentiment_report(ticker: str, curr_date: str) -> str:
     Returns:
         str: Markdown 格式的情緒分析報告
     """
-    # 快取檢查（快速路徑，無鎖）
-    cached = _get_cached_report("sentiment", ticker, curr_date)
+    def generate():
+        return _single_flight_report("sentiment", ticker, curr_date,
+                                     lambda: _generate_sentiment_report(ticker, curr_date))
+
+    # 快取檢查（快速路徑，無鎖；過期舊報告於背景更新）
+    cached = _get_cached_report("sentiment", ticker, curr_date, refresh=generate)
     if cached:
         return cached
 
-    # 鍵鎖保護：同一股票+日期只允許一個執行緒呼叫 API
-    # 避免並行分析師（新聞+社群）重複呼叫相同情緒 API
-    key_lock = _get_key_lock(f"sentiment:{ticker}:{curr_date}")
-    with key_lock:
-        # 雙重檢查：其他執行緒可能已完成快取
-        cached = _get_cached_report("sentiment", ticker, curr_date)
-        if cached:
-            return cached
-        return _generate_sentiment_report(ticker, curr_date)
+    # single-flight：同一股票+日期在所有 worker 間只呼叫一次 API
+    # 避免並行分析師（新聞+社群）與多個行程重複呼叫相同情緒 API
+    return generate()
 
 
 def _generate_sentiment_report(ticker: str, curr_date: str) -> str:
-    """實際產生情緒報告的內部函式（由鍵鎖保護呼叫）
+    """實際產生情緒報告的內部函式（由 single-flight 保護呼叫）
     內部 2 個 API 呼叫（news_sentiment + social_sentiment）並行執行
     """
     client = _get_finnhub_client()
@@ -280,22 +251,21 @@ def get_finnhub_analyst_report(ticker: str, curr_date: str) -> str:
     Returns:
         str: Markdown 格式的分析師共識報告
     """
-    # 快取檢查（快速路徑，無鎖）
-    cached = _get_cached_report("analyst", ticker, curr_date)
+    def generate():
+        return _single_flight_report("analyst", ticker, curr_date,
+                                     lambda: _generate_analyst_report(ticker, curr_date))
+
+    # 快取檢查（快速路徑，無鎖；過期舊報告於背景更新）
+    cached = _get_cached_report("analyst", ticker, curr_date, refresh=generate)
     if cached:
         return cached
 
-    # 鍵鎖保護：同一股票+日期只呼叫一次 API
-    key_lock = _get_key_lock(f"analyst:{ticker}:{curr_date}")
-    with key_lock:
-        cached = _get_cached_report("analyst", ticker, curr_date)
-        if cached:
-            return cached
-        return _generate_analyst_report(ticker, curr_date)
+    # single-flight：同一股票+日期只呼叫一次 API
+    return generate()
 
 
 def _generate_analyst_report(ticker: str, curr_date: str) -> str:
-    """實際產生分析師共識報告的內部函式（由鍵鎖保護呼叫）
+    """實際產生分析師共識報告的內部函式（由 single-flight 保護呼叫）
     內部 7 個 API 呼叫並行執行，大幅縮短資料取得時間（12s -> 2s）
     """
     client = _get_finnhub_client()
@@ -484,22 +454,21 @@ def get_finnhub_technical_report(ticker: str, resolution: str = 'D') -> str:
     Returns:
         str: Markdown 格式的技術訊號報告
     """
-    # 快取檢查（快速路徑，無鎖）
-    cached = _get_cached_report("technical", ticker, resolution)
+    def generate():
+        return _single_flight_report("technical", ticker, resolution,
+                                     lambda: _generate_technical_report(ticker, resolution))
+
+    # 快取檢查（快速路徑，無鎖；過期舊報告於背景更新）
+    cached = _get_cached_report("technical", ticker, resolution, refresh=generate)
     if cached:
         return cached
 
-    # 鍵鎖保護：同一股票+解析度只呼叫一次 API
-    key_lock = _get_key_lock(f"technical:{ticker}:{resolution}")
-    with key_lock:
-        cached = _get_cached_report("technical", ticker, resolution)
-        if cached:
-            return cached
-        return _generate_technical_report(ticker, resolution)
+    # single-flight：同一股票+解析度只呼叫一次 API
+    return generate()
 
 
 def _generate_technical_report(ticker: str, resolution: str = 'D') -> str:
-    """實際產生技術訊號報告的內部函式（由鍵鎖保護呼叫）
+    """實際產生技術訊號報告的內部函式（由 single-flight 保護呼叫）
     內部 2 個 API 呼叫（aggregate_indicator + support_resistance）並行執行
     """
     client = _get_finnhub_client()
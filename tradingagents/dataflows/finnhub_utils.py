@@ -1,11 +1,74 @@
 import json
 import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
 
 # 匯入日誌模組
 from tradingagents.utils.logging_manager import get_logger
 logger = get_logger('agents')
 
 
+# ---------------------------------------------------------------------------
+# 已載入的 Finnhub 離線資料檔（依日期排序的索引，多個工具與並行分析共用同一份）
+# 格式: {data_path: (mtime_ns, size, sorted_keys, values)}
+# 檔案 mtime 或大小改變時重新載入
+# ---------------------------------------------------------------------------
+_data_file_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_data_file_cache_lock = threading.Lock()
+_data_file_load_locks = {}
+_MAX_DATA_FILES = 256
+
+
+def _get_cached_data_file(data_path, stat):
+    with _data_file_cache_lock:
+        entry = _data_file_cache.get(data_path)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            _data_file_cache.move_to_end(data_path)
+            return entry[2], entry[3]
+    return None
+
+
+def _load_data_file(data_path):
+    """載入資料檔並建立排序日期索引；回傳 (sorted_keys, values)，不存在時回傳 None"""
+    try:
+        stat = os.stat(data_path)
+    except FileNotFoundError:
+        return None
+
+    cached = _get_cached_data_file(data_path, stat)
+    if cached is not None:
+        return cached
+
+    # 每個檔案一把載入鎖：並行分析不會重複解析同一個檔案，不同檔案則互不阻塞
+    with _data_file_cache_lock:
+        load_lock = _data_file_load_locks.setdefault(data_path, threading.Lock())
+    with load_lock:
+        cached = _get_cached_data_file(data_path, stat)
+        if cached is not None:
+            return cached
+
+        with open(data_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        # 只索引有內容的日期（與原本 len(value) > 0 的過濾一致）
+        keys = sorted(key for key, value in data.items() if len(value) > 0)
+        values = [data[key] for key in keys]
+
+        with _data_file_cache_lock:
+            _data_file_cache[data_path] = (stat.st_mtime_ns, stat.st_size, keys, values)
+            while len(_data_file_cache) > _MAX_DATA_FILES:
+                evicted, _ = _data_file_cache.popitem(last=False)
+                _data_file_load_locks.pop(evicted, None)
+        return keys, values
+
+
+def clear_finnhub_data_cache():
+    """清除已載入的 Finnhub 離線資料索引"""
+    with _data_file_cache_lock:
+        _data_file_cache.clear()
+        _data_file_load_locks.clear()
+
+
 def get_data_in_range(ticker, start_date, end_date, data_type, data_dir, period=None):
     """
     Gets finnhub data saved and processed on disk.
@@ -30,16 +93,11 @@ def get_data_in_range(ticker, start_date, end_date, data_type, data_dir, period=
         )
 
     try:
-        if not os.path.exists(data_path):
+        loaded = _load_data_file(data_path)
+        if loaded is None:
             logger.warning(f"資料檔案不存在: {data_path}")
             logger.warning("請確保已下載相關資料或檢查資料目錄配置")
             return {}
-        
-        with open(data_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        logger.error(f"[ERROR] 檔案未找到: {data_path}")
-        return {}
     except json.JSONDecodeError as e:
         logger.error(f"[ERROR] JSON解析錯誤: {e}")
         return {}
@@ -48,8 +106,8 @@ def get_data_in_range(ticker, start_date, end_date, data_type, data_dir, period=
         return {}
 
     # filter keys (date, str in format YYYY-MM-DD) by the date range (str, str in format YYYY-MM-DD)
-    filtered_data = {}
-    for key, value in data.items():
-        if start_date <= key <= end_date and len(value) > 0:
-            filtered_data[key] = value
-    return filtered_data
+    # 以二分搜尋切出區間；回傳的內容為共用資料，呼叫端不可修改
+    keys, values = loaded
+    lo = bisect_left(keys, start_date)
+    hi = bisect_right(keys, end_date)
+    return dict(zip(keys[lo:hi], values[lo:hi]))
@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 """
 整合快取管理器
-結合原有快取系統和新的自適應資料庫支援
-提供向後相容的介面
+以統一分層快取（記憶體 → Redis → MongoDB/檔案）作為熱資料層，
+原有檔案快取保留為持久化儲存與查詢索引，提供向後相容的介面
 """
 
 from typing import Any, Dict, Optional
@@ -13,56 +13,46 @@ from tradingagents.utils.logging_init import setup_dataflow_logging
 # 匯入原有快取系統
 from .cache_manager import StockDataCache
 
-# 匯入自適應快取系統
-try:
-    from .adaptive_cache import get_cache_system
-    from ..config.database_manager import get_database_manager
-    ADAPTIVE_CACHE_AVAILABLE = True
-except ImportError:
-    ADAPTIVE_CACHE_AVAILABLE = False
+# 匯入統一分層快取
+from .tiered_cache import get_tiered_cache
 
 class IntegratedCacheManager:
-    """整合快取管理器 - 智慧選擇快取策略"""
+    """整合快取管理器 - 分層快取在前，檔案快取在後"""
     
     def __init__(self, cache_dir: str = None):
         self.logger = setup_dataflow_logging()
         
-        # 初始化原有快取系統（作為備用）
+        # 原有快取系統：持久化儲存與 find_cached_* 查詢索引
         self.legacy_cache = StockDataCache(cache_dir)
         
-        # 嘗試初始化自適應快取系統
-        self.adaptive_cache = None
-        self.use_adaptive = False
-        
-        if ADAPTIVE_CACHE_AVAILABLE:
-            try:
-                self.adaptive_cache = get_cache_system()
-                self.db_manager = get_database_manager()
-                self.use_adaptive = True
-                self.logger.info("自適應快取系統已啟用")
-            except Exception as e:
-                self.logger.warning(f"自適應快取系統初始化失敗，使用傳統快取: {e}")
-                self.use_adaptive = False
-        else:
-            self.logger.info("自適應快取系統不可用，使用傳統檔案快取")
+        # 統一分層快取：所有資料類型共用同一組 L1/L2/L3
+        self.tiered_cache = get_tiered_cache()
         
         # 顯示當前配置
         self._log_cache_status()
     
     def _log_cache_status(self):
         """記錄快取狀態"""
-        if self.use_adaptive:
-            backend = self.adaptive_cache.primary_backend
-            mongodb_available = self.db_manager.is_mongodb_available()
-            redis_available = self.db_manager.is_redis_available()
-            
-            self.logger.info("快取配置:")
-            self.logger.info(f"  主要後端: {backend}")
-            self.logger.info(f"  MongoDB: {'可用' if mongodb_available else '不可用'}")
-            self.logger.info(f"  Redis: {'可用' if redis_available else '不可用'}")
-            self.logger.info(f"  降級支援: {'啟用' if self.adaptive_cache.fallback_enabled else '禁用'}")
-        else:
-            self.logger.info("使用傳統檔案快取系統")
+        stats = self.tiered_cache.get_stats()
+        self.logger.info("快取配置:")
+        self.logger.info(f"  L2: {stats['l2_backend'] or '不可用'}")
+        self.logger.info(f"  L3: {stats['l3_backend']}")
+    
+    def _save(self, data_type: str, cache_key: str, data: Any) -> str:
+        """將已寫入檔案快取的資料同步放入分層快取"""
+        if cache_key:
+            self.tiered_cache.set(data_type, cache_key, data)
+        return cache_key
+    
+    def _load(self, data_type: str, cache_key: str, legacy_loader) -> Optional[Any]:
+        """先查分層快取，未命中時讀檔案快取並回填"""
+        data = self.tiered_cache.get(data_type, cache_key)
+        if data is not None:
+            return data
+        data = legacy_loader(cache_key)
+        if data is not None:
+            self.tiered_cache.set(data_type, cache_key, data)
+        return data
     
     def save_stock_data(self, symbol: str, data: Any, start_date: str = None, 
                        end_date: str = None, data_source: str = "default") -> str:
@@ -79,25 +69,14 @@ class IntegratedCacheManager:
         Returns:
             快取鍵
         """
-        if self.use_adaptive:
-            # 使用自適應快取系統
-            return self.adaptive_cache.save_data(
-                symbol=symbol,
-                data=data,
-                start_date=start_date or "",
-                end_date=end_date or "",
-                data_source=data_source,
-                data_type="stock_data"
-            )
-        else:
-            # 使用傳統快取系統
-            return self.legacy_cache.save_stock_data(
-                symbol=symbol,
-                data=data,
-                start_date=start_date,
-                end_date=end_date,
-                data_source=data_source
-            )
+        cache_key = self.legacy_cache.save_stock_data(
+            symbol=symbol,
+            data=data,
+            start_date=start_date,
+            end_date=end_date,
+            data_source=data_source
+        )
+        return self._save("stock_data", cache_key, data)
     
     def load_stock_data(self, cache_key: str) -> Optional[Any]:
         """
@@ -109,12 +88,7 @@ class IntegratedCacheManager:
         Returns:
             股票資料或None
         """
-        if self.use_adaptive:
-            # 使用自適應快取系統
-            return self.adaptive_cache.load_data(cache_key)
-        else:
-            # 使用傳統快取系統
-            return self.legacy_cache.load_stock_data(cache_key)
+        return self._load("stock_data", cache_key, self.legacy_cache.load_stock_data)
     
     def find_cached_stock_data(self, symbol: str, start_date: str = None, 
                               end_date: str = None, data_source: str = "default") -> Optional[str]:
@@ -130,131 +104,69 @@ class IntegratedCacheManager:
         Returns:
             快取鍵或None
         """
-        if self.use_adaptive:
-            # 使用自適應快取系統
-            return self.adaptive_cache.find_cached_data(
-                symbol=symbol,
-                start_date=start_date or "",
-                end_date=end_date or "",
-                data_source=data_source,
-                data_type="stock_data"
-            )
-        else:
-            # 使用傳統快取系統
-            return self.legacy_cache.find_cached_stock_data(
-                symbol=symbol,
-                start_date=start_date,
-                end_date=end_date,
-                data_source=data_source
-            )
+        return self.legacy_cache.find_cached_stock_data(
+            symbol=symbol,
+            start_date=start_date,
+            end_date=end_date,
+            data_source=data_source
+        )
     
     def save_news_data(self, symbol: str, data: Any, data_source: str = "default") -> str:
         """保存新聞資料"""
-        if self.use_adaptive:
-            return self.adaptive_cache.save_data(
-                symbol=symbol,
-                data=data,
-                data_source=data_source,
-                data_type="news_data"
-            )
-        else:
-            return self.legacy_cache.save_news_data(symbol, data, data_source)
+        cache_key = self.legacy_cache.save_news_data(symbol, data, data_source)
+        return self._save("news_data", cache_key, data)
     
     def load_news_data(self, cache_key: str) -> Optional[Any]:
         """載入新聞資料"""
-        if self.use_adaptive:
-            return self.adaptive_cache.load_data(cache_key)
-        else:
-            # StockDataCache 無獨立 load_news_data，共用 load_stock_data（支援 txt）
-            return self.legacy_cache.load_stock_data(cache_key)
+        # StockDataCache 無獨立 load_news_data，共用 load_stock_data（支援 txt）
+        return self._load("news_data", cache_key, self.legacy_cache.load_stock_data)
     
     def save_fundamentals_data(self, symbol: str, data: Any, data_source: str = "default") -> str:
         """保存基本面資料"""
-        if self.use_adaptive:
-            return self.adaptive_cache.save_data(
-                symbol=symbol,
-                data=data,
-                data_source=data_source,
-                data_type="fundamentals_data"
-            )
-        else:
-            return self.legacy_cache.save_fundamentals_data(symbol, data, data_source)
+        cache_key = self.legacy_cache.save_fundamentals_data(symbol, data, data_source)
+        return self._save("fundamentals_data", cache_key, data)
     
     def load_fundamentals_data(self, cache_key: str) -> Optional[Any]:
         """載入基本面資料"""
-        if self.use_adaptive:
-            return self.adaptive_cache.load_data(cache_key)
-        else:
-            return self.legacy_cache.load_fundamentals_data(cache_key)
+        return self._load("fundamentals_data", cache_key, self.legacy_cache.load_fundamentals_data)
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """取得快取統計資訊"""
-        if self.use_adaptive:
-            # 取得自適應快取統計
-            adaptive_stats = self.adaptive_cache.get_cache_stats()
-            
-            # 新增傳統快取統計
-            legacy_stats = self.legacy_cache.get_cache_stats()
-            
-            return {
-                "cache_system": "adaptive",
-                "adaptive_cache": adaptive_stats,
-                "legacy_cache": legacy_stats,
-                "database_available": self.db_manager.is_database_available(),
-                "mongodb_available": self.db_manager.is_mongodb_available(),
-                "redis_available": self.db_manager.is_redis_available()
-            }
-        else:
-            # 只返回傳統快取統計
-            legacy_stats = self.legacy_cache.get_cache_stats()
-            return {
-                "cache_system": "legacy",
-                "legacy_cache": legacy_stats,
-                "database_available": False,
-                "mongodb_available": False,
-                "redis_available": False
-            }
+        tiered_stats = self.tiered_cache.get_stats()
+        return {
+            "cache_system": "tiered",
+            "tiered_cache": tiered_stats,
+            "legacy_cache": self.legacy_cache.get_cache_stats(),
+            "database_available": self.is_database_available(),
+            "mongodb_available": tiered_stats["l3_backend"] == "mongodb",
+            "redis_available": tiered_stats["l2_backend"] == "redis"
+        }
     
     def clear_expired_cache(self, max_age_days: int = 7):
-        """清理過期快取"""
-        if self.use_adaptive:
-            self.adaptive_cache.clear_expired_cache()
-
-        # 總是清理傳統快取
+        """清理過期快取（分層快取依 TTL 自動過期，僅需清理檔案快取）"""
         self.legacy_cache.clear_old_cache(max_age_days=max_age_days)
     
     def get_cache_backend_info(self) -> Dict[str, Any]:
         """取得快取後端資訊"""
-        if self.use_adaptive:
-            return {
-                "system": "adaptive",
-                "primary_backend": self.adaptive_cache.primary_backend,
-                "fallback_enabled": self.adaptive_cache.fallback_enabled,
-                "mongodb_available": self.db_manager.is_mongodb_available(),
-                "redis_available": self.db_manager.is_redis_available()
-            }
-        else:
-            return {
-                "system": "legacy",
-                "primary_backend": "file",
-                "fallback_enabled": False,
-                "mongodb_available": False,
-                "redis_available": False
-            }
+        stats = self.tiered_cache.get_stats()
+        return {
+            "system": "tiered",
+            "primary_backend": stats["l2_backend"] or stats["l3_backend"],
+            "fallback_enabled": True,
+            "mongodb_available": stats["l3_backend"] == "mongodb",
+            "redis_available": stats["l2_backend"] == "redis"
+        }
     
     def is_database_available(self) -> bool:
         """檢查資料庫是否可用"""
-        if self.use_adaptive:
-            return self.db_manager.is_database_available()
-        return False
+        stats = self.tiered_cache.get_stats()
+        return stats["l2_backend"] is not None or stats["l3_backend"] == "mongodb"
     
     def get_performance_mode(self) -> str:
         """取得性能模式"""
-        if not self.use_adaptive:
-            return "基礎模式 (檔案快取)"
-        
-        mongodb_available = self.db_manager.is_mongodb_available()
-        redis_available = self.db_manager.is_redis_available()
+        stats = self.tiered_cache.get_stats()
+        mongodb_available = stats["l3_backend"] == "mongodb"
+        redis_available = stats["l2_backend"] == "redis"
         
         if redis_available and mongodb_available:
             return "高性能模式 (Redis + MongoDB + 檔案)"
@@ -263,7 +175,7 @@ class IntegratedCacheManager:
         elif mongodb_available:
             return "持久化模式 (MongoDB + 檔案)"
         else:
-            return "標準模式 (智慧檔案快取)"
+            return "標準模式 (記憶體 + 檔案)"
 
 
 # 全局整合快取管理器實例（執行緒安全）
@@ -2,6 +2,8 @@ from typing import Annotated
 import os
 from .googlenews_utils import getNewsData
 from .finnhub_utils import get_data_in_range
+from .price_store import load_offline_prices
+from .simfin_store import get_latest_statement
 
 # 匯入日誌模組
 from tradingagents.utils.logging_manager import get_logger
@@ -9,6 +11,8 @@ logger = get_logger('dataflows')
 
 # 匯入 Finnhub I/O 執行緒池，用於並行呼叫 Finnhub API
 from .finnhub_extra import _FINNHUB_IO_POOL
+from .single_flight import run_single_flight
+from .tiered_cache import refresh_in_background
 
 # 嘗試匯入 yfinance 相關模組，如果失敗則跳過
 try:
@@ -51,7 +55,7 @@ except ImportError as e:
     logger.warning(f"yfinance庫不可用: {e}")
     yf = None
     YF_AVAILABLE = False
-from .config import get_config, DATA_DIR
+from .config import get_config, get_data_dir
 
 
 def get_finnhub_news(
@@ -78,7 +82,7 @@ def get_finnhub_news(
     before = start_date - relativedelta(days=look_back_days)
     before = before.strftime("%Y-%m-%d")
 
-    result = get_data_in_range(ticker, before, curr_date, "news_data", DATA_DIR)
+    result = get_data_in_range(ticker, before, curr_date, "news_data", get_data_dir())
 
     if len(result) == 0:
         error_msg = f"無法取得{ticker}的新聞資料 ({before} 到 {curr_date})\n"
@@ -124,7 +128,7 @@ def get_finnhub_company_insider_sentiment(
     before = date_obj - relativedelta(days=look_back_days)
     before = before.strftime("%Y-%m-%d")
 
-    data = get_data_in_range(ticker, before, curr_date, "insider_senti", DATA_DIR)
+    data = get_data_in_range(ticker, before, curr_date, "insider_senti", get_data_dir())
 
     if len(data) == 0:
         return f"[{ticker}] 在指定期間內無內部人情緒資料。"
@@ -165,7 +169,7 @@ def get_finnhub_company_insider_transactions(
     before = date_obj - relativedelta(days=look_back_days)
     before = before.strftime("%Y-%m-%d")
 
-    data = get_data_in_range(ticker, before, curr_date, "insider_trans", DATA_DIR)
+    data = get_data_in_range(ticker, before, curr_date, "insider_trans", get_data_dir())
 
     if len(data) == 0:
         return f"[{ticker}] 在指定期間內無內部人交易資料。"
@@ -194,35 +198,15 @@ def get_simfin_balance_sheet(
     ],
     curr_date: Annotated[str, "current date you are trading at, yyyy-mm-dd"],
 ):
-    data_path = os.path.join(
-        DATA_DIR,
-        "fundamental_data",
-        "simfin_data_all",
-        "balance_sheet",
-        "companies",
-        "us",
-        f"us-balance-{freq}.csv",
-    )
-    df = pd.read_csv(data_path, sep=";")
-
-    # Convert date strings to datetime objects and remove any time components
-    df["Report Date"] = pd.to_datetime(df["Report Date"], utc=True).dt.normalize()
-    df["Publish Date"] = pd.to_datetime(df["Publish Date"], utc=True).dt.normalize()
-
-    # Convert the current date to datetime and normalize
-    curr_date_dt = pd.to_datetime(curr_date, utc=True).normalize()
-
-    # Filter the DataFrame for the given ticker and for reports that were published on or before the current date
-    filtered_df = df[(df["Ticker"] == ticker) & (df["Publish Date"] <= curr_date_dt)]
+    # Get the most recent balance sheet published on or before the current date
+    # （依 ticker 分區、發布日排序的索引，二分搜尋取代整檔 read_csv）
+    latest_balance_sheet = get_latest_statement(get_data_dir(), "balance_sheet", ticker, freq, curr_date)
 
     # Check if there are any available reports; if not, return a notification
-    if filtered_df.empty:
+    if latest_balance_sheet is None:
         logger.info("No balance sheet available before the given current date.")
         return f"[{ticker}] 在指定日期前無可用的資產負債表資料。"
 
-    # Get the most recent balance sheet by selecting the row with the latest Publish Date
-    latest_balance_sheet = filtered_df.loc[filtered_df["Publish Date"].idxmax()]
-
     # drop the SimFinID column
     latest_balance_sheet = latest_balance_sheet.drop("SimFinId")
 
@@ -241,35 +225,15 @@ def get_simfin_cashflow(
     ],
     curr_date: Annotated[str, "current date you are trading at, yyyy-mm-dd"],
 ):
-    data_path = os.path.join(
-        DATA_DIR,
-        "fundamental_data",
-        "simfin_data_all",
-        "cash_flow",
-        "companies",
-        "us",
-        f"us-cashflow-{freq}.csv",
-    )
-    df = pd.read_csv(data_path, sep=";")
-
-    # Convert date strings to datetime objects and remove any time components
-    df["Report Date"] = pd.to_datetime(df["Report Date"], utc=True).dt.normalize()
-    df["Publish Date"] = pd.to_datetime(df["Publish Date"], utc=True).dt.normalize()
-
-    # Convert the current date to datetime and normalize
-    curr_date_dt = pd.to_datetime(curr_date, utc=True).normalize()
-
-    # Filter the DataFrame for the given ticker and for reports that were published on or before the current date
-    filtered_df = df[(df["Ticker"] == ticker) & (df["Publish Date"] <= curr_date_dt)]
+    # Get the most recent cash flow statement published on or before the current date
+    # （依 ticker 分區、發布日排序的索引，二分搜尋取代整檔 read_csv）
+    latest_cash_flow = get_latest_statement(get_data_dir(), "cash_flow", ticker, freq, curr_date)
 
     # Check if there are any available reports; if not, return a notification
-    if filtered_df.empty:
+    if latest_cash_flow is None:
         logger.info("No cash flow statement available before the given current date.")
         return f"[{ticker}] 在指定日期前無可用的現金流量表資料。"
 
-    # Get the most recent cash flow statement by selecting the row with the latest Publish Date
-    latest_cash_flow = filtered_df.loc[filtered_df["Publish Date"].idxmax()]
-
     # drop the SimFinID column
     latest_cash_flow = latest_cash_flow.drop("SimFinId")
 
@@ -288,35 +252,15 @@ def get_simfin_income_statements(
     ],
     curr_date: Annotated[str, "current date you are trading at, yyyy-mm-dd"],
 ):
-    data_path = os.path.join(
-        DATA_DIR,
-        "fundamental_data",
-        "simfin_data_all",
-        "income_statements",
-        "companies",
-        "us",
-        f"us-income-{freq}.csv",
-    )
-    df = pd.read_csv(data_path, sep=";")
-
-    # Convert date strings to datetime objects and remove any time components
-    df["Report Date"] = pd.to_datetime(df["Report Date"], utc=True).dt.normalize()
-    df["Publish Date"] = pd.to_datetime(df["Publish Date"], utc=True).dt.normalize()
-
-    # Convert the current date to datetime and normalize
-    curr_date_dt = pd.to_datetime(curr_date, utc=True).normalize()
-
-    # Filter the DataFrame for the given ticker and for reports that were published on or before the current date
-    filtered_df = df[(df["Ticker"] == ticker) & (df["Publish Date"] <= curr_date_dt)]
+    # Get the most recent income statement published on or before the current date
+    # （依 ticker 分區、發布日排序的索引，二分搜尋取代整檔 read_csv）
+    latest_income = get_latest_statement(get_data_dir(), "income_statements", ticker, freq, curr_date)
 
     # Check if there are any available reports; if not, return a notification
-    if filtered_df.empty:
+    if latest_income is None:
         logger.info("No income statement available before the given current date.")
         return f"[{ticker}] 在指定日期前無可用的損益表資料。"
 
-    # Get the most recent income statement by selecting the row with the latest Publish Date
-    latest_income = filtered_df.loc[filtered_df["Publish Date"].idxmax()]
-
     # drop the SimFinID column
     latest_income = latest_income.drop("SimFinId")
 
@@ -449,39 +393,34 @@ def get_stock_stats_indicators_window(
     curr_date = datetime.strptime(curr_date, "%Y-%m-%d")
     before = curr_date - relativedelta(days=look_back_days)
 
-    if not online:
-        # read from YFin data
-        data = pd.read_csv(
-            os.path.join(
-                DATA_DIR,
-                f"market_data/price_data/{symbol}-YFin-data-2015-01-01-2025-03-25.csv",
-            )
-        )
-        data["Date"] = pd.to_datetime(data["Date"], utc=True)
-        dates_in_df = data["Date"].astype(str).str[:10]
-
-        ind_string = ""
-        while curr_date >= before:
-            # only do the trading dates
-            if curr_date.strftime("%Y-%m-%d") in dates_in_df.values:
-                indicator_value = get_stockstats_indicator(
-                    symbol, indicator, curr_date.strftime("%Y-%m-%d"), online
-                )
-
-                ind_string += f"{curr_date.strftime('%Y-%m-%d')}: {indicator_value}\n"
-
-            curr_date = curr_date - relativedelta(days=1)
-    else:
-        # online gathering
-        ind_string = ""
-        while curr_date >= before:
-            indicator_value = get_stockstats_indicator(
-                symbol, indicator, curr_date.strftime("%Y-%m-%d"), online
-            )
+    if StockstatsUtils is None:
+        return f"[{symbol}] stockstats 工具不可用，無法計算 {indicator} 技術指標"
 
-            ind_string += f"{curr_date.strftime('%Y-%m-%d')}: {indicator_value}\n"
+    # 一次載入價格序列並計算整段指標，再切出回看視窗（避免逐日重讀 CSV、重算指標）
+    try:
+        window_values = StockstatsUtils.get_stock_stats_window(
+            symbol,
+            indicator,
+            before.strftime("%Y-%m-%d"),
+            end_date,
+            os.path.join(get_data_dir(), "market_data", "price_data"),
+            online=online,
+        )
+    except Exception as e:
+        logger.error(
+            f"Error getting stockstats indicator window for indicator {indicator} on {end_date}: {e}"
+        )
+        return f"[{symbol}] 無法取得 {indicator} 技術指標資料"
 
-            curr_date = curr_date - relativedelta(days=1)
+    ind_string = ""
+    while curr_date >= before:
+        date_str = curr_date.strftime("%Y-%m-%d")
+        if date_str in window_values:
+            ind_string += f"{date_str}: {window_values[date_str]}\n"
+        elif online:
+            # 線上模式保留非交易日列，與原逐日查詢的輸出格式一致
+            ind_string += f"{date_str}: N/A: Not a trading day (weekend or holiday)\n"
+        curr_date = curr_date - relativedelta(days=1)
 
     result_str = (
         f"## {indicator} values from {before.strftime('%Y-%m-%d')} to {end_date}:\n\n"
@@ -513,7 +452,7 @@ def get_stockstats_indicator(
             symbol,
             indicator,
             curr_date,
-            os.path.join(DATA_DIR, "market_data", "price_data"),
+            os.path.join(get_data_dir(), "market_data", "price_data"),
             online=online,
         )
     except Exception as e:
@@ -535,25 +474,15 @@ def get_YFin_data_window(
     before = date_obj - relativedelta(days=look_back_days)
     start_date = before.strftime("%Y-%m-%d")
 
-    # read in data
-    data = pd.read_csv(
-        os.path.join(
-            DATA_DIR,
-            f"market_data/price_data/{symbol}-YFin-data-2015-01-01-2025-03-25.csv",
-        )
+    # read in data（列式價格儲存，依日期二分切片，保留原 CSV 的 index）
+    filtered_data = load_offline_prices(
+        symbol,
+        os.path.join(get_data_dir(), "market_data", "price_data"),
+        start_date,
+        curr_date,
+        keep_index=True,
     )
 
-    # Extract just the date part for comparison
-    data["DateOnly"] = data["Date"].str[:10]
-
-    # Filter data between the start and end dates (inclusive)
-    filtered_data = data[
-        (data["DateOnly"] >= start_date) & (data["DateOnly"] <= curr_date)
-    ]
-
-    # Drop the temporary column we created
-    filtered_data = filtered_data.drop("DateOnly", axis=1)
-
     # Set pandas display options to show the full DataFrame
     with pd.option_context(
         "display.max_rows", None, "display.max_columns", None, "display.width", None
@@ -616,32 +545,18 @@ def get_YFin_data(
     start_date: Annotated[str, "Start date in yyyy-mm-dd format"],
     end_date: Annotated[str, "End date in yyyy-mm-dd format"],
 ) -> str:
-    # read in data
-    data = pd.read_csv(
-        os.path.join(
-            DATA_DIR,
-            f"market_data/price_data/{symbol}-YFin-data-2015-01-01-2025-03-25.csv",
-        )
-    )
-
     if end_date > "2025-03-25":
         raise Exception(
             f"Get_YFin_Data: {end_date} is outside of the data range of 2015-01-01 to 2025-03-25"
         )
 
-    # Extract just the date part for comparison
-    data["DateOnly"] = data["Date"].str[:10]
-
-    # Filter data between the start and end dates (inclusive)
-    filtered_data = data[
-        (data["DateOnly"] >= start_date) & (data["DateOnly"] <= end_date)
-    ]
-
-    # Drop the temporary column we created
-    filtered_data = filtered_data.drop("DateOnly", axis=1)
-
-    # remove the index from the dataframe
-    filtered_data = filtered_data.reset_index(drop=True)
+    # read in data（列式價格儲存，依日期二分切片，index 已從 0 開始）
+    filtered_data = load_offline_prices(
+        symbol,
+        os.path.join(get_data_dir(), "market_data", "price_data"),
+        start_date,
+        end_date,
+    )
 
     return filtered_data
 
@@ -726,137 +641,31 @@ def get_fundamentals_finnhub(ticker, curr_date):
         str: 格式化的基本面資料報告
     """
     try:
-        import finnhub
-        import os
         from .cache_manager import get_cache
         
         # 檢查快取
         cache = get_cache()
-        cached_key = cache.find_cached_fundamentals_data(ticker, data_source="finnhub")
-        if cached_key:
-            cached_data = cache.load_fundamentals_data(cached_key)
-            if cached_data:
-                logger.debug(f"從快取載入Finnhub基本面資料: {ticker}")
-                return cached_data
-        
-        # 取得Finnhub API密鑰
-        api_key = os.getenv('FINNHUB_API_KEY')
-        if not api_key:
-            return "錯誤：未配置FINNHUB_API_KEY環境變數"
-        
-        # 初始化Finnhub客戶端
-        finnhub_client = finnhub.Client(api_key=api_key)
-        
-        logger.debug(f"使用Finnhub API取得 {ticker} 的基本面資料...")
-
-        # 並行呼叫 3 個 Finnhub API（共用 finnhub_extra 執行緒池）
-        fut_financials = _FINNHUB_IO_POOL.submit(
-            finnhub_client.company_basic_financials, ticker, 'all'
-        )
-        fut_profile = _FINNHUB_IO_POOL.submit(
-            finnhub_client.company_profile2, symbol=ticker
-        )
-        fut_earnings = _FINNHUB_IO_POOL.submit(
-            finnhub_client.company_earnings, ticker, limit=4
-        )
-
-        # 收集結果，個別容錯
-        try:
-            basic_financials = fut_financials.result(timeout=15)
-        except Exception as e:
-            logger.error(f"Finnhub基本財務資料取得失敗: {str(e)}")
-            basic_financials = None
-
-        try:
-            company_profile = fut_profile.result(timeout=15)
-        except Exception as e:
-            logger.error(f"Finnhub公司概況取得失敗: {str(e)}")
-            company_profile = None
-
-        try:
-            earnings = fut_earnings.result(timeout=15)
-        except Exception as e:
-            logger.error(f"Finnhub收益資料取得失敗: {str(e)}")
-            earnings = None
-        
-        # 格式化報告
-        report = f"# {ticker} 基本面分析報告（Finnhub資料來源）\n\n"
-        report += f"**資料取得時間**: {curr_date}\n"
-        report += f"**資料來源**: Finnhub API\n\n"
-        
-        # 公司概況部分
-        if company_profile:
-            report += "## 公司概況\n"
-            report += f"- **公司名稱**: {company_profile.get('name', 'N/A')}\n"
-            report += f"- **行業**: {company_profile.get('finnhubIndustry', 'N/A')}\n"
-            report += f"- **國家**: {company_profile.get('country', 'N/A')}\n"
-            report += f"- **貨幣**: {company_profile.get('currency', 'N/A')}\n"
-            report += f"- **市值**: {company_profile.get('marketCapitalization', 'N/A')} 百萬美元\n"
-            report += f"- **流通股數**: {company_profile.get('shareOutstanding', 'N/A')} 百萬股\n\n"
-        
-        # 基本財務指標
-        if basic_financials and 'metric' in basic_financials:
-            metrics = basic_financials['metric']
-            report += "## 關鍵財務指標\n"
-            report += "| 指標 | 數值 |\n"
-            report += "|------|------|\n"
-            
-            # 估值指標
-            if 'peBasicExclExtraTTM' in metrics:
-                report += f"| 市盈率 (PE) | {metrics['peBasicExclExtraTTM']:.2f} |\n"
-            if 'psAnnual' in metrics:
-                report += f"| 市銷率 (PS) | {metrics['psAnnual']:.2f} |\n"
-            if 'pbAnnual' in metrics:
-                report += f"| 市淨率 (PB) | {metrics['pbAnnual']:.2f} |\n"
-            
-            # 盈利能力指標
-            if 'roeTTM' in metrics:
-                report += f"| 淨資產收益率 (ROE) | {metrics['roeTTM']:.2f}% |\n"
-            if 'roaTTM' in metrics:
-                report += f"| 總資產收益率 (ROA) | {metrics['roaTTM']:.2f}% |\n"
-            if 'netProfitMarginTTM' in metrics:
-                report += f"| 淨利潤率 | {metrics['netProfitMarginTTM']:.2f}% |\n"
-            
-            # 財務健康指標
-            if 'currentRatioAnnual' in metrics:
-                report += f"| 流動比率 | {metrics['currentRatioAnnual']:.2f} |\n"
-            if 'totalDebt/totalEquityAnnual' in metrics:
-                report += f"| 負債權益比 | {metrics['totalDebt/totalEquityAnnual']:.2f} |\n"
-            
-            report += "\n"
+        cached_data = _load_cached_fundamentals_finnhub(cache, ticker)
+        if cached_data:
+            return cached_data
         
-        # 收益歷史
-        if earnings:
-            report += "## 收益歷史\n"
-            report += "| 季度 | 實際EPS | 預期EPS | 差異 |\n"
-            report += "|------|---------|---------|------|\n"
-            for earning in earnings[:4]:  # 顯示最近4個季度
-                actual = earning.get('actual', 'N/A')
-                estimate = earning.get('estimate', 'N/A')
-                period = earning.get('period', 'N/A')
-                surprise = earning.get('surprise', 'N/A')
-                report += f"| {period} | {actual} | {estimate} | {surprise} |\n"
-            report += "\n"
-        
-        # 資料可用性說明
-        report += "## 資料說明\n"
-        report += "- 本報告使用Finnhub API提供的官方財務資料\n"
-        report += "- 資料來源於公司財報和SEC檔案\n"
-        report += "- TTM表示過去12個月資料\n"
-        report += "- Annual表示年度資料\n\n"
+        # single-flight：多個 worker 同時分析同一股票時只呼叫一次 Finnhub API
+        def fetch():
+            return run_single_flight(
+                "finnhub_fundamentals", f"{ticker}:{curr_date}",
+                lambda: _fetch_fundamentals_finnhub(cache, ticker, curr_date),
+                # 成功的報告才會寫入快取；錯誤訊息不分享給等待者
+                publish_if=lambda _report: _load_cached_fundamentals_finnhub(cache, ticker) is not None,
+            )
         
-        if not basic_financials and not company_profile and not earnings:
-            report += "**警告**: 無法取得該股票的基本面資料，可能原因：\n"
-            report += "- 股票代碼不正確\n"
-            report += "- Finnhub API限制\n"
-            report += "- 該股票暫無基本面資料\n"
+        # stale-while-revalidate：寬限期內先回傳舊報告，背景重新取得
+        stale_key = cache.find_stale_cached_data(ticker, "fundamentals", data_source="finnhub")
+        stale_data = cache.load_fundamentals_data(stale_key) if stale_key else None
+        if stale_data:
+            refresh_in_background(f"finnhub_fundamentals:{ticker}", fetch)
+            return stale_data
         
-        # 儲存到快取
-        if report and len(report) > 100:  # 只有當報告有實際內容時才快取
-            cache.save_fundamentals_data(ticker, report, data_source="finnhub")
-        
-        logger.debug(f"Finnhub基本面資料取得完成，報告長度: {len(report)}")
-        return report
+        return fetch()
         
     except ImportError:
         return "錯誤：未安裝finnhub-python庫，請執行: pip install finnhub-python"
@@ -865,6 +674,146 @@ def get_fundamentals_finnhub(ticker, curr_date):
         return "Finnhub基本面資料取得失敗，請檢查API密鑰及網路連線"
 
 
+def _load_cached_fundamentals_finnhub(cache, ticker):
+    """從快取載入 Finnhub 基本面報告，無有效快取時回傳 None"""
+    cached_key = cache.find_cached_fundamentals_data(ticker, data_source="finnhub")
+    if cached_key:
+        cached_data = cache.load_fundamentals_data(cached_key)
+        if cached_data:
+            logger.debug(f"從快取載入Finnhub基本面資料: {ticker}")
+            return cached_data
+    return None
+
+
+def _fetch_fundamentals_finnhub(cache, ticker, curr_date):
+    """呼叫 Finnhub API 產生基本面報告並寫入快取（由 single-flight 保護呼叫）"""
+    # 雙重檢查：其他執行緒 / 行程可能已完成快取
+    cached_data = _load_cached_fundamentals_finnhub(cache, ticker)
+    if cached_data:
+        return cached_data
+
+    import finnhub
+
+    # 取得Finnhub API密鑰
+    api_key = os.getenv('FINNHUB_API_KEY')
+    if not api_key:
+        return "錯誤：未配置FINNHUB_API_KEY環境變數"
+
+    # 初始化Finnhub客戶端
+    finnhub_client = finnhub.Client(api_key=api_key)
+
+    logger.debug(f"使用Finnhub API取得 {ticker} 的基本面資料...")
+
+    # 並行呼叫 3 個 Finnhub API（共用 finnhub_extra 執行緒池）
+    fut_financials = _FINNHUB_IO_POOL.submit(
+        finnhub_client.company_basic_financials, ticker, 'all'
+    )
+    fut_profile = _FINNHUB_IO_POOL.submit(
+        finnhub_client.company_profile2, symbol=ticker
+    )
+    fut_earnings = _FINNHUB_IO_POOL.submit(
+        finnhub_client.company_earnings, ticker, limit=4
+    )
+
+    # 收集結果，個別容錯
+    try:
+        basic_financials = fut_financials.result(timeout=15)
+    except Exception as e:
+        logger.error(f"Finnhub基本財務資料取得失敗: {str(e)}")
+        basic_financials = None
+
+    try:
+        company_profile = fut_profile.result(timeout=15)
+    except Exception as e:
+        logger.error(f"Finnhub公司概況取得失敗: {str(e)}")
+        company_profile = None
+
+    try:
+        earnings = fut_earnings.result(timeout=15)
+    except Exception as e:
+        logger.error(f"Finnhub收益資料取得失敗: {str(e)}")
+        earnings = None
+
+    # 格式化報告
+    report = f"# {ticker} 基本面分析報告（Finnhub資料來源）\n\n"
+    report += f"**資料取得時間**: {curr_date}\n"
+    report += f"**資料來源**: Finnhub API\n\n"
+
+    # 公司概況部分
+    if company_profile:
+        report += "## 公司概況\n"
+        report += f"- **公司名稱**: {company_profile.get('name', 'N/A')}\n"
+        report += f"- **行業**: {company_profile.get('finnhubIndustry', 'N/A')}\n"
+        report += f"- **國家**: {company_profile.get('country', 'N/A')}\n"
+        report += f"- **貨幣**: {company_profile.get('currency', 'N/A')}\n"
+        report += f"- **市值**: {company_profile.get('marketCapitalization', 'N/A')} 百萬美元\n"
+        report += f"- **流通股數**: {company_profile.get('shareOutstanding', 'N/A')} 百萬股\n\n"
+
+    # 基本財務指標
+    if basic_financials and 'metric' in basic_financials:
+        metrics = basic_financials['metric']
+        report += "## 關鍵財務指標\n"
+        report += "| 指標 | 數值 |\n"
+        report += "|------|------|\n"
+
+        # 估值指標
+        if 'peBasicExclExtraTTM' in metrics:
+            report += f"| 市盈率 (PE) | {metrics['peBasicExclExtraTTM']:.2f} |\n"
+        if 'psAnnual' in metrics:
+            report += f"| 市銷率 (PS) | {metrics['psAnnual']:.2f} |\n"
+        if 'pbAnnual' in metrics:
+            report += f"| 市淨率 (PB) | {metrics['pbAnnual']:.2f} |\n"
+
+        # 盈利能力指標
+        if 'roeTTM' in metrics:
+            report += f"| 淨資產收益率 (ROE) | {metrics['roeTTM']:.2f}% |\n"
+        if 'roaTTM' in metrics:
+            report += f"| 總資產收益率 (ROA) | {metrics['roaTTM']:.2f}% |\n"
+        if 'netProfitMarginTTM' in metrics:
+            report += f"| 淨利潤率 | {metrics['netProfitMarginTTM']:.2f}% |\n"
+
+        # 財務健康指標
+        if 'currentRatioAnnual' in metrics:
+            report += f"| 流動比率 | {metrics['currentRatioAnnual']:.2f} |\n"
+        if 'totalDebt/totalEquityAnnual' in metrics:
+            report += f"| 負債權益比 | {metrics['totalDebt/totalEquityAnnual']:.2f} |\n"
+
+        report += "\n"
+
+    # 收益歷史
+    if earnings:
+        report += "## 收益歷史\n"
+        report += "| 季度 | 實際EPS | 預期EPS | 差異 |\n"
+        report += "|------|---------|---------|------|\n"
+        for earning in earnings[:4]:  # 顯示最近4個季度
+            actual = earning.get('actual', 'N/A')
+            estimate = earning.get('estimate', 'N/A')
+            period = earning.get('period', 'N/A')
+            surprise = earning.get('surprise', 'N/A')
+            report += f"| {period} | {actual} | {estimate} | {surprise} |\n"
+        report += "\n"
+
+    # 資料可用性說明
+    report += "## 資料說明\n"
+    report += "- 本報告使用Finnhub API提供的官方財務資料\n"
+    report += "- 資料來源於公司財報和SEC檔案\n"
+    report += "- TTM表示過去12個月資料\n"
+    report += "- Annual表示年度資料\n\n"
+
+    if not basic_financials and not company_profile and not earnings:
+        report += "**警告**: 無法取得該股票的基本面資料，可能原因：\n"
+        report += "- 股票代碼不正確\n"
+        report += "- Finnhub API限制\n"
+        report += "- 該股票暫無基本面資料\n"
+
+    # 儲存到快取
+    if report and len(report) > 100:  # 只有當報告有實際內容時才快取
+        cache.save_fundamentals_data(ticker, report, data_source="finnhub")
+
+    logger.debug(f"Finnhub基本面資料取得完成，報告長度: {len(report)}")
+    return report
+
+
 def get_fundamentals_openai(ticker, curr_date):
     """
     取得股票基本面資料，優先使用OpenAI，失敗時回退到Finnhub API
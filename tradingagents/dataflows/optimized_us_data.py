@@ -5,17 +5,24 @@
 """
 
 import time
+import threading as _threading
 from datetime import datetime
 from typing import Optional
 import yfinance as yf
 import pandas as pd
 from .cache_manager import get_cache
 from .config import get_config
+from .price_store import get_price_store
+from .single_flight import run_single_flight
+from .tiered_cache import NAMESPACE_STALE_GRACE, refresh_in_background
 
 # 匯入日誌模組
 from tradingagents.utils.logging_manager import get_logger
 logger = get_logger('agents')
 
+# FINNHUB 即時報價快取秒數（報告本身依請求區間即時產生，不再快取）
+_QUOTE_CACHE_TTL_SECONDS = 15 * 60
+
 
 class OptimizedUSDataProvider:
     """優化的美股資料提供器 - 整合快取和API限制處理"""
@@ -23,6 +30,10 @@ class OptimizedUSDataProvider:
     def __init__(self):
         self.cache = get_cache()
         self.config = get_config()
+        # 原始資料快取：日K線存於列式價格儲存，FINNHUB 報價存於記憶體
+        self.price_store = get_price_store()
+        self._quote_cache = {}
+        self._quote_cache_lock = _threading.Lock()
         # 按 API 端點分離 rate limit，避免跨端點互相阻塞
         self._rate_limits = {
             "finnhub": {"last_call": 0, "interval": 0.3},   # FinnHub 60/min，0.3s 允許突發
@@ -48,7 +59,10 @@ class OptimizedUSDataProvider:
                       force_refresh: bool = False) -> str:
         """
         取得美股資料 - 優先使用快取
-        
+
+        快取的是原始資料（FINNHUB 報價 / Yahoo Finance 日K線），報告依請求區間即時產生，
+        因此不同區間、不同指標的請求都能共用同一次抓取。
+
         Args:
             symbol: 股票代碼
             start_date: 開始日期 (YYYY-MM-DD)
@@ -59,91 +73,176 @@ class OptimizedUSDataProvider:
             格式化的股票資料字串
         """
         logger.info(f"取得美股資料: {symbol} ({start_date} 到 {end_date})")
-        
-        # 檢查快取（除非強制重新整理）
-        if not force_refresh:
-            # 優先查找FINNHUB快取
-            cache_key = self.cache.find_cached_stock_data(
-                symbol=symbol,
-                start_date=start_date,
-                end_date=end_date,
-                data_source="finnhub"
-            )
-
-            # 如果沒有FINNHUB快取，查找Yahoo Finance快取
-            if not cache_key:
-                cache_key = self.cache.find_cached_stock_data(
-                    symbol=symbol,
-                    start_date=start_date,
-                    end_date=end_date,
-                    data_source="yfinance"
-                )
-
-            if cache_key:
-                cached_data = self.cache.load_stock_data(cache_key)
-                if cached_data:
-                    logger.info(f"從快取載入美股資料: {symbol}")
-                    return cached_data
-        
-        # 快取未命中，從API取得 - 優先使用FINNHUB
-        formatted_data = None
-        data_source = None
 
-        # 嘗試FINNHUB API（優先）
+        # 優先使用 FINNHUB 即時報價；時點資料模式（回測）只使用分析日以前的K線，避免引入未來資訊
+        if not get_config().get("point_in_time_data", False):
+            try:
+                quote = self.get_quote(symbol, force_refresh=force_refresh)
+                if quote:
+                    logger.info(f"FINNHUB資料取得成功: {symbol}")
+                    return self._render_finnhub_report(symbol, quote, start_date, end_date)
+                logger.error("FINNHUB資料取得失敗，嘗試備用方案")
+            except Exception as e:
+                logger.error(f"FINNHUB API呼叫失敗: {e}")
+
+        # 備用方案：使用 Yahoo Finance 日K線
         try:
+            data = self.get_price_history(symbol, start_date, end_date, force_refresh=force_refresh)
+            if data is None or data.empty:
+                error_msg = f"未找到股票 '{symbol}' 在 {start_date} 到 {end_date} 期間的資料"
+                logger.error(f"{error_msg}")
+            else:
+                logger.info(f"Yahoo Finance資料取得成功: {symbol}")
+                return self._format_stock_data(symbol, data, start_date, end_date)
+        except Exception as e:
+            logger.error(f"資料取得失敗: {e}")
+
+        # 如果所有API都失敗，生成備用資料
+        error_msg = "所有美股資料來源都不可用"
+        logger.error(f"{error_msg}")
+        return self._generate_fallback_data(symbol, start_date, end_date, error_msg)
+
+    def get_quote(self, symbol: str, force_refresh: bool = False) -> Optional[dict]:
+        """
+        取得 FINNHUB 即時報價原始資料（含公司名稱），依 symbol 快取
+
+        Returns:
+            {"quote": 報價 dict, "company_name": 公司名稱}，無 API 金鑰或失敗時回傳 None
+        """
+        symbol = symbol.upper()
+
+        def fetch() -> Optional[dict]:
             logger.info(f"從FINNHUB API取得資料: {symbol}")
             self._wait_for_rate_limit("finnhub")
+            return self._get_data_from_finnhub(symbol)
 
-            formatted_data = self._get_data_from_finnhub(symbol, start_date, end_date)
-            if formatted_data and "錯誤訊息" not in formatted_data:
-                data_source = "finnhub"
-                logger.info(f"FINNHUB資料取得成功: {symbol}")
-            else:
-                logger.error("FINNHUB資料取得失敗，嘗試備用方案")
-                formatted_data = None
+        def refresh() -> Optional[dict]:
+            # single-flight：多個 worker 同時請求同一報價時只呼叫一次 API
+            raw = run_single_flight("finnhub_quote", symbol, fetch)
+            if raw:
+                with self._quote_cache_lock:
+                    self._quote_cache[symbol] = (time.time(), raw)
+            return raw
 
-        except Exception as e:
-            logger.error(f"FINNHUB API呼叫失敗: {e}")
-            formatted_data = None
+        if not force_refresh:
+            with self._quote_cache_lock:
+                cached = self._quote_cache.get(symbol)
+            if cached:
+                age = time.time() - cached[0]
+                if age < _QUOTE_CACHE_TTL_SECONDS:
+                    logger.info(f"從快取載入美股報價: {symbol}")
+                    return cached[1]
+                # stale-while-revalidate：寬限期內先回傳舊報價，背景更新
+                grace = NAMESPACE_STALE_GRACE.get("finnhub_quote", 0)
+                if age < _QUOTE_CACHE_TTL_SECONDS + grace:
+                    refresh_in_background(f"finnhub_quote:{symbol}", refresh)
+                    logger.info(f"美股報價快取已過期，先回傳舊資料並於背景更新: {symbol}")
+                    return cached[1]
+
+        return refresh()
+
+    def get_price_history(self, symbol: str, start_date: str, end_date: str,
+                          force_refresh: bool = False) -> Optional[pd.DataFrame]:
+        """
+        取得 Yahoo Finance 日K線原始資料 [start_date, end_date)
 
-        # 備用方案：使用 Yahoo Finance 取得資料
-        if not formatted_data:
-            try:
-                logger.info(f"從Yahoo Finance API取得資料: {symbol}")
-                self._wait_for_rate_limit("yfinance")
+        K線保存在列式價格儲存中（與 stockstats 線上模式共用），只下載尚未覆蓋的缺口；
+        任何被既有資料覆蓋的區間都直接切片回傳，不再向 Yahoo Finance 請求。
 
-                ticker = yf.Ticker(symbol.upper())
-                data = ticker.history(start=start_date, end=end_date)
+        Returns:
+            以日期為 index 的 OHLCV DataFrame，無資料時回傳 None
+        """
+        symbol = symbol.upper()
 
-                if data.empty:
-                    error_msg = f"未找到股票 '{symbol}' 在 {start_date} 到 {end_date} 期間的資料"
-                    logger.error(f"{error_msg}")
-                else:
-                    formatted_data = self._format_stock_data(symbol, data, start_date, end_date)
-                    data_source = "yfinance"
-                    logger.info(f"Yahoo Finance資料取得成功: {symbol}")
+        def fetch(fetch_start: str, fetch_end: str) -> pd.DataFrame:
+            def download() -> pd.DataFrame:
+                logger.info(f"從Yahoo Finance API取得資料: {symbol} ({fetch_start} 到 {fetch_end})")
+                self._wait_for_rate_limit("yfinance")
+                data = yf.Ticker(symbol).history(start=fetch_start, end=fetch_end).reset_index()
+                # 日期放在欄位中並去除時區（保留交易所當地日期），經分層快取的 JSON 發布給
+                # 其他行程後仍還原為日期欄，不會因轉為 UTC 而跨日
+                if "Date" in data.columns and getattr(data["Date"].dt, "tz", None) is not None:
+                    data["Date"] = data["Date"].dt.tz_localize(None)
+                return data
+
+            # single-flight：多個 worker 同時請求同一缺口時只下載一次
+            return run_single_flight("yfinance_history", f"{symbol}:{fetch_start}:{fetch_end}", download)
+
+        if force_refresh:
+            # 與 ensure_range 一致，只保存已收盤的交易日
+            today = datetime.now().strftime("%Y-%m-%d")
+            if start_date < today:
+                self.price_store.merge(symbol, fetch(start_date, min(end_date, today)), [])
+        else:
+            self.price_store.ensure_range(symbol, start_date, end_date, fetch)
+
+        # end_date 不含（與 yfinance history 的語意一致）
+        last_day = (pd.Timestamp(end_date) - pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+        frame = self.price_store.get_frame(symbol, start_date, last_day)
+        if frame is None or frame.empty:
+            return None
+        frame.index = pd.DatetimeIndex(pd.to_datetime(frame.pop("Date")), name="Date")
+        return frame
 
-            except Exception as e:
-                logger.error(f"資料取得失敗: {e}")
-                formatted_data = None
+    def prefetch_price_histories(self, symbols, start_date: str, end_date: str) -> list:
+        """
+        以單次 yf.download 批次補齊多檔股票的日K線 [start_date, end_date)
 
-        # 如果所有API都失敗，生成備用資料
-        if not formatted_data:
-            error_msg = "所有美股資料來源都不可用"
-            logger.error(f"{error_msg}")
-            return self._generate_fallback_data(symbol, start_date, end_date, error_msg)
-
-        # 保存到快取
-        self.cache.save_stock_data(
-            symbol=symbol,
-            data=formatted_data,
-            start_date=start_date,
-            end_date=end_date,
-            data_source=data_source
+        供批次分析在執行圖之前呼叫：已完整覆蓋的股票不下載，其餘股票合併為一個請求，
+        結果寫入列式價格儲存（與 stockstats 線上模式共用），之後 get_price_history 直接命中。
+
+        Returns:
+            本次寫入價格儲存的股票代碼列表
+        """
+        start_date = start_date[:10]
+        # 與 ensure_range 一致，只保存已收盤的交易日
+        end_date = min(end_date[:10], datetime.now().strftime("%Y-%m-%d"))
+        if start_date >= end_date:
+            return []
+
+        pending = [
+            symbol for symbol in dict.fromkeys(s.upper() for s in symbols)
+            if self.price_store.missing_ranges(symbol, start_date, end_date)
+        ]
+        if not pending:
+            return []
+
+        logger.info(f"從Yahoo Finance API批次取得資料: {len(pending)} 檔 ({start_date} 到 {end_date})")
+        self._wait_for_rate_limit("yfinance")
+        data = yf.download(
+            pending,
+            start=start_date,
+            end=end_date,
+            group_by="ticker",
+            auto_adjust=True,
+            progress=False,
         )
+        if data is None or data.empty:
+            return []
+
+        seeded = []
+        for symbol in pending:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                frame = data[symbol]
+            else:
+                frame = data
+            frame = frame.dropna(how="all")
+            if frame.empty:
+                # 下載失敗的股票不登記覆蓋，分析時由單檔請求重試
+                continue
+            frame = frame.rename_axis("Date").reset_index()
+
+            def from_batch(fetch_start: str, fetch_end: str, frame=frame) -> pd.DataFrame:
+                dates = pd.to_datetime(frame["Date"]).dt.strftime("%Y-%m-%d")
+                return frame[(dates >= fetch_start) & (dates < fetch_end)]
+
+            # 經由 ensure_range 寫入：沿用逐檔鎖、缺口登記與歷史價格重新調整偵測
+            self.price_store.ensure_range(symbol, start_date, end_date, from_batch)
+            seeded.append(symbol)
+        return seeded
 
-        return formatted_data
-    
     def _format_stock_data(self, symbol: str, data: pd.DataFrame, 
                           start_date: str, end_date: str) -> str:
         """格式化股票資料為字串"""
@@ -208,35 +307,22 @@ class OptimizedUSDataProvider:
     def _try_get_old_cache(self, symbol: str, start_date: str, end_date: str) -> Optional[str]:
         """嘗試取得過期的快取資料作為備用"""
         try:
-            # 查找任何相關的快取，不考慮TTL
-            for metadata_file in self.cache.metadata_dir.glob(f"*_meta.json"):
-                try:
-                    import json
-                    with open(metadata_file, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-                    
-                    if (metadata.get('symbol') == symbol and 
-                        metadata.get('data_type') == 'stock_data' and
-                        metadata.get('market_type') == 'us'):
-                        
-                        cache_key = metadata_file.stem.replace('_meta', '')
-                        cached_data = self.cache.load_stock_data(cache_key)
-                        if cached_data:
-                            return cached_data + "\n\n註意: 使用的是過期快取資料"
-                except (json.JSONDecodeError, KeyError, IOError):
-                    continue
-        except OSError as e:
-            logger.debug(f"讀取快取目錄失敗: {e}")
+            # 查找任何相關的快取，不考慮TTL（最新的在前）
+            for cache_key in self.cache._find_in_index(symbol=symbol, data_type='stock_data',
+                                                       market_type='us'):
+                cached_data = self.cache.load_stock_data(cache_key)
+                if isinstance(cached_data, str) and cached_data:
+                    return cached_data + "\n\n註意: 使用的是過期快取資料"
+        except Exception as e:
+            logger.debug(f"讀取快取索引失敗: {e}")
 
         return None
 
-    def _get_data_from_finnhub(self, symbol: str, start_date: str, end_date: str) -> str:
-        """從FINNHUB API取得股票資料"""
+    def _get_data_from_finnhub(self, symbol: str) -> Optional[dict]:
+        """從FINNHUB API取得即時報價與公司名稱（原始資料）"""
         try:
             import finnhub
             import os
-            from datetime import datetime
-
 
             # 取得API密鑰
             api_key = os.getenv('FINNHUB_API_KEY')
@@ -254,12 +340,27 @@ class OptimizedUSDataProvider:
             profile = client.company_profile2(symbol=symbol.upper())
             company_name = profile.get('name', symbol.upper()) if profile else symbol.upper()
 
-            # 格式化資料
-            current_price = quote.get('c', 0)
-            change = quote.get('d', 0)
-            change_percent = quote.get('dp', 0)
+            return {
+                "quote": quote,
+                "company_name": company_name,
+                "fetched_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+
+        except Exception as e:
+            logger.error(f"FINNHUB資料取得失敗: {e}")
+            return None
+
+    def _render_finnhub_report(self, symbol: str, raw: dict, start_date: str, end_date: str) -> str:
+        """由 FINNHUB 原始報價產生報告"""
+        quote = raw["quote"]
+        company_name = raw.get("company_name", symbol.upper())
 
-            formatted_data = f"""# {symbol.upper()} 美股資料分析
+        # 格式化資料
+        current_price = quote.get('c', 0)
+        change = quote.get('d', 0)
+        change_percent = quote.get('dp', 0)
+
+        return f"""# {symbol.upper()} 美股資料分析
 
 ## 實時行情
 - 股票名稱: {company_name}
@@ -270,7 +371,7 @@ class OptimizedUSDataProvider:
 - 最高價: ${quote.get('h', 0):.2f}
 - 最低價: ${quote.get('l', 0):.2f}
 - 前收盤: ${quote.get('pc', 0):.2f}
-- 更新時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+- 更新時間: {raw.get('fetched_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))}
 
 ## 資料概覽
 - 資料期間: {start_date} 至 {end_date}
@@ -281,12 +382,6 @@ class OptimizedUSDataProvider:
 生成時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 """
 
-            return formatted_data
-
-        except Exception as e:
-            logger.error(f"FINNHUB資料取得失敗: {e}")
-            return None
-
     def _generate_fallback_data(self, symbol: str, start_date: str, end_date: str, error_msg: str) -> str:
         """在所有資料來源失敗時生成錯誤報告（不含任何模擬數據）"""
         return f"""# {symbol} 美股資料取得失敗
@@ -308,7 +403,6 @@ class OptimizedUSDataProvider:
 
 
 # 全局實例（執行緒安全）
-import threading as _threading
 _us_data_provider = None
 _us_data_provider_lock = _threading.Lock()
 
@@ -338,3 +432,19 @@ def get_us_stock_data_cached(symbol: str, start_date: str, end_date: str,
     """
     provider = get_optimized_us_data_provider()
     return provider.get_stock_data(symbol, start_date, end_date, force_refresh)
+
+
+def prefetch_us_price_histories(symbols, start_date: str, end_date: str) -> list:
+    """
+    批次預載入多檔美股日K線的便捷函式（單次 yf.download）
+
+    Args:
+        symbols: 股票代碼列表
+        start_date: 開始日期 (YYYY-MM-DD)
+        end_date: 結束日期 (YYYY-MM-DD，不含)
+
+    Returns:
+        本次寫入價格儲存的股票代碼列表
+    """
+    provider = get_optimized_us_data_provider()
+    return provider.prefetch_price_histories(symbols, start_date, end_date)
@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+列式價格儲存
+每支股票一個目錄，每個欄位一個原始二進位檔（float64 / datetime64[D]），
+讀取時以 numpy.memmap 映射並用日期二分搜尋切片，避免重複解析 CSV 與日期轉換；
+新K線以附加寫入的方式追加到檔尾，不需重寫整個檔案。
+
+目錄結構:
+    {root_dir}/{SYMBOL}/meta.json      欄位清單、原始 dtype 與附加資訊
+    {root_dir}/{SYMBOL}/Date.bin       交易日（datetime64[D]，int64）
+    {root_dir}/{SYMBOL}/{column}.bin   數值欄位（float64，讀取時整數欄還原為原始 dtype）
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Callable
+
+import numpy as np
+import pandas as pd
+
+# 匯入日誌模組
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('dataflows')
+
+
+_DATE_COLUMN = "Date"
+_DATE_DTYPE = np.dtype("datetime64[D]")
+_VALUE_DTYPE = np.dtype("float64")
+_OFFLINE_CSV_TEMPLATE = "{symbol}-YFin-data-2015-01-01-2025-03-25.csv"
+# 含交易日的區間下載結果為空時（可能是假日或下載失敗），暫不重試的秒數
+_EMPTY_GAP_RETRY_SECONDS = 3600
+
+
+def _column_file(column: str) -> str:
+    """欄位對應的檔名（如 "Adj Close" 轉為 "Adj_Close.bin"）"""
+    return column.replace(" ", "_").replace("/", "_") + ".bin"
+
+
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def _next_day(date_str: str) -> str:
+    return str(np.datetime64(date_str[:10], "D") + 1)
+
+
+def _merge_intervals(intervals: List[List[str]]) -> List[List[str]]:
+    """合併重疊或相鄰的 [start, end) 日期區間"""
+    merged: List[List[str]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _normalize_dates(values) -> np.ndarray:
+    """將任意日期欄（字串含時區、Timestamp）正規化為 datetime64[D]"""
+    as_str = pd.Series(values).astype(str).str[:10]
+    return pd.to_datetime(as_str, format="%Y-%m-%d").to_numpy().astype(_DATE_DTYPE)
+
+
+class PriceStore:
+    """每股一目錄的列式 OHLCV 儲存（memory-mapped，可附加）"""
+
+    def __init__(self, root_dir: str):
+        self.root_dir = str(root_dir)
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # 已映射的欄位快取 {symbol: (signature, {column: memmap})}
+        self._maps: Dict[str, tuple] = {}
+        # 每支股票的補資料鎖，避免多執行緒重複下載同一缺口
+        self._symbol_locks: Dict[str, threading.Lock] = {}
+        # 下載結果為空的缺口 {(symbol, start, end): 時間戳}
+        self._empty_gaps: Dict[tuple, float] = {}
+
+    # ------------------------------------------------------------------
+    # 路徑與 metadata
+    # ------------------------------------------------------------------
+
+    def _symbol_dir(self, symbol: str) -> str:
+        return os.path.join(self.root_dir, symbol.upper())
+
+    def _meta_path(self, symbol: str) -> str:
+        return os.path.join(self._symbol_dir(symbol), "meta.json")
+
+    def get_meta(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """讀取股票 metadata（欄位清單、附加資訊），不存在時回傳 None"""
+        try:
+            with open(self._meta_path(symbol), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def update_meta(self, symbol: str, **fields) -> None:
+        """更新 metadata 的附加欄位（如資料來源、抓取區間）"""
+        with self._lock:
+            meta = self.get_meta(symbol)
+            if meta is None:
+                return
+            meta.update(fields)
+            self._write_meta(symbol, meta)
+
+    def _write_meta(self, symbol: str, meta: Dict[str, Any]) -> None:
+        meta["updated_at"] = datetime.now().isoformat()
+        tmp_path = self._meta_path(symbol) + f".{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self._meta_path(symbol))
+
+    def has(self, symbol: str) -> bool:
+        return self.get_meta(symbol) is not None
+
+    # ------------------------------------------------------------------
+    # 讀取
+    # ------------------------------------------------------------------
+
+    def _signature(self, symbol: str, columns: List[str]) -> Optional[tuple]:
+        sizes = []
+        for column in [_DATE_COLUMN] + columns:
+            try:
+                sizes.append(os.path.getsize(os.path.join(self._symbol_dir(symbol), _column_file(column))))
+            except OSError:
+                return None
+        return tuple(sizes)
+
+    def _load_maps(self, symbol: str) -> Optional[Dict[str, np.ndarray]]:
+        """取得欄位映射；檔案大小改變（附加或重寫）時重新映射"""
+        meta = self.get_meta(symbol)
+        if meta is None:
+            return None
+        columns = meta.get("columns", [])
+        signature = self._signature(symbol, columns)
+        if signature is None:
+            return None
+
+        with self._lock:
+            cached = self._maps.get(symbol.upper())
+            if cached and cached[0] == (signature, tuple(columns)):
+                return cached[1]
+
+        # 各欄位以最短長度為準，避免附加寫入中途被讀到長度不一致
+        length = min(
+            size // (_DATE_DTYPE.itemsize if i == 0 else _VALUE_DTYPE.itemsize)
+            for i, size in enumerate(signature)
+        )
+        maps: Dict[str, np.ndarray] = {}
+        for column in [_DATE_COLUMN] + columns:
+            dtype = _DATE_DTYPE if column == _DATE_COLUMN else _VALUE_DTYPE
+            path = os.path.join(self._symbol_dir(symbol), _column_file(column))
+            if length == 0:
+                maps[column] = np.empty(0, dtype=dtype)
+            else:
+                maps[column] = np.memmap(path, dtype=dtype, mode="r", shape=(length,))
+
+        with self._lock:
+            self._maps[symbol.upper()] = ((signature, tuple(columns)), maps)
+        return maps
+
+    def get_arrays(self, symbol: str, start_date: str = None,
+                   end_date: str = None) -> Optional[Dict[str, np.ndarray]]:
+        """
+        取得 [start_date, end_date] 區間的欄位陣列（memmap 零拷貝切片）
+
+        Returns:
+            {"Date": datetime64[D] 陣列, 欄位: float64 陣列}，無資料時回傳 None
+        """
+        maps = self._load_maps(symbol)
+        if maps is None:
+            return None
+        lo, hi = self._bounds(maps[_DATE_COLUMN], start_date, end_date)
+        return {column: values[lo:hi] for column, values in maps.items()}
+
+    @staticmethod
+    def _bounds(dates: np.ndarray, start_date: str = None, end_date: str = None) -> tuple:
+        """以二分搜尋取得 [start_date, end_date] 在序列中的 [lo, hi) 位置"""
+        lo = 0 if start_date is None else int(np.searchsorted(dates, np.datetime64(start_date[:10], "D"), side="left"))
+        hi = len(dates) if end_date is None else int(np.searchsorted(dates, np.datetime64(end_date[:10], "D"), side="right"))
+        return lo, hi
+
+    def get_frame(self, symbol: str, start_date: str = None, end_date: str = None,
+                  keep_index: bool = False) -> Optional[pd.DataFrame]:
+        """
+        取得區間 DataFrame，Date 欄為 YYYY-mm-dd 字串（與原 CSV 流程相容）
+
+        整數欄（如 Volume）還原為寫入時的 dtype（區間內含 NaN 時維持 float64）；
+        keep_index=True 時 index 為該列在完整序列中的位置，與直接篩選原 CSV 的結果一致。
+        """
+        maps = self._load_maps(symbol)
+        if maps is None:
+            return None
+        lo, hi = self._bounds(maps[_DATE_COLUMN], start_date, end_date)
+        frame = pd.DataFrame({
+            column: np.asarray(values[lo:hi]) for column, values in maps.items() if column != _DATE_COLUMN
+        })
+        frame.insert(0, _DATE_COLUMN, np.datetime_as_string(maps[_DATE_COLUMN][lo:hi], unit="D"))
+        if keep_index:
+            frame.index = pd.RangeIndex(lo, lo + len(frame))
+
+        dtypes = (self.get_meta(symbol) or {}).get("dtypes", {})
+        for column, dtype in dtypes.items():
+            if column not in frame.columns or frame[column].isna().any():
+                continue
+            try:
+                dtype = np.dtype(dtype)
+            except TypeError:
+                continue
+            if dtype.kind in "iub":
+                frame[column] = frame[column].astype(dtype)
+        return frame
+
+    def date_range(self, symbol: str) -> Optional[tuple]:
+        """回傳已儲存的 (第一個交易日, 最後一個交易日)，無資料時回傳 None"""
+        arrays = self.get_arrays(symbol)
+        if not arrays or len(arrays[_DATE_COLUMN]) == 0:
+            return None
+        dates = arrays[_DATE_COLUMN]
+        return str(dates[0]), str(dates[-1])
+
+    # ------------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _prepare(data: pd.DataFrame) -> tuple:
+        """抽出日期與數值欄，依日期排序並去除重複日期
+
+        Returns:
+            (dates, columns, values, dtypes, dropped)：dtypes 為數值欄的原始 dtype，
+            dropped 為無法以 float64 保存而略過的非數值欄
+        """
+        if _DATE_COLUMN not in data.columns:
+            data = data.reset_index()
+            if _DATE_COLUMN not in data.columns:
+                data = data.rename(columns={data.columns[0]: _DATE_COLUMN})
+        dates = _normalize_dates(data[_DATE_COLUMN])
+        columns, dropped = [], []
+        for c in data.columns:
+            if c == _DATE_COLUMN:
+                continue
+            (columns if pd.api.types.is_numeric_dtype(data[c]) else dropped).append(c)
+        order = np.argsort(dates, kind="stable")
+        dates = dates[order]
+        keep = np.ones(len(dates), dtype=bool)
+        keep[1:] = dates[1:] != dates[:-1]
+        values = {c: data[c].to_numpy(dtype=_VALUE_DTYPE)[order][keep] for c in columns}
+        dtypes = {c: str(data[c].dtype) for c in columns}
+        return dates[keep], columns, values, dtypes, [str(c) for c in dropped]
+
+    def write(self, symbol: str, data: pd.DataFrame, **meta_fields) -> int:
+        """以整段資料取代股票的既有序列，回傳寫入筆數"""
+        dates, columns, values, dtypes, dropped = self._prepare(data)
+        symbol_dir = self._symbol_dir(symbol)
+        os.makedirs(symbol_dir, exist_ok=True)
+
+        with self._lock:
+            self._maps.pop(symbol.upper(), None)
+            tmp_suffix = f".{os.getpid()}.tmp"
+            for column, array, dtype in [(_DATE_COLUMN, dates, _DATE_DTYPE)] + [
+                (c, values[c], _VALUE_DTYPE) for c in columns
+            ]:
+                path = os.path.join(symbol_dir, _column_file(column))
+                np.ascontiguousarray(array, dtype=dtype).tofile(path + tmp_suffix)
+                os.replace(path + tmp_suffix, path)
+            meta = dict(meta_fields)
+            meta.update(symbol=symbol.upper(), columns=columns, dtypes=dtypes, dropped_columns=dropped)
+            self._write_meta(symbol, meta)
+
+        logger.debug(f"[PriceStore] 寫入 {symbol}: {len(dates)} 筆")
+        return len(dates)
+
+    def append(self, symbol: str, data: pd.DataFrame, **meta_fields) -> int:
+        """
+        附加晚於最後交易日的新K線，回傳新增筆數
+        股票尚無資料時等同 write()；欄位缺漏時以 NaN 補齊
+        """
+        meta = self.get_meta(symbol)
+        if meta is None:
+            return self.write(symbol, data, **meta_fields)
+
+        dates, _, values, _, _ = self._prepare(data)
+        current = self.get_arrays(symbol)
+        if current is not None and len(current[_DATE_COLUMN]) > 0:
+            newer = dates > current[_DATE_COLUMN][-1]
+            dates = dates[newer]
+            values = {c: v[newer] for c, v in values.items()}
+
+        if len(dates) == 0:
+            if meta_fields:
+                self.update_meta(symbol, **meta_fields)
+            return 0
+
+        columns = meta.get("columns", [])
+        symbol_dir = self._symbol_dir(symbol)
+        with self._lock:
+            # 數值欄先寫、日期欄最後寫，讀取端以最短欄位長度為準，不會讀到半筆資料
+            for column in columns:
+                array = values.get(column)
+                if array is None:
+                    array = np.full(len(dates), np.nan, dtype=_VALUE_DTYPE)
+                with open(os.path.join(symbol_dir, _column_file(column)), "ab") as f:
+                    f.write(np.ascontiguousarray(array, dtype=_VALUE_DTYPE).tobytes())
+            with open(os.path.join(symbol_dir, _column_file(_DATE_COLUMN)), "ab") as f:
+                f.write(np.ascontiguousarray(dates, dtype=_DATE_DTYPE).tobytes())
+            meta.update(meta_fields)
+            self._write_meta(symbol, meta)
+
+        logger.debug(f"[PriceStore] 附加 {symbol}: {len(dates)} 筆")
+        return len(dates)
+
+    def import_csv(self, symbol: str, csv_path: str) -> bool:
+        """
+        由 CSV 建立列式序列；已匯入且 CSV 未更新時直接略過
+
+        Returns:
+            bool: 本次是否重新匯入
+        """
+        mtime = os.path.getmtime(csv_path)
+        meta = self.get_meta(symbol)
+        # 舊版 metadata 沒有 dtypes，重新匯入以還原整數欄
+        if (meta and "dtypes" in meta and meta.get("source_path") == os.path.abspath(csv_path)
+                and meta.get("source_mtime") == mtime):
+            return False
+        data = pd.read_csv(csv_path)
+        self.write(symbol, data, source_path=os.path.abspath(csv_path), source_mtime=mtime)
+        logger.info(f"[PriceStore] 已由 CSV 匯入 {symbol}: {csv_path}")
+        return True
+
+
+    # ------------------------------------------------------------------
+    # 區間覆蓋（線上資料的增量補齊）
+    # ------------------------------------------------------------------
+
+    def get_coverage(self, symbol: str) -> List[List[str]]:
+        """回傳已向資料源查詢過的 [start, end) 日期區間（end 不含）"""
+        meta = self.get_meta(symbol)
+        if meta is None:
+            return []
+        coverage = meta.get("coverage")
+        if coverage is None:
+            # 舊版 metadata 沒有覆蓋紀錄，以已儲存的首末交易日推估
+            stored = self.date_range(symbol)
+            return [[stored[0], _next_day(stored[1])]] if stored else []
+        return coverage
+
+    def missing_ranges(self, symbol: str, start_date: str, end_date: str) -> List[tuple]:
+        """回傳 [start_date, end_date) 中尚未覆蓋的缺口區間"""
+        gaps = []
+        cursor = start_date[:10]
+        end_date = end_date[:10]
+        for cov_start, cov_end in self.get_coverage(symbol):
+            if cov_end <= cursor:
+                continue
+            if cov_start >= end_date:
+                break
+            if cov_start > cursor:
+                gaps.append((cursor, cov_start))
+            cursor = max(cursor, cov_end)
+            if cursor >= end_date:
+                break
+        if cursor < end_date:
+            gaps.append((cursor, end_date))
+        return gaps
+
+    def merge(self, symbol: str, data: Optional[pd.DataFrame], covered: List[tuple]) -> int:
+        """
+        合併一段新資料並登記覆蓋區間，回傳寫入筆數
+        新資料全部晚於既有序列時以附加寫入，否則合併後重寫（新資料優先）
+        """
+        meta = self.get_meta(symbol)
+        coverage = _merge_intervals(self.get_coverage(symbol) + [list(r) for r in covered])
+
+        if data is None or data.empty:
+            if meta is not None:
+                self.update_meta(symbol, coverage=coverage)
+            return 0
+
+        if _DATE_COLUMN not in data.columns:
+            data = data.reset_index()
+        stored = self.date_range(symbol)
+        new_dates = _normalize_dates(data[_DATE_COLUMN])
+        if stored is None or new_dates.min() > np.datetime64(stored[1], "D"):
+            return self.append(symbol, data, coverage=coverage)
+
+        existing = self.get_frame(symbol)
+        combined = pd.concat([data, existing], ignore_index=True)
+        extra = {
+            k: v for k, v in meta.items()
+            if k not in ("symbol", "columns", "dtypes", "dropped_columns", "updated_at")
+        }
+        extra["coverage"] = coverage
+        return self.write(symbol, combined, **extra)
+
+    def _get_symbol_lock(self, symbol: str) -> threading.Lock:
+        with self._lock:
+            lock = self._symbol_locks.get(symbol.upper())
+            if lock is None:
+                lock = threading.Lock()
+                self._symbol_locks[symbol.upper()] = lock
+            return lock
+
+    def _adjustment_changed(self, symbol: str, date_str: str, data: pd.DataFrame) -> bool:
+        """比對重疊交易日的收盤價，判斷歷史價格是否已被重新調整（除權息、分割）"""
+        stored = self.get_arrays(symbol, date_str, date_str)
+        if not stored or "Close" not in stored or len(stored["Close"]) == 0:
+            return False
+        if _DATE_COLUMN not in data.columns:
+            data = data.reset_index()
+        if "Close" not in data.columns:
+            return False
+        dates = _normalize_dates(data[_DATE_COLUMN])
+        fresh = data["Close"].to_numpy(dtype=_VALUE_DTYPE)[dates == np.datetime64(date_str, "D")]
+        if len(fresh) == 0:
+            return False
+        old = float(stored["Close"][0])
+        return not np.isclose(old, float(fresh[0]), rtol=1e-6, equal_nan=True)
+
+    def ensure_range(self, symbol: str, start_date: str, end_date: str,
+                     fetch_fn: Callable[[str, str], Optional[pd.DataFrame]]) -> int:
+        """
+        確保 [start_date, end_date) 已在儲存中，只下載缺少的頭尾或中間缺口
+        （end_date 超過今天時以今天為界）
+
+        Args:
+            fetch_fn: fetch_fn(start, end) 下載 [start, end) 的K線 DataFrame
+
+        Returns:
+            int: 本次向資料源發出的請求數
+        """
+        # 只保存已收盤的交易日：今天（含）之後的區間不登記覆蓋，避免盤中K線被當成定案
+        start_date, end_date = start_date[:10], min(end_date[:10], _today())
+        requests = 0
+        with self._get_symbol_lock(symbol):
+            for gap_start, gap_end in self.missing_ranges(symbol, start_date, end_date):
+                gap_key = (symbol.upper(), gap_start, gap_end)
+                if time.time() - self._empty_gaps.get(gap_key, 0) < _EMPTY_GAP_RETRY_SECONDS:
+                    continue
+
+                # 尾端缺口多抓最後一個已存交易日，用來偵測歷史價格是否重新調整
+                stored = self.date_range(symbol)
+                tail_overlap = stored is not None and gap_start > stored[1]
+                fetch_start = stored[1] if tail_overlap else gap_start
+
+                data = fetch_fn(fetch_start, gap_end)
+                requests += 1
+                if data is None or data.empty:
+                    if np.busday_count(gap_start, gap_end) == 0:
+                        # 缺口只有週末，確定沒有K線，直接登記為已覆蓋
+                        self.merge(symbol, None, [(gap_start, gap_end)])
+                    else:
+                        self._empty_gaps[gap_key] = time.time()
+                    continue
+
+                if tail_overlap and self._adjustment_changed(symbol, stored[1], data):
+                    logger.info(f"[PriceStore] {symbol} 歷史價格已重新調整，重新下載 {start_date} ~ {end_date}")
+                    full = fetch_fn(start_date, end_date)
+                    requests += 1
+                    if full is not None and not full.empty:
+                        self.write(symbol, full, coverage=[[start_date, end_date]])
+                    break
+
+                if tail_overlap:
+                    # 去掉重疊K線，讓 merge 走附加寫入而非重寫整段序列
+                    if _DATE_COLUMN not in data.columns:
+                        data = data.reset_index()
+                    data = data[_normalize_dates(data[_DATE_COLUMN]) > np.datetime64(stored[1], "D")]
+                self.merge(symbol, data, [(gap_start, gap_end)])
+
+        if requests:
+            logger.debug(f"[PriceStore] {symbol} 補齊 {start_date} ~ {end_date}，請求 {requests} 次")
+        return requests
+
+
+# ---------------------------------------------------------------------------
+# 全局實例（依根目錄區分）
+# ---------------------------------------------------------------------------
+_store_instances: Dict[str, PriceStore] = {}
+_store_instances_lock = threading.Lock()
+
+
+def get_price_store(root_dir: str = None) -> PriceStore:
+    """取得指定根目錄的價格儲存實例，預設位於 data_cache_dir/price_store"""
+    if root_dir is None:
+        from .config import get_config
+        root_dir = os.path.join(get_config()["data_cache_dir"], "price_store")
+    root_dir = os.path.abspath(root_dir)
+    store = _store_instances.get(root_dir)
+    if store is None:
+        with _store_instances_lock:
+            store = _store_instances.get(root_dir)
+            if store is None:
+                store = PriceStore(root_dir)
+                _store_instances[root_dir] = store
+    return store
+
+
+def load_offline_prices(symbol: str, price_data_dir: str, start_date: str = None,
+                        end_date: str = None, keep_index: bool = False) -> pd.DataFrame:
+    """
+    讀取離線 YFin 價格資料（market_data/price_data 下的 CSV）
+
+    首次讀取時匯入到同目錄的 .price_store，之後直接以 memmap 切片；
+    儲存目錄不可寫、或 CSV 含列式儲存無法保存的非數值欄時，退回直接解析 CSV。
+    keep_index=True 時保留列在原 CSV 中的 index，否則從 0 開始。
+    """
+    csv_path = os.path.join(price_data_dir, _OFFLINE_CSV_TEMPLATE.format(symbol=symbol))
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(csv_path)
+
+    try:
+        store = get_price_store(os.path.join(price_data_dir, ".price_store"))
+        store.import_csv(symbol, csv_path)
+        if not (store.get_meta(symbol) or {}).get("dropped_columns"):
+            frame = store.get_frame(symbol, start_date, end_date, keep_index=keep_index)
+            if frame is not None:
+                return frame
+    except OSError as e:
+        logger.warning(f"[PriceStore] 列式儲存不可用，改為直接讀取 CSV: {e}")
+
+    data = pd.read_csv(csv_path)
+    data["Date"] = data["Date"].astype(str).str[:10]
+    if start_date is not None:
+        data = data[data["Date"] >= start_date[:10]]
+    if end_date is not None:
+        data = data[data["Date"] <= end_date[:10]]
+    return data if keep_index else data.reset_index(drop=True)
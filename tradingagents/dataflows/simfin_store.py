@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+SimFin 基本面資料索引
+將 us-{balance|cashflow|income}-{freq}.csv 一次解析為依 (Ticker, Publish Date) 排序的表，
+並建立每支股票的列範圍索引；「截至 curr_date 最新一期報表」的查詢變成對少數幾列的二分搜尋。
+
+每個行程只解析一次，CSV 的 mtime 改變時自動重建
+（不落地為 pickle 檔，避免載入不受信任的序列化資料）。
+"""
+
+import os
+import threading
+from typing import Optional, Dict
+
+import numpy as np
+import pandas as pd
+
+# 匯入日誌模組
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('dataflows')
+
+
+# 報表類型 -> (子目錄, 檔名前綴)
+SIMFIN_STATEMENTS = {
+    "balance_sheet": ("balance_sheet", "us-balance"),
+    "cash_flow": ("cash_flow", "us-cashflow"),
+    "income_statements": ("income_statements", "us-income"),
+}
+
+
+class SimFinStatementIndex:
+    """單一 SimFin 報表檔的已排序索引"""
+
+    def __init__(self, csv_path: str, frame: pd.DataFrame, mtime: float):
+        self.csv_path = csv_path
+        self.mtime = mtime
+        self.frame = frame
+        # Publish Date 以 int64（ns）保存，二分搜尋不需再經過 pandas
+        self._publish = frame["Publish Date"].to_numpy(dtype="datetime64[ns]").view("int64")
+        tickers = frame["Ticker"].to_numpy()
+        # 每支股票在已排序表中的 [start, end) 列範圍
+        self._ranges: Dict[str, tuple] = {}
+        if len(tickers):
+            boundaries = np.flatnonzero(tickers[1:] != tickers[:-1]) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(tickers)]))
+            for start, end in zip(starts, ends):
+                self._ranges[tickers[start]] = (int(start), int(end))
+
+    @classmethod
+    def build(cls, csv_path: str, mtime: float) -> "SimFinStatementIndex":
+        """解析 CSV、正規化日期並依 (Ticker, Publish Date) 穩定排序"""
+        df = pd.read_csv(csv_path, sep=";")
+        df["Report Date"] = pd.to_datetime(df["Report Date"], utc=True).dt.normalize()
+        df["Publish Date"] = pd.to_datetime(df["Publish Date"], utc=True).dt.normalize()
+        # 無發布日期的列永遠不會被時點查詢選中
+        df = df[df["Publish Date"].notna() & df["Ticker"].notna()]
+        # 保留原始 index，使回傳的報表 Series 與逐次讀檔時完全一致
+        df = df.sort_values(["Ticker", "Publish Date"], kind="mergesort")
+        return cls(csv_path, df, mtime)
+
+    def latest(self, ticker: str, curr_date: str) -> Optional[pd.Series]:
+        """回傳 ticker 截至 curr_date（含）最新發布的一期報表，無資料時回傳 None"""
+        bounds = self._ranges.get(ticker)
+        if bounds is None:
+            return None
+        start, end = bounds
+        cutoff = pd.to_datetime(curr_date, utc=True).normalize().value
+        publish = self._publish[start:end]
+        pos = int(np.searchsorted(publish, cutoff, side="right"))
+        if pos == 0:
+            return None
+        # 同一發布日有多筆時取原始順序的第一筆（與 idxmax 行為一致）
+        first_of_latest = int(np.searchsorted(publish, publish[pos - 1], side="left"))
+        return self.frame.iloc[start + first_of_latest]
+
+
+_indexes: Dict[str, SimFinStatementIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _load_index(csv_path: str) -> SimFinStatementIndex:
+    """取得報表索引：記憶體中已有且 CSV 未更新時直接使用，否則重新解析"""
+    mtime = os.path.getmtime(csv_path)
+    index = _indexes.get(csv_path)
+    if index is not None and index.mtime == mtime:
+        return index
+
+    with _indexes_lock:
+        index = _indexes.get(csv_path)
+        if index is not None and index.mtime == mtime:
+            return index
+        index = SimFinStatementIndex.build(csv_path, mtime)
+        logger.info(f"[SimFin索引] 已建立 {os.path.basename(csv_path)}: {len(index.frame)} 列")
+        _indexes[csv_path] = index
+        return index
+
+
+def get_latest_statement(data_dir: str, statement: str, ticker: str,
+                         freq: str, curr_date: str) -> Optional[pd.Series]:
+    """
+    查詢 ticker 截至 curr_date 最新發布的 SimFin 報表
+
+    Args:
+        data_dir: 資料根目錄（DATA_DIR）
+        statement: balance_sheet / cash_flow / income_statements
+        freq: annual / quarterly
+
+    Returns:
+        報表 Series（含 SimFinId），無資料時回傳 None；CSV 不存在時拋出 FileNotFoundError
+    """
+    sub_dir, prefix = SIMFIN_STATEMENTS[statement]
+    csv_path = os.path.join(
+        data_dir,
+        "fundamental_data",
+        "simfin_data_all",
+        sub_dir,
+        "companies",
+        "us",
+        f"{prefix}-{freq}.csv",
+    )
+    return _load_index(os.path.abspath(csv_path)).latest(ticker, curr_date)
+
+
+def clear_simfin_index():
+    """清除記憶體中的報表索引"""
+    with _indexes_lock:
+        _indexes.clear()
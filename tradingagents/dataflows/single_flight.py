@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+跨行程 single-flight
+同一個資料請求（namespace + key）在所有 worker / pod 之間同時只由一個 leader 執行，
+其餘呼叫端等待 leader 的結果，不再各自向 Finnhub / Yahoo Finance 發出相同請求。
+
+- 行程內：同鍵的執行緒共用同一個 Future
+- 行程間：Redis 租約鎖（SET NX PX，逾時自動釋放）；Redis 不可用時改用本機檔案鎖（fcntl.flock）
+- 結果發布：leader 將結果本身以 write-through 寫入分層快取的短效命名空間（DataFrame 依分層快取的
+  序列化規則保留型別），等待者輪詢取得
+- 只發布成功且非空的結果；leader 失敗、回傳空結果或錯誤訊息時不發布，
+  等待者改為自行取得（跨行程時由下一個取得鎖的呼叫端重試）；等待逾時則自行執行請求
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+
+# 匯入日誌模組
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('dataflows')
+
+try:
+    import fcntl
+    FILE_LOCK_AVAILABLE = True
+except ImportError:
+    # Windows 無 fcntl，退化為僅行程內去重
+    FILE_LOCK_AVAILABLE = False
+
+
+# 發布結果的命名空間前綴與保留秒數（只需涵蓋等待者的輪詢期間）
+_RESULT_NAMESPACE = "singleflight"
+_RESULT_TTL = 60
+
+# 比較 token 後才刪除，避免釋放到其他 leader 已重新取得的租約
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def is_publishable(value: Any) -> bool:
+    """預設的發布條件：None、空 DataFrame / Series、空字串與空容器不發布"""
+    if value is None:
+        return False
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return not value.empty
+    if isinstance(value, (str, dict, list, tuple)):
+        return bool(value.strip() if isinstance(value, str) else value)
+    return True
+
+
+class _RedisLease:
+    def __init__(self, client, lock_key: str, token: str):
+        self.client = client
+        self.lock_key = lock_key
+        self.token = token
+
+    def release(self):
+        try:
+            self.client.eval(_RELEASE_SCRIPT, 1, self.lock_key, self.token)
+        except Exception as e:
+            logger.debug(f"[single-flight] Redis 租約釋放失敗: {e}")
+
+
+class _FileLease:
+    def __init__(self, fd: int):
+        self.fd = fd
+
+    def release(self):
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self.fd)
+
+
+class _NullLease:
+    def release(self):
+        pass
+
+
+class SingleFlight:
+    """跨行程 single-flight 協調器"""
+
+    def __init__(self, lock_dir: str = None, redis_client=None, result_cache=None,
+                 use_redis: bool = True):
+        """
+        Args:
+            lock_dir: 檔案鎖目錄，預設為 data_cache_dir/locks
+            redis_client: Redis 客戶端，預設由資料庫管理器取得
+            result_cache: 發布結果用的 TieredCache，預設為全局分層快取
+            use_redis: False 時只使用檔案鎖
+        """
+        if lock_dir is None:
+            lock_dir = _default_lock_dir()
+        self.lock_dir = Path(lock_dir)
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+
+        if redis_client is None and use_redis:
+            try:
+                from ..config.database_manager import get_database_manager
+                redis_client = get_database_manager().get_redis_client()
+            except Exception as e:
+                logger.debug(f"[single-flight] Redis 不可用，使用檔案鎖: {e}")
+                redis_client = None
+        self._redis = redis_client
+
+        if result_cache is None:
+            from .tiered_cache import get_tiered_cache
+            result_cache = get_tiered_cache()
+        self._results = result_cache
+
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._stats = {"leader": 0, "shared_in_process": 0, "shared_cross_process": 0, "timeout": 0}
+
+    # ------------------------------------------------------------------
+    # 租約
+    # ------------------------------------------------------------------
+
+    def _try_acquire(self, flight_key: str, lease_seconds: float):
+        """嘗試取得租約，成功回傳租約物件，否則回傳 None"""
+        if self._redis is not None:
+            lock_key = f"ta:lease:{flight_key}"
+            token = uuid.uuid4().hex
+            try:
+                if self._redis.set(lock_key, token, nx=True, px=int(lease_seconds * 1000)):
+                    return _RedisLease(self._redis, lock_key, token)
+                return None
+            except Exception as e:
+                logger.debug(f"[single-flight] Redis 租約失敗，改用檔案鎖: {e}")
+
+        if not FILE_LOCK_AVAILABLE:
+            # 無跨行程鎖可用，行程內 Future 已保證同鍵只有一個 leader
+            return _NullLease()
+        digest = hashlib.sha256(flight_key.encode("utf-8")).hexdigest()[:32]
+        fd = os.open(str(self.lock_dir / f"{digest}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        return _FileLease(fd)
+
+    def _count(self, stat: str) -> None:
+        with self._inflight_lock:
+            self._stats[stat] += 1
+
+    def _published(self, flight_key: str) -> Any:
+        return self._results.get(_RESULT_NAMESPACE, flight_key)
+
+    # ------------------------------------------------------------------
+    # 公開 API
+    # ------------------------------------------------------------------
+
+    def do(self, namespace: str, key: str, fn: Callable[[], Any],
+           lease_seconds: float = 60, wait_timeout: float = 90,
+           poll_interval: float = 0.1, publish_if: Callable[[Any], bool] = None) -> Any:
+        """
+        執行 fn，確保同一 namespace + key 在所有行程間同時只執行一次
+
+        Args:
+            fn: 實際取得資料的函式（回傳值需可由分層快取序列化）
+            lease_seconds: 租約有效秒數（leader 當機時自動釋放）
+            wait_timeout: 等待 leader 的最長秒數，逾時自行執行 fn
+            poll_interval: 等待其他行程時的輪詢間隔
+            publish_if: 判斷結果是否成功、可分享給等待者（預設 is_publishable）；
+                不符合時等待者自行執行 fn
+
+        Returns:
+            fn 的回傳值（本身執行或 leader 發布的結果）
+        """
+        flight_key = f"{namespace}:{key}"
+        publish_if = publish_if or is_publishable
+        with self._inflight_lock:
+            future = self._inflight.get(flight_key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[flight_key] = future
+
+        if not is_leader:
+            try:
+                value, shared = future.result(timeout=wait_timeout)
+            except FutureTimeoutError:
+                self._count("timeout")
+                logger.warning(f"[single-flight] 等待逾時，自行取得: {flight_key}")
+                return fn()
+            except Exception as e:
+                logger.debug(f"[single-flight] leader 失敗，自行取得: {flight_key} ({e})")
+                return fn()
+            if not shared:
+                # leader 的結果未發布（空結果或錯誤訊息），不分享給等待者
+                return fn()
+            self._count("shared_in_process")
+            return value
+
+        try:
+            value, shared = self._do_cross_process(
+                flight_key, fn, lease_seconds, wait_timeout, poll_interval, publish_if
+            )
+            future.set_result((value, shared))
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(flight_key, None)
+
+    def _do_cross_process(self, flight_key: str, fn: Callable[[], Any], lease_seconds: float,
+                          wait_timeout: float, poll_interval: float,
+                          publish_if: Callable[[Any], bool]) -> tuple:
+        """回傳 (結果, 是否為可分享的成功結果)"""
+        deadline = time.time() + wait_timeout
+        waited = False
+        while True:
+            published = self._published(flight_key) if waited else None
+            if published is not None:
+                self._count("shared_cross_process")
+                logger.debug(f"[single-flight] 使用其他行程的結果: {flight_key}")
+                return published, True
+
+            lease = self._try_acquire(flight_key, lease_seconds)
+            if lease is not None:
+                try:
+                    # 雙重檢查：取得鎖前 leader 可能剛完成
+                    if waited:
+                        published = self._published(flight_key)
+                        if published is not None:
+                            self._count("shared_cross_process")
+                            return published, True
+                    self._count("leader")
+                    value = fn()
+                    shared = publish_if(value)
+                    if shared:
+                        self._results.set(_RESULT_NAMESPACE, flight_key, value,
+                                          ttl=_RESULT_TTL, write_through=True)
+                    return value, shared
+                finally:
+                    lease.release()
+
+            if time.time() >= deadline:
+                self._count("timeout")
+                logger.warning(f"[single-flight] 等待其他行程逾時，自行取得: {flight_key}")
+                return fn(), False
+            waited = True
+            time.sleep(poll_interval * (0.5 + random.random()))
+
+    def forget(self, namespace: str, key: str) -> None:
+        """移除已發布的結果（強制下一次呼叫重新取得）"""
+        self._results.delete(_RESULT_NAMESPACE, f"{namespace}:{key}")
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._inflight_lock:
+            return dict(self._stats)
+
+
+def _default_lock_dir() -> str:
+    """目前設定的檔案鎖目錄（data_cache_dir/locks）"""
+    from .config import get_config
+    return os.path.abspath(os.path.join(get_config()["data_cache_dir"], "locks"))
+
+
+# 全局 single-flight 實例（依檔案鎖目錄區分，執行緒安全）
+_single_flights: Dict[str, SingleFlight] = {}
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """取得目前設定（data_cache_dir）對應的全局 single-flight 實例"""
+    lock_dir = _default_lock_dir()
+    flight = _single_flights.get(lock_dir)
+    if flight is None:
+        with _single_flight_lock:
+            flight = _single_flights.get(lock_dir)
+            if flight is None:
+                flight = SingleFlight(lock_dir=lock_dir)
+                _single_flights[lock_dir] = flight
+    return flight
+
+
+def run_single_flight(namespace: str, key: str, fn: Callable[[], Any], **kwargs) -> Any:
+    """以全局實例執行 single-flight（參數同 SingleFlight.do）"""
+    return get_single_flight().do(namespace, key, fn, **kwargs)
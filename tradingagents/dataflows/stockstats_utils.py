@@ -2,11 +2,49 @@ import pandas as pd
 import yfinance as yf
 from stockstats import wrap
 from typing import Annotated
-import os
-from .config import get_config
+from .price_store import get_price_store, load_offline_prices
 
 
 class StockstatsUtils:
+    @staticmethod
+    def _load_stock_frame(symbol: str, data_dir: str, online: bool = False):
+        """載入價格序列並包裝為 stockstats 資料框，Date 欄統一為 YYYY-mm-dd 字串"""
+        if not online:
+            try:
+                data = load_offline_prices(symbol, data_dir)
+            except FileNotFoundError:
+                raise Exception("Stockstats fail: Yahoo Finance data not fetched yet!")
+            return wrap(data)
+
+        # Get today's date as YYYY-mm-dd to add to cache
+        today_date = pd.Timestamp.today()
+
+        end_date = today_date
+        start_date = today_date - pd.DateOffset(years=15)
+        start_date = start_date.strftime("%Y-%m-%d")
+        end_date = end_date.strftime("%Y-%m-%d")
+
+        # 列式價格儲存：只下載尚未覆蓋的缺口（通常只有最新一兩根K線）
+        store = get_price_store()
+        store.ensure_range(
+            symbol,
+            start_date,
+            end_date,
+            lambda fetch_start, fetch_end: yf.download(
+                symbol,
+                start=fetch_start,
+                end=fetch_end,
+                multi_level_index=False,
+                progress=False,
+                auto_adjust=True,
+            ),
+        )
+
+        data = store.get_frame(symbol, start_date, end_date)
+        if data is None or data.empty:
+            raise Exception(f"Stockstats fail: no price data available for {symbol}")
+        return wrap(data)
+
     @staticmethod
     def get_stock_stats(
         symbol: Annotated[str, "ticker symbol for the company"],
@@ -25,57 +63,8 @@ class StockstatsUtils:
             "whether to use online tools to fetch data or offline tools. If True, will use online tools.",
         ] = False,
     ):
-        df = None
-        data = None
-
-        if not online:
-            try:
-                data = pd.read_csv(
-                    os.path.join(
-                        data_dir,
-                        f"{symbol}-YFin-data-2015-01-01-2025-03-25.csv",
-                    )
-                )
-                df = wrap(data)
-            except FileNotFoundError:
-                raise Exception("Stockstats fail: Yahoo Finance data not fetched yet!")
-        else:
-            # Get today's date as YYYY-mm-dd to add to cache
-            today_date = pd.Timestamp.today()
-            curr_date = pd.to_datetime(curr_date)
-
-            end_date = today_date
-            start_date = today_date - pd.DateOffset(years=15)
-            start_date = start_date.strftime("%Y-%m-%d")
-            end_date = end_date.strftime("%Y-%m-%d")
-
-            # Get config and ensure cache directory exists
-            config = get_config()
-            os.makedirs(config["data_cache_dir"], exist_ok=True)
-
-            data_file = os.path.join(
-                config["data_cache_dir"],
-                f"{symbol}-YFin-data-{start_date}-{end_date}.csv",
-            )
-
-            if os.path.exists(data_file):
-                data = pd.read_csv(data_file)
-                data["Date"] = pd.to_datetime(data["Date"])
-            else:
-                data = yf.download(
-                    symbol,
-                    start=start_date,
-                    end=end_date,
-                    multi_level_index=False,
-                    progress=False,
-                    auto_adjust=True,
-                )
-                data = data.reset_index()
-                data.to_csv(data_file, index=False)
-
-            df = wrap(data)
-            df["Date"] = df["Date"].dt.strftime("%Y-%m-%d")
-            curr_date = curr_date.strftime("%Y-%m-%d")
+        df = StockstatsUtils._load_stock_frame(symbol, data_dir, online)
+        curr_date = pd.to_datetime(curr_date).strftime("%Y-%m-%d")
 
         df[indicator]  # trigger stockstats to calculate the indicator
         matching_rows = df[df["Date"].str.startswith(curr_date)]
@@ -85,3 +74,35 @@ class StockstatsUtils:
             return indicator_value
         else:
             return "N/A: Not a trading day (weekend or holiday)"
+
+    @staticmethod
+    def get_stock_stats_window(
+        symbol: Annotated[str, "ticker symbol for the company"],
+        indicator: Annotated[
+            str, "quantitative indicators based off of the stock data for the company"
+        ],
+        start_date: Annotated[str, "window start date, YYYY-mm-dd"],
+        end_date: Annotated[str, "window end date, YYYY-mm-dd"],
+        data_dir: Annotated[
+            str,
+            "directory where the stock data is stored.",
+        ],
+        online: Annotated[
+            bool,
+            "whether to use online tools to fetch data or offline tools. If True, will use online tools.",
+        ] = False,
+    ) -> dict:
+        """一次計算整段指標序列並切出 [start_date, end_date] 視窗
+
+        價格資料只載入一次、指標欄位只計算一次，回傳 {交易日: 指標值}；
+        非交易日不會出現在結果中，由呼叫端自行決定如何呈現。
+        """
+        df = StockstatsUtils._load_stock_frame(symbol, data_dir, online)
+        values = df[indicator]
+
+        dates = df["Date"]
+        mask = (dates >= start_date) & (dates <= end_date)
+        window = pd.Series(values[mask].to_numpy(), index=dates[mask].to_numpy())
+        # 同一日期若有重複列，與逐日查詢一致取第一筆
+        window = window[~window.index.duplicated(keep="first")]
+        return dict(zip(window.index, window.to_numpy()))
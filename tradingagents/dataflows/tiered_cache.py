@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+"""
+統一分層快取
+L1 行程內 LRU → L2 Redis → L3 MongoDB（不可用時為本地檔案），單一 API、單一鍵格式。
+
+- 讀取：由上而下逐層查找，下層命中時回填（promote）到上層
+- 寫入：L1 同步寫入，L2/L3 交由背景執行緒寫入（write-behind），不阻塞呼叫端
+- TTL：依命名空間設定，各層共用同一個到期時間
+- stale-while-revalidate：可依命名空間啟用寬限期，期間內回傳舊值並於背景重新整理
+- 鍵格式：ta:{namespace}:{key}
+- 序列化：JSON（DataFrame / Series / datetime 另行標記），不使用 pickle
+"""
+
+import os
+import re
+import json
+import asyncio
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from io import StringIO
+from pathlib import Path
+from typing import Any, Dict, Optional, Callable
+
+import pandas as pd
+
+# 匯入日誌模組
+from tradingagents.utils.logging_manager import get_logger
+logger = get_logger('dataflows')
+
+
+_KEY_PREFIX = "ta"
+_DEFAULT_TTL = 3600
+
+# 各命名空間的快取有效期（秒），未列出的命名空間使用 _DEFAULT_TTL
+NAMESPACE_TTLS: Dict[str, int] = {
+    "finnhub_sentiment": 7200,       # 情緒資料：2 小時
+    "finnhub_analyst": 86400,        # 分析師共識：24 小時
+    "finnhub_technical": 3600,       # 技術訊號：1 小時
+    "news": 4 * 3600,                # 統一新聞工具：4 小時
+    "stock_data": 4 * 3600,          # 美股歷史資料
+    "news_data": 8 * 3600,           # 美股新聞資料
+    "fundamentals_data": 24 * 3600,  # 美股基本面資料
+    "llm_reports": 7 * 86400,        # 內容定址的節點報告：輸入改變即換鍵，僅為回收空間
+    "trending": 600,                 # 熱門特區市場概覽與指數
+    "trending_ai": 7200,             # 熱門特區 AI 趨勢分析
+    "stock_context": 900,            # 個股快照（行情 + 新聞）
+}
+
+
+
+def _escape_redis_glob(text: str) -> str:
+    """跳脫 Redis SCAN MATCH 的萬用字元（* ? [ ] \\），讓字串以字面比對"""
+    return re.sub(r"([*?\[\]\\])", r"\\\1", text)
+
+
+def parse_stale_grace(raw: str) -> Dict[str, int]:
+    """解析寬限期設定，格式: name=秒數,name=秒數（無效項目略過）"""
+    result = {}
+    for item in (raw or "").split(","):
+        name, _, seconds = item.partition("=")
+        try:
+            if name.strip() and int(seconds) > 0:
+                result[name.strip()] = int(seconds)
+        except ValueError:
+            logger.warning(f"[分層快取] 無效的寬限期設定: {item}")
+    return result
+
+
+# stale-while-revalidate 寬限期（秒）：預設不啟用，以 CACHE_STALE_GRACE 逐命名空間開啟
+# 例: CACHE_STALE_GRACE=finnhub_sentiment=3600,finnhub_analyst=43200,us_fundamentals=43200
+NAMESPACE_STALE_GRACE: Dict[str, int] = parse_stale_grace(os.getenv("CACHE_STALE_GRACE", ""))
+
+# 背景寫入執行緒池（L2/L3 write-behind）
+_CACHE_WRITE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-writer")
+
+# 背景重新整理執行緒池（stale-while-revalidate），同一鍵同時只排入一次
+_REVALIDATE_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-revalidate")
+_revalidating: set = set()
+_revalidating_lock = threading.Lock()
+
+
+def refresh_in_background(task_key: str, fn: Callable[[], Any]) -> bool:
+    """
+    於背景 I/O 池執行重新整理函式
+
+    Returns:
+        bool: 是否已排入（同一 task_key 正在重新整理時回傳 False）
+    """
+    with _revalidating_lock:
+        if task_key in _revalidating:
+            return False
+        _revalidating.add(task_key)
+
+    def run():
+        try:
+            fn()
+        except Exception as e:
+            logger.warning(f"[分層快取] 背景重新整理失敗: {task_key} ({e})")
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(task_key)
+
+    _REVALIDATE_POOL.submit(run)
+    return True
+
+
+def _serialize(value: Any) -> Dict[str, Any]:
+    """將資料序列化為 JSON 安全格式"""
+    if isinstance(value, pd.DataFrame):
+        return {"_type": "dataframe", "_value": value.to_json(orient="split", date_format="iso")}
+    if isinstance(value, pd.Series):
+        return {"_type": "series", "_value": value.to_json(orient="split", date_format="iso")}
+    if isinstance(value, datetime):
+        return {"_type": "datetime", "_value": value.isoformat()}
+    return {"_type": "raw", "_value": value}
+
+
+def _deserialize(serialized: Dict[str, Any]) -> Any:
+    """從 JSON 安全格式還原資料"""
+    value_type = serialized.get("_type", "raw")
+    value = serialized.get("_value")
+    if value_type == "dataframe":
+        return pd.read_json(StringIO(value), orient="split")
+    if value_type == "series":
+        return pd.read_json(StringIO(value), orient="split", typ="series")
+    if value_type == "datetime":
+        return datetime.fromisoformat(value)
+    return value
+
+
+class TieredCache:
+    """分層快取：L1 記憶體 LRU、L2 Redis、L3 MongoDB 或本地檔案"""
+
+    def __init__(self, cache_dir: str = None, l1_max_entries: int = 2000,
+                 use_database: bool = True):
+        """
+        Args:
+            cache_dir: L3 檔案層目錄，預設為 data_cache_dir/tiered
+            l1_max_entries: L1 記憶體快取的項目上限
+            use_database: 是否嘗試使用 Redis / MongoDB（False 時只有 L1 + 檔案）
+        """
+        if cache_dir is None:
+            cache_dir = default_tiered_cache_dir()
+        self.cache_dir = Path(cache_dir)
+        self.l1_max_entries = l1_max_entries
+        self.namespace_ttls = dict(NAMESPACE_TTLS)
+        self.namespace_stale_grace = dict(NAMESPACE_STALE_GRACE)
+
+        # L1: {full_key: (expires_at, value, fresh_until)}
+        # fresh_until 之後為過期（stale），expires_at 之後才真正移除
+        self._l1: "OrderedDict[str, tuple]" = OrderedDict()
+        self._l1_lock = threading.Lock()
+
+        self._redis = None
+        self._mongo_collection = None
+        if use_database:
+            self._init_database_tiers()
+
+        self._stats = {"l1_hits": 0, "l2_hits": 0, "l3_hits": 0, "misses": 0, "sets": 0,
+                       "stale_hits": 0, "revalidations": 0}
+        self._stats_lock = threading.Lock()
+        # 尚未完成的背景寫入
+        self._pending_writes = set()
+
+    def _init_database_tiers(self):
+        """透過資料庫管理器取得 Redis / MongoDB 連線（不可用時略過）"""
+        try:
+            from ..config.database_manager import get_database_manager
+            db_manager = get_database_manager()
+            self._redis = db_manager.get_redis_client()
+            mongo_client = db_manager.get_mongodb_client()
+            if mongo_client is not None:
+                database = db_manager.get_config()["mongodb"]["database"]
+                self._mongo_collection = mongo_client[database]["tiered_cache"]
+                self._mongo_collection.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"[分層快取] 資料庫層不可用，僅使用記憶體與檔案快取: {e}")
+            self._redis = None
+            self._mongo_collection = None
+
+    # ------------------------------------------------------------------
+    # 鍵與 TTL
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def make_key(namespace: str, key: str) -> str:
+        """統一鍵格式：ta:{namespace}:{key}"""
+        return f"{_KEY_PREFIX}:{namespace}:{key}"
+
+    @staticmethod
+    def hash_key(*parts: Any) -> str:
+        """將多個參數組合成固定長度的鍵"""
+        raw = "|".join(str(p) for p in parts)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+    def register_namespace(self, namespace: str, ttl_seconds: int,
+                           stale_grace_seconds: int = None) -> None:
+        """設定命名空間的 TTL 與（選用的）stale-while-revalidate 寬限期"""
+        self.namespace_ttls[namespace] = int(ttl_seconds)
+        if stale_grace_seconds is not None:
+            self.namespace_stale_grace[namespace] = int(stale_grace_seconds)
+
+    def get_ttl(self, namespace: str) -> int:
+        return self.namespace_ttls.get(namespace, _DEFAULT_TTL)
+
+    def get_stale_grace(self, namespace: str) -> int:
+        """命名空間的寬限期秒數，0 表示未啟用 stale-while-revalidate"""
+        return self.namespace_stale_grace.get(namespace, 0)
+
+    def _file_path(self, namespace: str, full_key: str) -> Path:
+        digest = hashlib.sha256(full_key.encode("utf-8")).hexdigest()[:32]
+        return self.cache_dir / namespace / f"{digest}.json"
+
+    def _submit_write(self, *args) -> None:
+        """排入背景寫入（write-behind）"""
+        future = _CACHE_WRITE_POOL.submit(self._lower_set, *args)
+        with self._stats_lock:
+            self._pending_writes.add(future)
+        future.add_done_callback(self._write_done)
+
+    def _write_done(self, future) -> None:
+        with self._stats_lock:
+            self._pending_writes.discard(future)
+
+    def _count(self, stat: str) -> None:
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+    # ------------------------------------------------------------------
+    # L1
+    # ------------------------------------------------------------------
+
+    def _l1_get(self, full_key: str):
+        with self._l1_lock:
+            entry = self._l1.get(full_key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._l1.pop(full_key, None)
+                return None
+            self._l1.move_to_end(full_key)
+            return entry
+
+    def _l1_set(self, full_key: str, value: Any, expires_at: float, fresh_until: float) -> None:
+        with self._l1_lock:
+            self._l1[full_key] = (expires_at, value, fresh_until)
+            self._l1.move_to_end(full_key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # L2 / L3
+    # ------------------------------------------------------------------
+
+    def _lower_get(self, namespace: str, full_key: str) -> Optional[tuple]:
+        """依序查詢 L2、L3，回傳 (tier, expires_at, value, fresh_until)"""
+        if self._redis is not None:
+            try:
+                raw = self._redis.get(full_key)
+                if raw:
+                    payload = json.loads(raw)
+                    expires_at = payload["expires_at"]
+                    return ("l2", expires_at, _deserialize(payload["data"]),
+                            payload.get("fresh_until", expires_at))
+            except Exception as e:
+                logger.debug(f"[分層快取] Redis 讀取失敗: {e}")
+
+        if self._mongo_collection is not None:
+            try:
+                doc = self._mongo_collection.find_one({"_id": full_key})
+                if doc:
+                    # pymongo 預設回傳不含時區的 UTC 時間
+                    expires_at = doc["expires_at"].replace(tzinfo=timezone.utc).timestamp()
+                    if expires_at > time.time():
+                        return ("l3", expires_at, _deserialize(json.loads(doc["data"])),
+                                doc.get("fresh_until", expires_at))
+            except Exception as e:
+                logger.debug(f"[分層快取] MongoDB 讀取失敗: {e}")
+            return None
+
+        path = self._file_path(namespace, full_key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.debug(f"[分層快取] 檔案讀取失敗: {e}")
+            return None
+        if payload.get("key") != full_key:
+            return None
+        if payload["expires_at"] <= time.time():
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+        return ("l3", payload["expires_at"], _deserialize(payload["data"]),
+                payload.get("fresh_until", payload["expires_at"]))
+
+    def _lower_set(self, namespace: str, full_key: str, value: Any, expires_at: float,
+                   fresh_until: float, tiers=("l2", "l3")) -> None:
+        """寫入 L2/L3（在背景執行緒中執行）"""
+        ttl = max(1, int(expires_at - time.time()))
+        try:
+            data = _serialize(value)
+        except Exception as e:
+            logger.warning(f"[分層快取] 資料無法序列化，只保留在記憶體: {full_key} ({e})")
+            return
+
+        if "l2" in tiers and self._redis is not None:
+            try:
+                payload = json.dumps({"data": data, "expires_at": expires_at,
+                                      "fresh_until": fresh_until},
+                                     ensure_ascii=False, default=str)
+                self._redis.setex(full_key, ttl, payload)
+            except Exception as e:
+                logger.debug(f"[分層快取] Redis 寫入失敗: {e}")
+
+        if "l3" not in tiers:
+            return
+        if self._mongo_collection is not None:
+            try:
+                self._mongo_collection.replace_one(
+                    {"_id": full_key},
+                    {"_id": full_key, "namespace": namespace,
+                     "data": json.dumps(data, ensure_ascii=False, default=str),
+                     "fresh_until": fresh_until,
+                     "expires_at": datetime.fromtimestamp(expires_at, tz=timezone.utc)},
+                    upsert=True,
+                )
+            except Exception as e:
+                logger.debug(f"[分層快取] MongoDB 寫入失敗: {e}")
+            return
+
+        path = self._file_path(namespace, full_key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"key": full_key, "data": data, "expires_at": expires_at,
+                           "fresh_until": fresh_until},
+                          f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f"[分層快取] 檔案寫入失敗: {e}")
+
+    # ------------------------------------------------------------------
+    # 公開 API
+    # ------------------------------------------------------------------
+
+    def _lookup(self, namespace: str, full_key: str) -> Optional[tuple]:
+        """
+        逐層查找，回傳 (tier, value, fresh_until)；下層命中時回填上層
+        L1 只有過期（stale）值時仍查詢下層，其他行程可能已重新整理
+        """
+        entry = self._l1_get(full_key)
+        if entry is not None and entry[2] > time.time():
+            return "l1", entry[1], entry[2]
+
+        found = self._lower_get(namespace, full_key)
+        if found is not None and (entry is None or found[3] > entry[2]):
+            tier, expires_at, value, fresh_until = found
+            self._l1_set(full_key, value, expires_at, fresh_until)
+            if tier == "l3" and self._redis is not None:
+                self._submit_write(namespace, full_key, value, expires_at, fresh_until, ("l2",))
+            return tier, value, fresh_until
+        if entry is not None:
+            return "l1", entry[1], entry[2]
+        return None
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        """讀取快取（read-through），下層命中時回填上層；只回傳未過期的值"""
+        found = self._lookup(namespace, self.make_key(namespace, key))
+        if found is None or found[2] <= time.time():
+            self._count("misses")
+            return default
+        self._count(f"{found[0]}_hits")
+        return found[1]
+
+    def get_entry(self, namespace: str, key: str) -> Optional[tuple]:
+        """
+        讀取快取並標示新鮮度
+
+        Returns:
+            (value, is_fresh)；is_fresh 為 False 表示在寬限期內的舊值，無資料時回傳 None
+        """
+        found = self._lookup(namespace, self.make_key(namespace, key))
+        if found is None:
+            self._count("misses")
+            return None
+        tier, value, fresh_until = found
+        if fresh_until > time.time():
+            self._count(f"{tier}_hits")
+            return value, True
+        self._count("stale_hits")
+        return value, False
+
+    def set(self, namespace: str, key: str, value: Any, ttl: int = None,
+            write_through: bool = False) -> None:
+        """
+        寫入快取：L1 同步寫入，L2/L3 於背景寫入
+
+        Args:
+            ttl: 有效秒數，預設使用命名空間設定（啟用寬限期時實際保留 ttl + 寬限期）
+            write_through: True 時同步寫入所有層（呼叫端需要立即跨行程可見時使用）
+        """
+        full_key = self.make_key(namespace, key)
+        fresh_until = time.time() + (ttl if ttl is not None else self.get_ttl(namespace))
+        expires_at = fresh_until + self.get_stale_grace(namespace)
+        self._l1_set(full_key, value, expires_at, fresh_until)
+        self._count("sets")
+        if write_through:
+            self._lower_set(namespace, full_key, value, expires_at, fresh_until)
+        else:
+            self._submit_write(namespace, full_key, value, expires_at, fresh_until)
+
+    def get_or_set(self, namespace: str, key: str, loader: Callable[[], Any],
+                   ttl: int = None) -> Any:
+        """讀取快取，未命中時呼叫 loader 取得資料並寫入（loader 回傳 None 時不寫入）"""
+        value = self.get(namespace, key)
+        if value is not None:
+            return value
+        value = loader()
+        if value is not None:
+            self.set(namespace, key, value, ttl=ttl)
+        return value
+
+    def revalidate(self, namespace: str, key: str, loader: Callable[[], Any],
+                   ttl: int = None) -> bool:
+        """於背景呼叫 loader 並寫回快取，回傳是否已排入"""
+        def refresh():
+            value = loader()
+            if value is not None:
+                self.set(namespace, key, value, ttl=ttl)
+
+        scheduled = refresh_in_background(self.make_key(namespace, key), refresh)
+        if scheduled:
+            self._count("revalidations")
+        return scheduled
+
+    def get_or_revalidate(self, namespace: str, key: str, loader: Callable[[], Any],
+                          ttl: int = None) -> Any:
+        """
+        stale-while-revalidate 讀取：新鮮值直接回傳；寬限期內回傳舊值並於背景重新整理；
+        無資料或已超過寬限期時同步呼叫 loader
+        """
+        entry = self.get_entry(namespace, key)
+        if entry is not None:
+            value, is_fresh = entry
+            if not is_fresh:
+                self.revalidate(namespace, key, loader, ttl=ttl)
+            return value
+        value = loader()
+        if value is not None:
+            self.set(namespace, key, value, ttl=ttl)
+        return value
+
+    def delete(self, namespace: str, key: str) -> None:
+        """刪除單一鍵（所有層）"""
+        # 先等待背景寫入完成，避免刪除後又被寫回
+        self.flush()
+        full_key = self.make_key(namespace, key)
+        with self._l1_lock:
+            self._l1.pop(full_key, None)
+        if self._redis is not None:
+            try:
+                self._redis.delete(full_key)
+            except Exception as e:
+                logger.debug(f"[分層快取] Redis 刪除失敗: {e}")
+        if self._mongo_collection is not None:
+            try:
+                self._mongo_collection.delete_one({"_id": full_key})
+            except Exception as e:
+                logger.debug(f"[分層快取] MongoDB 刪除失敗: {e}")
+        else:
+            try:
+                self._file_path(namespace, full_key).unlink()
+            except OSError:
+                pass
+
+    # 非同步介面：於執行緒中執行，Redis / MongoDB / 檔案 I/O 與 delete() 的 flush 不阻塞事件迴圈
+
+    async def aget(self, namespace: str, key: str, default: Any = None) -> Any:
+        """get() 的非同步版本（供 async 路由與背景任務使用）"""
+        return await asyncio.to_thread(self.get, namespace, key, default)
+
+    async def aset(self, namespace: str, key: str, value: Any, ttl: int = None,
+                   write_through: bool = False) -> None:
+        """set() 的非同步版本"""
+        await asyncio.to_thread(self.set, namespace, key, value, ttl, write_through)
+
+    async def adelete(self, namespace: str, key: str) -> None:
+        """delete() 的非同步版本"""
+        await asyncio.to_thread(self.delete, namespace, key)
+
+    def clear(self, namespace: str, contains: str = None) -> int:
+        """
+        清除命名空間中的快取（所有層）
+
+        Args:
+            contains: 只清除鍵中包含此字串的項目（如 ticker），None 表示整個命名空間
+
+        Returns:
+            int: L1 中被清除的項目數
+        """
+        self.flush()
+        prefix = self.make_key(namespace, "")
+
+        def matches(full_key: str) -> bool:
+            return full_key.startswith(prefix) and (contains is None or contains in full_key[len(prefix):])
+
+        with self._l1_lock:
+            keys = [k for k in self._l1 if matches(k)]
+            for k in keys:
+                self._l1.pop(k, None)
+
+        if self._redis is not None:
+            try:
+                # 鍵與 contains 可能含 * ? [ 等字元，需跳脫以免被當成萬用字元而刪除過多鍵
+                escaped = _escape_redis_glob(prefix)
+                pattern = f"{escaped}*{_escape_redis_glob(contains)}*" if contains else f"{escaped}*"
+                batch = list(self._redis.scan_iter(match=pattern, count=500))
+                if batch:
+                    self._redis.delete(*batch)
+            except Exception as e:
+                logger.debug(f"[分層快取] Redis 清除失敗: {e}")
+
+        if self._mongo_collection is not None:
+            try:
+                query = {"namespace": namespace}
+                if contains:
+                    query["_id"] = {"$regex": f"^{prefix}.*{re.escape(contains)}"}
+                self._mongo_collection.delete_many(query)
+            except Exception as e:
+                logger.debug(f"[分層快取] MongoDB 清除失敗: {e}")
+        else:
+            for path in (self.cache_dir / namespace).glob("*.json"):
+                try:
+                    if contains is not None:
+                        with open(path, "r", encoding="utf-8") as f:
+                            if not matches(json.load(f).get("key", "")):
+                                continue
+                    path.unlink()
+                except (OSError, json.JSONDecodeError):
+                    continue
+        return len(keys)
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """等待已排入的背景寫入完成（測試與關閉前使用）"""
+        with self._stats_lock:
+            pending = list(self._pending_writes)
+        if pending:
+            wait(pending, timeout=timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得各層命中統計"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["l1_hits"] + stats["l2_hits"] + stats["l3_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        with self._l1_lock:
+            stats["l1_entries"] = len(self._l1)
+        stats["l2_backend"] = "redis" if self._redis is not None else None
+        stats["l3_backend"] = "mongodb" if self._mongo_collection is not None else "file"
+        return stats
+
+
+def default_tiered_cache_dir() -> str:
+    """目前設定的 L3 檔案層目錄（data_cache_dir/tiered）"""
+    from .config import get_config
+    return os.path.abspath(os.path.join(get_config()["data_cache_dir"], "tiered"))
+
+
+# 全局分層快取實例（依 L3 目錄區分，執行緒安全）
+_tiered_caches: Dict[str, TieredCache] = {}
+_tiered_cache_lock = threading.Lock()
+
+
+def get_tiered_cache() -> TieredCache:
+    """取得目前設定（data_cache_dir）對應的全局分層快取實例"""
+    cache_dir = default_tiered_cache_dir()
+    cache = _tiered_caches.get(cache_dir)
+    if cache is None:
+        with _tiered_cache_lock:
+            cache = _tiered_caches.get(cache_dir)
+            if cache is None:
+                cache = TieredCache(cache_dir=cache_dir)
+                _tiered_caches[cache_dir] = cache
+    return cache
@@ -17,10 +17,65 @@ DEFAULT_CONFIG = {
     "max_debate_rounds": 1,
     "max_risk_discuss_rounds": 1,
     "max_recur_limit": 30,
+    # 圖執行檢查點：none（預設，不寫入檔案）/ sqlite / mongodb
+    # 啟用後失敗或取消的分析可用同一個 thread_id 從最後完成的節點續跑
+    "checkpoint_backend": os.getenv("TRADINGAGENTS_CHECKPOINT_BACKEND", "none"),
+    "checkpoint_db_path": os.getenv("TRADINGAGENTS_CHECKPOINT_DB", ""),  # 空值使用 data_cache_dir
+    "checkpoint_keep_completed": False,  # 成功完成後是否保留檢查點
+    # 批次分析（propagate_many）：同時執行的圖數、所有圖共用的 LLM 同時呼叫數、單檔失敗重試次數
+    "batch_max_concurrency": int(os.getenv("BATCH_MAX_CONCURRENCY", "4")),
+    "batch_llm_concurrency": int(os.getenv("BATCH_LLM_CONCURRENCY", "8")),
+    "batch_retries": 1,
+    # 錄製 / 重播（cassette）：record 保存工具結果與 LLM 回應，replay 完全離線重現分析
+    "cassette_mode": os.getenv("TRADINGAGENTS_CASSETTE_MODE", "off"),
+    "cassette_path": os.getenv("TRADINGAGENTS_CASSETTE_PATH", ""),  # 空值使用 data_cache_dir/cassettes
+    # 報告摘要階段：off（預設）/ extract（規則擷取關鍵數據，不呼叫 LLM）/ llm（quick_think 模型各摘要一次）
+    # 啟用後辯論、交易員與風險節點改用摘要（每份 report_digest_tokens 個 token）取代原始報告
+    "report_digest_mode": os.getenv("REPORT_DIGEST_MODE", "off"),
+    "report_digest_tokens": int(os.getenv("REPORT_DIGEST_TOKENS", "400")),
+    # 下游節點的輸入 token 預算（依模型 tokenizer 計算；無法取得 tokenizer 時以字元估算）
+    "context_budget_shared_reports": int(os.getenv("CONTEXT_BUDGET_SHARED_REPORTS", "4000")),  # 共用報告前綴
+    "context_budget_trader_plan": 1200,  # 風險辯論者共用的交易員計劃
+    "context_budget_report_excerpt": 200,  # 供應商不快取前綴時，風險辯論者每份報告的節錄
+    "context_budget_node_tokens": int(os.getenv("CONTEXT_BUDGET_NODE_TOKENS", "7000")),  # 每個節點輸入上限（含共用前綴）
+    "context_budget_node_overrides": {"research_manager": 9000, "risk_manager": 9000},
+    "context_budget_memory_situation": 1500,  # 記憶檢索的情境描述
+    # 供應商提示詞快取：下游節點共用逐字相同的報告前綴（Anthropic cache_control 斷點、OpenAI prompt_cache_key）
+    "prompt_cache_enabled": os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true",
+    # 供應商層級的 LLM 回應快取：sqlite / redis / none（預設停用）
+    # 相同模型參數與正規化提示詞的呼叫直接回傳先前的回應，依 TTL 過期、超過大小上限時淘汰最久未使用的條目
+    "llm_cache_backend": os.getenv("TRADINGAGENTS_LLM_CACHE", "none"),
+    "llm_cache_db_path": os.getenv("TRADINGAGENTS_LLM_CACHE_DB", ""),  # 空值使用 data_cache_dir
+    "llm_cache_ttl_seconds": int(os.getenv("TRADINGAGENTS_LLM_CACHE_TTL", str(7 * 86400))),
+    "llm_cache_max_mb": float(os.getenv("TRADINGAGENTS_LLM_CACHE_MAX_MB", "256")),
+    # LLM 速率限制與並發調度：none（預設）/ local（行程內計量）/ redis（多個行程共用額度）
+    # 依「供應商:模型」計量 RPM 與 TPM；互動分析優先，翻譯與熱門股票預先產生不使用保留額度
+    # 啟用時與批次分析的 batch_llm_concurrency 疊加，實際同時呼叫數取兩者較小者；
+    # 下列上限需依帳號等級調整，否則可能比供應商實際額度更嚴格
+    "llm_governor_backend": os.getenv("LLM_GOVERNOR_BACKEND", "none"),
+    "llm_rate_limits": {  # 鍵可為供應商或「供應商:模型」，0 表示不限制
+        "openai": {
+            "rpm": int(os.getenv("OPENAI_RPM_LIMIT", "500")),
+            "tpm": int(os.getenv("OPENAI_TPM_LIMIT", "200000")),
+            "max_concurrency": 8,
+        },
+        "anthropic": {
+            "rpm": int(os.getenv("ANTHROPIC_RPM_LIMIT", "50")),
+            "tpm": int(os.getenv("ANTHROPIC_TPM_LIMIT", "80000")),
+            "max_concurrency": 6,
+        },
+    },
+    "llm_governor_background_reserve": 0.3,  # background 請求不可使用的額度比例
+    "llm_governor_max_wait_seconds": 120,  # 等待額度超過此秒數時直接放行
+    "llm_priority": "interactive",  # 圖的 LLM 呼叫優先權：interactive / background
     # Tool settings - 從環境變數讀取，提供預設值
     "online_tools": os.getenv("ONLINE_TOOLS_ENABLED", "false").lower() == "true",
     "online_news": os.getenv("ONLINE_NEWS_ENABLED", "true").lower() == "true", 
     "realtime_data": os.getenv("REALTIME_DATA_ENABLED", "false").lower() == "true",
+    # 時點資料模式（回測使用）：市場資料只取分析日以前的歷史K線，不使用即時報價
+    "point_in_time_data": False,
+    # 內容定址的節點報告快取：提示詞（含工具資料與上游報告）與模型完全相同時沿用先前輸出
+    "report_cache_enabled": os.getenv("REPORT_CACHE_ENABLED", "true").lower() == "true",
 
     # Note: Database and cache configuration is now managed by .env file and config.database_manager
     # No database/cache settings in default config to avoid configuration conflicts
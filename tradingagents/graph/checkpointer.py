@@ -0,0 +1,165 @@
+# TradingAgents/graph/checkpointer.py
+"""
+圖執行檢查點
+
+每個 superstep 完成後由 LangGraph 將狀態寫入檢查點；分析在後段失敗（如 Risk Judge 遇到
+供應商 5xx）或被取消時，以同一個 thread_id 再次呼叫 propagate 即可從最後完成的節點續跑，
+不需重新執行預載入、分析師與辯論。
+
+- sqlite（預設）：本機檔案，位於 data_cache_dir/graph_checkpoints.sqlite
+- mongodb：需安裝 langgraph-checkpoint-mongodb 並啟用 MongoDB，無法使用時退回 sqlite
+- none：停用檢查點
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+# 匯入統一日誌系統
+from tradingagents.utils.logging_init import get_logger
+logger = get_logger("graph.checkpointer")
+
+try:
+    from langgraph.checkpoint.mongodb import MongoDBSaver
+    MONGODB_SAVER_AVAILABLE = True
+except ImportError:
+    MongoDBSaver = None
+    MONGODB_SAVER_AVAILABLE = False
+
+
+_CHECKPOINT_DB_NAME = "graph_checkpoints.sqlite"
+
+
+class ThreadedSqliteSaver(SqliteSaver):
+    """SqliteSaver 加上非同步介面（交由執行緒池執行同步方法）
+
+    官方 SqliteSaver 只支援同步呼叫；連線以 check_same_thread=False 開啟且寫入受鎖保護，
+    因此 graph.astream（apropagate）可透過 asyncio.to_thread 共用同一個連線。
+    """
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+# 依資料庫路徑共用檢查點儲存（同一行程的多個圖實例共用連線）
+_sqlite_savers: Dict[str, ThreadedSqliteSaver] = {}
+_mongodb_saver = None
+_savers_lock = threading.Lock()
+
+
+def get_checkpoint_db_path(config: Dict[str, Any]) -> str:
+    """取得 SQLite 檢查點檔案路徑"""
+    path = config.get("checkpoint_db_path")
+    if path:
+        return os.path.abspath(path)
+    return os.path.abspath(os.path.join(config["data_cache_dir"], _CHECKPOINT_DB_NAME))
+
+
+def _get_sqlite_saver(db_path: str) -> ThreadedSqliteSaver:
+    with _savers_lock:
+        saver = _sqlite_savers.get(db_path)
+        if saver is None:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            saver = ThreadedSqliteSaver(conn)
+            saver.setup()
+            _sqlite_savers[db_path] = saver
+            logger.info(f"[檢查點] 使用 SQLite: {db_path}")
+        return saver
+
+
+def _get_mongodb_saver():
+    """取得 MongoDB 檢查點儲存，無法使用時回傳 None"""
+    global _mongodb_saver
+    if not MONGODB_SAVER_AVAILABLE:
+        logger.warning("[檢查點] 未安裝 langgraph-checkpoint-mongodb，改用 SQLite")
+        return None
+
+    from tradingagents.config.database_manager import get_mongodb_client
+    client = get_mongodb_client()
+    if client is None:
+        logger.warning("[檢查點] MongoDB 不可用，改用 SQLite")
+        return None
+
+    with _savers_lock:
+        if _mongodb_saver is None:
+            db_name = os.getenv("MONGODB_DATABASE", "tradingagents")
+            _mongodb_saver = MongoDBSaver(client, db_name=db_name)
+            logger.info(f"[檢查點] 使用 MongoDB: {db_name}")
+        return _mongodb_saver
+
+
+def create_checkpointer(config: Dict[str, Any]):
+    """依設定建立檢查點儲存
+
+    Args:
+        config: 圖設定（checkpoint_backend: sqlite / mongodb / none）
+
+    Returns:
+        BaseCheckpointSaver 或 None（停用）
+    """
+    backend = str(config.get("checkpoint_backend") or "none").lower()
+    if backend in ("none", "off", "false", ""):
+        return None
+
+    if backend == "mongodb":
+        saver = _get_mongodb_saver()
+        if saver is not None:
+            return saver
+    elif backend != "sqlite":
+        logger.warning(f"[檢查點] 不支援的後端 {backend}，改用 SQLite")
+
+    try:
+        return _get_sqlite_saver(get_checkpoint_db_path(config))
+    except Exception as e:
+        logger.error(f"[檢查點] 初始化 SQLite 失敗，停用檢查點: {e}")
+        return None
+
+
+def get_resumable_state(graph, thread_id: Optional[str]):
+    """取得可續跑的檢查點狀態
+
+    Returns:
+        StateSnapshot: thread 有尚未完成的節點時回傳快照，否則回傳 None
+    """
+    if not thread_id or getattr(graph, "checkpointer", None) is None:
+        return None
+    try:
+        snapshot = graph.get_state({"configurable": {"thread_id": thread_id}})
+    except Exception as e:
+        logger.warning(f"[檢查點] 讀取 {thread_id} 失敗，重新開始分析: {e}")
+        return None
+    if snapshot is None or not snapshot.next:
+        return None
+    return snapshot
+
+
+def delete_thread(graph, thread_id: Optional[str]) -> None:
+    """刪除已完成分析的檢查點（避免檢查點檔案無限成長）"""
+    checkpointer = getattr(graph, "checkpointer", None)
+    if not thread_id or checkpointer is None:
+        return
+    try:
+        checkpointer.delete_thread(thread_id)
+    except Exception as e:
+        logger.warning(f"[檢查點] 清除 {thread_id} 失敗: {e}")
@@ -0,0 +1,326 @@
+# TradingAgents/graph/llm_cache.py
+"""
+LLM 回應快取（供應商層級）
+
+以 LangChain 的 cache 介面掛在 TradingAgentsGraph 建立的 quick / deep 聊天模型下方，
+任何經由這兩個模型的呼叫（分析師、辯論、經理、交易員、風險節點與反思）都會先查詢快取：
+
+- 快取鍵：LangChain 的模型參數字串（供應商類型、模型、temperature、max_tokens 等）
+  加上訊息內容（只統一空白，不遮蔽時間戳等內容）的 sha256
+- sqlite（預設）：本機檔案，依 TTL 過期並依總大小淘汰最久未使用的條目
+- redis：多個行程共用，TTL 由 Redis 過期處理，大小上限交由 Redis maxmemory 策略
+- none：停用（預設，需以 llm_cache_backend 啟用）
+
+與節點層級的報告快取（report_cache）不同，這一層不需要節點知道快取存在，
+也涵蓋沒有經過 invoke_llm_cached 的呼叫；統計命中率與節省的 token 數。
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation
+
+# 匯入統一日誌系統
+from tradingagents.utils.logging_init import get_logger
+logger = get_logger("graph.llm_cache")
+
+
+_CACHE_DB_NAME = "llm_response_cache.sqlite"
+_REDIS_PREFIX = "tradingagents:llm_cache:"
+
+# 空白（含序列化訊息中跳脫的 \n、\t、\r）
+_WHITESPACE_RE = re.compile(r"(?:\s|\\[nrt])+")
+
+# 過短的回應不快取（風險經理等節點會重試過短的回應，不可被快取固定下來）
+_MIN_CACHEABLE_CHARS = 10
+# 超過大小上限時淘汰到上限的比例，避免每次寫入都觸發淘汰
+_EVICT_TARGET_RATIO = 0.9
+
+
+def _usage_tokens(generation) -> int:
+    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+    return int(usage.get("total_tokens") or 0)
+
+
+def _serialize(generations) -> Optional[str]:
+    """將回應轉為 JSON（只保存內容與 token 用量），無法快取時回傳 None"""
+    items = []
+    for generation in generations:
+        message = getattr(generation, "message", None)
+        content = message.content if message is not None else generation.text
+        if not isinstance(content, str) or len(content.strip()) <= _MIN_CACHEABLE_CHARS:
+            return None
+        if message is not None and getattr(message, "tool_calls", None):
+            return None
+        items.append({
+            "content": content,
+            "chat": message is not None,
+            "usage": dict(getattr(message, "usage_metadata", None) or {}),
+        })
+    return json.dumps(items, ensure_ascii=False) if items else None
+
+
+def _deserialize(value: str) -> List[Generation]:
+    generations = []
+    for item in json.loads(value):
+        if item.get("chat", True):
+            message = AIMessage(
+                content=item["content"],
+                usage_metadata=item.get("usage") or None,
+                response_metadata={"llm_cache_hit": True},
+            )
+            generations.append(ChatGeneration(message=message))
+        else:
+            generations.append(Generation(text=item["content"]))
+    return generations
+
+
+class LLMResponseCache(BaseCache):
+    """LLM 回應快取基底：鍵計算、序列化與命中統計，子類別實作儲存"""
+
+    backend = "base"
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "tokens_saved": 0, "evictions": 0}
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(prompt: str, llm_string: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(llm_string.encode("utf-8"))
+        digest.update(b"\x00")
+        # 只統一空白；時間戳等內容可能影響回應，不可遮蔽
+        digest.update(_WHITESPACE_RE.sub(" ", prompt).strip().encode("utf-8"))
+        return digest.hexdigest()
+
+    def _count(self, field: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[field] += amount
+
+    def lookup(self, prompt: str, llm_string: str):
+        try:
+            value = self._get(self.cache_key(prompt, llm_string))
+            generations = _deserialize(value) if value is not None else None
+        except Exception as e:
+            logger.debug(f"[LLM快取] 讀取失敗: {e}")
+            generations = None
+
+        if generations is None:
+            self._count("misses")
+            return None
+        tokens = sum(_usage_tokens(g) for g in generations)
+        with self._stats_lock:
+            self._stats["hits"] += 1
+            self._stats["tokens_saved"] += tokens
+        logger.info(f"[LLM快取] 命中，跳過供應商呼叫（節省 {tokens} tokens）")
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        value = _serialize(return_val)
+        if value is None:
+            return
+        try:
+            self._set(self.cache_key(prompt, llm_string), value)
+            self._count("stores")
+        except Exception as e:
+            logger.debug(f"[LLM快取] 寫入失敗: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得命中統計（行程內累計）"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["backend"] = self.backend
+        return stats
+
+    def _get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def _set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+
+class SQLiteLLMCache(LLMResponseCache):
+    """SQLite 儲存：TTL 過期 + 依總大小淘汰最久未使用的條目"""
+
+    backend = "sqlite"
+
+    def __init__(self, db_path: str, ttl_seconds: int, max_bytes: int):
+        super().__init__(ttl_seconds)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._db_lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._db_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_responses_accessed ON llm_responses(accessed_at)"
+            )
+            self._conn.commit()
+            self._total_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM llm_responses"
+            ).fetchone()[0]
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT value, size, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, size, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return value
+
+    def _set(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._db_lock:
+            old = self._conn.execute("SELECT size FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """先移除過期條目，仍超過上限時依最後存取時間淘汰（呼叫端持有 _db_lock）"""
+        self._conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+
+        target = self.max_bytes * _EVICT_TARGET_RATIO
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_responses ORDER BY accessed_at"):
+            if self._total_bytes <= target:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM llm_responses WHERE key = ?", evicted)
+        if evicted:
+            self._count("evictions", len(evicted))
+            logger.info(f"[LLM快取] 超過大小上限，淘汰 {len(evicted)} 筆最久未使用的回應")
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._db_lock:
+            self._conn.execute("DELETE FROM llm_responses")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def __len__(self) -> int:
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+
+
+class RedisLLMCache(LLMResponseCache):
+    """Redis 儲存：多個行程共用，TTL 由 Redis 處理（大小上限請設定 maxmemory-policy allkeys-lru）"""
+
+    backend = "redis"
+
+    def __init__(self, client, ttl_seconds: int, prefix: str = _REDIS_PREFIX):
+        super().__init__(ttl_seconds)
+        self._client = client
+        self._prefix = prefix
+
+    def _get(self, key: str) -> Optional[str]:
+        value = self._client.get(self._prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        return value
+
+    def _set(self, key: str, value: str) -> None:
+        self._client.set(self._prefix + key, value, ex=self.ttl_seconds)
+
+    def clear(self, **kwargs: Any) -> None:
+        keys = list(self._client.scan_iter(match=f"{self._prefix}*"))
+        if keys:
+            self._client.delete(*keys)
+
+
+# 依後端與路徑共用快取實例（同一行程的多個圖實例共用統計與連線）
+_caches: Dict[tuple, LLMResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_llm_cache_db_path(config: Dict[str, Any]) -> str:
+    path = config.get("llm_cache_db_path")
+    if path:
+        return os.path.abspath(path)
+    return os.path.abspath(os.path.join(config["data_cache_dir"], _CACHE_DB_NAME))
+
+
+def _get_redis_cache(ttl_seconds: int) -> Optional[LLMResponseCache]:
+    from tradingagents.config.database_manager import get_redis_client
+    client = get_redis_client()
+    if client is None:
+        logger.warning("[LLM快取] Redis 不可用，改用 SQLite")
+        return None
+    with _caches_lock:
+        cache = _caches.get(("redis",))
+        if cache is None:
+            cache = RedisLLMCache(client, ttl_seconds)
+            _caches[("redis",)] = cache
+            logger.info("[LLM快取] 使用 Redis")
+        return cache
+
+
+def create_llm_cache(config: Dict[str, Any]) -> Optional[LLMResponseCache]:
+    """依設定建立 LLM 回應快取
+
+    Args:
+        config: 圖設定（llm_cache_backend: sqlite / redis / none）
+
+    Returns:
+        LLMResponseCache 或 None（停用）
+    """
+    backend = str(config.get("llm_cache_backend") or "none").lower()
+    if backend in ("none", "off", "false", ""):
+        return None
+    ttl_seconds = int(config.get("llm_cache_ttl_seconds", 7 * 86400))
+
+    if backend == "redis":
+        cache = _get_redis_cache(ttl_seconds)
+        if cache is not None:
+            return cache
+    elif backend != "sqlite":
+        logger.warning(f"[LLM快取] 不支援的後端 {backend}，改用 SQLite")
+
+    db_path = get_llm_cache_db_path(config)
+    max_bytes = int(float(config.get("llm_cache_max_mb", 256)) * 1024 * 1024)
+    try:
+        with _caches_lock:
+            cache = _caches.get(("sqlite", db_path))
+            if cache is None:
+                cache = SQLiteLLMCache(db_path, ttl_seconds, max_bytes)
+                _caches[("sqlite", db_path)] = cache
+                logger.info(f"[LLM快取] 使用 SQLite: {db_path}")
+            return cache
+    except Exception as e:
+        logger.error(f"[LLM快取] 初始化 SQLite 失敗，停用 LLM 回應快取: {e}")
+        return None
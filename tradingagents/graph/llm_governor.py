@@ -0,0 +1,589 @@
+# TradingAgents/graph/llm_governor.py
+"""
+LLM 速率限制與並發調度（供應商層級）
+
+分析圖（analysis_runner 快取的 TradingAgentsGraph）、熱門股票的 AI 摘要與分析結果翻譯
+共用同一組供應商帳號，過去各自呼叫 API，沒有任何一方追蹤 RPM / TPM，突發請求觸發 429
+後只能等待 SDK 的退避重試。本模組以行程內共用的調度器統一管理：
+
+- 依「供應商:模型」各有一組 token bucket，同時計量請求數（rpm）與估算的 token 數（tpm），
+  另限制同時進行中的呼叫數（max_concurrency）
+- 呼叫前以訊息內容加上輸出上限估算 token 數，完成後依實際用量（usage_metadata）補扣或退回
+- 優先權：interactive（使用者發起的分析）優先；background（翻譯、熱門股票預先產生）
+  不可用掉保留給互動請求的額度（background_reserve），且有互動請求等待時讓出
+- none（預設）：停用；local：行程內計量；redis：bucket 狀態存於 Redis（Lua 腳本原子扣除），
+  多個行程共用同一份額度，並發上限仍為各行程自行計算
+- 批次分析（propagate_many）的 llm_slot 預算在調度器之前生效，兩者同時啟用時
+  實際同時呼叫數取較小者
+- 等待超過 max_wait_seconds 時不再阻擋，直接放行並記錄警告（交由 SDK 的重試處理）
+- 行程只有一個調度器：第一個明確傳入的設定決定限制，之後設定不同的圖沿用它並記錄一次警告
+
+GovernedChatOpenAI / GovernedChatAnthropic 在 LangChain 的 _generate / _stream 外層取得額度，
+位於 LLM 回應快取（llm_cache）之後，快取命中不佔用額度；bind_tools 產生的綁定同樣經過調度。
+"""
+
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, ClassVar, Dict, List, NamedTuple, Optional
+
+from langchain_anthropic import ChatAnthropic
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+
+from tradingagents.agents.utils.context_budget import get_tokenizer
+
+# 匯入統一日誌系統
+from tradingagents.utils.logging_init import get_logger
+logger = get_logger("graph.llm_governor")
+
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND)
+
+_REDIS_PREFIX = "tradingagents:llm_governor:"
+# Redis 中閒置的 bucket 狀態保留秒數（一分鐘即可完全補滿，之後不需要保留）
+_REDIS_STATE_TTL = 120
+# 額度不足或並發已滿時的最長輪詢間隔
+_POLL_SECONDS = 0.25
+# 模型未設定 max_tokens 時預估的輸出 token 數
+_DEFAULT_OUTPUT_TOKENS = 1024
+
+
+class RateLimits(NamedTuple):
+    """單一「供應商:模型」的限制（0 表示不限制）"""
+
+    rpm: int = 0
+    tpm: int = 0
+    max_concurrency: int = 0
+
+
+def _parse_limits(value) -> RateLimits:
+    if isinstance(value, RateLimits):
+        return value
+    value = value or {}
+    return RateLimits(
+        rpm=int(value.get("rpm") or 0),
+        tpm=int(value.get("tpm") or 0),
+        max_concurrency=int(value.get("max_concurrency") or 0),
+    )
+
+
+def _token_bucket(levels: List[float], ts: float, capacities, needs, floor: float, force: bool, now: float):
+    """依經過時間補充 bucket 後嘗試扣除
+
+    Args:
+        levels: 各 bucket 目前的餘額（請求數、token 數）
+        ts: 上次更新時間
+        capacities: 各 bucket 每分鐘的額度（0 表示不限制）
+        needs: 本次需要扣除的數量
+        floor: 扣除後須保留的比例（background 請求保留給互動請求）
+        force: 不論餘額直接扣除（可扣成負值，之後的請求等待補回）
+        now: 目前時間
+
+    Returns:
+        (更新後的餘額, 需要等待的秒數；0 表示已扣除)
+    """
+    elapsed = max(now - ts, 0.0)
+    refilled = [min(cap, level + elapsed * cap / 60.0) if cap else 0.0 for level, cap in zip(levels, capacities)]
+    wait = 0.0
+    for level, cap, need in zip(refilled, capacities, needs):
+        if cap and level - need < cap * floor:
+            wait = max(wait, (need + cap * floor - level) * 60.0 / cap)
+    if wait and not force:
+        return refilled, wait
+    return [level - need if cap else 0.0 for level, cap, need in zip(refilled, capacities, needs)], 0.0
+
+
+class GovernorLease:
+    """取得的呼叫額度：完成後以 settle 回報實際 token 用量，離開時歸還並發名額"""
+
+    def __init__(self, governor: "LLMGovernor", key: str, limits: RateLimits, tokens: int):
+        self._governor = governor
+        self.key = key
+        self.limits = limits
+        self.tokens = tokens
+        self._settled = False
+        self._released = False
+
+    def settle(self, actual_tokens: int) -> None:
+        """依實際用量補扣或退回估算的 token 數（沒有用量資訊時保留估算值）"""
+        if self._settled or not actual_tokens:
+            return
+        self._settled = True
+        delta = int(actual_tokens) - self.tokens
+        if delta:
+            self._governor._adjust(self.key, self.limits, delta)
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._governor._release(self.key)
+
+    def __enter__(self) -> "GovernorLease":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class LLMGovernor:
+    """行程內的 token bucket 調度器（依「供應商:模型」分別計量）"""
+
+    backend = "local"
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Any]] = None,
+        background_reserve: float = 0.3,
+        max_wait_seconds: float = 120.0,
+    ):
+        """
+        Args:
+            limits: 供應商或「供應商:模型」 -> {rpm, tpm, max_concurrency}；模型未列出時使用供應商的限制
+            background_reserve: background 請求不可使用的額度比例（保留給互動請求）
+            max_wait_seconds: 等待額度的上限，超過後直接放行
+        """
+        self._limits = {str(name).lower(): _parse_limits(value) for name, value in (limits or {}).items()}
+        self.background_reserve = min(max(float(background_reserve), 0.0), 0.9)
+        self.max_wait_seconds = float(max_wait_seconds)
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, list] = {}
+        self._in_flight: Dict[str, int] = defaultdict(int)
+        self._waiting: Dict[tuple, int] = defaultdict(int)
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def limits_for(self, provider: str, model: str) -> RateLimits:
+        provider = (provider or "").lower()
+        return self._limits.get(f"{provider}:{(model or '').lower()}") or self._limits.get(provider) or RateLimits()
+
+    def _prepare(self, provider: str, model: str, tokens: int, priority: str):
+        if priority not in PRIORITIES:
+            raise ValueError(f"不支援的 LLM 呼叫優先權: {priority}（可用: {', '.join(PRIORITIES)}）")
+        key = f"{(provider or '').lower()}:{(model or '').lower()}"
+        return key, self.limits_for(provider, model), max(int(tokens or 0), 0)
+
+    def _floor(self, priority: str) -> float:
+        return self.background_reserve if priority == PRIORITY_BACKGROUND else 0.0
+
+    def _max_concurrency(self, limits: RateLimits, priority: str) -> int:
+        if priority == PRIORITY_BACKGROUND and limits.max_concurrency:
+            return max(1, int(limits.max_concurrency * (1 - self.background_reserve)))
+        return limits.max_concurrency
+
+    def _needs(self, limits: RateLimits, tokens: int, floor: float):
+        """本次扣除的請求數與 token 數（超過可用額度時以可用額度計，避免永遠等不到）"""
+        usable = 1 - floor
+        need_r = min(1.0, limits.rpm * usable) if limits.rpm else 0.0
+        need_t = min(float(tokens), limits.tpm * usable) if limits.tpm else 0.0
+        return need_r, need_t
+
+    def _take(self, key: str, limits: RateLimits, tokens: int, floor: float, force: bool) -> float:
+        """嘗試從 bucket 扣除（呼叫端持有 _lock），回傳需要等待的秒數"""
+        now = time.time()
+        state = self._buckets.get(key)
+        if state is None:
+            state = [float(limits.rpm), float(limits.tpm), now]
+        levels, wait = _token_bucket(
+            state[:2], state[2], (limits.rpm, limits.tpm), self._needs(limits, tokens, floor), floor, force, now
+        )
+        self._buckets[key] = [levels[0], levels[1], now]
+        return wait
+
+    def _adjust(self, key: str, limits: RateLimits, token_delta: int) -> None:
+        """依實際用量調整 token bucket（正值補扣、負值退回）"""
+        with self._lock:
+            self._count(key, "tokens", token_delta)
+            state = self._buckets.get(key)
+            if limits.tpm and state is not None:
+                state[1] = min(float(limits.tpm), state[1] - token_delta)
+
+    def _try_acquire(self, key: str, limits: RateLimits, tokens: int, priority: str, force: bool) -> float:
+        with self._lock:
+            if not force:
+                if priority == PRIORITY_BACKGROUND and self._waiting[(key, PRIORITY_INTERACTIVE)]:
+                    return _POLL_SECONDS
+                max_concurrency = self._max_concurrency(limits, priority)
+                if max_concurrency and self._in_flight[key] >= max_concurrency:
+                    return _POLL_SECONDS
+            wait = self._take(key, limits, tokens, self._floor(priority), force)
+            if wait > 0:
+                return wait
+            self._in_flight[key] += 1
+            return 0.0
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            self._in_flight[key] = max(self._in_flight[key] - 1, 0)
+
+    def _set_waiting(self, key: str, priority: str, delta: int) -> None:
+        with self._lock:
+            self._waiting[(key, priority)] += delta
+
+    def _count(self, key: str, field: str, amount: float = 1) -> None:
+        """累加統計（呼叫端持有 _lock）"""
+        stats = self._stats.setdefault(key, {
+            "requests": 0, "tokens": 0, "throttled": 0, "wait_seconds": 0.0, "forced": 0,
+        })
+        stats[field] += amount
+
+    def _granted(self, key, limits, tokens, priority, started: float, waited: bool, forced: bool) -> GovernorLease:
+        waited_seconds = time.monotonic() - started
+        with self._lock:
+            self._count(key, "requests")
+            self._count(key, "tokens", tokens)
+            if waited:
+                self._count(key, "throttled")
+                self._count(key, "wait_seconds", waited_seconds)
+            if forced:
+                self._count(key, "forced")
+        if forced:
+            logger.warning(f"[LLM限流] {key} 等待超過 {self.max_wait_seconds:.0f} 秒，直接放行（{priority}）")
+        elif waited:
+            logger.debug(f"[LLM限流] {key} 等待 {waited_seconds:.2f} 秒後取得額度（{priority}，{tokens} tokens）")
+        return GovernorLease(self, key, limits, tokens)
+
+    def acquire(self, provider: str, model: str, tokens: int = 0,
+                priority: str = PRIORITY_INTERACTIVE) -> GovernorLease:
+        """等待並取得一次呼叫的額度
+
+        Args:
+            provider: 供應商（openai / anthropic）
+            model: 模型名稱
+            tokens: 估算的 token 數（輸入加上輸出上限）
+            priority: interactive / background
+
+        Returns:
+            GovernorLease：以 with 使用，離開時歸還並發名額
+        """
+        key, limits, tokens = self._prepare(provider, model, tokens, priority)
+        started = time.monotonic()
+        waited = forced = False
+        self._set_waiting(key, priority, 1)
+        try:
+            while True:
+                forced = time.monotonic() - started >= self.max_wait_seconds
+                wait = self._try_acquire(key, limits, tokens, priority, forced)
+                if wait <= 0:
+                    break
+                waited = True
+                time.sleep(min(wait, _POLL_SECONDS))
+        finally:
+            self._set_waiting(key, priority, -1)
+        return self._granted(key, limits, tokens, priority, started, waited, forced)
+
+    async def aacquire(self, provider: str, model: str, tokens: int = 0,
+                       priority: str = PRIORITY_INTERACTIVE) -> GovernorLease:
+        """acquire 的非同步版本（等待期間不阻塞事件迴圈）"""
+        key, limits, tokens = self._prepare(provider, model, tokens, priority)
+        started = time.monotonic()
+        waited = forced = False
+        self._set_waiting(key, priority, 1)
+        try:
+            while True:
+                forced = time.monotonic() - started >= self.max_wait_seconds
+                wait = self._try_acquire(key, limits, tokens, priority, forced)
+                if wait <= 0:
+                    break
+                waited = True
+                await asyncio.sleep(min(wait, _POLL_SECONDS))
+        finally:
+            self._set_waiting(key, priority, -1)
+        return self._granted(key, limits, tokens, priority, started, waited, forced)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """各「供應商:模型」的請求數、token 數、被限流次數、累計等待秒數與強制放行次數"""
+        with self._lock:
+            stats = {
+                key: dict(values, wait_seconds=round(values["wait_seconds"], 3), in_flight=self._in_flight.get(key, 0))
+                for key, values in self._stats.items()
+            }
+        return stats
+
+
+# KEYS[1]: bucket 狀態；ARGV: now, rpm, tpm, need_r, need_t, floor, force, ttl
+# 與 _token_bucket 相同的演算法，在 Redis 內原子執行
+_REDIS_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local caps = {tonumber(ARGV[2]), tonumber(ARGV[3])}
+local needs = {tonumber(ARGV[4]), tonumber(ARGV[5])}
+local floor = tonumber(ARGV[6])
+local force = ARGV[7] == '1'
+local state = redis.call('HMGET', KEYS[1], 'r', 't', 'ts')
+local levels = {tonumber(state[1]) or caps[1], tonumber(state[2]) or caps[2]}
+local elapsed = math.max(now - (tonumber(state[3]) or now), 0)
+local wait = 0
+for i = 1, 2 do
+  if caps[i] > 0 then
+    levels[i] = math.min(caps[i], levels[i] + elapsed * caps[i] / 60)
+    if levels[i] - needs[i] < caps[i] * floor then
+      wait = math.max(wait, (needs[i] + caps[i] * floor - levels[i]) * 60 / caps[i])
+    end
+  end
+end
+if wait == 0 or force then
+  for i = 1, 2 do levels[i] = levels[i] - needs[i] end
+  wait = 0
+end
+redis.call('HSET', KEYS[1], 'r', tostring(levels[1]), 't', tostring(levels[2]), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[8]))
+return tostring(wait)
+"""
+
+
+class RedisLLMGovernor(LLMGovernor):
+    """bucket 狀態存於 Redis，多個行程共用同一份 RPM / TPM 額度（並發上限仍為各行程計算）"""
+
+    backend = "redis"
+
+    def __init__(self, client, limits=None, background_reserve: float = 0.3,
+                 max_wait_seconds: float = 120.0, prefix: str = _REDIS_PREFIX):
+        super().__init__(limits, background_reserve, max_wait_seconds)
+        self._client = client
+        self._prefix = prefix
+        self._script = client.register_script(_REDIS_TAKE_SCRIPT)
+
+    def _take(self, key: str, limits: RateLimits, tokens: int, floor: float, force: bool) -> float:
+        if not limits.rpm and not limits.tpm:
+            return 0.0
+        need_r, need_t = self._needs(limits, tokens, floor)
+        wait = self._script(
+            keys=[self._prefix + key],
+            args=[time.time(), limits.rpm, limits.tpm, need_r, need_t, floor, int(force), _REDIS_STATE_TTL],
+        )
+        return float(wait)
+
+    def _adjust(self, key: str, limits: RateLimits, token_delta: int) -> None:
+        with self._lock:
+            self._count(key, "tokens", token_delta)
+        if limits.tpm:
+            try:
+                self._client.hincrbyfloat(self._prefix + key, "t", -token_delta)
+            except Exception as e:
+                logger.debug(f"[LLM限流] 調整 Redis token 額度失敗: {e}")
+
+
+_UNSET = object()
+# 行程共用的調度器（第一個明確傳入的設定決定限制）
+_governor: Any = _UNSET
+# 目前調度器的設定摘要；_governor_explicit 為 False 表示由預設設定隱含建立，可被明確設定取代
+_governor_settings: Optional[tuple] = None
+_governor_explicit = False
+# 已警告過的不一致設定（同一組設定只警告一次）
+_warned_settings: set = set()
+_governor_lock = threading.Lock()
+
+
+def _settings_key(config: Dict[str, Any]) -> tuple:
+    """調度器相關設定的摘要（後端、各模型限制、保留比例、等待上限）"""
+    backend = str(config.get("llm_governor_backend") or "none").lower()
+    if backend in ("none", "off", "false", ""):
+        return ("none",)
+    limits = tuple(sorted(
+        (str(name).lower(), _parse_limits(value)) for name, value in (config.get("llm_rate_limits") or {}).items()
+    ))
+    return (
+        backend,
+        limits,
+        float(config.get("llm_governor_background_reserve", 0.3)),
+        float(config.get("llm_governor_max_wait_seconds", 120)),
+    )
+
+
+def create_llm_governor(config: Dict[str, Any]) -> Optional[LLMGovernor]:
+    """依設定建立調度器（llm_governor_backend: local / redis / none）"""
+    backend = str(config.get("llm_governor_backend") or "none").lower()
+    if backend in ("none", "off", "false", ""):
+        return None
+    kwargs = {
+        "limits": config.get("llm_rate_limits") or {},
+        "background_reserve": config.get("llm_governor_background_reserve", 0.3),
+        "max_wait_seconds": config.get("llm_governor_max_wait_seconds", 120),
+    }
+    if backend == "redis":
+        from tradingagents.config.database_manager import get_redis_client
+        client = get_redis_client()
+        if client is not None:
+            try:
+                governor = RedisLLMGovernor(client, **kwargs)
+                logger.info("[LLM限流] 使用 Redis 共用額度")
+                return governor
+            except Exception as e:
+                logger.warning(f"[LLM限流] 初始化 Redis 調度器失敗，改用行程內計量: {e}")
+        else:
+            logger.warning("[LLM限流] Redis 不可用，改用行程內計量")
+    elif backend != "local":
+        logger.warning(f"[LLM限流] 不支援的後端 {backend}，改用行程內計量")
+    return LLMGovernor(**kwargs)
+
+
+def get_llm_governor(config: Optional[Dict[str, Any]] = None) -> Optional[LLMGovernor]:
+    """取得行程共用的調度器（停用時回傳 None）
+
+    行程內所有聊天模型共用同一個調度器，才能共同計量同一組供應商額度。第一個明確傳入的
+    config 決定限制；在此之前由聊天模型以預設設定隱含建立的調度器會被取代。之後的 config
+    與目前調度器不一致時沿用目前的調度器，並記錄一次警告。
+    """
+    global _governor, _governor_settings, _governor_explicit
+    with _governor_lock:
+        if config is None:
+            if _governor is _UNSET:
+                from tradingagents.default_config import DEFAULT_CONFIG
+                _governor = create_llm_governor(DEFAULT_CONFIG)
+                _governor_settings = _settings_key(DEFAULT_CONFIG)
+            return _governor
+
+        settings = _settings_key(config)
+        if _governor is _UNSET or (not _governor_explicit and settings != _governor_settings):
+            _governor = create_llm_governor(config)
+            _governor_settings = settings
+        elif settings != _governor_settings and _governor_settings is not None and settings not in _warned_settings:
+            _warned_settings.add(settings)
+            logger.warning(
+                f"[LLM限流] 行程已使用先前設定建立的調度器（{_governor_settings[0]}），"
+                f"本次設定的 llm_governor_backend / llm_rate_limits（{settings[0]}）不會生效"
+            )
+        _governor_explicit = True
+        return _governor
+
+
+def set_llm_governor(governor: Optional[LLMGovernor]) -> Any:
+    """替換行程共用的調度器（None 表示停用），回傳原本的調度器；之後的設定不會再取代它"""
+    global _governor, _governor_settings, _governor_explicit
+    with _governor_lock:
+        previous, _governor = _governor, governor
+        _governor_settings, _governor_explicit = None, True
+    return None if previous is _UNSET else previous
+
+
+def _message_text(message) -> str:
+    content = getattr(message, "content", "")
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block) for block in content or []
+    )
+
+
+def _usage_total(message) -> int:
+    usage = getattr(message, "usage_metadata", None) or {}
+    return int(usage.get("total_tokens") or 0)
+
+
+# 目前的呼叫已取得額度（_generate 內部改走 _stream 時不重複計量）
+_governed_call: ContextVar[bool] = ContextVar("llm_governed_call", default=False)
+
+
+class _GovernedChatModel(BaseChatModel):
+    """在供應商呼叫外層取得調度器額度的聊天模型（與 ChatOpenAI / ChatAnthropic 組合使用）"""
+
+    governor_priority: str = PRIORITY_INTERACTIVE
+    _governor_provider: ClassVar[str] = ""
+
+    def _governor_model(self) -> str:
+        model = getattr(self, "model_name", None) or getattr(self, "model", None)
+        return model if isinstance(model, str) else ""
+
+    def _estimate_tokens(self, messages) -> int:
+        tokenizer = get_tokenizer(self._governor_model() or None)
+        output_tokens = getattr(self, "max_tokens", None) or _DEFAULT_OUTPUT_TOKENS
+        return sum(tokenizer.count(_message_text(message)) for message in messages) + int(output_tokens)
+
+    @contextmanager
+    def _governed(self, messages):
+        governor = get_llm_governor()
+        if governor is None or _governed_call.get():
+            yield None
+            return
+        with governor.acquire(self._governor_provider, self._governor_model(),
+                              self._estimate_tokens(messages), self.governor_priority) as lease:
+            token = _governed_call.set(True)
+            try:
+                yield lease
+            finally:
+                _governed_call.reset(token)
+
+    @asynccontextmanager
+    async def _agoverned(self, messages):
+        governor = get_llm_governor()
+        if governor is None or _governed_call.get():
+            yield None
+            return
+        lease = await governor.aacquire(self._governor_provider, self._governor_model(),
+                                        self._estimate_tokens(messages), self.governor_priority)
+        with lease:
+            token = _governed_call.set(True)
+            try:
+                yield lease
+            finally:
+                _governed_call.reset(token)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        with self._governed(messages) as lease:
+            result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            if lease is not None:
+                lease.settle(sum(_usage_total(getattr(g, "message", None)) for g in result.generations))
+            return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        async with self._agoverned(messages) as lease:
+            result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            if lease is not None:
+                lease.settle(sum(_usage_total(getattr(g, "message", None)) for g in result.generations))
+            return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        with self._governed(messages) as lease:
+            used = 0
+            for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                used += _usage_total(getattr(chunk, "message", None))
+                yield chunk
+            if lease is not None:
+                lease.settle(used)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        async with self._agoverned(messages) as lease:
+            used = 0
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                used += _usage_total(getattr(chunk, "message", None))
+                yield chunk
+            if lease is not None:
+                lease.settle(used)
+
+
+class GovernedChatOpenAI(_GovernedChatModel, ChatOpenAI):
+    """經過 LLM 調度器的 ChatOpenAI"""
+
+    _governor_provider: ClassVar[str] = "openai"
+
+
+class GovernedChatAnthropic(_GovernedChatModel, ChatAnthropic):
+    """經過 LLM 調度器的 ChatAnthropic"""
+
+    _governor_provider: ClassVar[str] = "anthropic"
+
+
+_GOVERNED_MODELS = {"openai": GovernedChatOpenAI, "anthropic": GovernedChatAnthropic}
+
+
+def create_chat_model(provider: str, priority: str = PRIORITY_INTERACTIVE, **kwargs) -> BaseChatModel:
+    """建立經過調度器的聊天模型
+
+    Args:
+        provider: openai / anthropic
+        priority: interactive（使用者發起的分析）/ background（翻譯、預先產生）
+        **kwargs: 傳給 ChatOpenAI / ChatAnthropic 的參數
+    """
+    model_cls = _GOVERNED_MODELS.get((provider or "").lower())
+    if model_cls is None:
+        raise ValueError(f"不支援的 LLM 提供商: {provider}。僅支援 openai 和 anthropic。")
+    if priority not in PRIORITIES:
+        raise ValueError(f"不支援的 LLM 呼叫優先權: {priority}（可用: {', '.join(PRIORITIES)}）")
+    # 預設優先權不寫入模型參數，LLM 回應快取的鍵與一般模型相同
+    if priority != PRIORITY_INTERACTIVE:
+        kwargs["governor_priority"] = priority
+    return model_cls(**kwargs)
@@ -1,6 +1,6 @@
 # TradingAgents/graph/propagation.py
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 # 匯入統一日誌系統
 from tradingagents.utils.logging_init import get_logger
@@ -42,11 +42,19 @@ class Propagator:
             "fundamentals_report": "",
             "sentiment_report": "",
             "news_report": "",
+            "report_digests": {},
         }
 
-    def get_graph_args(self) -> Dict[str, Any]:
-        """Get arguments for the graph invocation."""
+    def get_graph_args(self, thread_id: Optional[str] = None) -> Dict[str, Any]:
+        """Get arguments for the graph invocation.
+
+        Args:
+            thread_id: 檢查點 thread id（圖啟用檢查點時必填，續跑時沿用同一個值）
+        """
+        config = {"recursion_limit": self.max_recur_limit}
+        if thread_id:
+            config["configurable"] = {"thread_id": thread_id}
         return {
             "stream_mode": "values",
-            "config": {"recursion_limit": self.max_recur_limit},
+            "config": config,
         }
@@ -1,6 +1,7 @@
 # TradingAgents/graph/setup.py
 
 from typing import Dict, Any
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import END, StateGraph, START
 
 from tradingagents.agents import (
@@ -18,6 +19,7 @@ from tradingagents.agents import (
     create_neutral_debator,
     create_parallel_risk_debate,
     create_trader,
+    create_report_digest,
     create_msg_delete,
     Toolkit,
     AgentState,
@@ -30,6 +32,18 @@ from tradingagents.utils.logging_init import get_logger
 logger = get_logger("graph.setup")
 
 
+def as_graph_node(node, name: str = None):
+    """將節點包裝為同時支援 invoke / ainvoke 的 Runnable
+
+    節點宣告 anode（非同步版本）時，graph.astream 會直接 await 該協程，
+    不再佔用執行緒池；graph.stream / invoke 仍走原本的同步函式。
+    """
+    anode = getattr(node, "anode", None)
+    if anode is None:
+        return node
+    return RunnableLambda(node, afunc=anode, name=name)
+
+
 class GraphSetup:
     """Handles the setup and configuration of the agent graph."""
 
@@ -57,9 +71,10 @@ class GraphSetup:
         self.risk_manager_memory = risk_manager_memory
         self.conditional_logic = conditional_logic
         self.config = config or {}
+        self.analyst_nodes = {}
 
     def setup_graph(
-        self, selected_analysts=["market", "social", "news", "fundamentals"]
+        self, selected_analysts=["market", "social", "news", "fundamentals"], checkpointer=None
     ):
         """Set up and compile the agent workflow graph.
 
@@ -69,6 +84,7 @@ class GraphSetup:
                 - "social": Social media analyst
                 - "news": News analyst
                 - "fundamentals": Fundamentals analyst
+            checkpointer: 可選的 LangGraph 檢查點儲存（啟用後可依 thread_id 續跑）
         """
         if len(selected_analysts) == 0:
             raise ValueError("Trading Agents Graph Setup Error: no analysts selected!")
@@ -101,6 +117,9 @@ class GraphSetup:
             )
             delete_nodes["fundamentals"] = create_msg_delete()
 
+        # 保留實際編譯進圖的分析師節點，供預載入規劃器讀取資料相依宣告
+        self.analyst_nodes = dict(analyst_nodes)
+
         # 建立研究員和管理員節點
         bull_researcher_node = create_bull_researcher(
             self.quick_thinking_llm, self.bull_memory
@@ -143,40 +162,55 @@ class GraphSetup:
         else:
             logger.info(f"風險辯論模式: 串行（{max_risk_rounds} 輪辯論）")
 
+        # 選用的報告摘要階段：分析師 fan-in 後只摘要一次，下游節點共用摘要而非原始報告
+        digest_mode = str(self.config.get("report_digest_mode") or "off").lower()
+        use_digest = digest_mode != "off"
+        if use_digest:
+            report_digest_node = create_report_digest(
+                self.quick_thinking_llm,
+                mode=digest_mode,
+                max_tokens=int(self.config.get("report_digest_tokens", 400)),
+            )
+            logger.info(f"報告摘要模式: {digest_mode}")
+
         # 建立工作流程
         workflow = StateGraph(AgentState)
 
         # 加入分析師節點
         for analyst_type, node in analyst_nodes.items():
-            workflow.add_node(f"{analyst_type.capitalize()} Analyst", node)
-            workflow.add_node(
-                f"Msg Clear {analyst_type.capitalize()}", delete_nodes[analyst_type]
-            )
+            analyst_name = f"{analyst_type.capitalize()} Analyst"
+            clear_name = f"Msg Clear {analyst_type.capitalize()}"
+            workflow.add_node(analyst_name, as_graph_node(node, analyst_name))
+            workflow.add_node(clear_name, as_graph_node(delete_nodes[analyst_type], clear_name))
+
+        if use_digest:
+            workflow.add_node("Report Digest", as_graph_node(report_digest_node, "Report Digest"))
 
         # 加入辯論節點
         if use_parallel_debate:
             # 並行模式：單一節點包裝兩位研究員
-            workflow.add_node("Invest Debate", parallel_debate_node)
+            workflow.add_node("Invest Debate", as_graph_node(parallel_debate_node, "Invest Debate"))
         else:
             # 串行模式：兩個獨立節點依序執行
-            workflow.add_node("Bull Researcher", bull_researcher_node)
-            workflow.add_node("Bear Researcher", bear_researcher_node)
-        workflow.add_node("Research Manager", research_manager_node)
-        workflow.add_node("Trader", trader_node)
+            workflow.add_node("Bull Researcher", as_graph_node(bull_researcher_node, "Bull Researcher"))
+            workflow.add_node("Bear Researcher", as_graph_node(bear_researcher_node, "Bear Researcher"))
+        workflow.add_node("Research Manager", as_graph_node(research_manager_node, "Research Manager"))
+        workflow.add_node("Trader", as_graph_node(trader_node, "Trader"))
 
         if use_parallel_risk:
             # 並行模式：單一節點包裝三位分析師
-            workflow.add_node("Risk Debate", parallel_risk_node)
+            workflow.add_node("Risk Debate", as_graph_node(parallel_risk_node, "Risk Debate"))
         else:
             # 串行模式：三個獨立節點依序執行
-            workflow.add_node("Risky Analyst", risky_analyst)
-            workflow.add_node("Neutral Analyst", neutral_analyst)
-            workflow.add_node("Safe Analyst", safe_analyst)
-        workflow.add_node("Risk Judge", risk_manager_node)
+            workflow.add_node("Risky Analyst", as_graph_node(risky_analyst, "Risky Analyst"))
+            workflow.add_node("Neutral Analyst", as_graph_node(neutral_analyst, "Neutral Analyst"))
+            workflow.add_node("Safe Analyst", as_graph_node(safe_analyst, "Safe Analyst"))
+        workflow.add_node("Risk Judge", as_graph_node(risk_manager_node, "Risk Judge"))
 
         # 定義邊：fan-out/fan-in 並行分析師節點
         # 分析師已改為直接工具呼叫，無需條件分支和工具節點迴圈
-        fan_in_target = "Invest Debate" if use_parallel_debate else "Bull Researcher"
+        debate_entry = "Invest Debate" if use_parallel_debate else "Bull Researcher"
+        fan_in_target = "Report Digest" if use_digest else debate_entry
         for analyst_type in selected_analysts:
             current_analyst = f"{analyst_type.capitalize()} Analyst"
             current_clear = f"Msg Clear {analyst_type.capitalize()}"
@@ -190,6 +224,10 @@ class GraphSetup:
             # 所有分析師完成後匯合到辯論節點（fan-in）
             workflow.add_edge(current_clear, fan_in_target)
 
+        if use_digest:
+            # 報告摘要 -> 辯論節點
+            workflow.add_edge("Report Digest", debate_entry)
+
         if use_parallel_debate:
             # 並行模式：Invest Debate（並行看漲/看跌）-> Research Manager
             workflow.add_edge("Invest Debate", "Research Manager")
@@ -248,4 +286,4 @@ class GraphSetup:
         workflow.add_edge("Risk Judge", END)
 
         # Compile and return
-        return workflow.compile()
+        return workflow.compile(checkpointer=checkpointer)
@@ -1,27 +1,46 @@
 # TradingAgents/graph/trading_graph.py
 
+import asyncio
+import functools
 import os
 import re
 import time
 import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
 from pathlib import Path
 import json
 from typing import Dict, Any
 
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
 
-from tradingagents.agents.utils.agent_utils import Toolkit, reset_tool_result_cache, prefetch_analyst_data
+from tradingagents.agents.utils.agent_utils import (
+    Toolkit,
+    calc_start_date,
+    prefetch_analyst_data,
+)
+from tradingagents.agents.utils.analysis_context import (
+    AnalysisContext,
+    analysis_scope,
+    get_current_analysis_context,
+)
+from tradingagents.agents.utils.cassette import cassette_from_config
+from tradingagents.agents.utils.prompt_prefix import is_official_openai
+from tradingagents.agents.utils.llm_budget import LLMConcurrencyBudget, use_llm_budget
 from tradingagents.default_config import DEFAULT_CONFIG
 from tradingagents.agents.utils.memory import FinancialSituationMemory
 
 # 匯入日誌模組
 from tradingagents.utils.logging_manager import get_logger
 logger = get_logger('agents')
-from tradingagents.dataflows.config import set_config
+from tradingagents.dataflows.config import use_config
+from tradingagents.dataflows.optimized_us_data import prefetch_us_price_histories
 
 from .conditional_logic import ConditionalLogic
 from .setup import GraphSetup
+from .checkpointer import create_checkpointer, delete_thread, get_resumable_state
+from .llm_cache import create_llm_cache
+from .llm_governor import GovernedChatAnthropic, GovernedChatOpenAI, PRIORITY_INTERACTIVE, get_llm_governor
 from .propagation import Propagator
 from .reflection import Reflector
 from .signal_processing import SignalProcessor
@@ -30,6 +49,9 @@ from .signal_processing import SignalProcessor
 _SYMBOL_RE = re.compile(r"^[A-Za-z]{1,5}$")
 _DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
 
+# 批次分析單檔失敗後的重試等待秒數（每次加倍，上限 10 秒）
+_BATCH_RETRY_BASE_DELAY = 1.0
+
 
 class TradingAgentsGraph:
     """Main class that orchestrates the trading agents framework."""
@@ -49,17 +71,16 @@ class TradingAgentsGraph:
         """
         if selected_analysts is None:
             selected_analysts = ["market", "social", "news", "fundamentals"]
+        self.selected_analysts = list(selected_analysts)
         self.debug = debug
-        self.config = config or DEFAULT_CONFIG
-
-        # Update the interface's config
-        set_config(self.config)
+        # 每個實例持有獨立的設定副本；propagate 期間以 use_config 綁定給資料層，
+        # 不再修改行程全域設定，不同設定的圖可在同一行程同時執行
+        self.config = DEFAULT_CONFIG.copy()
+        if config:
+            self.config.update(config)
 
         # Create necessary directories
-        os.makedirs(
-            os.path.join(self.config["project_dir"], "dataflows/data_cache"),
-            exist_ok=True,
-        )
+        os.makedirs(self.config["data_cache_dir"], exist_ok=True)
 
         # 初始化 LLM（僅支援 OpenAI 和 Anthropic）
         provider = self.config["llm_provider"].lower()
@@ -69,6 +90,17 @@ class TradingAgentsGraph:
         quick_max = self.config.get("quick_think_max_tokens", 3000)
         deep_max = self.config.get("deep_think_max_tokens", 4096)
 
+        # 供應商層級的 LLM 回應快取（llm_cache_backend: sqlite / redis / none），shared_kwargs 為兩個模型共用的參數
+        self.llm_cache = create_llm_cache(self.config)
+        shared_kwargs = {"cache": self.llm_cache} if self.llm_cache is not None else {}
+        # 供應商提示詞快取：下游節點的共用報告前綴逐字相同（Anthropic 由節點加上 cache_control 斷點）
+        prompt_cache = self.config.get("prompt_cache_enabled", True)
+        # 行程共用的速率限制調度器（分析、翻譯與熱門股票摘要共用供應商額度）
+        self.llm_governor = get_llm_governor(self.config)
+        priority = self.config.get("llm_priority", PRIORITY_INTERACTIVE)
+        if priority != PRIORITY_INTERACTIVE:
+            shared_kwargs["governor_priority"] = priority
+
         if provider == "openai":
             # OpenAI 支援自訂 base_url（用於相容 API 代理等場景）
             # 強制使用 Chat Completions API，避免 Responses API 回傳不支援的物件
@@ -82,7 +114,10 @@ class TradingAgentsGraph:
                 openai_kwargs["max_tokens"] = deep_max
             if backend_url:
                 openai_kwargs["base_url"] = backend_url
-            self.deep_thinking_llm = ChatOpenAI(**openai_kwargs)
+            if prompt_cache and is_official_openai(backend_url):
+                # OpenAI 對超過 1024 tokens 的相同前綴自動快取，prompt_cache_key 讓同模型請求路由到同一快取
+                openai_kwargs["model_kwargs"] = {"prompt_cache_key": f"tradingagents-{deep_model}"}
+            self.deep_thinking_llm = GovernedChatOpenAI(**openai_kwargs, **shared_kwargs)
 
             openai_kwargs_quick = {
                 "model": self.config["quick_think_llm"],
@@ -91,7 +126,11 @@ class TradingAgentsGraph:
             }
             if backend_url:
                 openai_kwargs_quick["base_url"] = backend_url
-            self.quick_thinking_llm = ChatOpenAI(**openai_kwargs_quick)
+            if prompt_cache and is_official_openai(backend_url):
+                openai_kwargs_quick["model_kwargs"] = {
+                    "prompt_cache_key": f"tradingagents-{self.config['quick_think_llm']}"
+                }
+            self.quick_thinking_llm = GovernedChatOpenAI(**openai_kwargs_quick, **shared_kwargs)
 
         elif provider == "anthropic":
             # Anthropic 使用獨立的 API 端點，不傳入 OpenAI 的 base_url
@@ -102,7 +141,7 @@ class TradingAgentsGraph:
             anthropic_base = self.config.get("anthropic_base_url", "")
             if anthropic_base:
                 anthropic_kwargs["base_url"] = anthropic_base
-            self.deep_thinking_llm = ChatAnthropic(**anthropic_kwargs)
+            self.deep_thinking_llm = GovernedChatAnthropic(**anthropic_kwargs, **shared_kwargs)
 
             anthropic_kwargs_quick = {
                 "model": self.config["quick_think_llm"],
@@ -110,7 +149,7 @@ class TradingAgentsGraph:
             }
             if anthropic_base:
                 anthropic_kwargs_quick["base_url"] = anthropic_base
-            self.quick_thinking_llm = ChatAnthropic(**anthropic_kwargs_quick)
+            self.quick_thinking_llm = GovernedChatAnthropic(**anthropic_kwargs_quick, **shared_kwargs)
 
         else:
             raise ValueError(f"不支援的 LLM 提供商: {self.config['llm_provider']}。僅支援 openai 和 anthropic。")
@@ -162,9 +201,24 @@ class TradingAgentsGraph:
         self.curr_state = None
         self.ticker = None
         self.log_states_dict = {}  # date to full state dict
-
-        # Set up the graph
-        self.graph = self.graph_setup.setup_graph(selected_analysts)
+        # 依股票分開的記錄（同一圖實例可能同時分析不同股票，寫檔時互不覆蓋）
+        self._logs_by_ticker: Dict[str, Dict[str, Any]] = {}
+        self._log_lock = threading.Lock()
+
+        # 錄製 / 重播工具結果與 LLM 回應（cassette_mode: off / record / replay）
+        self.cassette = cassette_from_config(self.config)
+
+        # Set up the graph（啟用檢查點時每個 superstep 完成後保存狀態，失敗可續跑）
+        self.checkpointer = create_checkpointer(self.config)
+        self.graph = self.graph_setup.setup_graph(selected_analysts, checkpointer=self.checkpointer)
+
+    # 分析師類型 -> 報告欄位（續跑時跳過已完成分析師的預載入）
+    _ANALYST_REPORT_FIELDS = {
+        "market": "market_report",
+        "social": "sentiment_report",
+        "news": "news_report",
+        "fundamentals": "fundamentals_report",
+    }
 
     # 節點級別進度偵測：狀態欄位 -> 進度事件標識
     # 當串流中對應欄位從空值變為有值時，回報該進度事件
@@ -177,14 +231,210 @@ class TradingAgentsGraph:
         "final_trade_decision": "node_risk_judge_done",
     }
 
-    def propagate(self, company_name, trade_date, progress_callback=None):
+    def propagate(self, company_name, trade_date, progress_callback=None, thread_id=None):
         """執行交易智慧體圖分析。
 
         Args:
             company_name: 股票代碼
             trade_date: 分析日期（YYYY-MM-DD）
             progress_callback: 可選的進度回呼函式，接收進度事件標識字串
+            thread_id: 檢查點 thread id；傳入先前失敗或取消的分析的 thread id
+                時從最後完成的節點續跑，未傳入時自動產生
+        """
+        ticker = self._validate_inputs(company_name, trade_date)
+        thread_id = self._resolve_thread_id(ticker, trade_date, thread_id)
+
+        # 每次分析綁定本實例的設定，並使用獨立的工具結果 / 記憶嵌入快取範圍，
+        # 同時執行的其他分析不會被清除預載入資料；離開時釋放共享結果引用
+        with use_config(self.config), analysis_scope(f"{ticker}@{trade_date}") as context:
+            try:
+                result = self._run_propagation(company_name, trade_date, progress_callback, context, thread_id)
+            except BaseException:
+                self._log_resume_hint(ticker, thread_id)
+                raise
+            finally:
+                self._save_cassette()
+        self._release_checkpoint(thread_id)
+        return result
+
+    async def apropagate(self, company_name, trade_date, progress_callback=None, thread_id=None):
+        """propagate 的非同步版本，以 graph.astream 執行圖分析。
+
+        宣告 anode 的節點直接 await LLM 的 ainvoke，並行辯論以 asyncio.gather 執行，
+        不佔用執行緒池；可在同一個事件迴圈中同時執行多個分析。
+        工具與記憶查詢仍為同步用戶端，由執行緒池執行。
+
+        Args:
+            company_name: 股票代碼
+            trade_date: 分析日期（YYYY-MM-DD）
+            progress_callback: 可選的進度回呼函式，接收進度事件標識字串
+            thread_id: 檢查點 thread id（與 propagate 相同，可續跑兩者任一路徑留下的檢查點）
+        """
+        ticker = self._validate_inputs(company_name, trade_date)
+        thread_id = self._resolve_thread_id(ticker, trade_date, thread_id)
+
+        with use_config(self.config), analysis_scope(f"{ticker}@{trade_date}") as context:
+            try:
+                t_start = time.monotonic()
+                stage_times: dict[str, float] = {}
+                graph_input, args, stage_times["prefetch"] = self._prepare_run(
+                    company_name, trade_date, context, progress_callback, thread_id
+                )
+
+                populated = set()
+                final_state = None
+                t_graph = time.monotonic()
+                node_timestamps = {}
+
+                async for chunk in self.graph.astream(graph_input, **args):
+                    final_state = chunk
+                    self._handle_chunk(chunk, populated, node_timestamps, t_graph, progress_callback)
+
+                stage_times["graph"] = round(time.monotonic() - t_graph, 2)
+                self._finish_propagation(ticker, trade_date, final_state, node_timestamps, stage_times, t_start)
+
+                # 訊號處理為同步 LLM 呼叫，交由執行緒池執行
+                signal = await asyncio.to_thread(
+                    self.process_signal, final_state["final_trade_decision"], company_name
+                )
+            except BaseException:
+                self._log_resume_hint(ticker, thread_id)
+                raise
+            finally:
+                await asyncio.to_thread(self._save_cassette)
+        await asyncio.to_thread(self._release_checkpoint, thread_id)
+        return final_state, signal
+
+    def propagate_many(self, tickers, trade_date, max_concurrency=None, max_llm_concurrency=None,
+                       retries=None, progress_callback=None):
+        """批次分析多檔股票，依完成順序逐一產出結果（generator）。
+
+        - 圖執行前以單次 yf.download 批次補齊所有股票的日K線
+        - 同時執行 max_concurrency 個圖，所有圖的 LLM 呼叫共用 max_llm_concurrency 的並發預算
+        - 單檔失敗不影響其他股票；失敗的股票以同一個 thread_id 從檢查點續跑重試
+
+        Args:
+            tickers: 股票代碼列表
+            trade_date: 分析日期（YYYY-MM-DD）
+            max_concurrency: 同時執行的圖數（預設為設定 batch_max_concurrency）
+            max_llm_concurrency: 所有圖共用的 LLM 同時呼叫數（預設為設定 batch_llm_concurrency）
+            retries: 單檔失敗後的重試次數（預設為設定 batch_retries）
+            progress_callback: 可選的進度回呼函式，接收 (股票代碼, 進度事件標識)
+
+        Yields:
+            dict: ticker、final_state、signal、error（成功時為 None）、attempts、thread_id、elapsed
         """
+        if not trade_date or not _DATE_RE.match(str(trade_date).strip()):
+            raise ValueError(f"無效的日期格式: {trade_date}")
+        max_concurrency = max(1, int(max_concurrency or self.config.get("batch_max_concurrency", 4)))
+        max_llm_concurrency = max(1, int(max_llm_concurrency or self.config.get("batch_llm_concurrency", 8)))
+        if retries is None:
+            retries = self.config.get("batch_retries", 1)
+        retries = max(0, int(retries))
+
+        # 無效的股票代碼直接回報錯誤，不影響其他股票
+        valid = []
+        for ticker in tickers:
+            try:
+                ticker = self._validate_inputs(ticker, trade_date)
+            except ValueError as e:
+                yield self._batch_result(ticker, error=e)
+                continue
+            if ticker not in valid:
+                valid.append(ticker)
+        if not valid:
+            return
+
+        logger.info(
+            f"[批次分析] {len(valid)} 檔 @ {trade_date}，"
+            f"圖並發 {max_concurrency}，LLM 並發 {max_llm_concurrency}，重試 {retries} 次"
+        )
+        t_batch = time.monotonic()
+        budget = LLMConcurrencyBudget(max_llm_concurrency)
+        executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch")
+        succeeded = failed = 0
+        try:
+            self._prefetch_batch(valid, trade_date)
+
+            futures = []
+            for ticker in valid:
+                callback = functools.partial(progress_callback, ticker) if progress_callback else None
+                futures.append(executor.submit(
+                    copy_context().run, self._propagate_with_retry, ticker, trade_date, retries, callback, budget
+                ))
+            for future in as_completed(futures):
+                result = future.result()
+                if result["error"] is None:
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield result
+        finally:
+            # 呼叫端提前停止迭代時取消尚未開始的股票（執行中的分析會完成並保留檢查點）
+            executor.shutdown(wait=False, cancel_futures=True)
+            logger.info(
+                f"[批次分析] 完成 {succeeded} 檔，失敗 {failed} 檔，"
+                f"LLM 並發峰值 {budget.peak}，耗時 {time.monotonic() - t_batch:.1f}秒"
+            )
+
+    def _prefetch_batch(self, tickers, trade_date):
+        """批次下載所有股票的日K線（其餘資料由各股票分析的預載入處理）"""
+        if "market" not in self.graph_setup.analyst_nodes or not self.toolkit.config.get("online_tools"):
+            return
+        with use_config(self.config):
+            try:
+                seeded = prefetch_us_price_histories(tickers, calc_start_date(trade_date), trade_date)
+                logger.info(f"[批次分析] 批次下載日K線 {len(seeded)}/{len(tickers)} 檔")
+            except Exception as e:
+                logger.warning(f"[批次分析] 批次下載日K線失敗，各股票將自行下載: {e}")
+
+    def _propagate_with_retry(self, ticker, trade_date, retries, progress_callback, budget):
+        """執行單檔分析（在 LLM 並發預算內），失敗時以同一個 thread_id 從檢查點續跑重試"""
+        thread_id = self._resolve_thread_id(ticker, trade_date, None)
+        t_start = time.monotonic()
+        error = None
+        attempt = 0
+        with use_llm_budget(budget):
+            for attempt in range(1, retries + 2):
+                try:
+                    final_state, signal = self.propagate(
+                        ticker, trade_date, progress_callback=progress_callback, thread_id=thread_id
+                    )
+                    return self._batch_result(
+                        ticker, final_state=final_state, signal=signal, attempts=attempt,
+                        thread_id=thread_id, elapsed=time.monotonic() - t_start,
+                    )
+                except ValueError as e:
+                    # 輸入或檢查點不符，重試也無法恢復
+                    error = e
+                    break
+                except Exception as e:
+                    error = e
+                    if attempt <= retries:
+                        delay = min(_BATCH_RETRY_BASE_DELAY * 2 ** (attempt - 1), 10)
+                        logger.warning(f"[批次分析] {ticker} 第 {attempt} 次執行失敗，{delay:.1f} 秒後重試: {e}")
+                        time.sleep(delay)
+
+        logger.error(f"[批次分析] {ticker} 分析失敗（已執行 {attempt} 次）: {error}")
+        return self._batch_result(
+            ticker, error=error, attempts=attempt, thread_id=thread_id, elapsed=time.monotonic() - t_start
+        )
+
+    @staticmethod
+    def _batch_result(ticker, final_state=None, signal=None, error=None, attempts=0, thread_id=None,
+                      elapsed=0.0):
+        return {
+            "ticker": ticker,
+            "final_state": final_state,
+            "signal": signal,
+            "error": error,
+            "attempts": attempts,
+            "thread_id": thread_id,
+            "elapsed": round(elapsed, 2),
+        }
+
+    def _validate_inputs(self, company_name, trade_date) -> str:
+        """驗證輸入並回傳正規化的股票代碼"""
         # 驗證股票代碼格式，防止路徑穿越攻擊
         if not company_name or not _SYMBOL_RE.match(str(company_name).strip()):
             raise ValueError(f"無效的股票代碼: {company_name}")
@@ -194,32 +444,20 @@ class TradingAgentsGraph:
             raise ValueError(f"無效的日期格式: {trade_date}")
 
         logger.debug(f"propagate 接收: company_name='{company_name}', trade_date='{trade_date}'")
+        return company_name.upper().strip()
 
+    def _run_propagation(self, company_name, trade_date, progress_callback, context: AnalysisContext,
+                         thread_id=None):
+        """在指定分析快取範圍內執行預載入與圖分析（由 propagate 呼叫）"""
         # 效能計時：記錄各階段耗時供監控最佳化
         t_start = time.monotonic()
         stage_times: dict[str, float] = {}
 
-        # 重置工具結果快取，確保本次分析使用新鮮資料
-        reset_tool_result_cache()
-
-        self.ticker = company_name.upper().strip()
-
-        # 資料預載入：在圖執行前並行載入所有分析師需要的資料到快取
-        # 7 個 API 呼叫合併為一批，分析師開始時直接命中快取
-        if progress_callback:
-            progress_callback("node_prefetch_started")
-        t_prefetch = time.monotonic()
-        try:
-            prefetch_analyst_data(self.toolkit, self.ticker, str(trade_date))
-        except Exception as e:
-            logger.warning(f"[資料預載入] 部分失敗，分析師將自行重試: {e}")
-        stage_times["prefetch"] = round(time.monotonic() - t_prefetch, 2)
-
-        # 建立初始狀態
-        init_agent_state = self.propagator.create_initial_state(
-            company_name, trade_date
+        # 使用區域變數：快取的圖實例可能同時服務多個分析，self.ticker 只保留最後一次的值
+        ticker = company_name.upper().strip()
+        graph_input, args, stage_times["prefetch"] = self._prepare_run(
+            company_name, trade_date, context, progress_callback, thread_id
         )
-        args = self.propagator.get_graph_args()
 
         # 統一使用 graph.stream()：既能取得最終狀態，也能偵測中間進度
         populated = set()
@@ -227,29 +465,120 @@ class TradingAgentsGraph:
         t_graph = time.monotonic()
         node_timestamps = {}  # 節點級別計時
 
-        for chunk in self.graph.stream(init_agent_state, **args):
+        for chunk in self.graph.stream(graph_input, **args):
             final_state = chunk
+            self._handle_chunk(chunk, populated, node_timestamps, t_graph, progress_callback)
 
-            if self.debug and chunk.get("messages"):
-                last_msg = chunk["messages"][-1]
-                msg_content = getattr(last_msg, 'content', str(last_msg))
-                logger.debug(f"[Debug] {msg_content[:200]}")
+        stage_times["graph"] = round(time.monotonic() - t_graph, 2)
+        self._finish_propagation(ticker, trade_date, final_state, node_timestamps, stage_times, t_start)
 
-            # 偵測狀態欄位變化，回報節點級別進度（例外不中斷主流程）
-            if progress_callback:
-                try:
-                    self._detect_progress(chunk, populated, progress_callback)
-                except Exception as e:
-                    logger.warning(f"進度偵測回呼失敗: {e}")
+        # 回傳決策和處理後的訊號
+        return final_state, self.process_signal(final_state["final_trade_decision"], company_name)
 
-            # 記錄節點完成時間戳（用於效能分析）
-            for field, event in self._PROGRESS_FIELDS.items():
-                if field not in node_timestamps and chunk.get(field):
-                    elapsed = round(time.monotonic() - t_graph, 2)
-                    node_timestamps[field] = elapsed
+    def _prepare_run(self, company_name, trade_date, context: AnalysisContext, progress_callback, thread_id):
+        """決定圖輸入（新分析的初始狀態，或續跑時的 None）並送出預載入
 
-        stage_times["graph"] = round(time.monotonic() - t_graph, 2)
+        Returns:
+            tuple: (graph_input, graph_args, 預載入送出耗時)
+        """
+        ticker = company_name.upper().strip()
+        args = self.propagator.get_graph_args(thread_id)
+        # cassette 綁定在分析範圍，預載入的工具執行緒與圖節點都能取得
+        context.cassette = self.cassette
+
+        snapshot = get_resumable_state(self.graph, thread_id)
+        if snapshot is None:
+            analyst_nodes = list(self.graph_setup.analyst_nodes.values())
+            graph_input = self.propagator.create_initial_state(company_name, trade_date)
+        else:
+            values = snapshot.values
+            if (str(values.get("company_of_interest", "")).upper() != ticker
+                    or str(values.get("trade_date")) != str(trade_date)):
+                raise ValueError(
+                    f"thread_id {thread_id} 的檢查點屬於 "
+                    f"{values.get('company_of_interest')}@{values.get('trade_date')}，無法用於 {ticker}@{trade_date}"
+                )
+            # 續跑：只預載入尚未完成報告的分析師所需資料
+            analyst_nodes = [
+                node for analyst_type, node in self.graph_setup.analyst_nodes.items()
+                if not values.get(self._ANALYST_REPORT_FIELDS.get(analyst_type, ""))
+            ]
+            graph_input = None
+            logger.info(f"[檢查點] {ticker}@{trade_date} 從 {list(snapshot.next)} 續跑 (thread_id={thread_id})")
+
+        return graph_input, args, self._start_prefetch(ticker, trade_date, context, progress_callback, analyst_nodes)
+
+    def _start_prefetch(self, ticker, trade_date, context: AnalysisContext, progress_callback,
+                        analyst_nodes=None) -> float:
+        """送出資料預載入，回傳送出耗時（秒）"""
+        self.ticker = ticker
+        if analyst_nodes is None:
+            analyst_nodes = list(self.graph_setup.analyst_nodes.values())
+        if not analyst_nodes:
+            return 0.0
+
+        # 資料預載入：依圖中分析師宣告的資料相依與設定規劃不重複的 API 呼叫，
+        # 一批送出後立即開始執行圖；各工具的 Future 登記在分析範圍中，
+        # 分析師只等待自己需要的資料（市場分析師可在新聞仍在下載時就進入 LLM 推理）
+        if progress_callback:
+            progress_callback("node_prefetch_started")
+        t_prefetch = time.monotonic()
+        try:
+            prefetch_analyst_data(
+                self.toolkit, ticker, str(trade_date), context=context, wait=False,
+                analyst_nodes=analyst_nodes,
+            )
+        except Exception as e:
+            logger.warning(f"[資料預載入] 部分失敗，分析師將自行重試: {e}")
+        return round(time.monotonic() - t_prefetch, 2)
+
+    def _resolve_thread_id(self, ticker, trade_date, thread_id):
+        """啟用檢查點時回傳 thread id（未指定時產生新的），停用時回傳 None"""
+        if self.checkpointer is None:
+            if thread_id:
+                logger.warning("[檢查點] 檢查點已停用，忽略 thread_id 並重新分析")
+            return None
+        return thread_id or f"{ticker}-{trade_date}-{uuid.uuid4().hex[:12]}"
+
+    def _log_resume_hint(self, ticker, thread_id):
+        if thread_id:
+            logger.error(f"[檢查點] {ticker} 分析中斷，可使用 thread_id={thread_id} 從最後完成的節點續跑")
+
+    def _save_cassette(self):
+        """record 模式在每次分析結束（含失敗）時寫入錄製內容"""
+        if self.cassette is not None and self.cassette.recording:
+            try:
+                self.cassette.save()
+            except Exception as e:
+                logger.error(f"[Cassette] 保存錄製失敗: {e}")
+
+    def _release_checkpoint(self, thread_id):
+        """分析成功後清除檢查點（設定 checkpoint_keep_completed 時保留）"""
+        if not self.config.get("checkpoint_keep_completed", False):
+            delete_thread(self.graph, thread_id)
+
+    def _handle_chunk(self, chunk, populated, node_timestamps, t_graph, progress_callback):
+        """處理串流 chunk：除錯輸出、進度回報與節點計時"""
+        if self.debug and chunk.get("messages"):
+            last_msg = chunk["messages"][-1]
+            msg_content = getattr(last_msg, 'content', str(last_msg))
+            logger.debug(f"[Debug] {msg_content[:200]}")
+
+        # 偵測狀態欄位變化，回報節點級別進度（例外不中斷主流程）
+        if progress_callback:
+            try:
+                self._detect_progress(chunk, populated, progress_callback)
+            except Exception as e:
+                logger.warning(f"進度偵測回呼失敗: {e}")
 
+        # 記錄節點完成時間戳（用於效能分析）
+        for field, event in self._PROGRESS_FIELDS.items():
+            if field not in node_timestamps and chunk.get(field):
+                elapsed = round(time.monotonic() - t_graph, 2)
+                node_timestamps[field] = elapsed
+
+    def _finish_propagation(self, ticker, trade_date, final_state, node_timestamps, stage_times, t_start):
+        """記錄節點耗時、保存最終狀態並輸出效能統計"""
         # 記錄節點級別耗時（幫助定位瓶頸）
         if node_timestamps:
             timing_parts = [f"{k.replace('_report','').replace('_plan','').replace('_decision','')}={v}s"
@@ -263,20 +592,33 @@ class TradingAgentsGraph:
         self.curr_state = final_state
 
         # 記錄狀態
-        self._log_state(trade_date, final_state)
+        self._log_state(trade_date, final_state, ticker)
 
         # 效能統計日誌
         total = round(time.monotonic() - t_start, 2)
         stage_times["total"] = total
         logger.info(
-            f"[效能] {self.ticker} 分析完成: "
+            f"[效能] {ticker} 分析完成: "
             f"prefetch={stage_times['prefetch']}s, "
             f"graph={stage_times['graph']}s, "
             f"total={total}s"
         )
-
-        # 回傳決策和處理後的訊號
-        return final_state, self.process_signal(final_state["final_trade_decision"], company_name)
+        context = get_current_analysis_context()
+        usage = context.llm_usage_stats() if context is not None else {}
+        if usage:
+            usage_parts = [f"{node}={u['cache_read']}/{u['input_tokens']}" for node, u in sorted(usage.items())]
+            logger.info(f"[效能-提示快取] 快取讀取/輸入 tokens: {' | '.join(usage_parts)}")
+        if self.llm_cache is not None:
+            stats = self.llm_cache.get_stats()
+            logger.info(
+                f"[LLM快取] 命中 {stats['hits']}/{stats['hits'] + stats['misses']} "
+                f"(命中率 {stats['hit_ratio']:.0%})，累計節省 {stats['tokens_saved']} tokens"
+            )
+        if self.llm_governor is not None:
+            throttled = {key: s for key, s in self.llm_governor.get_stats().items() if s["throttled"]}
+            if throttled:
+                parts = [f"{key}={s['throttled']}次/{s['wait_seconds']}s" for key, s in sorted(throttled.items())]
+                logger.info(f"[LLM限流] 行程累計限流等待: {' | '.join(parts)}")
 
     def _detect_progress(self, chunk, populated, callback):
         """偵測串流 chunk 中新出現的狀態欄位，回報對應進度事件。
@@ -312,12 +654,21 @@ class TradingAgentsGraph:
                 populated.add("risk_debate_started")
                 callback("node_risk_debate_started")
 
-    def _log_state(self, trade_date, final_state):
+    def reset_state(self):
+        """清除跨分析保留的狀態（快取重用圖實例時呼叫，不影響執行中的分析）"""
+        with self._log_lock:
+            self.curr_state = None
+            self.ticker = None
+            self.log_states_dict = {}
+            self._logs_by_ticker = {}
+
+    def _log_state(self, trade_date, final_state, ticker=None):
         """Log the final state to a JSON file."""
+        ticker = ticker or self.ticker
         try:
             invest_debate = final_state.get("investment_debate_state", {})
             risk_debate = final_state.get("risk_debate_state", {})
-            self.log_states_dict[str(trade_date)] = {
+            entry = {
                 "company_of_interest": final_state.get("company_of_interest", ""),
                 "trade_date": final_state.get("trade_date", ""),
                 "market_report": final_state.get("market_report", ""),
@@ -346,13 +697,17 @@ class TradingAgentsGraph:
             logger.error(f"記錄狀態時發生錯誤: {e}")
             return
 
-        # 背景執行緒寫入，不阻塞分析結果回傳
-        data_copy = dict(self.log_states_dict)
-        ticker = self.ticker
+        with self._log_lock:
+            self.log_states_dict[str(trade_date)] = entry
+            ticker_logs = self._logs_by_ticker.setdefault(ticker, {})
+            ticker_logs[str(trade_date)] = entry
+            # 背景執行緒寫入，不阻塞分析結果回傳
+            data_copy = dict(ticker_logs)
+        # 於呼叫當下解析路徑，背景寫入不受之後工作目錄變更影響
+        directory = Path(f"eval_results/{ticker}/TradingAgentsStrategy_logs/").absolute()
 
         def _write():
             try:
-                directory = Path(f"eval_results/{ticker}/TradingAgentsStrategy_logs/")
                 directory.mkdir(parents=True, exist_ok=True)
                 with open(directory / "full_states_log.json", "w", encoding="utf-8") as f:
                     json.dump(data_copy, f, ensure_ascii=False)
@@ -361,9 +716,15 @@ class TradingAgentsGraph:
 
         threading.Thread(target=_write, daemon=True).start()
 
-    def reflect_and_remember(self, returns_losses):
-        """Reflect on decisions and update memory based on returns."""
-        if not self.curr_state:
+    def reflect_and_remember(self, returns_losses, final_state=None):
+        """Reflect on decisions and update memory based on returns.
+
+        Args:
+            returns_losses: 持倉收益
+            final_state: 要反思的分析狀態（預設為最近一次分析；同一圖實例執行多個分析時應明確傳入）
+        """
+        state = final_state or self.curr_state
+        if not state:
             logger.warning("尚無分析狀態，跳過反思")
             return
 
@@ -379,7 +740,7 @@ class TradingAgentsGraph:
                 logger.debug(f"{name} 記憶系統未啟用，跳過反思")
                 continue
             try:
-                reflect_fn(self.curr_state, returns_losses, memory)
+                reflect_fn(state, returns_losses, memory)
             except Exception as e:
                 logger.error(f"{name} 反思時發生錯誤: {e}")
 
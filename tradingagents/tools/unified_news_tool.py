@@ -6,10 +6,12 @@
 """
 
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 import hashlib
 import os
 
+from tradingagents.dataflows.tiered_cache import get_tiered_cache
+
 logger = logging.getLogger(__name__)
 
 class UnifiedNewsAnalyzer:
@@ -22,7 +24,6 @@ class UnifiedNewsAnalyzer:
             toolkit: 包含各種新聞取得工具的工具包
         """
         self.toolkit = toolkit
-        self.news_cache = {}
         self.cache_hours = int(os.getenv('NEWS_CACHE_HOURS', '4'))
         self.cache_enabled = os.getenv('NEWS_CACHE_ENABLED', 'true').lower() == 'true'
         logger.info(f"[統一新聞工具] 快取已{'啟用' if self.cache_enabled else '禁用'}，快取時間: {self.cache_hours}小時")
@@ -77,18 +78,12 @@ class UnifiedNewsAnalyzer:
         return hashlib.sha256(key_str.encode()).hexdigest()[:16]
 
     def _get_from_cache(self, cache_key: str):
-        """從快取取得資料"""
-        if cache_key in self.news_cache:
-            cached_data, cached_time = self.news_cache[cache_key]
-            if datetime.now() - cached_time < timedelta(hours=self.cache_hours):
-                return cached_data
-            else:
-                del self.news_cache[cache_key]
-        return None
+        """從分層快取取得資料（跨實例、跨行程共用）"""
+        return get_tiered_cache().get("news", cache_key)
 
     def _save_to_cache(self, cache_key: str, data: str):
-        """將資料保存到快取"""
-        self.news_cache[cache_key] = (data, datetime.now())
+        """將資料保存到分層快取"""
+        get_tiered_cache().set("news", cache_key, data, ttl=self.cache_hours * 3600)
     
     def _identify_stock_type(self, stock_code: str) -> str:
         """識別股票類型 - 統一視為美股"""
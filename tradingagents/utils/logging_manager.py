@@ -171,10 +171,18 @@ class TradingAgentsLogger:
             logging_config.get('docker', {}).get('enabled', False)
         )
 
+        # 環境變數指定的日誌目錄優先於配置檔
+        handlers = logging_config.get('handlers', {})
+        env_log_dir = os.getenv('TRADINGAGENTS_LOG_DIR')
+        if env_log_dir:
+            for handler in handlers.values():
+                if isinstance(handler, dict) and 'directory' in handler:
+                    handler['directory'] = env_log_dir
+
         return {
             'level': logging_config.get('level', 'INFO'),
             'format': logging_config.get('format', {}),
-            'handlers': logging_config.get('handlers', {}),
+            'handlers': handlers,
             'loggers': logging_config.get('loggers', {}),
             'docker': {
                 'enabled': is_docker,
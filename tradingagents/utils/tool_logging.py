@@ -6,6 +6,7 @@
 
 import time
 import functools
+import inspect
 from typing import Optional, Callable
 from datetime import datetime
 
@@ -300,94 +301,114 @@ def log_analysis_step(step_name: str, symbol: str, **extra_data):
     tool_logger.info(f"[分析步驟] {step_name} - {symbol}", extra=extra)
 
 
+def _extract_module_symbol(module_name: str, args, kwargs) -> str:
+    """從模組函式參數中提取股票代碼（找不到時回傳 'unknown'）"""
+    symbol = None
+
+    # 特殊處理：訊號處理模組的參數結構
+    if module_name == "graph_signal_processing":
+        # 訊號處理模組：process_signal(self, full_signal, stock_symbol=None)
+        if len(args) >= 3:  # self, full_signal, stock_symbol
+            symbol = str(args[2]) if args[2] else None
+        elif 'stock_symbol' in kwargs:
+            symbol = str(kwargs['stock_symbol']) if kwargs['stock_symbol'] else None
+    else:
+        if args:
+            # 檢查第一個參數是否是state字典（分析師節點的情況）
+            first_arg = args[0]
+            if isinstance(first_arg, dict) and 'company_of_interest' in first_arg:
+                symbol = str(first_arg['company_of_interest'])
+            # 檢查第一個參數是否是股票代碼
+            elif isinstance(first_arg, str) and len(first_arg) <= 10:
+                symbol = first_arg
+
+    # 從kwargs中查找股票代碼
+    if not symbol:
+        for key in ['symbol', 'ticker', 'stock_code', 'stock_symbol', 'company_of_interest']:
+            if key in kwargs:
+                symbol = str(kwargs[key])
+                break
+
+    # 如果還是沒找到，使用預設值
+    return symbol or 'unknown'
+
+
 def log_analysis_module(module_name: str, session_id: str = None):
     """
     分析模組日誌裝飾器
-    自動記錄模組的開始和結束
+    自動記錄模組的開始和結束（同時支援同步函式與協程函式）
 
     Args:
         module_name: 模組名稱（如：market_analyst、fundamentals_analyst等）
         session_id: 會話ID（可選）
     """
     def decorator(func: Callable) -> Callable:
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            # 嘗試從參數中提取股票代碼
-            symbol = None
-
-            # 特殊處理：訊號處理模組的參數結構
-            if module_name == "graph_signal_processing":
-                # 訊號處理模組：process_signal(self, full_signal, stock_symbol=None)
-                if len(args) >= 3:  # self, full_signal, stock_symbol
-                    symbol = str(args[2]) if args[2] else None
-                elif 'stock_symbol' in kwargs:
-                    symbol = str(kwargs['stock_symbol']) if kwargs['stock_symbol'] else None
-            else:
-                if args:
-                    # 檢查第一個參數是否是state字典（分析師節點的情況）
-                    first_arg = args[0]
-                    if isinstance(first_arg, dict) and 'company_of_interest' in first_arg:
-                        symbol = str(first_arg['company_of_interest'])
-                    # 檢查第一個參數是否是股票代碼
-                    elif isinstance(first_arg, str) and len(first_arg) <= 10:
-                        symbol = first_arg
-
-            # 從kwargs中查找股票代碼
-            if not symbol:
-                for key in ['symbol', 'ticker', 'stock_code', 'stock_symbol', 'company_of_interest']:
-                    if key in kwargs:
-                        symbol = str(kwargs[key])
-                        break
-
-            # 如果還是沒找到，使用預設值
-            if not symbol:
-                symbol = 'unknown'
+        def _start(args, kwargs):
+            symbol = _extract_module_symbol(module_name, args, kwargs)
 
             # 生成會話ID
             actual_session_id = session_id or f"session_{int(time.time())}"
 
             # 記錄模組開始
             logger_manager = get_logger_manager()
-
-            start_time = time.time()
-
             logger_manager.log_module_start(
                 tool_logger, module_name, symbol, actual_session_id,
                 function_name=func.__name__,
                 args_count=len(args),
                 kwargs_keys=list(kwargs.keys())
             )
+            return logger_manager, symbol, actual_session_id, time.time()
 
-            try:
-                # 執行分析函式
-                result = func(*args, **kwargs)
+        def _complete(started, result):
+            logger_manager, symbol, actual_session_id, start_time = started
+            # 計算執行時間
+            duration = time.time() - start_time
 
-                # 計算執行時間
-                duration = time.time() - start_time
+            # 記錄模組完成
+            result_length = len(str(result)) if result else 0
+            logger_manager.log_module_complete(
+                tool_logger, module_name, symbol, actual_session_id,
+                duration, success=True, result_length=result_length,
+                function_name=func.__name__
+            )
 
-                # 記錄模組完成
-                result_length = len(str(result)) if result else 0
-                logger_manager.log_module_complete(
-                    tool_logger, module_name, symbol, actual_session_id,
-                    duration, success=True, result_length=result_length,
-                    function_name=func.__name__
-                )
+        def _error(started, e):
+            logger_manager, symbol, actual_session_id, start_time = started
+            duration = time.time() - start_time
+
+            # 記錄模組錯誤
+            logger_manager.log_module_error(
+                tool_logger, module_name, symbol, actual_session_id,
+                duration, str(e),
+                function_name=func.__name__
+            )
 
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = _start(args, kwargs)
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    _error(started, e)
+                    raise
+                _complete(started, result)
                 return result
 
-            except Exception as e:
-                # 計算執行時間
-                duration = time.time() - start_time
-
-                # 記錄模組錯誤
-                logger_manager.log_module_error(
-                    tool_logger, module_name, symbol, actual_session_id,
-                    duration, str(e),
-                    function_name=func.__name__
-                )
+            return async_wrapper
 
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = _start(args, kwargs)
+            try:
+                # 執行分析函式
+                result = func(*args, **kwargs)
+            except Exception as e:
+                _error(started, e)
                 # 重新拋出異常
                 raise
+            _complete(started, result)
+            return result
 
         return wrapper
     return decorator
@@ -4,7 +4,6 @@
 使用者可以查看、管理和清理股票資料快取
 """
 
-import json
 from datetime import datetime, timedelta
 
 import streamlit as st
@@ -192,25 +191,21 @@ def main():
     
     # 顯示快取檔案列表
     try:
-        metadata_files = list(cache.metadata_dir.glob("*_meta.json"))
+        entries = cache.list_entries(data_type)
         
-        if metadata_files:
+        if entries:
             cache_items = []
-            for metadata_file in metadata_files:
+            for metadata in entries:
                 try:
-                    with open(metadata_file, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-                    
-                    if metadata.get('data_type') == data_type:
-                        cached_at = datetime.fromisoformat(metadata['cached_at'])
-                        cache_items.append({
-                            'symbol': metadata.get('symbol', 'N/A'),
-                            'data_source': metadata.get('data_source', 'N/A'),
-                            'cached_at': cached_at.strftime('%Y-%m-%d %H:%M:%S'),
-                            'start_date': metadata.get('start_date', 'N/A'),
-                            'end_date': metadata.get('end_date', 'N/A'),
-                            'file_path': metadata.get('file_path', 'N/A')
-                        })
+                    cached_at = datetime.fromisoformat(metadata['cached_at'])
+                    cache_items.append({
+                        'symbol': metadata.get('symbol', 'N/A'),
+                        'data_source': metadata.get('data_source', 'N/A'),
+                        'cached_at': cached_at.strftime('%Y-%m-%d %H:%M:%S'),
+                        'start_date': metadata.get('start_date', 'N/A'),
+                        'end_date': metadata.get('end_date', 'N/A'),
+                        'file_path': metadata.get('file_path', 'N/A')
+                    })
                 except Exception as e:
                     continue
             
@@ -69,6 +69,12 @@ def _compute_graph_cache_key(config: dict, analysts: list) -> str:
         str(config.get("max_risk_discuss_rounds", 1)),
         str(config.get("memory_enabled", True)),
         str(config.get("online_tools", False)),
+        # LLM 調度器的呼叫優先權隨模型建立
+        config.get("llm_priority", "interactive"),
+        # 設定隨圖實例綁定，目錄不同的設定不可共用同一個圖
+        config.get("data_dir", ""),
+        config.get("results_dir", ""),
+        config.get("data_cache_dir", ""),
         ",".join(sorted(analysts)),
     ]
     return hashlib.md5("|".join(parts).encode()).hexdigest()
@@ -84,10 +90,8 @@ def _get_or_create_graph(config: dict, analysts: list):
         if cache_key in _GRAPH_CACHE:
             graph = _GRAPH_CACHE[cache_key]
             logger.info(f"TradingAgentsGraph 快取命中（key={cache_key[:8]}）")
-            # 重置實例狀態，避免前次分析殘留
-            graph.curr_state = None
-            graph.ticker = None
-            graph.log_states_dict = {}
+            # 重置實例狀態，避免前次分析殘留（分析本身的設定與快取範圍由 propagate 各自綁定）
+            graph.reset_state()
             return graph
 
     # 快取未命中，建立新實例（在鎖外執行，避免長時間持鎖）
@@ -674,8 +678,10 @@ def run_stock_analysis(stock_symbol, analysis_date, analysts, research_depth, ll
                 step_num = min(_node_step[0], _total_steps - 2)
                 update_progress(msg, step=step_num)
 
+        # 啟用檢查點時以 session_id 作為 thread id，中斷時可依日誌中的 session_id 續跑
         state, decision = graph.propagate(
-            formatted_symbol, analysis_date, progress_callback=_node_progress
+            formatted_symbol, analysis_date, progress_callback=_node_progress,
+            thread_id=session_id if graph.checkpointer is not None else None,
         )
 
         # 格式化結果（使用固定的倒數第二步）